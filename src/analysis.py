@@ -0,0 +1,94 @@
+from typing import Callable, Dict, Iterable
+
+from cfg import ControlFlowGraph, count_definitions, count_uses
+from tac import TacProgram
+
+
+# how to compute each analysis of a code unit, given the unit and the cache to get other analyses from
+ANALYSES: Dict[str, Callable] = {
+    "cfg": lambda unit, analyses: ControlFlowGraph(unit.program),
+    # (live in, live out) for each block of the unit's cfg
+    "liveness": lambda unit, analyses: analyses.get("cfg", unit).get_live_variables(),
+    "loops": lambda unit, analyses: analyses.get("cfg", unit).get_natural_loops(),
+    "dominators": lambda unit, analyses: analyses.get("cfg", unit).get_dominators(),
+    # how many instructions define and read each variable name
+    "definitions": lambda unit, analyses: count_definitions(i for b in analyses.get("cfg", unit).blocks
+                                                            for i in b.instructions),
+    "uses": lambda unit, analyses: count_uses(i for b in analyses.get("cfg", unit).blocks for i in b.instructions),
+}
+
+
+# analyses of the code units of a program, computed when first asked for and kept until a pass that changes the
+# program throws them away
+# analyses can depend on each other, eg liveness is worked out over the cached cfg, so an analysis is only valid
+# while everything it was computed from is. Throwing away the cfg also throws away the liveness
+class AnalysisCache:
+    def __init__(self, program: TacProgram):
+        self.program = program
+        self._results = {}  # (name, id(unit)) -> (unit, result); the unit is kept so its id cannot be reused
+        self.num_computed = 0
+        self.num_reused = 0
+
+    def get(self, name: str, unit):
+        key = (name, id(unit))
+        if key in self._results and self._results[key][0] is unit:
+            self.num_reused += 1
+            return self._results[key][1]
+
+        result = ANALYSES[name](unit, self)
+        self._results[key] = (unit, result)
+        self.num_computed += 1
+        return result
+
+    # throw away every analysis not in preserved, and everything computed from them
+    # the allocation of each unit's temporaries is kept on the unit, rather than here, but is thrown away in the same
+    # way, unless "allocation" is preserved
+    def invalidate(self, preserved: Iterable[str] = ()):
+        kept = set(preserved)
+        if "cfg" not in kept:
+            kept.clear()
+
+        self._results = {k: v for k, v in self._results.items() if k[0] in kept}
+        if "allocation" not in kept:
+            for unit in self.program.get_code_units():
+                unit.allocation = None
+
+    # throw away every analysis of one code unit, and its allocation, after its code has been changed
+    # passes which change one unit at a time call this, so that the analyses of the others can still be used
+    def invalidate_unit(self, unit):
+        self._results = {k: v for k, v in self._results.items() if v[0] is not unit}
+        unit.allocation = None
+
+
+# apply transform(unit, cfg, loop) to each loop in the main program and each procedure, innermost first
+# transform returns true iff it changed the CFG, and must leave it alone otherwise, as it is the cached one
+# the loops which contain no other loop still to be done cannot overlap, so they are transformed together, with the
+# same analyses, which are only thrown away once all of them are done. A transform changes only its own loop and
+# the entry to it, which leaves the analyses of the others valid, apart from liveness, which can only shrink, so is
+# still safe to use. The analyses are rebuilt once per level of nesting, rather than once per loop
+def transform_each_loop(program: TacProgram, transform, analyses: AnalysisCache = None):
+    analyses = analyses or AnalysisCache(program)
+    changed = False
+    for unit in program.get_code_units():
+        done_headers = set()  # loops are identified by their header label, which survives rebuilding the CFG
+        while True:
+            cfg = analyses.get("cfg", unit)
+            loops = [loop for loop in analyses.get("loops", unit)
+                     if loop.header.label is not None and loop.header.label.name not in done_headers]
+            if not loops:
+                break
+
+            innermost = [loop for loop in loops
+                         if not any(other is not loop and other.header in loop.blocks for other in loops)]
+            unit_changed = False
+            for loop in innermost:
+                done_headers.add(loop.header.label.name)
+                if transform(unit, cfg, loop):
+                    unit_changed = True
+
+            if unit_changed:
+                unit.program = cfg.to_code()
+                analyses.invalidate_unit(unit)
+                changed = True
+
+    return changed
@@ -0,0 +1,380 @@
+import os
+import subprocess
+import tempfile
+from typing import Dict, List, Union
+
+from cbackend import CCompilerError, RUNTIME_SOURCES
+from regalloc import allocate_unit
+from tac import IF_FALSE_GOTO, IF_TRUE_GOTO, Label, TacInstruction, TacProcedure, TacProgram, TacVariable, is_number_literal
+from typechecker import STR
+
+# temporaries are kept in callee saved registers, so that they survive calls without being saved by the caller
+REGISTERS = ["rbx", "r12", "r13", "r14", "r15"]
+# System V passes the first six arguments in these, and the rest on the stack
+ARGUMENT_REGISTERS = ["rdi", "rsi", "rdx", "rcx", "r8", "r9"]
+
+ARITHMETIC = {
+    "+": "add",
+    "-": "sub",
+    "*": "imul",
+    "&&": "and",  # booleans are always 0 or 1
+    "||": "or"
+}
+# (setcc for the comparison holding, jcc for it not holding, jcc for it holding)
+COMPARISONS = {
+    "==": ("sete", "jne", "je"),
+    "<": ("setl", "jge", "jl")
+}
+
+
+# translate the program into x86-64 assembly for the GNU assembler, in Intel syntax, following the System V ABI
+# each code unit becomes a function, with its temporaries allocated to registers by linear scan and spilled to
+# the stack when they run out. Named variables live in the stack frame
+def generate_assembly(program: TacProgram) -> str:
+    strings: Dict[str, str] = {}  # string literal -> its label
+
+    lines = [".intel_syntax noprefix", ".text", ".globl main"]
+    for unit in program.procedures + [program]:
+        lines += [""] + FunctionGenerator(unit, strings).generate()
+
+    if strings:
+        lines += ["", ".section .rodata"]
+        for string, label in strings.items():
+            lines += [f"{label}:", f"    .asciz {asm_string_literal(string)}"]
+    lines += ["", '.section .note.GNU-stack,"",@progbits']
+
+    return "\n".join(lines) + "\n"
+
+
+# assemble the program and link it with the runtime into a native executable at output_file
+def build_executable(program: TacProgram, output_file, compiler="cc"):
+    with tempfile.TemporaryDirectory() as directory:
+        source_file = os.path.join(directory, "program.s")
+        with open(source_file, "w") as file:
+            file.write(generate_assembly(program))
+
+        command = [compiler, "-O2", "-o", output_file, source_file] + RUNTIME_SOURCES
+        try:
+            result = subprocess.run(command, capture_output=True, text=True)
+        except OSError as e:
+            raise CCompilerError(f"Could not run {compiler}: {e}")
+        if result.returncode != 0:
+            raise CCompilerError(f"{compiler} failed:\n{result.stderr}")
+
+    return output_file
+
+
+# the frame of a function looks like:
+#     [rbp + 16 + 8i]   stack arguments, from the seventh on
+#     [rbp + 8]         return address
+#     [rbp]             caller's rbp
+#     [rbp - 8]...      callee saved registers used by the function
+#     below those       a slot for each named variable, then each spilled temporary
+# after the prologue rsp is rounded down to a multiple of 16, so calls can be made from anywhere in the body
+class FunctionGenerator:
+    def __init__(self, unit: Union[TacProgram, TacProcedure], strings: Dict[str, str]):
+        self.unit = unit
+        self.is_procedure = isinstance(unit, TacProcedure)
+        self.name = f"p_{unit.name}" if self.is_procedure else "main"
+        self.strings = strings
+        self.lines: List[str] = []
+
+        self.instructions = [i for i in unit.program if isinstance(i, TacInstruction)]
+        self.allocation = allocate_unit(unit.program, len(REGISTERS))
+        self.saved_registers = [REGISTERS[r] for r in sorted(set(self.allocation.registers.values()))]
+
+        # every named variable and spilled temporary gets a slot in the frame
+        self.parameters = [repr(p) for p in unit.parameters] if self.is_procedure else []
+        named = list(dict.fromkeys(self.parameters + [repr(v) for i in self.instructions
+                                                       for v in i.get_used_variables() + [i.get_defined_variable()]
+                                                       if v is not None and v.is_named]))
+        self.locations: Dict[str, str] = {}
+        for index, name in enumerate(named):
+            self.locations[name] = self._slot(index)
+        for name, spill_slot in self.allocation.spill_slots.items():
+            self.locations[name] = self._slot(len(named) + spill_slot)
+        for name, register in self.allocation.registers.items():
+            self.locations[name] = REGISTERS[register]
+        self.num_slots = len(named) + self.allocation.num_spill_slots
+        self.named = named
+
+        self.use_counts: Dict[str, int] = {}
+        for instruction in self.instructions:
+            for variable in instruction.get_used_variables():
+                self.use_counts[repr(variable)] = self.use_counts.get(repr(variable), 0) + 1
+
+    def _slot(self, index):
+        return f"QWORD PTR [rbp - {8 * (len(self.saved_registers) + index + 1)}]"
+
+    def generate(self) -> List[str]:
+        self.lines = [f"{self.name}:"]
+        self._generate_prologue()
+
+        pending_arguments = []  # pushed parameters, first argument last
+        code = self.unit.program
+        index = 0
+        while index < len(code):
+            item = code[index]
+            index += 1
+            if isinstance(item, Label):
+                self.lines.append(f".{item.name}:")
+                continue
+
+            if item.op == "PushParam":
+                pending_arguments.append(item.arg1)
+            elif item.op == "LCall":
+                self._generate_call(item, list(reversed(pending_arguments)))
+                pending_arguments = []
+            elif item.op in COMPARISONS and index < len(code) and self._is_fusable(item, code[index]):
+                # compare and branch directly, without materialising the condition
+                self._generate_comparison(item, branch=code[index])
+                index += 1
+            else:
+                self._generate_instruction(item)
+
+        if not self.is_procedure:
+            self._emit("call oreo_exit@PLT")
+            self._emit("xor eax, eax")
+            self._generate_epilogue()
+
+        return self.lines
+
+    def _emit(self, line):
+        self.lines.append("    " + line)
+
+    def _generate_prologue(self):
+        self._emit("push rbp")
+        self._emit("mov rbp, rsp")
+        for register in self.saved_registers:
+            self._emit(f"push {register}")
+        if self.num_slots:
+            self._emit(f"sub rsp, {8 * self.num_slots}")
+        self._emit("and rsp, -16")
+
+        for index, parameter in enumerate(self.parameters):
+            if index < len(ARGUMENT_REGISTERS):
+                self._emit(f"mov {self.locations[parameter]}, {ARGUMENT_REGISTERS[index]}")
+            else:
+                self._emit(f"mov rax, QWORD PTR [rbp + {16 + 8 * (index - len(ARGUMENT_REGISTERS))}]")
+                self._emit(f"mov {self.locations[parameter]}, rax")
+        # variables read before being assigned are 0, as in the other backends
+        for name in self.named[len(self.parameters):]:
+            self._emit(f"mov {self.locations[name]}, 0")
+
+    def _generate_epilogue(self):
+        self.lines.append(f".Lreturn_{self.name}:")
+        if self.saved_registers:
+            self._emit(f"lea rsp, [rbp - {8 * len(self.saved_registers)}]")
+        else:
+            self._emit("mov rsp, rbp")
+        for register in reversed(self.saved_registers):
+            self._emit(f"pop {register}")
+        self._emit("pop rbp")
+        self._emit("ret")
+
+    def _generate_instruction(self, instruction: TacInstruction):
+        op = instruction.op
+        if op == "copy":
+            self._generate_copy(instruction.result_var, instruction.arg1)
+
+        elif op in ARITHMETIC:
+            self._generate_arithmetic(instruction)
+
+        elif op == "/":
+            self._load(instruction.arg1, "rdi")
+            self._load(instruction.arg2, "rsi")
+            self._emit("call oreo_divide@PLT")
+            self._store("rax", instruction.result_var)
+
+        elif op in COMPARISONS:
+            self._generate_comparison(instruction)
+
+        elif op == "not":
+            target = self._get_target(instruction.result_var)
+            self._load(instruction.arg1, target)
+            self._emit(f"xor {target}, 1")
+            self._store(target, instruction.result_var)
+
+        elif op == "Goto":
+            self._emit(f"jmp .{instruction.get_jump_target().name}")
+
+        elif op in [IF_FALSE_GOTO, IF_TRUE_GOTO]:
+            self._generate_conditional_jump(instruction)
+
+        elif op == "ReadLine":
+            self._emit("call oreo_read_line@PLT")
+            self._store("rax", instruction.result_var)
+
+        elif op in ["PrintString", "PrintStringLn"]:
+            is_string = instruction.value_type == STR or \
+                (isinstance(instruction.arg1, str) and not is_number_literal(instruction.arg1))
+            self._load(instruction.arg1, "rdi")
+            self._emit(f"call oreo_print_{'str' if is_string else 'num'}@PLT")
+            if op == "PrintStringLn":
+                self._emit("call oreo_print_newline@PLT")
+
+        elif op in ["BeginFunc", "PopParams"]:
+            pass
+
+        elif op == "Return":
+            if instruction.arg1 is not None:
+                self._load(instruction.arg1, "rax")
+            else:
+                self._emit("xor eax, eax")
+            self._emit(f"jmp .Lreturn_{self.name}")
+
+        elif op == "EndFunc":
+            self._emit("xor eax, eax")
+            self._generate_epilogue()
+
+        else:
+            raise ValueError(f"Cannot generate assembly for {instruction}")
+
+    def _generate_copy(self, result: TacVariable, operand):
+        destination = self.locations[repr(result)]
+        if _is_register(destination):
+            self._load(operand, destination)
+            return
+
+        source = self._get_source(operand, "rax")
+        if _is_memory(source):
+            self._emit(f"mov rax, {source}")
+            source = "rax"
+        self._emit(f"mov {destination}, {source}")
+
+    def _generate_arithmetic(self, instruction: TacInstruction):
+        target = self._get_target(instruction.result_var, avoid=instruction.arg2)
+        self._load(instruction.arg1, target)
+
+        source = self._get_source(instruction.arg2, "rcx")
+        if instruction.op == "*" and _is_immediate(source):
+            self._emit(f"imul {target}, {target}, {source}")
+        else:
+            self._emit(f"{ARITHMETIC[instruction.op]} {target}, {source}")
+        self._store(target, instruction.result_var)
+
+    def _generate_comparison(self, instruction: TacInstruction, branch: TacInstruction = None):
+        left = self._get_source(instruction.arg1, "rax")
+        if not _is_register(left):
+            self._load(instruction.arg1, "rax")
+            left = "rax"
+        right = self._get_source(instruction.arg2, "rcx")
+        self._emit(f"cmp {left}, {right}")
+
+        set_instruction, jump_if_false, jump_if_true = COMPARISONS[instruction.op]
+        if branch is not None:
+            jump_instruction = jump_if_false if branch.op == IF_FALSE_GOTO else jump_if_true
+            self._emit(f"{jump_instruction} .{branch.get_jump_target().name}")
+        else:
+            self._emit(f"{set_instruction} al")
+            self._emit("movzx eax, al")
+            self._store("rax", instruction.result_var)
+
+    def _generate_conditional_jump(self, instruction: TacInstruction):
+        target = instruction.get_jump_target().name
+        jumps_if_true = instruction.op == IF_TRUE_GOTO
+        condition = instruction.arg1
+        if not isinstance(condition, TacVariable):
+            # a literal condition is a number, as strings are never used as conditions
+            if (int(condition) != 0) == jumps_if_true:
+                self._emit(f"jmp .{target}")
+            return
+
+        location = self.locations[repr(condition)]
+        if _is_register(location):
+            self._emit(f"test {location}, {location}")
+        else:
+            self._emit(f"cmp {location}, 0")
+        self._emit(f"{'jne' if jumps_if_true else 'je'} .{target}")
+
+    # a comparison can be merged with the branch straight after it, if the branch is the only thing reading it
+    def _is_fusable(self, comparison: TacInstruction, branch):
+        if not isinstance(branch, TacInstruction) or not branch.is_conditional_jump():
+            return False
+        condition = comparison.get_defined_variable()
+        return not condition.is_named and isinstance(branch.arg1, TacVariable) \
+            and repr(branch.arg1) == repr(condition) and self.use_counts.get(repr(condition)) == 1
+
+    def _generate_call(self, call: TacInstruction, arguments: list):
+        callee = call.arg1.tag
+        stack_arguments = arguments[len(ARGUMENT_REGISTERS):]
+
+        # the stack must stay 16 byte aligned at the call
+        padding = len(stack_arguments) % 2
+        if padding:
+            self._emit("sub rsp, 8")
+        for argument in reversed(stack_arguments):
+            source = self._get_source(argument, "rax")
+            self._emit(f"push {source}")
+        for register, argument in zip(ARGUMENT_REGISTERS, arguments):
+            self._load(argument, register)
+
+        self._emit(f"call p_{callee}")
+        if stack_arguments:
+            self._emit(f"add rsp, {8 * (len(stack_arguments) + padding)}")
+        if call.result_var is not None:
+            self._store("rax", call.result_var)
+
+    # the register to compute a result in: its own register if it has one, otherwise rax
+    def _get_target(self, result: TacVariable, avoid=None):
+        location = self.locations[repr(result)]
+        if _is_register(location) and not (isinstance(avoid, TacVariable) and
+                                           self.locations[repr(avoid)] == location):
+            return location
+        return "rax"
+
+    # an operand for an instruction's second source: a register, memory, or a 32 bit immediate
+    # anything else is loaded into scratch first
+    def _get_source(self, operand, scratch) -> str:
+        if isinstance(operand, TacVariable):
+            return self.locations[repr(operand)]
+        if is_number_literal(operand) and -2 ** 31 <= int(operand) < 2 ** 31:
+            return str(int(operand))
+        self._load(operand, scratch)
+        return scratch
+
+    def _load(self, operand, register):
+        if isinstance(operand, TacVariable):
+            location = self.locations[repr(operand)]
+            if location != register:
+                self._emit(f"mov {register}, {location}")
+        elif is_number_literal(operand):
+            value = (int(operand) + 2 ** 63) % 2 ** 64 - 2 ** 63
+            self._emit(f"mov {register}, {value}")
+        else:
+            string = operand[1:-1]
+            if string not in self.strings:
+                self.strings[string] = f".LS{len(self.strings)}"
+            self._emit(f"lea {register}, [rip + {self.strings[string]}]")
+
+    def _store(self, register, result: TacVariable):
+        location = self.locations[repr(result)]
+        if location != register:
+            self._emit(f"mov {location}, {register}")
+
+
+def _is_register(location):
+    return location in REGISTERS or location in ["rax", "rcx"] or location in ARGUMENT_REGISTERS
+
+
+def _is_memory(location):
+    return location.startswith("QWORD PTR")
+
+
+def _is_immediate(location):
+    return is_number_literal(location)
+
+
+# a GNU assembler string literal for s, encoded as UTF-8
+def asm_string_literal(s: str) -> str:
+    escaped = []
+    for byte in s.encode("utf-8"):
+        character = chr(byte)
+        if character in '"\\':
+            escaped.append("\\" + character)
+        elif 32 <= byte < 127:
+            escaped.append(character)
+        else:
+            escaped.append(f"\\{byte:03o}")
+
+    return '"' + "".join(escaped) + '"'
@@ -0,0 +1,192 @@
+"""Compiles many Oreo files at once, spread across a pool of worker processes
+
+Usage: python3 batch.py <FILE OR DIRECTORY> ... [--jobs N] [--chunk-size N] [-O LEVEL] [--emit FORMAT]
+                        [--output-dir DIR] [--max-errors N] [--grammar <GRAMMAR FILENAME>]
+
+Each worker parses the grammar once, when it starts. Files are reported as they finish, followed by every error in
+each file, up to the most allowed, and a table of how long each phase took on each file
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+from grammarparse import parse_grammar_from_file
+from oreoc import GENERATORS, CompilerDriver, OREO_GRAMMAR, compile_source
+from parseerror import DEFAULT_MAX_ERRORS, ErrorLog, ParseError, ParseErrors
+from passes import OPTIMISATION_LEVELS, format_table
+
+PHASES = ["lex", "parse", "semantic", "typecheck", "tac", "optimise", "backend"]
+# check only compiles each file, without writing anything
+EMIT_FORMATS = ["check", "tac", "python", "c", "asm"]
+EXTENSIONS = {"tac": ".tac", "python": ".py", "c": ".c", "asm": ".s"}
+SOURCE_EXTENSION = ".oreo"
+
+# the grammar, parsed once by each worker process when it starts
+_expansions = None
+
+
+class FileResult:
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.times = {}  # phase -> wall time in seconds, for the phases which ran
+        self.error = None  # the message of the errors which stopped compilation, if there were any
+        self.output_file = None
+
+    def is_ok(self):
+        return self.error is None
+
+    def get_total_time(self):
+        return sum(self.times.values())
+
+
+# the source files named by paths, where every .oreo file in a directory, or any directory below it, is included
+def find_source_files(paths: List[str]) -> List[str]:
+    return list(find_output_names(paths))
+
+
+# each of the source files named by paths, mapped to the name its output is given in an output directory, which is
+# its path relative to the directory named in paths it was found in, so that files with the same name in different
+# directories do not overwrite each other
+def find_output_names(paths: List[str]) -> Dict[str, str]:
+    output_names = {}
+    for path in paths:
+        if not os.path.isdir(path):
+            output_names[path] = os.path.basename(path)
+            continue
+        for directory, subdirectories, files in os.walk(path):
+            subdirectories.sort()
+            for filename in [os.path.join(directory, f) for f in sorted(files) if f.endswith(SOURCE_EXTENSION)]:
+                output_names[filename] = os.path.relpath(filename, path)
+    return output_names
+
+
+# compile every file, yielding each result as soon as it is ready, so in the order the files finish in
+# the files are handed out to the workers chunk_size at a time: bigger chunks mean less time spent passing work to
+# and from the workers, but a less even spread of work across them
+# jobs is the number of worker processes, by default one for each CPU
+# output_names gives the name in output_dir of each file's output, as found by find_output_names, by default the
+# name of the file
+def compile_batch(filenames: List[str], grammar_file=OREO_GRAMMAR, jobs=None, chunk_size=1, optimisation_level=0,
+                  emit="check", output_dir=None, max_errors=DEFAULT_MAX_ERRORS, output_names: Dict[str, str] = None):
+    files = [(filename, (output_names or {}).get(filename)) for filename in filenames]
+    chunks = [files[i:i + chunk_size] for i in range(0, len(files), max(chunk_size, 1))]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_initialise_worker, initargs=(grammar_file,)) as executor:
+        futures = [executor.submit(_compile_chunk, chunk, optimisation_level, emit, output_dir, max_errors)
+                   for chunk in chunks]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def _initialise_worker(grammar_file):
+    global _expansions
+    _expansions = parse_grammar_from_file(grammar_file)
+
+
+def _compile_chunk(files, optimisation_level, emit, output_dir, max_errors) -> List[FileResult]:
+    return [compile_file(filename, _expansions, optimisation_level, emit, output_dir, max_errors, output_name)
+            for filename, output_name in files]
+
+
+# compile one file, catching any error, even one in the compiler, so that one bad file does not stop the rest of the
+# batch
+def compile_file(filename, expansions, optimisation_level=0, emit="check", output_dir=None,
+                 max_errors=DEFAULT_MAX_ERRORS, output_name=None) -> FileResult:
+    result = FileResult(filename)
+    driver = CompilerDriver()
+    errors = ErrorLog(max_errors)
+    try:
+        with open(filename) as file:
+            source = file.read()
+        program = compile_source(source, expansions, driver, errors, optimisation_level=optimisation_level)
+
+        if emit != "check":
+            with driver.phase("backend"):
+                output = GENERATORS[emit](program)
+            result.output_file = _get_output_file(filename, emit, output_dir, output_name)
+            with open(result.output_file, "w") as file:
+                file.write(output if output.endswith("\n") else output + "\n")
+    except (ParseError, ParseErrors) as e:
+        result.error = e.message
+    except (OSError, RecursionError) as e:
+        result.error = f"{type(e).__name__}: {e}"
+    except Exception as e:
+        result.error = f"Internal compiler error: {type(e).__name__}: {e}"
+
+    result.times = {report.name: report.wall_time for report in driver.reports}
+    return result
+
+
+def _get_output_file(filename, emit, output_dir, output_name=None):
+    base, _ = os.path.splitext(filename)
+    if output_dir is not None:
+        base, _ = os.path.splitext(os.path.join(output_dir, output_name or os.path.basename(filename)))
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+    return base + EXTENSIONS[emit]
+
+
+# every error, each headed by the file it is in
+def format_errors(results: List[FileResult]) -> str:
+    return "\n".join(f"{r.filename}:\n{r.error}" for r in results if not r.is_ok())
+
+
+# the time in milliseconds of each phase on each file, with the files sorted by name
+def format_summary(results: List[FileResult]) -> str:
+    rows = [("file", "status") + tuple(PHASES) + ("total",)]
+    for result in sorted(results, key=lambda r: r.filename):
+        rows.append((result.filename, "ok" if result.is_ok() else "error")
+                    + tuple(_format_time(result.times.get(phase)) for phase in PHASES)
+                    + (_format_time(result.get_total_time()),))
+
+    num_failed = sum(not r.is_ok() for r in results)
+    rows.append(("total", f"{num_failed} failed")
+                + tuple(_format_time(sum(r.times.get(phase, 0) for r in results)) for phase in PHASES)
+                + (_format_time(sum(r.get_total_time() for r in results)),))
+    return format_table(rows)
+
+
+def _format_time(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.3f}"
+
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(description="Compile many Oreo files in parallel")
+    parser.add_argument("paths", nargs="+", help="Files to compile, or directories to compile every .oreo file in")
+    parser.add_argument("--grammar", "-g", default=OREO_GRAMMAR, help="File containing a valid grammar")
+    parser.add_argument("--jobs", "-j", type=int, help="Number of worker processes (default one for each CPU)")
+    parser.add_argument("--chunk-size", type=int, default=1, help="Number of files handed to a worker at a time")
+    parser.add_argument("-O", dest="optimisation_level", type=int, default=0, choices=OPTIMISATION_LEVELS,
+                        help="Optimisation level")
+    parser.add_argument("--emit", choices=EMIT_FORMATS, default="check",
+                        help="Format to write each compiled file in, next to its source unless --output-dir is given")
+    parser.add_argument("--output-dir", help="Directory to write the compiled files to, under their paths relative "
+                                             "to the directory they were found in")
+    parser.add_argument("--max-errors", type=int, default=DEFAULT_MAX_ERRORS, metavar="N",
+                        help="Stop compiling a file after finding this many errors in it, or 0 for no limit")
+    return parser
+
+
+# returns the exit status, which is 1 if any file failed to compile
+def main(argv=None, stdout=None, stderr=None):
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    args = get_argument_parser().parse_args(argv)
+
+    output_names = find_output_names(args.paths)
+    results = []
+    for result in compile_batch(list(output_names), args.grammar, args.jobs, args.chunk_size,
+                                args.optimisation_level, args.emit, args.output_dir, args.max_errors, output_names):
+        results.append(result)
+        stdout.write(f"{'ok' if result.is_ok() else 'error':5} {result.filename}\n")
+        stdout.flush()
+
+    if not all(r.is_ok() for r in results):
+        stderr.write(format_errors(results) + "\n")
+    stdout.write(format_summary(results) + "\n")
+    return 0 if all(r.is_ok() for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""Benchmarks each phase of the compiler on synthetic programs of increasing size
+
+Usage: python3 benchmark.py [--families FAMILY ...] [--sizes N ...] [--repeats N] [--save FILE] [--baseline FILE]
+
+For each family of program shapes, every phase is timed at each size, and a power law is fitted to its times, so
+that phases which scale worse than linearly stand out. Results can be saved as a baseline, and later results
+compared against it
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+from typing import Dict, List, Tuple
+
+from grammarparse import parse_grammar_from_file
+from lexer import lex
+from oreoc import CompilerDriver, OREO_GRAMMAR, compile_source
+from parseerror import ErrorLog
+from passes import format_table
+from synthetic import ProgramShape, generate_program
+
+RESULTS_VERSION = 1
+PHASES = ["lex", "parse", "semantic", "typecheck", "tac", "optimise"]
+
+# for each family, the shape of the program of size n, with one feature of the program growing with n
+FAMILIES = {
+    "statements": lambda n: ProgramShape(statements=n, nesting_depth=1, expression_length=3, variables=5),
+    "nesting": lambda n: ProgramShape(statements=n, nesting_depth=n, expression_length=2, variables=3),
+    "expressions": lambda n: ProgramShape(statements=5, nesting_depth=0, expression_length=n, variables=5),
+    "procedures": lambda n: ProgramShape(statements=n, nesting_depth=1, expression_length=2, procedures=n,
+                                         variables=3),
+    "variables": lambda n: ProgramShape(statements=n, nesting_depth=0, expression_length=2, variables=n),
+}
+DEFAULT_SIZES = [10, 20, 40, 80]
+
+# a phase whose time grows faster than the number of tokens to this power is reported as scaling badly
+SUPERLINEAR_EXPONENT = 1.3
+# a phase is only reported as slower than the baseline if it takes this many times as long, and at least
+# NOISE_FLOOR seconds longer, as small timings vary a lot from run to run
+REGRESSION_TOLERANCE = 1.5
+NOISE_FLOOR = 0.002
+
+
+# the best of repeats timings of each phase compiling source, in seconds
+def time_phases(source: str, expansions, repeats=3) -> Dict[str, float]:
+    best = {}
+    for _ in range(repeats):
+        driver = CompilerDriver()
+        compile_source(source, expansions, driver, ErrorLog(), optimisation_level=2)
+
+        for report in driver.reports:
+            best[report.name] = min(best.get(report.name, math.inf), report.wall_time)
+
+    return best
+
+
+# times every phase on the family's programs at each size
+# the results hold the number of tokens in each program, the time of each phase at each size, and the exponent of
+# the power law fitted to each phase's times against the number of tokens
+def run_family(family: str, sizes: List[int], expansions, repeats=3) -> dict:
+    result = {"sizes": list(sizes), "tokens": [], "times": {phase: [] for phase in PHASES}, "exponents": {}}
+    for size in sizes:
+        source = generate_program(FAMILIES[family](size))
+        result["tokens"].append(len(lex(source)))
+        times = time_phases(source, expansions, repeats)
+        for phase in PHASES:
+            result["times"][phase].append(times[phase])
+
+    for phase in PHASES:
+        result["exponents"][phase] = fit_power_law(result["tokens"], result["times"][phase])[1]
+    return result
+
+
+def run_benchmarks(families: List[str], sizes: List[int], expansions, repeats=3) -> dict:
+    return {"version": RESULTS_VERSION, "python": platform.python_version(),
+            "families": {family: run_family(family, sizes, expansions, repeats) for family in families}}
+
+
+# least squares fit of y = coefficient * x ** exponent, returning (coefficient, exponent)
+def fit_power_law(xs: List[float], ys: List[float]) -> Tuple[float, float]:
+    points = [(math.log(x), math.log(y)) for x, y in zip(xs, ys) if x > 0 and y > 0]
+    if len(points) < 2:
+        return 0.0, 0.0
+
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    if spread == 0:
+        return math.exp(mean_y), 0.0
+    exponent = sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+    return math.exp(mean_y - exponent * mean_x), exponent
+
+
+# (family, phase) for each phase which scales worse than linearly
+def find_superlinear_phases(results: dict, threshold=SUPERLINEAR_EXPONENT) -> List[Tuple[str, str]]:
+    return [(family, phase) for family, result in results["families"].items()
+            for phase, exponent in result["exponents"].items() if exponent > threshold]
+
+
+# a description of each timing which is noticeably slower than the same one in the baseline
+# only families and sizes which are in both are compared
+def compare_to_baseline(results: dict, baseline: dict, tolerance=REGRESSION_TOLERANCE) -> List[str]:
+    regressions = []
+    for family, result in results["families"].items():
+        if family not in baseline["families"]:
+            continue
+        old_result = baseline["families"][family]
+        old_indices = {size: i for i, size in enumerate(old_result["sizes"])}
+
+        for phase in PHASES:
+            for i, size in enumerate(result["sizes"]):
+                if size not in old_indices:
+                    continue
+                time = result["times"][phase][i]
+                old_time = old_result["times"][phase][old_indices[size]]
+                if time > old_time * tolerance and time - old_time > NOISE_FLOOR:
+                    regressions.append(f"{family} {phase} at size {size}: {old_time * 1000:.3f} ms -> "
+                                       f"{time * 1000:.3f} ms")
+    return regressions
+
+
+def format_results(results: dict) -> str:
+    tables = []
+    for family, result in results["families"].items():
+        rows = [(family, "tokens") + tuple(PHASES)]
+        for i, size in enumerate(result["sizes"]):
+            rows.append((str(size), str(result["tokens"][i]))
+                        + tuple(f"{result['times'][phase][i] * 1000:.3f}" for phase in PHASES))
+        rows.append(("exponent", "") + tuple(f"{result['exponents'][phase]:.2f}" for phase in PHASES))
+        tables.append(format_table(rows))
+
+    return "\n\n".join(tables)
+
+
+def save_results(results: dict, filename):
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(filename, "w") as file:
+        json.dump(results, file, indent=1)
+
+
+def load_results(filename) -> dict:
+    with open(filename) as file:
+        results = json.load(file)
+    if results.get("version") != RESULTS_VERSION:
+        raise ValueError(f"{filename} does not hold version {RESULTS_VERSION} benchmark results")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each compiler phase on synthetic programs")
+    parser.add_argument("--families", nargs="+", choices=list(FAMILIES), default=list(FAMILIES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--repeats", type=int, default=3, help="Take the best of this many timings")
+    parser.add_argument("--grammar", "-g", default=OREO_GRAMMAR, help="File containing a valid grammar")
+    parser.add_argument("--save", metavar="FILE", help="Save the results, eg as a new baseline")
+    parser.add_argument("--baseline", metavar="FILE", help="Compare the results with those saved in FILE")
+    args = parser.parse_args()
+
+    # deeply nested programs make for deeply nested parse trees
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20000))
+
+    results = run_benchmarks(args.families, args.sizes, parse_grammar_from_file(args.grammar), args.repeats)
+    print(format_results(results))
+
+    for family, phase in find_superlinear_phases(results):
+        print(f"warning: {phase} scales as tokens ^ {results['families'][family]['exponents'][phase]:.2f} "
+              f"on {family}")
+    if args.save:
+        save_results(results, args.save)
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, load_results(args.baseline))
+        for regression in regressions:
+            print("slower than baseline: " + regression)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,213 @@
+"""Builds modules of procedures into objects, compiling the modules which do not depend on each other at the same
+time, in a pool of worker processes
+
+Usage: python3 build.py <MODULE FILE OR DIRECTORY> ... [--object-dir DIR] [--jobs N] [--max-errors N]
+                        [--grammar <GRAMMAR FILENAME>]
+
+A module depends on the modules defining the procedures it calls, and is compiled against their objects once they
+have been built, so modules cannot depend on each other in a circle. An object from an earlier build is kept if it
+is up to date: if neither its module nor the signatures of the procedures it calls have changed. Programs are then
+linked with the objects by oreoc's --link
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List
+
+from batch import find_source_files
+from grammarparse import parse_grammar_from_file
+from incremental import find_procedures
+from lexer import lex
+from linker import LinkError, compile_module, get_context_key, get_module_key, get_module_name, get_object_file, \
+    get_signatures, load_object, save_object
+from oreoc import OREO_GRAMMAR
+from parseerror import DEFAULT_MAX_ERRORS, ErrorLog, ParseError, ParseErrors
+
+COMPILED = "compiled"
+UP_TO_DATE = "up to date"
+FAILED = "error"
+
+# the grammar, and the key of it, set by each worker process when it starts
+_expansions = None
+_context_key = None
+
+
+class ModuleResult:
+    def __init__(self, filename: str, object_file: str):
+        self.filename = filename
+        self.object_file = object_file
+        self.status = FAILED
+        self.error = None  # the message of the errors which stopped the module building, if there were any
+        self.time = 0.0  # wall time in seconds
+
+    def is_ok(self):
+        return self.error is None
+
+
+# the modules each module depends on: those defining the procedures it calls, as far as can be told from its tokens
+def find_dependencies(filenames: List[str]) -> Dict[str, List[str]]:
+    defined, called = {}, {}
+    for filename in filenames:
+        try:
+            with open(filename) as file:
+                tokens = lex(file.read(), ErrorLog(max_errors=None))
+        except OSError:
+            tokens = []  # the worker building it reports the error
+        defined[filename] = [span.name for span in find_procedures(tokens)]
+        called[filename] = {t.attribute[:-1] for t in tokens if t.name == "ID_PAREN"}
+
+    # as when linking, a procedure should be defined by only one module, which is left to the linker to report
+    defining_module = {}
+    for filename in filenames:
+        for name in defined[filename]:
+            defining_module.setdefault(name, filename)
+    return {filename: sorted({defining_module[name] for name in called[filename] if name in defining_module}
+                             - {filename}) for filename in filenames}
+
+
+# build every module, yielding each result as soon as it is ready
+# a module is built as soon as the modules it depends on have been, so independent modules are built at the same time
+def build_modules(filenames: List[str], grammar_file=OREO_GRAMMAR, object_dir=None, jobs=None,
+                  max_errors=DEFAULT_MAX_ERRORS):
+    pending = find_dependencies(filenames)
+    results: Dict[str, ModuleResult] = {}
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_initialise_worker, initargs=(grammar_file,)) as executor:
+        running = {}
+        while pending or running:
+            # a module skipped because a module it depends on failed makes those depending on it ready in turn
+            ready = _get_ready(pending, results)
+            while ready:
+                for filename in ready:
+                    dependencies = pending.pop(filename)
+                    object_file = get_object_file(filename, object_dir)
+                    failed = [d for d in dependencies if not results[d].is_ok()]
+                    if failed:
+                        result = ModuleResult(filename, object_file)
+                        result.error = f"Depends on {failed[0]}, which did not build"
+                        results[filename] = result
+                        yield result
+                    else:
+                        objects = [results[d].object_file for d in dependencies]
+                        running[executor.submit(build_module, filename, object_file, objects, max_errors)] = filename
+                ready = _get_ready(pending, results)
+
+            if not running:
+                # nothing can be built until a module it depends on is, which depends on it in turn
+                for filename in sorted(pending):
+                    result = ModuleResult(filename, get_object_file(filename, object_dir))
+                    result.error = "Modules depend on each other in a circle: " + " -> ".join(
+                        _find_circle(filename, pending))
+                    results[filename] = result
+                    yield result
+                return
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+                result = future.result()
+                results[result.filename] = result
+                yield result
+
+
+def _initialise_worker(grammar_file):
+    global _expansions, _context_key
+    _expansions = parse_grammar_from_file(grammar_file)
+    _context_key = get_context_key(grammar_file)
+
+
+# build one module against the objects of the modules it depends on, unless its object is already up to date,
+# catching any error, so that one bad module does not stop the modules which do not depend on it
+def build_module(filename, object_file, dependency_objects: List[str], max_errors=DEFAULT_MAX_ERRORS) -> ModuleResult:
+    result = ModuleResult(filename, object_file)
+    start = time.perf_counter()
+    try:
+        with open(filename) as file:
+            source = file.read()
+        signatures = get_signatures([load_object(f) for f in dependency_objects])
+        # an object is only written for a module without errors, so lexing can carry on past any
+        key = get_module_key(_context_key, source, lex(source, ErrorLog(max_errors=None)), signatures)
+        if _is_up_to_date(object_file, key):
+            result.status = UP_TO_DATE
+        else:
+            module = compile_module(source, _expansions, get_module_name(filename), _context_key, signatures,
+                                    ErrorLog(max_errors))
+            if os.path.dirname(object_file):
+                os.makedirs(os.path.dirname(object_file), exist_ok=True)
+            save_object(module, object_file)
+            result.status = COMPILED
+    except (ParseError, ParseErrors, LinkError) as e:
+        result.error = e.message
+    except (OSError, RecursionError) as e:
+        result.error = f"{type(e).__name__}: {e}"
+
+    result.time = time.perf_counter() - start
+    return result
+
+
+def _is_up_to_date(object_file, key) -> bool:
+    if not os.path.exists(object_file):
+        return False
+    try:
+        return load_object(object_file).key == key
+    except LinkError:
+        return False  # made by another version of the compiler, or not an object at all
+
+
+# the modules which are waiting to be built, and whose dependencies have all been, in the order they were given
+def _get_ready(pending: Dict[str, List[str]], results: Dict[str, ModuleResult]) -> List[str]:
+    return [filename for filename, dependencies in pending.items() if all(d in results for d in dependencies)]
+
+
+# a circle of dependencies reached from the module, which is waiting on a module in it
+def _find_circle(filename: str, pending: Dict[str, List[str]]) -> List[str]:
+    path = [filename]
+    while path.count(path[-1]) < 2:
+        path.append(next(d for d in pending[path[-1]] if d in pending))
+    return path[path.index(path[-1]):]
+
+
+def format_errors(results: List[ModuleResult]) -> str:
+    return "\n".join(f"{r.filename}:\n{r.error}" for r in results if not r.is_ok())
+
+
+def format_summary(results: List[ModuleResult]) -> str:
+    counts = {status: sum(r.is_ok() and r.status == status for r in results) for status in [COMPILED, UP_TO_DATE]}
+    num_failed = sum(not r.is_ok() for r in results)
+    return f"{len(results)} modules: {counts[COMPILED]} compiled, {counts[UP_TO_DATE]} up to date, {num_failed} failed"
+
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(description="Build Oreo modules into objects, in parallel")
+    parser.add_argument("paths", nargs="+", help="Modules, or directories to build every .oreo file in")
+    parser.add_argument("--grammar", "-g", default=OREO_GRAMMAR, help="File containing a valid grammar")
+    parser.add_argument("--object-dir", help="Directory to write the objects to, instead of next to each module")
+    parser.add_argument("--jobs", "-j", type=int, help="Number of worker processes (default one for each CPU)")
+    parser.add_argument("--max-errors", type=int, default=DEFAULT_MAX_ERRORS, metavar="N",
+                        help="Stop compiling a module after finding this many errors in it, or 0 for no limit")
+    return parser
+
+
+# returns the exit status, which is 1 if any module failed to build
+def main(argv=None, stdout=None, stderr=None):
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    args = get_argument_parser().parse_args(argv)
+
+    results = []
+    for result in build_modules(find_source_files(args.paths), args.grammar, args.object_dir, args.jobs,
+                                args.max_errors):
+        results.append(result)
+        stdout.write(f"{result.status if result.is_ok() else FAILED:10} {result.filename}\n")
+        stdout.flush()
+
+    if not all(r.is_ok() for r in results):
+        stderr.write(format_errors(results) + "\n")
+    stdout.write(format_summary(results) + "\n")
+    return 0 if all(r.is_ok() for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
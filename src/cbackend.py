@@ -0,0 +1,173 @@
+import os
+import subprocess
+import tempfile
+from typing import List, Union
+
+from tac import IF_FALSE_GOTO, IF_TRUE_GOTO, Label, TacInstruction, TacProcedure, TacProgram, TacVariable, is_number_literal
+from typechecker import STR
+
+RUNTIME_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "runtime")
+RUNTIME_SOURCES = [os.path.join(RUNTIME_DIR, "oreo_runtime.c")]
+
+INDENT = "    "
+
+# C expressions for the TAC ops which compute a value, given C expressions for their operands
+# arithmetic is done unsigned so that overflow wraps round instead of being undefined
+EXPRESSIONS = {
+    "copy": "{0}",
+    "+": "(oreo_value) ((uint64_t) {0} + (uint64_t) {1})",
+    "-": "(oreo_value) ((uint64_t) {0} - (uint64_t) {1})",
+    "*": "(oreo_value) ((uint64_t) {0} * (uint64_t) {1})",
+    "/": "oreo_divide({0}, {1})",
+    "==": "{0} == {1}",
+    "<": "{0} < {1}",
+    "&&": "{0} && {1}",
+    "||": "{0} || {1}",
+    "not": "!{0}"
+}
+
+
+class CCompilerError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+# translate the program into a C file, which must be compiled along with the runtime
+# labels become goto targets, every variable becomes a local of the function for its code unit, and each
+# procedure becomes a C function taking its parameters as arguments
+def generate_c(program: TacProgram) -> str:
+    lines = ["/* generated from Oreo TAC */", "#include <stdint.h>", '#include "oreo_runtime.h"', ""]
+    lines += [_get_signature(p) + ";" for p in program.procedures]
+    for unit in program.procedures + [program]:
+        lines += [""] + _generate_unit(unit)
+
+    return "\n".join(lines) + "\n"
+
+
+# compile the program into a native executable at output_file, using the system C compiler
+def build_executable(program: TacProgram, output_file, optimise=False, compiler="cc"):
+    with tempfile.TemporaryDirectory() as directory:
+        source_file = os.path.join(directory, "program.c")
+        with open(source_file, "w") as file:
+            file.write(generate_c(program))
+
+        command = [compiler, "-std=c99", "-I", RUNTIME_DIR, "-o", output_file, source_file] + RUNTIME_SOURCES
+        if optimise:
+            command.insert(1, "-O2")
+        try:
+            result = subprocess.run(command, capture_output=True, text=True)
+        except OSError as e:
+            raise CCompilerError(f"Could not run {compiler}: {e}")
+        if result.returncode != 0:
+            raise CCompilerError(f"{compiler} failed:\n{result.stderr}")
+
+    return output_file
+
+
+def _get_signature(procedure: TacProcedure):
+    parameters = ", ".join(f"oreo_value {p!r}" for p in procedure.parameters) or "void"
+    return f"static oreo_value p_{procedure.name}({parameters})"
+
+
+def _generate_unit(unit: Union[TacProgram, TacProcedure]) -> List[str]:
+    is_procedure = isinstance(unit, TacProcedure)
+    lines = [(_get_signature(unit) if is_procedure else "int main(void)") + " {"]
+
+    parameters = {repr(p) for p in unit.parameters} if is_procedure else set()
+    variables = sorted({repr(v) for i in unit.program if isinstance(i, TacInstruction)
+                        for v in i.get_used_variables() + [i.get_defined_variable()] if v is not None} - parameters)
+    if variables:
+        lines.append(INDENT + "oreo_value " + ", ".join(f"{v} = 0" for v in variables) + ";")
+
+    pending_arguments = []  # pushed parameters, first argument last
+    for item in unit.program:
+        if isinstance(item, Label):
+            # a label must be followed by a statement, even at the end of a function
+            lines.append(f"{item.name}:;")
+            continue
+
+        op = item.op
+        if op == "LCall":
+            # the calling sequence collapses into a C call, as the pushes always come straight before the call
+            call = f"p_{item.arg1.tag}({', '.join(reversed(pending_arguments))})"
+            pending_arguments = []
+            lines.append(INDENT + (f"{item.result_var!r} = {call};" if item.result_var is not None else f"{call};"))
+        elif op == "PushParam":
+            pending_arguments.append(_operand(item.arg1))
+        else:
+            lines += [INDENT + statement for statement in _generate_instruction(item)]
+
+    if not is_procedure:
+        lines += [INDENT + "oreo_exit();", INDENT + "return 0;"]
+    lines.append("}")
+
+    return lines
+
+
+def _generate_instruction(instruction: TacInstruction) -> List[str]:
+    op = instruction.op
+    if op in EXPRESSIONS:
+        operands = [_operand(a) for a in [instruction.arg1, instruction.arg2] if a is not None]
+        return [f"{instruction.result_var!r} = {EXPRESSIONS[op].format(*operands)};"]
+
+    if op == "Goto":
+        return [f"goto {instruction.get_jump_target().name};"]
+
+    if op == IF_FALSE_GOTO:
+        return [f"if (!{_operand(instruction.arg1)}) goto {instruction.get_jump_target().name};"]
+
+    if op == IF_TRUE_GOTO:
+        return [f"if ({_operand(instruction.arg1)}) goto {instruction.get_jump_target().name};"]
+
+    if op == "ReadLine":
+        return [f"{instruction.result_var!r} = oreo_read_line();"]
+
+    if op in ["PrintString", "PrintStringLn"]:
+        is_string = instruction.value_type == STR or _is_string_literal(instruction.arg1)
+        statements = [f"oreo_print_{'str' if is_string else 'num'}({_operand(instruction.arg1)});"]
+        if op == "PrintStringLn":
+            statements.append("oreo_print_newline();")
+        return statements
+
+    if op in ["BeginFunc", "PopParams"]:
+        return []
+
+    if op == "Return":
+        return [f"return {_operand(instruction.arg1) if instruction.arg1 is not None else 0};"]
+
+    if op == "EndFunc":
+        return ["return 0;"]
+
+    raise ValueError(f"Cannot generate C for {instruction}")
+
+
+def _is_string_literal(operand):
+    return isinstance(operand, str) and not is_number_literal(operand)
+
+
+def _operand(operand) -> str:
+    if isinstance(operand, TacVariable):
+        return repr(operand)
+    if is_number_literal(operand):
+        # numbers wrap round to 64 bits, and the most negative one has no literal of its own in C
+        value = (int(operand) + 2 ** 63) % 2 ** 64 - 2 ** 63
+        if -2 ** 31 < value < 2 ** 31:
+            return str(value)
+        return f"INT64_C({value})" if value > -2 ** 63 else "INT64_MIN"
+    return f"OREO_STRING({c_string_literal(operand[1:-1])})"
+
+
+# a C string literal with the same bytes as s, encoded as UTF-8
+def c_string_literal(s: str) -> str:
+    escaped = []
+    for byte in s.encode("utf-8"):
+        character = chr(byte)
+        if character in '"\\?':
+            escaped.append("\\" + character)
+        elif 32 <= byte < 127:
+            escaped.append(character)
+        else:
+            escaped.append(f"\\{byte:03o}")
+
+    return '"' + "".join(escaped) + '"'
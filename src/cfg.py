@@ -0,0 +1,329 @@
+from collections import Counter
+from typing import Dict, List, Set, Union
+
+from tac import Label, TacInstruction
+
+# a flat list of TAC, as held in TacProgram.program
+TacCode = List[Union[Label, TacInstruction]]
+
+
+class BasicBlock:
+    def __init__(self, index: int, label: Union[Label, None] = None):
+        self.index = index
+        self.label = label
+        self.instructions: List[TacInstruction] = []
+        self.successors: List[BasicBlock] = []
+        self.predecessors: List[BasicBlock] = []
+
+    def __repr__(self):
+        return f"B{self.index}" + (f"({self.label})" if self.label else "")
+
+    def get_terminator(self) -> Union[TacInstruction, None]:
+        if self.instructions and self.instructions[-1].is_terminator():
+            return self.instructions[-1]
+        return None
+
+    # true iff control can run off the end of this block into the next one in the layout
+    def falls_through(self):
+        terminator = self.get_terminator()
+        return terminator is None or terminator.is_conditional_jump()
+
+
+class Loop:
+    def __init__(self, header: BasicBlock, blocks: Set[BasicBlock], latches: List[BasicBlock]):
+        self.header = header
+        self.blocks = blocks  # includes the header
+        self.latches = latches  # blocks with a back edge to the header
+
+    def __repr__(self):
+        return f"Loop({self.header}: {sorted(b.index for b in self.blocks)})"
+
+    # blocks inside the loop which can jump outside of it
+    def get_exiting_blocks(self) -> List[BasicBlock]:
+        return [b for b in self.blocks if any(s not in self.blocks for s in b.successors)]
+
+    def get_instructions(self) -> List[TacInstruction]:
+        return [i for b in sorted(self.blocks, key=lambda b: b.index) for i in b.instructions]
+
+
+# the dominators of each reachable block, as a mapping from the block to the set of blocks which dominate it
+# the sets are never built: the dominator tree is numbered in depth first order, so that a block dominates another
+# exactly when its range of numbers encloses the other's, and each set answers membership from those numbers
+class Dominators:
+    def __init__(self, order: List[BasicBlock], immediate: Dict[BasicBlock, BasicBlock]):
+        self._order = order  # reverse postorder of the CFG
+        children = {b: [] for b in order}
+        for block in order[1:]:
+            children[immediate[block]].append(block)
+
+        self._entered: Dict[BasicBlock, int] = {}
+        self._left: Dict[BasicBlock, int] = {}
+        counter = 0
+        # iterative depth first search, as the tree is as deep as the program is long
+        stack = [(order[0], iter(children[order[0]]))] if order else []
+        if order:
+            self._entered[order[0]] = counter
+        while stack:
+            block, remaining = stack[-1]
+            child = next(remaining, None)
+            counter += 1
+            if child is None:
+                self._left[block] = counter
+                stack.pop()
+            else:
+                self._entered[child] = counter
+                stack.append((child, iter(children[child])))
+
+    def __getitem__(self, block: BasicBlock) -> "DominatorSet":
+        if block not in self._entered:
+            raise KeyError(block)
+        return DominatorSet(self, block)
+
+    def __contains__(self, block):
+        return block in self._entered
+
+    def __iter__(self):
+        return iter(self._order)
+
+    def __len__(self):
+        return len(self._order)
+
+    def values(self) -> List["DominatorSet"]:
+        return [DominatorSet(self, b) for b in self._order]
+
+    # returns true iff a dominates b, which every block does itself
+    def dominates(self, a: BasicBlock, b: BasicBlock):
+        return a in self._entered and b in self._entered \
+            and self._entered[a] <= self._entered[b] and self._left[b] <= self._left[a]
+
+
+# the blocks which dominate one block
+class DominatorSet:
+    def __init__(self, dominators: Dominators, block: BasicBlock):
+        self.dominators = dominators
+        self.block = block
+
+    def __contains__(self, block):
+        return self.dominators.dominates(block, self.block)
+
+
+# the closest block which dominates both a and b, given the immediate dominators of the blocks processed so far
+def _get_common_dominator(a: BasicBlock, b: BasicBlock, immediate, positions) -> BasicBlock:
+    while a is not b:
+        while positions[a] > positions[b]:
+            a = immediate[a]
+        while positions[b] > positions[a]:
+            b = immediate[b]
+    return a
+
+
+# basic blocks start at labels and end after jumps or returns
+# the blocks are kept in program order, so that the CFG can be flattened back into TAC
+class ControlFlowGraph:
+    def __init__(self, code: TacCode):
+        self.blocks: List[BasicBlock] = []
+        self._blocks_by_label: Dict[str, BasicBlock] = {}
+        self._split_into_blocks(code)
+        self._link_blocks()
+
+    def __repr__(self):
+        return "\n".join(f"{b} -> {b.successors}" for b in self.blocks)
+
+    def _split_into_blocks(self, code: TacCode):
+        block = None
+        for item in code:
+            if isinstance(item, Label):
+                block = self._new_block(item)
+                continue
+
+            if block is None:
+                block = self._new_block()
+            block.instructions.append(item)
+
+            if item.is_terminator():
+                block = None
+
+    def _new_block(self, label=None):
+        block = BasicBlock(len(self.blocks), label)
+        self.blocks.append(block)
+        return block
+
+    def _link_blocks(self):
+        self._blocks_by_label = {b.label.name: b for b in self.blocks if b.label is not None}
+
+        for block in self.blocks:
+            block.successors = []
+            block.predecessors = []
+
+        for block in self.blocks:
+            self._add_edges_out_of(block)
+
+    def _add_edges_out_of(self, block: BasicBlock):
+        terminator = block.get_terminator()
+        if terminator is not None and terminator.is_jump():
+            self._add_edge(block, self._blocks_by_label[terminator.get_jump_target().name])
+        if block.falls_through() and block.index + 1 < len(self.blocks):
+            self._add_edge(block, self.blocks[block.index + 1])
+
+    # recompute the edges out of just the given blocks, as relinking every block after each small change to a large
+    # CFG would take time proportional to its size
+    def _relink_blocks(self, blocks: List[BasicBlock]):
+        blocks = list(dict.fromkeys(blocks))
+        for block in blocks:
+            for successor in block.successors:
+                successor.predecessors.remove(block)
+            block.successors = []
+        for block in blocks:
+            self._add_edges_out_of(block)
+
+    @staticmethod
+    def _add_edge(source: BasicBlock, dest: BasicBlock):
+        if dest not in source.successors:
+            source.successors.append(dest)
+            dest.predecessors.append(source)
+
+    def to_code(self) -> TacCode:
+        code = []
+        for block in self.blocks:
+            if block.label is not None:
+                code.append(block.label)
+            code.extend(block.instructions)
+        return code
+
+    # insert a new block directly before the block at position index, and recompute the edges
+    # only jumps to the block at index may have been changed to go to the new block instead
+    def insert_block(self, index: int, block: BasicBlock):
+        next_block = self.blocks[index]
+        self.blocks.insert(index, block)
+        for i in range(index, len(self.blocks)):
+            self.blocks[i].index = i
+        if block.label is not None:
+            self._blocks_by_label[block.label.name] = block
+
+        self._relink_blocks(self.blocks[max(index - 1, 0):index + 1] + next_block.predecessors)
+
+    # replace the blocks from index start up to and including index end with the blocks of code
+    # code must keep the labels of any of the blocks that are jumped to from outside them
+    def replace_blocks(self, start: int, end: int, code: TacCode):
+        old_blocks = self.blocks[start:end + 1]
+        new_blocks = ControlFlowGraph(code).blocks
+        self.blocks[start:end + 1] = new_blocks
+        for i in range(start, len(self.blocks)):
+            self.blocks[i].index = i
+
+        old = set(old_blocks)
+        entries = [p for b in old_blocks for p in b.predecessors if p not in old]
+        for block in old_blocks:
+            if block.label is not None:
+                del self._blocks_by_label[block.label.name]
+            for successor in block.successors:
+                if successor not in old:
+                    successor.predecessors.remove(block)
+        self._blocks_by_label.update((b.label.name, b) for b in new_blocks if b.label is not None)
+
+        for block in new_blocks:
+            block.successors, block.predecessors = [], []
+        self._relink_blocks(self.blocks[max(start - 1, 0):start] + new_blocks + entries)
+
+    def get_reverse_postorder(self) -> List[BasicBlock]:
+        visited = set()
+        postorder = []
+        # iterative depth first search, as programs can be far deeper than the recursion limit
+        stack = [(self.blocks[0], iter(self.blocks[0].successors))] if self.blocks else []
+        visited.update(b for b, _ in stack)
+        while stack:
+            block, successors = stack[-1]
+            for successor in successors:
+                if successor not in visited:
+                    visited.add(successor)
+                    stack.append((successor, iter(successor.successors)))
+                    break
+            else:
+                stack.pop()
+                postorder.append(block)
+
+        return postorder[::-1]
+
+    # maps each reachable block to the set of blocks which dominate it
+    # each block's immediate dominator is found by the iterative algorithm of Cooper, Harvey and Kennedy, rather than
+    # intersecting sets of dominators, which grow with the square of the number of blocks in straight line code
+    def get_dominators(self) -> "Dominators":
+        order = self.get_reverse_postorder()
+        positions = {b: i for i, b in enumerate(order)}
+        immediate = {order[0]: order[0]} if order else {}
+
+        changed = True
+        while changed:
+            changed = False
+            for block in order[1:]:
+                new_immediate = None
+                # only predecessors already given a dominator are used, and in reverse postorder there always is one
+                for predecessor in block.predecessors:
+                    if predecessor in immediate:
+                        new_immediate = predecessor if new_immediate is None \
+                            else _get_common_dominator(predecessor, new_immediate, immediate, positions)
+                if immediate.get(block) is not new_immediate:
+                    immediate[block] = new_immediate
+                    changed = True
+
+        return Dominators(order, immediate)
+
+    # natural loops, innermost (smallest) first
+    # back edges to the same header are merged into one loop
+    def get_natural_loops(self) -> List[Loop]:
+        dominators = self.get_dominators()
+        latches_by_header: Dict[BasicBlock, List[BasicBlock]] = {}
+        for block in dominators:
+            for successor in block.successors:
+                if successor in dominators[block]:
+                    latches_by_header.setdefault(successor, []).append(block)
+
+        loops = []
+        for header, latches in latches_by_header.items():
+            body = {header}
+            worklist = list(latches)
+            while worklist:
+                block = worklist.pop()
+                if block not in body:
+                    body.add(block)
+                    worklist.extend(p for p in block.predecessors if p in dominators)
+            loops.append(Loop(header, body, latches))
+
+        return sorted(loops, key=lambda loop: (len(loop.blocks), loop.header.index))
+
+    # returns (live in, live out) variable names for each block
+    def get_live_variables(self):
+        uses: Dict[BasicBlock, Set[str]] = {}
+        defs: Dict[BasicBlock, Set[str]] = {}
+        for block in self.blocks:
+            uses[block], defs[block] = set(), set()
+            for instruction in block.instructions:
+                uses[block].update(repr(v) for v in instruction.get_used_variables()
+                                   if repr(v) not in defs[block])
+                defined = instruction.get_defined_variable()
+                if defined is not None:
+                    defs[block].add(repr(defined))
+
+        live_in = {b: set() for b in self.blocks}
+        live_out = {b: set() for b in self.blocks}
+        changed = True
+        while changed:
+            changed = False
+            for block in reversed(self.blocks):
+                new_out = set().union(*[live_in[s] for s in block.successors])
+                new_in = uses[block] | (new_out - defs[block])
+                if new_out != live_out[block] or new_in != live_in[block]:
+                    live_out[block], live_in[block] = new_out, new_in
+                    changed = True
+
+        return live_in, live_out
+
+
+# number of assignments to each variable name in the instructions
+def count_definitions(instructions) -> Counter:
+    return Counter(repr(i.get_defined_variable()) for i in instructions if i.get_defined_variable() is not None)
+
+
+# number of instructions which read each variable name
+def count_uses(instructions) -> Counter:
+    return Counter(name for i in instructions for name in {repr(v) for v in i.get_used_variables()})
@@ -0,0 +1,173 @@
+import functools
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+from typing import Dict
+
+SOURCE_DIR = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "oreo")
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024  # bytes
+# once the cache is too big, entries are evicted until it is down to this fraction of its maximum size, so that
+# eviction does not happen on every write
+EVICTION_TARGET = 0.8
+
+# what is cached for each compilation, from earliest to latest
+# procedures are also cached one by one, so that they need not be compiled again when other parts of the file change
+STAGES = ["tokens", "tree", "procedure", "tac", "output"]
+
+
+# a hash of the compiler's own source code, so that changing the compiler invalidates everything it cached
+@functools.lru_cache(maxsize=None)
+def get_compiler_version() -> str:
+    digest = hashlib.sha256()
+    for directory in [SOURCE_DIR, os.path.join(SOURCE_DIR, "runtime")]:
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith((".py", ".c", ".h")):
+                digest.update(filename.encode())
+                with open(os.path.join(directory, filename), "rb") as file:
+                    digest.update(file.read())
+    return digest.hexdigest()
+
+
+# the key which a stage's result is cached under: a hash of everything the result depends on
+# parts are strings or bytes, eg the source code, the grammar and a description of the options used
+def get_key(*parts) -> str:
+    digest = hashlib.sha256(get_compiler_version().encode())
+    for part in parts:
+        data = part.encode() if isinstance(part, str) else part
+        # each part is prefixed by its length, so that different ways of splitting the same bytes differ
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class CacheStatistics:
+    def __init__(self):
+        self.hits: Dict[str, int] = {stage: 0 for stage in STAGES}
+        self.misses: Dict[str, int] = {stage: 0 for stage in STAGES}
+        self.writes = 0
+        self.evictions = 0
+        self.recompiled_procedures = None  # names of the procedures compiled from scratch, if compiled incrementally
+
+    def __repr__(self):
+        return f"{sum(self.hits.values())} hits, {sum(self.misses.values())} misses, {self.writes} writes, " \
+               f"{self.evictions} evictions"
+
+
+# results of compiling, kept on disk between runs of the compiler
+# each result is pickled and compressed into a file named after its key and stage
+# - writes go to a temporary file which is then renamed into place, so any number of compilers can share a cache:
+#   a reader sees either the whole of a result or nothing
+# - reading a result touches its file, and when the cache grows beyond max_size bytes, the least recently used
+#   files are deleted
+# - anything which cannot be read back, eg because it was written by an incompatible version of python, counts as a
+#   miss and is deleted
+class CompilationCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.statistics = CacheStatistics()
+        self._size = None  # estimated size of the cache, worked out when first needed
+
+    # the cached result, or None if there is none
+    def get(self, key: str, stage: str):
+        path = self._get_path(key, stage)
+        try:
+            with open(path, "rb") as file:
+                value = pickle.loads(zlib.decompress(file.read()))
+        except FileNotFoundError:
+            self.statistics.misses[stage] += 1
+            return None
+        except Exception:
+            self.statistics.misses[stage] += 1
+            self._remove(path)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # evicted by another compiler in the meantime
+        self.statistics.hits[stage] += 1
+        return value
+
+    # returns true iff the value was cached; values which cannot be pickled are not
+    def put(self, key: str, stage: str, value):
+        try:
+            data = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except (pickle.PicklingError, RecursionError, TypeError, AttributeError):
+            return False
+
+        path = self._get_path(key, stage)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(data)
+            os.replace(temporary_path, path)
+        except OSError:
+            self._remove(temporary_path)
+            return False
+
+        self.statistics.writes += 1
+        if self._size is not None:
+            self._size += len(data)
+        if self._get_size() > self.max_size:
+            self.evict(int(self.max_size * EVICTION_TARGET))
+        return True
+
+    # delete the least recently used results until the cache takes up at most target_size bytes
+    def evict(self, target_size: int):
+        entries = []
+        for path in self._get_files():
+            try:
+                status = os.stat(path)
+            except OSError:
+                continue
+            entries.append((status.st_mtime, status.st_size, path))
+
+        size = sum(size for _, size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= target_size:
+                break
+            if self._remove(path):
+                self.statistics.evictions += 1
+            size -= entry_size
+        self._size = size
+
+    def clear(self):
+        for path in self._get_files():
+            self._remove(path)
+        self._size = 0
+
+    def _get_size(self):
+        if self._size is None:
+            self._size = 0
+            for path in self._get_files():
+                try:
+                    self._size += os.path.getsize(path)
+                except OSError:
+                    pass
+        return self._size
+
+    def _get_path(self, key: str, stage: str):
+        # a level of subdirectories keeps directories small
+        return os.path.join(self.directory, key[:2], f"{key}.{stage}")
+
+    def _get_files(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return [os.path.join(self.directory, subdirectory, filename)
+                for subdirectory in os.listdir(self.directory)
+                if os.path.isdir(os.path.join(self.directory, subdirectory))
+                for filename in os.listdir(os.path.join(self.directory, subdirectory))
+                if not filename.startswith(".tmp")]
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
@@ -0,0 +1,90 @@
+"""Client for the compile server: a drop in replacement for parser.py, which has a running server do the compiling
+
+Usage: python3 compileclient.py <FILENAME> [--grammar <GRAMMAR FILENAME>] [--socket PATH] [--stop-after PHASE]
+                                [-O LEVEL] [--emit FORMAT]
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+from typing import List
+
+from compileserver import DEFAULT_SOCKET, EMIT_FORMATS
+from oreoc import STOP_POINTS
+from passes import OPTIMISATION_LEVELS
+
+# when the server is busy, the request is sent again after waiting BUSY_DELAY seconds, then twice that, and so on
+BUSY_RETRIES = 5
+BUSY_DELAY = 0.1
+
+
+# send the requests down one connection, returning the responses in the same order
+def send_requests(requests: List[dict], socket_path=DEFAULT_SOCKET) -> List[dict]:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        with connection.makefile("rwb") as stream:
+            responses = []
+            for request in requests:
+                stream.write((json.dumps(request) + "\n").encode())
+                stream.flush()
+                line = stream.readline()
+                if not line:
+                    raise ConnectionError("The compile server closed the connection")
+                responses.append(json.loads(line))
+            return responses
+
+
+def send_request(request: dict, socket_path=DEFAULT_SOCKET) -> dict:
+    delay = BUSY_DELAY
+    for _ in range(BUSY_RETRIES):
+        response = send_requests([request], socket_path)[0]
+        if response["status"] != "busy":
+            return response
+        time.sleep(delay)
+        delay *= 2
+    return response
+
+
+# returns the exit status
+def main(argv=None, stdout=None):
+    stdout = stdout or sys.stdout
+    parser = argparse.ArgumentParser(description="Have the compile server parse the given file and print the result")
+    parser.add_argument("file", help="File path to parse")
+    parser.add_argument("--grammar", "-g", help="File containing a valid grammar (default the server's)")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Path of the compile server's socket")
+    parser.add_argument("--stop-after", choices=STOP_POINTS + ["none"], default="parse",
+                        help="Phase to print the result of, or none to compile fully (default parse, as parser.py)")
+    parser.add_argument("-O", dest="optimisation_level", type=int, default=0, choices=OPTIMISATION_LEVELS,
+                        help="Optimisation level")
+    parser.add_argument("--emit", choices=EMIT_FORMATS, default="tac", help="Format to print the compiled program in")
+    args = parser.parse_args(argv)
+
+    with open(args.file) as file:
+        options = {"optimisation_level": args.optimisation_level, "emit": args.emit}
+        if args.stop_after != "none":
+            options["stop_after"] = args.stop_after
+        if args.grammar:
+            options["grammar"] = os.path.abspath(args.grammar)
+        request = {"source": file.read(), "options": options}
+
+    try:
+        response = send_request(request, args.socket)
+    except OSError as e:
+        stdout.write(f"Could not reach the compile server at {args.socket}: {e}\n")
+        return 1
+
+    if response["status"] == "ok":
+        stdout.write(response["output"] + "\n")
+        return 0
+    for diagnostic in response["diagnostics"]:
+        stdout.write(diagnostic["message"] + "\n")
+    if response["status"] in ["timeout", "busy"]:
+        stdout.write(f"The compile server gave up: {response['status']}\n")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""Compile server: keeps the grammar loaded and compiles programs sent to it over a Unix socket
+
+Usage: python3 compileserver.py [--socket PATH] [--workers N] [--timeout SECONDS] [--max-pending N]
+                                [--grammar <GRAMMAR FILENAME>]
+
+Each request is one line of JSON, and is answered by one line of JSON. A request is an object with:
+- "command": "compile" (the default), "ping", "stats" or "shutdown"
+- "id": anything, which is copied into the response
+- "source": the program to compile
+- "options": optionally, "stop_after" (a phase, as for oreoc), "emit" ("tac", "python", "c" or "asm", default "tac"),
+  "optimisation_level" (default 0), "grammar" (a grammar file, default the server's), "timeout" (seconds) and
+  "max_errors" (the most errors to report, or 0 for no limit)
+
+A response is an object with:
+- "status": "ok", "error" (the program has errors, or the request is invalid), "timeout" or "busy"
+- "output": what oreoc would print, eg the TAC, if the status is ok
+- "diagnostics": a list of {"message", "description", "line", "column"}, one for each error, in the order they appear
+  in the source
+- "times": the wall time of each phase, in seconds
+
+Compiling happens in a pool of worker processes, each of which parses the grammar once, when it starts. Responses to
+identical requests are kept, and reused while they are among the most recently used. Once max pending requests are
+being compiled, further requests are answered as busy straight away, so a client knows to back off
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from grammarparse import parse_grammar_from_file
+from oreoc import GENERATORS, CompilerDriver, OREO_GRAMMAR, STOP_POINTS, compile_source
+from parseerror import DEFAULT_MAX_ERRORS, ErrorLog, ParseError, ParseErrors
+from passes import OPTIMISATION_LEVELS
+
+DEFAULT_SOCKET = os.environ.get("OREO_SOCKET", os.path.join(tempfile.gettempdir(), f"oreo-{os.getuid()}.sock"))
+DEFAULT_TIMEOUT = 30.0  # seconds
+DEFAULT_MAX_PENDING = 64
+RESPONSE_CACHE_SIZE = 256
+MAX_REQUEST_SIZE = 16 * 1024 * 1024  # bytes, the longest line the server will read
+EMIT_FORMATS = ["tac", "python", "c", "asm"]
+
+# the grammars each worker process has parsed, by file name
+_expansions = {}
+
+
+class CompileServer:
+    def __init__(self, socket_path=DEFAULT_SOCKET, grammar_file=OREO_GRAMMAR, workers=None, timeout=DEFAULT_TIMEOUT,
+                 max_pending=DEFAULT_MAX_PENDING):
+        self.socket_path = socket_path
+        self.grammar_file = grammar_file
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.pending = 0
+        self.statistics = {"requests": 0, "compiled": 0, "cache_hits": 0, "errors": 0, "timeouts": 0, "busy": 0}
+
+        self._responses = OrderedDict()
+        self._executor = None
+        self._server = None
+        self._stopped = None
+
+    async def start(self):
+        self._stopped = asyncio.Event()
+        self._executor = self._make_executor()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)  # left behind by a server which did not shut down cleanly
+        self._server = await asyncio.start_unix_server(self._handle_connection, self.socket_path,
+                                                       limit=MAX_REQUEST_SIZE)
+
+    async def serve_until_shutdown(self):
+        await self._stopped.wait()
+        await self.stop()
+
+    def _make_executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_initialise_worker,
+                                   initargs=(self.grammar_file,))
+
+    async def stop(self):
+        self._stopped.set()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._executor is not None:
+            # compiles which timed out may still be running, and are abandoned
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    # each connection's requests are answered in order, one at a time, so a client which sends requests faster
+    # than they can be compiled is slowed down by the socket filling up
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:  # the line was longer than MAX_REQUEST_SIZE
+                    writer.write(_encode(_error_response(None, "Request too large")))
+                    break
+                if not line:
+                    break
+
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    response = _error_response(None, f"Invalid JSON: {e}")
+                else:
+                    response = await self.handle_request(request)
+                writer.write(_encode(response))
+                await writer.drain()
+        except ConnectionError:
+            pass  # the client went away
+        finally:
+            writer.close()
+
+    async def handle_request(self, request) -> dict:
+        self.statistics["requests"] += 1
+        if not isinstance(request, dict):
+            return _error_response(None, "A request must be a JSON object")
+        command = request.get("command", "compile")
+        request_id = request.get("id")
+
+        if command == "ping":
+            return {"id": request_id, "status": "ok"}
+        if command == "stats":
+            return {"id": request_id, "status": "ok", "statistics": dict(self.statistics, pending=self.pending)}
+        if command == "shutdown":
+            self._stopped.set()
+            return {"id": request_id, "status": "ok"}
+        if command != "compile":
+            return _error_response(request_id, f"Unknown command {command}")
+
+        options = dict(request.get("options") or {})
+        options.setdefault("grammar", self.grammar_file)
+        error = _check_options(options)
+        if error is None and not isinstance(request.get("source"), str):
+            error = "A compile request needs the source as a string"
+        if error is not None:
+            self.statistics["errors"] += 1
+            return _error_response(request_id, error)
+
+        timeout = min(float(options.pop("timeout", self.timeout)), self.timeout)
+        key = json.dumps([request["source"], options], sort_keys=True)
+        if key in self._responses:
+            self._responses.move_to_end(key)
+            self.statistics["cache_hits"] += 1
+            return dict(self._responses[key], id=request_id)
+
+        if self.pending >= self.max_pending:
+            self.statistics["busy"] += 1
+            return {"id": request_id, "status": "busy", "diagnostics": []}
+
+        # a compile is pending until its worker is done with it, even if nobody is waiting for it any more, so that
+        # compiles which timed out still hold back new requests
+        self.pending += 1
+        future = asyncio.get_running_loop().run_in_executor(self._executor, compile_request, request["source"],
+                                                            options)
+        future.add_done_callback(self._finish_compile)
+        try:
+            response = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            # the worker cannot be interrupted, so carries on with the compile, but nobody waits for it
+            # the pool is replaced, so that later requests do not queue behind it, and the old pool winds down once
+            # the compiles given to it are done
+            self.statistics["timeouts"] += 1
+            self._executor.shutdown(wait=False)
+            self._executor = self._make_executor()
+            return {"id": request_id, "status": "timeout", "diagnostics": []}
+        except BrokenProcessPool:
+            # a worker died, eg killed for running out of memory, which leaves the pool unusable
+            self.statistics["errors"] += 1
+            self._executor = self._make_executor()
+            return _error_response(request_id, "The compile failed, as the worker process running it died")
+
+        self.statistics["compiled"] += 1
+        if response["status"] == "error":
+            self.statistics["errors"] += 1
+        self._responses[key] = response
+        if len(self._responses) > RESPONSE_CACHE_SIZE:
+            self._responses.popitem(last=False)
+        return dict(response, id=request_id)
+
+
+    def _finish_compile(self, future: asyncio.Future):
+        self.pending -= 1
+        if not future.cancelled():
+            future.exception()  # so that the error of a compile nobody waited for is not reported as never retrieved
+
+
+def _initialise_worker(grammar_file):
+    _get_expansions(grammar_file)
+
+
+def _get_expansions(grammar_file):
+    if grammar_file not in _expansions:
+        _expansions[grammar_file] = parse_grammar_from_file(grammar_file)
+    return _expansions[grammar_file]
+
+
+# the reason the options are invalid, or None if they are valid
+def _check_options(options):
+    if options.get("stop_after") not in [None] + STOP_POINTS:
+        return f"stop_after must be one of {', '.join(STOP_POINTS)}"
+    if options.get("emit", "tac") not in EMIT_FORMATS:
+        return f"emit must be one of {', '.join(EMIT_FORMATS)}"
+    if options.get("optimisation_level", 0) not in OPTIMISATION_LEVELS:
+        return f"optimisation_level must be one of {', '.join(map(str, OPTIMISATION_LEVELS))}"
+    max_errors = options.get("max_errors", DEFAULT_MAX_ERRORS)
+    if not isinstance(max_errors, int) or max_errors < 0:
+        return "max_errors must be a whole number of errors, or 0 for no limit"
+    if not isinstance(options.get("timeout", 0), (int, float)):
+        return "timeout must be a number of seconds"
+    if not (isinstance(options["grammar"], str) and os.path.isfile(options["grammar"])):
+        return f"No grammar file {options['grammar']}"
+    return None
+
+
+# compile the source as oreoc would, in a worker process, returning the response
+def compile_request(source: str, options: dict) -> dict:
+    driver = CompilerDriver()
+    response = {"status": "ok", "output": None, "diagnostics": []}
+    try:
+        response["output"] = _compile_source(source, options, driver)
+    except ParseError as e:
+        response["status"] = "error"
+        response["diagnostics"].append(get_diagnostic(e))
+    except ParseErrors as e:
+        response["status"] = "error"
+        response["diagnostics"] += [get_diagnostic(error) for error in e.errors]
+    except RecursionError:
+        response["status"] = "error"
+        response["diagnostics"].append(_get_general_diagnostic("Program too deeply nested to compile"))
+    except Exception as e:
+        # a bug in the compiler, which is still answered, so that the client is not left without a response
+        response["status"] = "error"
+        response["diagnostics"].append(_get_general_diagnostic(f"Internal compiler error: {type(e).__name__}: {e}"))
+
+    response["times"] = {report.name: report.wall_time for report in driver.reports}
+    return response
+
+
+def get_diagnostic(error: ParseError) -> dict:
+    return {"message": error.message, "description": error.description, "line": error.line_num,
+            "column": error.col_num}
+
+
+def _compile_source(source: str, options: dict, driver: CompilerDriver) -> str:
+    stop_after = options.get("stop_after")
+    expansions = _get_expansions(options.get("grammar", OREO_GRAMMAR))
+    errors = ErrorLog(options.get("max_errors", DEFAULT_MAX_ERRORS))
+
+    result = compile_source(source, expansions, driver, errors, stop_after, options.get("optimisation_level", 0))
+    if stop_after == "lex":
+        return "\n".join(map(str, result))
+    if stop_after in ["parse", "semantic", "typecheck"]:
+        return result.get_pretty_print_string(print_scope=stop_after == "semantic",
+                                              print_type=stop_after == "typecheck")
+
+    emit = options.get("emit", "tac")
+    if stop_after is not None or emit == "tac":
+        return repr(result)
+    with driver.phase("backend"):
+        return GENERATORS[emit](result)
+
+
+# a diagnostic for an error which is not at any place in the source
+def _get_general_diagnostic(description: str) -> dict:
+    return {"message": description, "description": description, "line": None, "column": None}
+
+
+def _error_response(request_id, description):
+    return {"id": request_id, "status": "error", "diagnostics": [_get_general_diagnostic(description)]}
+
+
+def _encode(response) -> bytes:
+    return (json.dumps(response) + "\n").encode()
+
+
+async def _serve(args):
+    server = CompileServer(args.socket, args.grammar, args.workers, args.timeout, args.max_pending)
+    await server.start()
+    print(f"Listening on {args.socket}", flush=True)
+    await server.serve_until_shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve compile requests over a Unix socket")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Path of the socket to listen on")
+    parser.add_argument("--grammar", "-g", default=OREO_GRAMMAR, help="File containing a valid grammar")
+    parser.add_argument("--workers", type=int, help="Number of worker processes (default one for each CPU)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Longest time a compile may take")
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING,
+                        help="Number of compiles which can be in progress before requests are turned away")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,48 @@
+from analysis import AnalysisCache
+from tac import TacInstruction, TacProgram, TacProcedure, is_number_literal
+
+
+# remove instructions which compute a value that is never used
+# the main program's own variables are kept even when dead, as they are the result of running it, but ones made up
+# by the compiler, whose names start with an underscore, are not
+# pass the analysis cache of a pass manager to reuse its cfg and liveness. The cfg keeps its shape, as blocks are
+# only ever shortened, but liveness has to be worked out again afterwards
+# returns true iff the program was changed
+def remove_dead_code(program: TacProgram, analyses: AnalysisCache = None):
+    analyses = analyses or AnalysisCache(program)
+    changed = False
+    for unit in program.get_code_units():
+        cfg = analyses.get("cfg", unit)
+        _, live_out = analyses.get("liveness", unit)
+        unit_changed = False
+
+        for block in cfg.blocks:
+            live = set(live_out[block])
+            kept = []
+            for instruction in reversed(block.instructions):
+                defined = instruction.get_defined_variable()
+                if defined is not None and repr(defined) not in live and _is_removable(instruction, unit):
+                    unit_changed = True
+                    continue
+
+                if defined is not None:
+                    live.discard(repr(defined))
+                live.update(repr(v) for v in instruction.get_used_variables())
+                kept.append(instruction)
+            block.instructions[:] = reversed(kept)
+
+        if unit_changed:
+            unit.program = cfg.to_code()
+            changed = True
+
+    return changed
+
+
+def _is_removable(instruction: TacInstruction, unit):
+    if not instruction.is_pure():
+        return False
+    defined = instruction.get_defined_variable()
+    if not isinstance(unit, TacProcedure) and defined.is_named and not defined.name.startswith("_"):
+        return False
+    # division by zero is an error, which must still happen
+    return instruction.op != "/" or (is_number_literal(instruction.arg2) and int(instruction.arg2) != 0)
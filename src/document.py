@@ -0,0 +1,519 @@
+import re
+from itertools import chain
+from typing import Dict, List, Optional, Tuple
+
+from lexer import Token, lex, make_token
+from parseerror import ParseError
+from semanticanalyser import semantic_analyse, semantic_analyse_procedure
+from syntaxanalyser import NonTerminal, ParseTreeNode, find_expansion, syntax_analyse
+from typechecker import type_check, type_check_procedure
+
+# strings and comments are the only tokens which can span several lines
+# this matches what the lexer's regexes for them do, but is quicker to search with
+MULTI_LINE_TOKEN_REGEX = re.compile(r"""'[^']*'|"[^"]*"|{-[^-]*-}""")
+# the tokens which give a program its structure, by the character which stands for them in a string of token kinds,
+# which can be searched much faster than the tokens themselves
+TOKEN_KINDS = {"BEGIN": "B", "END": "E", ";": ";", "PROCEDURE": "P"}
+OTHER_KIND = "."
+BLOCK_REGEX = re.compile("[BE]")
+STATEMENT_END_REGEX = re.compile("[;B]")
+# stands in for the body of a block while the statement around it is parsed, and is valid in any block
+PLACEHOLDER_STATEMENT = [("PRINT", None), ("NUMBER", "0"), (";", None)]
+
+
+# a run of tokens which was parsed on its own: the whole program, or one statement in a block
+# the body of each block in it was parsed separately, a statement at a time, and put in place of a placeholder
+class _Chunk:
+    def __init__(self, node: ParseTreeNode, nested: Dict, definitions: List[ParseTreeNode]):
+        self.node = node
+        self.nested = nested  # key -> _Chunk, for every chunk in the bodies of this one's blocks
+        self.definitions = definitions  # the function_definition nodes in the chunk, in the order they appear
+
+
+# what was found when analysing a procedure
+class _ProcedureAnalysis:
+    def __init__(self, callees: Dict[str, Optional[str]], error: Optional[ParseError], is_complete: bool):
+        self.callees = callees  # name -> return type of each procedure it calls, None if there is no such procedure
+        self.error = error
+        self.is_complete = is_complete  # false if it has errors, or calls a procedure which does
+
+
+# a source file which is being edited, kept lexed, parsed and analysed as it changes
+# - an edit only relexes the lines it touched, widened to take in any string or comment which spans several lines
+# - each statement is parsed on its own, with the body of every block in it parsed separately, so that only the
+#   statements containing the edit are parsed again, and the rest keep their subtrees
+# - each procedure keeps its semantic and type analysis unless it changed, or a procedure it calls now returns a
+#   different type, and the main program is only analysed again if it changed, or a procedure's signature did
+# diagnostics are the errors found, ordered by position: the first error in each statement that does not parse, or
+# if the program parses, the first semantic or type error in each procedure and in the main program
+class Document:
+    def __init__(self, text: str, expansions):
+        self.expansions = expansions
+        self.lines = text.split("\n")
+        self.tokens: List[Token] = []
+        self.tree: Optional[ParseTreeNode] = None  # None if the program does not lex or parse
+        self.diagnostics: List[ParseError] = []
+
+        # what the last update did, eg for tests
+        self.num_parsed_chunks = 0
+        self.analysed_procedures: List[str] = []
+        self.is_main_analysed = False
+
+        self._line_tokens: List[Optional[List[Token]]] = [None] * len(self.lines)  # None if the line needs lexing
+        self._line_kinds: List[str] = [""] * len(self.lines)  # the kind of each token on each line
+        self._kinds = ""  # the kind of each token
+        self._spans: List[Tuple[int, int]] = []  # first and last line of each string or comment spanning lines
+        self._first_moved_line = 0  # the tokens on this line and after may need their line numbers updating
+        self._damage = None  # the range of indexes in tokens which were lexed again, or where tokens were removed
+        self._match: List[Optional[int]] = []  # for each BEGIN or END, the index of the token which pairs with it
+        self._chunks: Dict[Tuple, _Chunk] = {}
+        self._errors: List[ParseError] = []
+        self._is_main_changed = True
+        self._procedures: Dict[ParseTreeNode, _ProcedureAnalysis] = {}
+        self._signatures = None  # the name and return type of each procedure, when the main program was analysed
+        self._is_main_complete = False  # whether the main program was analysed without errors
+        self.update()
+
+    def get_text(self):
+        return "\n".join(self.lines)
+
+    # replace the text between two (line, character) positions, counting from 0
+    # call update once the edits have been made
+    def edit(self, start: Tuple[int, int], end: Tuple[int, int], text: str):
+        start_line, start_char = self._clamp(start)
+        end_line, end_char = self._clamp(end)
+        new_lines = (self.lines[start_line][:start_char] + text + self.lines[end_line][end_char:]).split("\n")
+        self.lines[start_line:end_line + 1] = new_lines
+        self._line_tokens[start_line:end_line + 1] = [None] * len(new_lines)
+        self._line_kinds[start_line:end_line + 1] = [""] * len(new_lines)
+
+        num_added = len(new_lines) - (end_line - start_line + 1)
+        last_line = start_line + len(new_lines) - 1
+        self._spans = [_move_span(span, start_line, end_line, last_line, num_added) for span in self._spans]
+        if num_added:
+            self._first_moved_line = min(self._first_moved_line, start_line)
+
+    def replace(self, text: str):
+        self.lines = text.split("\n")
+        self._line_tokens = [None] * len(self.lines)
+        self._line_kinds = [""] * len(self.lines)
+        self._spans = []
+        self._first_moved_line = 0
+
+    def _clamp(self, position):
+        line = min(max(position[0], 0), len(self.lines) - 1)
+        return line, min(max(position[1], 0), len(self.lines[line]))
+
+    # bring the tokens, tree and diagnostics up to date with the edits
+    def update(self):
+        self.tree = None
+        self.num_parsed_chunks = 0
+        self.analysed_procedures = []
+        self.is_main_analysed = False
+
+        lex_error = self._relex()
+        if lex_error is not None:
+            self.diagnostics = [lex_error]
+            return
+
+        self._errors = []
+        self._is_main_changed = False
+        root = self._parse()
+        if root is not None:
+            self.tree = root.node
+            self._analyse(root.definitions)
+        self.diagnostics = sorted(self._errors, key=lambda e: (e.line_num, e.col_num))
+
+    def _relex(self) -> Optional[ParseError]:
+        for i in range(self._first_moved_line, len(self.lines)):
+            for token in self._line_tokens[i] or []:
+                _move_token(token, i + 1)
+        self._first_moved_line = len(self.lines)
+
+        if None not in self._line_tokens:
+            self._damage = None
+            return None
+        first = self._line_tokens.index(None)
+        last = len(self._line_tokens) - 1 - self._line_tokens[::-1].index(None)
+
+        # a string or comment which spans lines has to be lexed as a whole, as do the lines which were in one before
+        # the edit, but may not be now
+        spans = _find_spans(self.get_text())
+        first, last = _widen_over_spans(first, last, spans + self._spans)
+
+        # a newline in front keeps the columns as they would be if the whole source were lexed, because the lexer
+        # counts them from 0 on the first line, and from 1 on the others
+        region = "\n".join(self.lines[first:last + 1])
+        offset = first - 1 if first > 0 else 0
+        try:
+            tokens = lex("\n" + region if first > 0 else region)
+        except ParseError as e:
+            # the lines stay unlexed, so they are lexed again after the next edit
+            return ParseError(e.description, e.line_num + offset, e.col_num, e.context_line, is_lex_error=True)
+
+        for i in range(first, last + 1):
+            self._line_tokens[i] = []
+        for token in tokens:
+            token.line_num += offset
+            self._line_tokens[token.line_num - 1].append(token)
+        for i in range(first, last + 1):
+            self._line_kinds[i] = "".join(TOKEN_KINDS.get(token.name, OTHER_KIND) for token in self._line_tokens[i])
+        self._spans = spans
+
+        self.tokens = list(chain.from_iterable(self._line_tokens))
+        self._kinds = "".join(self._line_kinds)
+        damage_start = sum(map(len, self._line_kinds[:first]))
+        self._damage = (damage_start, damage_start + sum(map(len, self._line_kinds[first:last + 1])))
+        return None
+
+    def _parse(self) -> Optional[_Chunk]:
+        if not self.tokens:
+            try:
+                syntax_analyse([], self.expansions)
+            except ParseError as e:
+                self._errors.append(e)
+            return None
+
+        self._match = _match_blocks(self._kinds)
+        root, self._chunks = self._parse_chunk(0, len(self.tokens), "p", None, False, False)
+        return root
+
+    # parse the tokens from start up to end as the non terminal name
+    # in_procedure is whether they are in the body of a procedure, and is_repeated whether they are a statement after
+    # the first in a block
+    # returns the chunk, or None if it has errors, and the chunks in it, by key, so they can be reused next time
+    def _parse_chunk(self, start, end, name, parent, is_repeated, in_procedure) -> Tuple[Optional[_Chunk], Dict]:
+        key = (name, id(self.tokens[start]), id(self.tokens[end - 1]), end - start)
+        chunk = self._chunks.get(key)
+        if chunk is not None and not self._is_damaged(start, end):
+            _attach(chunk.node, parent)
+            return chunk, {key: chunk, **chunk.nested}
+
+        self.num_parsed_chunks += 1
+        is_procedure = name == "statement" and self.tokens[start].name == "PROCEDURE"
+        holes = self._find_holes(start, end)
+        if self._is_damaged(start, end) and not (in_procedure or is_procedure) \
+                and not any(self._is_damage_within(begin + 1, end if finish is None else finish)
+                            for begin, finish in holes):
+            self._is_main_changed = True
+
+        node = ParseTreeNode(NonTerminal(name), parent)
+        error = self._parse_with_placeholders(node, start, end, holes, is_repeated)
+
+        # the blocks' bodies are parsed even if the statement has an error, to find any errors in them too
+        is_complete = error is None
+        blocks = _get_blocks(node) if is_complete else {}
+        body_name = "function_statement" if is_procedure else "statement"
+        nested = {}
+        definitions = [node.children[0]] if is_complete and is_procedure else []
+        num_errors = len(self._errors)
+        for begin, finish in holes:
+            body_end = end if finish is None else finish
+            statements = self._split_statements(begin + 1, body_end)
+            if self._is_body_changed(begin + 1, body_end, statements) and not (in_procedure or is_procedure):
+                self._is_main_changed = True
+
+            compound = blocks.get(id(self.tokens[begin]))
+            body = []
+            for i, (statement_start, statement_end) in enumerate(statements):
+                statement, statement_chunks = self._parse_chunk(statement_start, statement_end, body_name, compound,
+                                                                i > 0, in_procedure or is_procedure)
+                nested.update(statement_chunks)
+                body.append(statement)
+            if compound is not None and None not in body:
+                compound.children[1:-1] = [statement.node for statement in body]
+                for statement in body:
+                    definitions += statement.definitions
+            else:
+                is_complete = False
+
+        # running out of tokens is usually because a block is not closed, which is better reported in the block
+        if error is not None and ("END OF FILE" not in error.description or len(self._errors) == num_errors):
+            self._errors.append(error)
+        if not is_complete:
+            return None, nested
+
+        chunk = _Chunk(node, nested, definitions)
+        _attach(node, parent)
+        return chunk, {key: chunk, **nested}
+
+    # parse the tokens with the body of each block replaced by a placeholder, returning the error, if there is one
+    def _parse_with_placeholders(self, node, start, end, holes, is_repeated) -> Optional[ParseError]:
+        tokens = []
+        position = start
+        for begin, finish in holes:
+            tokens += self.tokens[position:begin + 1]
+            # a block which is not closed is reported as missing its END after the last token in it
+            tokens += [make_token(name, attribute, self.tokens[begin if finish is not None else end - 1])
+                       for name, attribute in PLACEHOLDER_STATEMENT]
+            position = end if finish is None else finish
+        tokens += self.tokens[position:end]
+
+        # a statement after the first in a block is optional, so if it cannot start with this token, the whole
+        # program's parser would have expected the block to end instead
+        if is_repeated and not find_expansion(node.content, tokens[0], self.expansions):
+            return ParseError(f"expected 'end', got '{repr(tokens[0]).lower()}'",
+                              tokens[0].line_num, tokens[0].col_num, tokens[0].context_line)
+
+        try:
+            node.parse_tokens(list(tokens), self.expansions)  # which takes the tokens off the list as it goes
+        except ParseError as e:
+            if "got END OF FILE" not in e.description or end == len(self.tokens):
+                return e
+            # the statement runs on past where it was thought to end, so parse it again with the token after it, to
+            # get the error the whole program's parser would have given
+            node = ParseTreeNode(NonTerminal(node.content.name), node.parent)
+            try:
+                node.parse_tokens(tokens + [self.tokens[end]], self.expansions)
+            except ParseError as e_with_next_token:
+                return e_with_next_token
+            return e
+        return None
+
+    # the blocks in the tokens from start to end which are not inside other blocks, as the indexes of their BEGIN and
+    # END, where END is None if the block is not closed before end
+    # blocks with empty bodies are left for the parser to report
+    def _find_holes(self, start, end) -> List[Tuple[int, Optional[int]]]:
+        holes = []
+        i = self._kinds.find("B", start, end)
+        while i != -1:
+            finish = self._match[i]
+            if finish is None or finish >= end:
+                if i + 1 < end:
+                    holes.append((i, None))
+                break
+            if finish > i + 1:
+                holes.append((i, finish))
+            i = self._kinds.find("B", finish, end)
+        return holes
+
+    # split the body of a block into statements: each ends with a ; outside any block inside it, or for a procedure
+    # with the END of its body
+    def _split_statements(self, start, end) -> List[Tuple[int, int]]:
+        statements = []
+        statement_start = start
+        match = STATEMENT_END_REGEX.search(self._kinds, start, end)
+        while match is not None:
+            i = match.start()
+            if self._kinds[i] == "B":
+                i = self._match[i]
+                if i is None or i >= end:
+                    break
+                if self._kinds[statement_start] != "P":
+                    match = STATEMENT_END_REGEX.search(self._kinds, i + 1, end)
+                    continue
+            statements.append((statement_start, i + 1))
+            statement_start = i + 1
+            match = STATEMENT_END_REGEX.search(self._kinds, statement_start, end)
+        if statement_start < end:
+            statements.append((statement_start, end))
+        return statements
+
+    # whether the tokens from start to end include ones which were lexed again, or had tokens removed from between them
+    def _is_damaged(self, start, end):
+        if self._damage is None:
+            return False
+        damage_start, damage_end = self._damage
+        if damage_start == damage_end:
+            return start < damage_start < end
+        return start < damage_end and damage_start < end
+
+    def _is_damage_within(self, start, end):
+        if self._damage is None:
+            return False
+        damage_start, damage_end = self._damage
+        return start <= damage_start and damage_end <= end
+
+    # whether the edit changed which statements a block's body has, rather than just what is in one of them
+    def _is_body_changed(self, start, end, statements):
+        if self._damage is None or not (self._is_damaged(start, end) or self._is_damage_within(start, end)):
+            return False
+        damage_start, damage_end = self._damage
+        if damage_start == damage_end:
+            return not any(s < damage_start < e for s, e in statements)
+        return not any(s <= damage_start and damage_end <= e for s, e in statements)
+
+    def _analyse(self, definitions: List[ParseTreeNode]):
+        # procedures only see their own scope, and the signatures of the procedures before them, so are analysed in
+        # order, each reusing its last analysis if it is still valid
+        analysed = []  # the procedures without errors, which later procedures can call
+        first_by_name = {}
+        failed_names = set()
+        procedures = {}
+        for definition in definitions:
+            name = definition.get_child("ID_PAREN").get_terminal_attribute()
+            analysis = self._procedures.get(definition)
+            if analysis is None or not analysis.is_complete or any(
+                    _get_return_type(first_by_name, definition, callee) != return_type
+                    for callee, return_type in analysis.callees.items()):
+                analysis = self._analyse_procedure(definition, analysed, first_by_name, failed_names)
+                self.analysed_procedures.append(name[:-1])
+
+            procedures[definition] = analysis
+            if analysis.error is not None:
+                self._errors.append(analysis.error)
+            if analysis.is_complete:
+                analysed.append(definition)
+                first_by_name.setdefault(name, definition)
+            else:
+                failed_names.add(name)
+        self._procedures = procedures
+
+        signatures = [(d.get_child("ID_PAREN").get_terminal_attribute(), getattr(d, "type", None))
+                      for d in definitions]
+        if self._is_main_complete and not self._is_main_changed and signatures == self._signatures:
+            return
+        self._signatures = signatures
+        self.is_main_analysed = True
+        self._is_main_complete = False
+        _clear_main_analysis(self.tree)
+        try:
+            semantic_analyse(self.tree)
+            # the main program cannot be type checked while a procedure it might call has errors
+            if not failed_names:
+                type_check(self.tree)
+                self._is_main_complete = True
+        except ParseError as e:
+            self._errors.append(e)
+
+    def _analyse_procedure(self, definition, analysed, first_by_name, failed_names) -> _ProcedureAnalysis:
+        callee_names = _clear_procedure_analysis(definition)
+        callees = {}
+        try:
+            semantic_analyse_procedure(definition)
+            # calls to a procedure with errors would be reported as calls to an undeclared procedure, which is
+            # misleading, so the caller is not type checked until the callee is fixed
+            if callee_names & failed_names:
+                return _ProcedureAnalysis(callees, None, is_complete=False)
+            type_check_procedure(definition, analysed)
+        except ParseError as e:
+            return _ProcedureAnalysis(callees, e, is_complete=False)
+
+        first_by_name = dict(first_by_name)
+        first_by_name.setdefault(definition.get_child("ID_PAREN").get_terminal_attribute(), definition)
+        callees = {name: _get_return_type(first_by_name, definition, name) for name in callee_names}
+        return _ProcedureAnalysis(callees, None, is_complete=True)
+
+
+# the return type of the procedure a call to name would go to, or None if there is no such procedure
+def _get_return_type(first_by_name, caller, name):
+    procedure = first_by_name.get(name)
+    if procedure is None and caller.get_child("ID_PAREN").get_terminal_attribute() == name:
+        procedure = caller
+    return None if procedure is None else getattr(procedure, "type", None)
+
+
+# where a line range is after replacing the lines from first_edited to last_edited, by lines up to last_new
+def _move_span(span, first_edited, last_edited, last_new, num_added):
+    first, last = span
+    if last < first_edited:
+        return span
+    if first > last_edited:
+        return first + num_added, last + num_added
+    return min(first, first_edited), max(last + num_added, last_new)
+
+
+# give a token which has moved to a different line its new line number, keeping the column as the lexer would
+# count it, which is from 0 on the first line and from 1 on the others
+def _move_token(token: Token, line_num):
+    if token.line_num == line_num:
+        return
+    if token.line_num == 1:
+        token.col_num += 1
+    elif line_num == 1:
+        token.col_num -= 1
+    token.line_num = line_num
+
+
+# the first and last line, counting from 0, of each string or comment which spans several lines
+def _find_spans(text) -> List[Tuple[int, int]]:
+    spans = []
+    line = 0
+    position = 0
+    for match in MULTI_LINE_TOKEN_REGEX.finditer(text):
+        line += text.count("\n", position, match.start())
+        num_lines = match.group().count("\n")
+        if num_lines:
+            spans.append((line, line + num_lines))
+        line += num_lines
+        position = match.end()
+    return spans
+
+
+def _widen_over_spans(first, last, spans):
+    is_widened = True
+    while is_widened:
+        is_widened = False
+        for span_first, span_last in spans:
+            if span_first <= last and span_last >= first and (span_first < first or span_last > last):
+                first, last = min(first, span_first), max(last, span_last)
+                is_widened = True
+    return first, last
+
+
+# for each BEGIN and END, the index of the END or BEGIN it pairs with, or None if it has none
+def _match_blocks(kinds: str) -> List[Optional[int]]:
+    match = [None] * len(kinds)
+    begins = []
+    for block_match in BLOCK_REGEX.finditer(kinds):
+        i = block_match.start()
+        if kinds[i] == "B":
+            begins.append(i)
+        elif begins:
+            begin = begins.pop()
+            match[begin] = i
+            match[i] = begin
+    return match
+
+
+# the compound nodes in a tree parsed with placeholders, by the id of their BEGIN token
+def _get_blocks(root: ParseTreeNode):
+    blocks = {}
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.is_terminal("BEGIN"):
+            blocks[id(node.content.token)] = node.parent
+        stack += node.children
+    return blocks
+
+
+# put a chunk's node in the tree, as the whole program's parser would have made it
+def _attach(node: ParseTreeNode, parent: Optional[ParseTreeNode]):
+    node.parent = parent
+    level = parent.level + 1 if parent is not None else 0
+    if node.level != level:
+        stack = [(node, level)]
+        while stack:
+            descendant, descendant_level = stack.pop()
+            descendant.level = descendant_level
+            stack += [(child, descendant_level + 1) for child in descendant.children]
+
+
+def _clear_analysis(node: ParseTreeNode):
+    for attribute in ["scope", "type"]:
+        if hasattr(node, attribute):
+            delattr(node, attribute)
+
+
+# clear the analysis of everything in a procedure, returning the names of the procedures it calls
+def _clear_procedure_analysis(definition: ParseTreeNode):
+    callee_names = set()
+    stack = [definition]
+    while stack:
+        node = stack.pop()
+        _clear_analysis(node)
+        if node.is_terminal("ID_PAREN") and node.parent is not definition:
+            callee_names.add(node.get_terminal_attribute())
+        stack += node.children
+    return callee_names
+
+
+# clear the analysis of everything in the main program, leaving the procedures' analysis
+def _clear_main_analysis(root: ParseTreeNode):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if not node.is_non_terminal("function_definition"):
+            _clear_analysis(node)
+            stack += node.children
@@ -2,9 +2,10 @@ from collections import defaultdict
 from typing import List
 
 from lexer import Token
-from syntaxanalyser import Expansion, NonTerminal, Terminal
+from syntaxanalyser import REPETITIONS, Expansion, NonTerminal, Terminal
 
 
+# a symbol can be followed by * (zero or more times), + (one or more times) or ? (optional), eg statement* or "ELSE"?
 def get_expansion(rule_str):
     rule_str = rule_str.split("#")[0]  # discard any content after #
     tokens = rule_str.split()
@@ -13,17 +14,19 @@ def get_expansion(rule_str):
         return Expansion(None)
 
     rule = []
-    is_zero_or_more = False
     for token in tokens:
         token = token.strip()
+        repetition = ""
+        if token[-1] in REPETITIONS:
+            repetition = token[-1]
+            token = token[:-1]
+            assert token, f"{repetition} must follow a symbol"
+
         if token.startswith('"') and token.endswith('"'):
             assert(len(token) > 2)
-            rule.append(Terminal(Token(token[1:-1])))
+            rule.append(Terminal(Token(token[1:-1]), repetition))
         else:
-            if token.endswith("*"):
-                token = token[:-1]
-                is_zero_or_more = True
-            rule.append(NonTerminal(token, is_zero_or_more))
+            rule.append(NonTerminal(token, repetition))
 
     return Expansion(rule)
 
@@ -0,0 +1,204 @@
+from typing import Dict, List, Tuple
+
+from compilecache import CompilationCache, get_key
+from lexer import Token, make_token
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import syntax_analyse
+from tac import Label, TacInstruction, TacProgram, TacProcedure, TacVariable, clone_code, compile_to_tac
+from typechecker import BOOL, NONE, NUM, STR, type_check
+
+# the literal a stub procedure returns, so that it has the same type as the procedure it stands in for
+STUB_RETURN_VALUES = {NUM: ("NUMBER", "0"), STR: ("STRING", ""), BOOL: ("TRUE", None), NONE: None}
+PARAMETER_TYPES = ["NUM", "STR", "BOOL"]
+
+
+# where a procedure definition is in the token stream, and what the rest of the program can see of it
+class ProcedureSpan:
+    def __init__(self, tokens: List[Token], start: int, header_end: int, end: int):
+        self.start = start  # index of the PROCEDURE token
+        self.header_end = header_end  # index of the ) after the parameters
+        self.end = end  # index of the END of the body
+        self.name = tokens[start + 1].attribute[:-1]
+        self.parameter_types = tuple(t.name for t in tokens[start + 2:header_end] if t.name in PARAMETER_TYPES)
+        self.first_line = tokens[start].line_num
+        self.fingerprint = _get_fingerprint(tokens[start:end + 1], self.first_line)
+
+
+# what is kept of a compiled procedure: its type and TAC, and the signatures of the procedures it calls, which
+# were assumed when compiling it
+# positions in the TAC are relative to first_line, the line the procedure started on when it was compiled
+class CachedProcedure:
+    def __init__(self, procedure: TacProcedure, return_type, callees: Dict[str, Tuple], first_line: int):
+        self.return_type = return_type
+        self.callees = callees
+        self.parameters = procedure.parameters
+        self.program = procedure.program
+        self.num_locals = procedure.num_locals
+        self.frame_size = procedure.frame_size
+        self.first_line = first_line
+
+
+# compile the tokens to TAC, reusing the analysis and TAC of any procedure whose body, and the signatures of the
+# procedures it calls, are the same as when it was last compiled
+# each unchanged procedure is parsed as a stub which takes the same parameters and returns the same type as it, so
+# the parser, which is the slowest phase, only sees the main program and the procedures which changed
+# context_key should be a cache key for everything else the TAC depends on, eg the grammar
+# returns the program, and the names of the procedures which were compiled from scratch
+def compile_incrementally(tokens: List[Token], expansions, cache: CompilationCache, context_key: str) \
+        -> Tuple[TacProgram, List[str]]:
+    spans = find_procedures(tokens)
+    keys = [get_key(context_key, span.fingerprint) for span in spans]
+    reused: Dict[int, CachedProcedure] = {}
+    for i, key in enumerate(keys):
+        cached = cache.get(key, "procedure")
+        if cached is not None:
+            reused[i] = cached
+
+    while True:
+        parse_tree = syntax_analyse(_stub_procedures(tokens, spans, reused), expansions)
+        semantic_analyse(parse_tree)
+        type_check(parse_tree)
+        definitions = get_definitions(parse_tree)
+        assert [d.get_child("ID_PAREN").get_terminal_attribute()[:-1] for d in definitions] == \
+               [span.name for span in spans]
+
+        # a procedure which calls one whose signature has changed has to be compiled again, to check the calls
+        # are still valid, and in case the callee's return type changed
+        visible = _get_visible_signatures(spans, definitions)
+        stale = [i for i, cached in reused.items()
+                 if any(visible[i].get(name) != signature for name, signature in cached.callees.items())]
+        if not stale:
+            break
+        for i in stale:
+            del reused[i]
+
+    program = compile_to_tac(parse_tree)
+    recompiled = []
+    for i, (span, procedure) in enumerate(zip(spans, program.procedures)):
+        if i in reused:
+            restore_procedure(program, procedure, reused[i], span.first_line)
+        else:
+            callees = {name: visible[i].get(name) for name in get_callees(procedure)}
+            cache.put(keys[i], "procedure", CachedProcedure(procedure, definitions[i].type, callees,
+                                                            span.first_line))
+            recompiled.append(span.name)
+
+    return program, recompiled
+
+
+# every procedure definition in the tokens, in order
+# returns no procedures if the tokens are not well formed enough to find where they end, leaving the parser to
+# report the error
+def find_procedures(tokens: List[Token]) -> List[ProcedureSpan]:
+    spans = []
+    i = 0
+    while i < len(tokens):
+        if tokens[i].name != "PROCEDURE":
+            i += 1
+            continue
+
+        header_end = next((j for j in range(i + 1, len(tokens)) if tokens[j].name in [")", "BEGIN"]), None)
+        if header_end is None or tokens[header_end].name != ")" or tokens[i + 1].name != "ID_PAREN" \
+                or header_end + 1 >= len(tokens) or tokens[header_end + 1].name != "BEGIN":
+            return []
+
+        depth = 0
+        end = None
+        for j in range(header_end + 1, len(tokens)):
+            if tokens[j].name == "BEGIN":
+                depth += 1
+            elif tokens[j].name == "END":
+                depth -= 1
+                if depth == 0:
+                    end = j
+                    break
+            elif tokens[j].name == "PROCEDURE":
+                break  # procedures cannot be nested, so the body is missing an END
+        if end is None:
+            return []
+
+        spans.append(ProcedureSpan(tokens, i, header_end, end))
+        i = end + 1
+
+    return spans
+
+
+# what a procedure's code depends on from its own text: the tokens, with lines relative to its first, so that moving
+# a procedure up or down the file does not change it
+def _get_fingerprint(tokens: List[Token], first_line: int) -> str:
+    return "\n".join(f"{t.name} {t.attribute} {t.line_num - first_line} {t.col_num}" for t in tokens)
+
+
+# the tokens with the bodies of the reused procedures replaced by a return of a value of the right type
+def _stub_procedures(tokens: List[Token], spans: List[ProcedureSpan], reused: Dict[int, CachedProcedure]):
+    stubbed = []
+    start = 0
+    for i, span in enumerate(spans):
+        if i not in reused:
+            continue
+        stubbed += tokens[start:span.header_end + 1]
+        begin, end = tokens[span.header_end + 1], tokens[span.end]
+        body = [("RETURN", None)]
+        if STUB_RETURN_VALUES[reused[i].return_type] is not None:
+            body.append(STUB_RETURN_VALUES[reused[i].return_type])
+        body.append((";", None))
+        stubbed.append(begin)
+        stubbed += [make_token(name, attribute, end) for name, attribute in body]
+        stubbed.append(end)
+        start = span.end + 1
+
+    return stubbed + tokens[start:]
+
+
+# the function_definition nodes in the tree, in the order they appear in the source
+def get_definitions(parse_tree):
+    definitions = []
+    stack = [parse_tree]
+    while stack:
+        node = stack.pop()
+        if node.is_non_terminal("function_definition"):
+            definitions.append(node)
+        else:
+            stack += reversed(node.children)
+    return definitions
+
+
+# for each procedure, the signature of each procedure it can call: the ones defined before it and itself
+# as with the type checker, if two procedures have the same name, the first one is called
+def _get_visible_signatures(spans: List[ProcedureSpan], definitions) -> List[Dict[str, Tuple]]:
+    visible = []
+    signatures = {}
+    for span, definition in zip(spans, definitions):
+        signatures.setdefault(span.name, (span.parameter_types, definition.type))
+        visible.append(dict(signatures))
+    return visible
+
+
+# the names of the procedures the procedure calls, sorted
+def get_callees(procedure: TacProcedure):
+    return sorted({i.arg1.tag for i in procedure.program if isinstance(i, TacInstruction) and i.op == "LCall"})
+
+
+# swap the stub's code for the cached code, with fresh labels and temporaries so that they cannot clash with the
+# rest of the program, and positions moved to where the procedure now is
+def restore_procedure(program: TacProgram, procedure: TacProcedure, cached: CachedProcedure, first_line: int):
+    offset = first_line - cached.first_line
+    code = clone_code(cached.program, program.session)
+    temporaries = {}
+    for item in code:
+        if item.position is not None:
+            item.position = (item.position[0] + offset, item.position[1])
+        if isinstance(item, Label):
+            continue
+
+        for variable in item.get_used_variables() + [item.get_defined_variable()]:
+            if isinstance(variable, TacVariable) and not variable.is_named and repr(variable) not in temporaries:
+                temporaries[repr(variable)] = program.new_variable()
+        item.rename_variables(temporaries)
+        if item.op == "LCall":
+            item.arg1 = program.get_procedure(item.arg1.tag).label
+
+    procedure.program = code
+    procedure.parameters = cached.parameters
+    procedure.num_locals = cached.num_locals
+    procedure.frame_size = cached.frame_size
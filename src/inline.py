@@ -0,0 +1,218 @@
+from typing import Dict, List, Set
+
+from analysis import AnalysisCache
+from cfg import ControlFlowGraph
+from tac import SLOT_SIZE, TacInstruction, TacProcedure, TacProgram, TacVariable, clone_code
+
+# (callees up to this many instructions are always inlined,
+#  callees up to this many instructions are inlined when called from a loop or from only one place)
+INLINE_THRESHOLDS = {
+    0: (0, 0),
+    1: (4, 0),
+    2: (12, 40)
+}
+# a call inside n nested loops is assumed to run LOOP_WEIGHT ** n times as often as one outside any loop
+LOOP_WEIGHT = 10
+# no more calls are inlined into a code unit once it has grown to this many times its original size
+GROWTH_LIMIT = 2
+
+
+class CallSite:
+    def __init__(self, start: int, call: TacInstruction, arguments: list, end: int):
+        self.start = start  # index of the first PushParam, or the LCall if there are no arguments
+        self.call = call
+        self.arguments = arguments  # in the order they were written in the call
+        self.end = end  # index of the PopParams, or the LCall if there are no arguments
+        self.frequency = 1
+
+    def get_callee_name(self):
+        return self.call.arg1.tag
+
+
+# substitute the bodies of small, non recursive procedures for calls to them
+# optimisation_level 0 never inlines, 1 only inlines tiny procedures, and 2 also inlines larger procedures that
+# are called in loops or only called once
+# with a profile, calls are considered hottest first until the growth limit is reached, how often each call ran
+# replaces the loop depth estimate, and calls which never ran are only inlined if the callee is tiny
+# procedures that are no longer called afterwards are removed
+# returns true iff the program was changed
+def inline_procedures(program: TacProgram, optimisation_level=2, profile=None, analyses: AnalysisCache = None):
+    always_size, hot_size = INLINE_THRESHOLDS[min(optimisation_level, max(INLINE_THRESHOLDS))]
+    if always_size == 0 and hot_size == 0:
+        return False
+
+    analyses = analyses or AnalysisCache(program)
+    call_graph = get_call_graph(program)
+    recursive = get_recursive_procedures(call_graph)
+    call_counts = _count_call_sites(program, analyses)
+
+    changed = False
+    # callees are done before their callers, so that what gets copied into the callers is already inlined
+    for unit in _get_bottom_up_order(program, call_graph) + [program]:
+        budget = GROWTH_LIMIT * len(unit.program)
+        new_size = len(unit.program)
+        chosen = []
+        # calls which run equally often are taken from the end backwards
+        for call_site in sorted(get_call_sites(unit, profile, analyses), key=lambda c: (-c.frequency, -c.start)):
+            callee = program.get_procedure(call_site.get_callee_name())
+            size = get_size(callee)
+            if callee.name in recursive or callee is unit or new_size > budget:
+                continue
+
+            hot = call_site.frequency > 1 or (call_counts[callee.name] == 1 and call_site.frequency > 0)
+            if size <= always_size or (hot and size <= hot_size):
+                chosen.append((call_site, callee))
+                # the call sequence is replaced by a copy of each argument and the body
+                new_size += len(callee.parameters) + size - (call_site.end - call_site.start + 1)
+
+        # from the end backwards, so that inlining a call does not move the ones still to be done
+        for call_site, callee in sorted(chosen, key=lambda c: c[0].start, reverse=True):
+            _inline_call(unit, call_site, callee)
+            changed = True
+        if chosen:
+            analyses.invalidate_unit(unit)
+
+    if changed:
+        called = {name for unit in program.get_code_units() for name in get_called_procedures(unit)}
+        program.procedures = [p for p in program.procedures if p.name in called]
+
+    return changed
+
+
+# maps each procedure name to the names of the procedures it calls
+def get_call_graph(program: TacProgram) -> Dict[str, Set[str]]:
+    return {p.name: get_called_procedures(p) for p in program.procedures}
+
+
+def get_called_procedures(unit) -> Set[str]:
+    return {i.arg1.tag for i in unit.program if isinstance(i, TacInstruction) and i.op == "LCall"}
+
+
+# procedures which can end up calling themselves
+def get_recursive_procedures(call_graph: Dict[str, Set[str]]) -> Set[str]:
+    recursive = set()
+    for procedure in call_graph:
+        reachable = set()
+        worklist = list(call_graph[procedure])
+        while worklist:
+            callee = worklist.pop()
+            if callee not in reachable:
+                reachable.add(callee)
+                worklist.extend(call_graph.get(callee, []))
+        if procedure in reachable:
+            recursive.add(procedure)
+
+    return recursive
+
+
+# the number of instructions in a procedure, not counting BeginFunc and EndFunc
+def get_size(procedure: TacProcedure):
+    return len([i for i in procedure.program if isinstance(i, TacInstruction)]) - 2
+
+
+# each call in the unit, in program order, with how often it ran according to the profile, or else an estimate
+# based on its loop depth
+def get_call_sites(unit, profile=None, analyses: AnalysisCache = None) -> List[CallSite]:
+    loops = analyses.get("loops", unit) if analyses is not None else ControlFlowGraph(unit.program).get_natural_loops()
+    loop_depths = {}
+    for loop in loops:
+        for block in loop.blocks:
+            for instruction in block.instructions:
+                loop_depths[id(instruction)] = loop_depths.get(id(instruction), 0) + 1
+
+    call_sites = []
+    code = unit.program
+    for index, item in enumerate(code):
+        if not isinstance(item, TacInstruction) or item.op != "LCall":
+            continue
+
+        # the caller pushes all of its arguments immediately before the call, and pops them straight after
+        pops = code[index + 1] if index + 1 < len(code) else None
+        if isinstance(pops, TacInstruction) and pops.op == "PopParams":
+            num_arguments = int(pops.arg1) // SLOT_SIZE
+            end = index + 1
+        else:
+            num_arguments = 0
+            end = index
+        pushes = code[index - num_arguments:index]
+
+        call_site = CallSite(index - num_arguments, item, [p.arg1 for p in reversed(pushes)], end)
+        count = profile.get_call_count(item) if profile is not None else None
+        call_site.frequency = count if count is not None else LOOP_WEIGHT ** loop_depths.get(id(item), 0)
+        call_sites.append(call_site)
+
+    return call_sites
+
+
+def _count_call_sites(program: TacProgram, analyses: AnalysisCache) -> Dict[str, int]:
+    counts = {p.name: 0 for p in program.procedures}
+    for unit in program.get_code_units():
+        for call_site in get_call_sites(unit, analyses=analyses):
+            counts[call_site.get_callee_name()] += 1
+    return counts
+
+
+def _get_bottom_up_order(program: TacProgram, call_graph: Dict[str, Set[str]]) -> List[TacProcedure]:
+    order = []
+    visited = set()
+
+    def visit(name):
+        if name in visited:
+            return
+        visited.add(name)
+        for callee in sorted(call_graph[name]):
+            visit(callee)
+        order.append(program.get_procedure(name))
+
+    for procedure in program.procedures:
+        visit(procedure.name)
+
+    return order
+
+
+# replace the call sequence with a copy of the callee's body
+# the callee's variables are renamed so they cannot clash with the caller's: user variables get a name starting
+# with an underscore, which Oreo identifiers cannot, and temporaries are replaced by new temporaries
+def _inline_call(unit, call_site: CallSite, callee: TacProcedure):
+    prefix = f"_{callee.name}{unit.session.next_inlined_call_number()}_"
+
+    body = clone_code(callee.program[1:-1], unit.session)
+    renamed = {}
+    for instruction in body:
+        if isinstance(instruction, TacInstruction):
+            for variable in instruction.get_used_variables() + [instruction.get_defined_variable()]:
+                if variable is not None and repr(variable) not in renamed:
+                    renamed[repr(variable)] = TacVariable(prefix + variable.name) if variable.is_named \
+                        else unit.new_variable()
+    for parameter in callee.parameters:
+        renamed.setdefault(repr(parameter), TacVariable(prefix + parameter.name))
+
+    # each parameter starts off as a copy of its argument
+    code = [TacInstruction(result_var=renamed[repr(p)], op="copy", arg1=a)
+            for p, a in zip(callee.parameters, call_site.arguments)]
+    # and each local variable as 0, as in a new frame, since one which is only assigned on some paths would otherwise
+    # keep its value from the last time the inlined code ran, eg in a loop
+    parameters = {repr(p) for p in callee.parameters}
+    code += [TacInstruction(result_var=variable, op="copy", arg1="0") for name, variable in renamed.items()
+             if variable.is_named and name not in parameters]
+
+    # returns become a jump to the end of the inlined code, unless they are already at the end
+    return_label = None
+    for index, item in enumerate(body):
+        if isinstance(item, TacInstruction):
+            item.rename_variables(renamed)
+            if item.op == "Return":
+                if item.arg1 is not None and call_site.call.result_var is not None:
+                    code.append(TacInstruction(result_var=call_site.call.result_var, op="copy", arg1=item.arg1))
+                if index < len(body) - 1:
+                    return_label = return_label or unit.new_label("inline_return")
+                    code.append(TacInstruction(result_var=return_label, op="Goto"))
+                continue
+        code.append(item)
+    if return_label is not None:
+        code.append(return_label)
+
+    unit.program[call_site.start:call_site.end + 1] = code
+
+    if isinstance(unit, TacProcedure):
+        unit.set_frame_size(unit.num_locals + callee.num_locals + len(callee.parameters))
@@ -3,7 +3,7 @@ import re
 from difflib import SequenceMatcher
 from typing import List, Tuple
 
-from parseerror import ParseError
+from parseerror import ErrorLog, ParseError
 
 KEYWORDS_BOUNDARY_AFTER = ['program', 'begin', 'end', 'var', 'print', 'println', 'get', 'while', 'if', 'then', 'else',
                            'or', 'and', 'not', 'true', 'false', 'procedure', 'return', 'num', 'str', 'bool']
@@ -53,57 +53,87 @@ class Token:
         return self.name == other.name and self.attribute == other.attribute
 
 
-def lex(lex_input: str):
+# a token which is not in the source, eg one in a stub standing in for a procedure, put at position, another token,
+# so that any error in it is reported there
+def make_token(name, attribute, position: Token) -> Token:
+    token = Token(name, attribute, position.line_num, position.col_num)
+    token.context_line = position.context_line
+    return token
+
+
+# keyword and special token patterns, compiled once, in the order they are tried
+KEYWORD_PATTERNS = [(keyword, re.compile(re.escape(keyword) + (r"\b" if keyword in KEYWORDS_BOUNDARY_AFTER else "")))
+                    for keyword in KEYWORDS_NO_BOUNDARY_AFTER + KEYWORDS_BOUNDARY_AFTER]
+SPECIAL_TOKEN_PATTERNS = [(special_token, re.compile(special_token["regex"])) for special_token in SPECIAL_TOKENS]
+
+
+# if errors is given, each error is added to it and lexing carries on after it, instead of stopping at the first
+def lex(lex_input: str, errors: ErrorLog = None):
     tokens: List[Token] = []
     index = 0
     line_num = 1
     index_at_start_of_line = 0
     lines = lex_input.split("\n")
+    # tokens from this index onwards are on the current line, so do not know their context line yet
+    first_token_on_line = 0
 
     while index < len(lex_input):
         # ignore whitespace
         if lex_input[index].isspace():
             if lex_input[index] == "\n":
+                _set_context_line(tokens, first_token_on_line, lines[line_num - 1])
+                first_token_on_line = len(tokens)
                 line_num += 1
                 index_at_start_of_line = index
-                this_line_content = lines.pop(0)
-                for token in tokens:
-                    if token.context_line is None:
-                        token.context_line = this_line_content
             index += 1
             continue
 
         # look for keywords
-        remaining_input = lex_input[index:]
-        index, keyword_found = _get_keyword(index, remaining_input, tokens, line_num,
+        index, keyword_found = _get_keyword(index, lex_input, tokens, line_num,
                                             col_num=index - index_at_start_of_line)
         if keyword_found:
             continue
 
         # look for special tokens
-        index, special_token_found = _get_special_token(index, remaining_input, tokens, line_num,
+        start = index
+        index, special_token_found = _get_special_token(index, lex_input, tokens, line_num,
                                                         col_num=index - index_at_start_of_line)
         if special_token_found:
+            # strings and comments can span several lines
+            num_newlines = lex_input.count("\n", start, index)
+            if num_newlines:
+                _set_context_line(tokens, first_token_on_line, lines[line_num - 1])
+                first_token_on_line = len(tokens)
+                line_num += num_newlines
+                index_at_start_of_line = lex_input.rfind("\n", start, index)
             continue
 
         else:
             # nothing found: error
-            message = _get_parse_error_message(remaining_input)
-            raise ParseError(message, line_num, index - index_at_start_of_line + 1, lines[0],
-                             is_lex_error=True)
+            message = _get_parse_error_message(lex_input[index:])
+            error = ParseError(message, line_num, index - index_at_start_of_line + 1, lines[line_num - 1],
+                               is_lex_error=True)
+            if errors is None:
+                raise error
+            errors.add(error)
+            index = _skip_error(index, lex_input, tokens, line_num, col_num=index - index_at_start_of_line)
 
-    this_line_content = lines.pop(0)
-    for token in tokens:
-        if token.context_line is None:
-            token.context_line = this_line_content
+    _set_context_line(tokens, first_token_on_line, lines[line_num - 1])
 
     return tokens
 
 
-def _get_keyword(index, remaining_input, tokens, line_num, col_num) -> Tuple[int, bool]:
-    for keyword in KEYWORDS_NO_BOUNDARY_AFTER + KEYWORDS_BOUNDARY_AFTER:
-        boundary = r"\b" if keyword in KEYWORDS_BOUNDARY_AFTER else ""
-        if re.match(re.escape(keyword) + boundary, remaining_input):
+# a token spanning several lines, eg a string, gets the line it starts on as its context
+def _set_context_line(tokens, start, context_line):
+    for token in tokens[start:]:
+        if token.context_line is None:
+            token.context_line = context_line
+
+
+# index is where to look in lex_input
+def _get_keyword(index, lex_input, tokens, line_num, col_num) -> Tuple[int, bool]:
+    for keyword, pattern in KEYWORD_PATTERNS:
+        if pattern.match(lex_input, index):
             tokens.append(Token(keyword.upper(), line_num=line_num, col_num=col_num))
             index += len(keyword)
             return index, True
@@ -112,9 +142,9 @@ def _get_keyword(index, remaining_input, tokens, line_num, col_num) -> Tuple[int
 
 
 # returns (updated index, True iff keyword was found)
-def _get_special_token(index, remaining_input, tokens, line_num, col_num):
-    for special_token in SPECIAL_TOKENS:
-        match = re.match(special_token["regex"], remaining_input)
+def _get_special_token(index, lex_input, tokens, line_num, col_num):
+    for special_token, pattern in SPECIAL_TOKEN_PATTERNS:
+        match = pattern.match(lex_input, index)
         if match:
             token_attribute = match.group()
             if "group_priority" in special_token:
@@ -148,6 +178,30 @@ def _get_parse_error_message(remaining_input):
     return message
 
 
+# returns the index to carry on lexing from after an error at index
+# an unclosed comment runs to the end of the input, and an unclosed string to the end of its line, leaving out a
+# semicolon at the end, which is most likely where the closing quote was left off; anything else is skipped up to
+# the next whitespace or token
+def _skip_error(index, lex_input, tokens, line_num, col_num):
+    if lex_input.startswith("{-", index):
+        return len(lex_input)
+
+    if lex_input[index] in ["'", '"']:
+        end = lex_input.find("\n", index)
+        end = len(lex_input) if end == -1 else end
+        string = lex_input[index + 1:end].rstrip()
+        if string.endswith(";"):
+            string = string[:-1]
+        tokens.append(Token("STRING", string, line_num=line_num, col_num=col_num))
+        return index + 1 + len(string)
+
+    index += 1
+    while index < len(lex_input) and not lex_input[index].isspace() \
+            and not any(pattern.match(lex_input, index) for _, pattern in KEYWORD_PATTERNS + SPECIAL_TOKEN_PATTERNS):
+        index += 1
+    return index
+
+
 def lex_and_join_with_newlines(s):
     return "\n".join(map(str, lex(s)))
 
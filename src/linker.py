@@ -0,0 +1,235 @@
+import os
+import pickle
+from typing import Dict, List, Tuple
+
+from compilecache import get_compiler_version, get_key
+from incremental import CachedProcedure, STUB_RETURN_VALUES, find_procedures, get_callees, get_definitions, \
+    restore_procedure
+from lexer import Token, lex, make_token
+from parseerror import ErrorLog, ParseError
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import ParseTreeNode, Terminal, syntax_analyse
+from tac import TacInstruction, TacProcedure, TacProgram, compile_to_tac
+from typechecker import type_check
+
+OBJECT_EXTENSION = ".oo"
+
+
+class LinkError(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(message)
+
+
+# a module, a file of procedure definitions, compiled on its own: the TAC of each procedure, and its signature, which
+# is all that programs and other modules calling it are compiled against
+# signatures are (parameter types, return type), as for incremental compilation, and each procedure keeps the
+# signatures of the procedures it calls as they were when it was compiled, so that linking can check they still are
+class ModuleObject:
+    def __init__(self, name: str, key: str, signatures: Dict[str, Tuple], procedures: Dict[str, CachedProcedure]):
+        self.name = name
+        self.key = key  # of the source and the signatures it was compiled against, to tell if it is up to date
+        self.signatures = signatures  # by procedure name, in the order they are defined
+        self.procedures = procedures
+        self.compiler_version = get_compiler_version()
+
+    # the signatures of the procedures in other modules which this one calls
+    def get_imports(self) -> Dict[str, Tuple]:
+        imports = {}
+        for procedure in self.procedures.values():
+            for name, signature in procedure.callees.items():
+                if name not in self.procedures:
+                    imports[name] = signature
+        return imports
+
+
+# the key of everything besides its source that any object depends on
+def get_context_key(grammar_file: str) -> str:
+    with open(grammar_file, "rb") as file:
+        return get_key("object", file.read())
+
+
+# the key of an object compiled from the source against the signatures: context_key should be a key for everything
+# else the object depends on, eg the grammar
+# only the signatures of the procedures the module calls count, so a change to any other does not make it out of date
+def get_module_key(context_key: str, source: str, tokens: List[Token], signatures: Dict[str, Tuple]) -> str:
+    imports = _get_imports(tokens, signatures)
+    return get_key("module", context_key, source, repr(sorted(imports.items())))
+
+
+# compile a module against the signatures of the procedures in other modules, which are all it can see of them
+# if errors is given, each error is added to it, as with the phases, and raised before the module is compiled to TAC
+def compile_module(source: str, expansions, name: str, context_key: str, signatures: Dict[str, Tuple] = None,
+                   errors: ErrorLog = None) -> ModuleObject:
+    signatures = signatures or {}
+    tokens = lex(source, errors)
+    if not tokens:
+        raise ParseError("A module must define at least one procedure", 1, 0, "<No content to parse>")
+    key = get_module_key(context_key, source, tokens, signatures)
+
+    # the module is parsed as a program of procedure definitions, with the procedures it calls from other modules
+    # defined first as stubs
+    imports = _get_imports(tokens, signatures)
+    begin = [make_token(t, a, tokens[0]) for t, a in [("PROGRAM", None), ("ID", name), ("BEGIN", None)]]
+    stubs = get_stub_tokens(imports, tokens[0])
+    parse_tree = syntax_analyse(begin + stubs + tokens + [make_token("END", None, tokens[-1])], expansions, errors)
+    _check_only_definitions(parse_tree, errors)
+    semantic_analyse(parse_tree, errors)
+    type_check(parse_tree, errors)
+    if errors is not None:
+        errors.check()
+
+    program = compile_to_tac(parse_tree)
+    definitions = get_definitions(parse_tree)[len(imports):]
+    spans = find_procedures(tokens)
+    assert [d.get_child("ID_PAREN").get_terminal_attribute()[:-1] for d in definitions] == [s.name for s in spans]
+
+    # as in a program, each procedure can call those defined before it and itself, and the first of two with the
+    # same name is the one called
+    visible = dict(imports)
+    procedures = {}
+    for span, definition, procedure in zip(spans, definitions, program.procedures[len(imports):]):
+        if span.name in procedures:
+            continue
+        visible[span.name] = (span.parameter_types, definition.type)
+        callees = {callee: visible.get(callee) for callee in get_callees(procedure)}
+        procedures[span.name] = CachedProcedure(procedure, definition.type, callees, span.first_line)
+
+    exported = {name: visible[name] for name in procedures}
+    return ModuleObject(name, key, exported, procedures)
+
+
+# tokens defining a stub for each procedure, which takes the same parameters and returns the same type, positioned
+# at the token given
+def get_stub_tokens(signatures: Dict[str, Tuple], position: Token) -> List[Token]:
+    tokens = []
+    for name, (parameter_types, return_type) in signatures.items():
+        stub = [("PROCEDURE", None), ("ID_PAREN", name + "(")]
+        for i, parameter_type in enumerate(parameter_types):
+            if i:
+                stub.append((",", None))
+            stub += [(parameter_type, None), ("ID", f"p{i}")]
+        stub += [(")", None), ("BEGIN", None), ("RETURN", None)]
+        if STUB_RETURN_VALUES[return_type] is not None:
+            stub.append(STUB_RETURN_VALUES[return_type])
+        stub += [(";", None), ("END", None)]
+        tokens += [make_token(token_name, attribute, position) for token_name, attribute in stub]
+    return tokens
+
+
+# the signature of every procedure in the objects, by name
+def get_signatures(objects: List[ModuleObject]) -> Dict[str, Tuple]:
+    signatures = {}
+    for module in objects:
+        for name, signature in module.signatures.items():
+            signatures.setdefault(name, signature)
+    return signatures
+
+
+# the program's tokens with stubs for the objects' procedures at the start of the main program, so that it can be
+# compiled against them and then linked with them
+def import_objects(tokens: List[Token], objects: List[ModuleObject]) -> List[Token]:
+    if len(tokens) < 3 or tokens[2].name != "BEGIN":
+        return tokens  # leave the parser to report the error
+
+    signatures = get_signatures(objects)
+    for span in find_procedures(tokens):
+        if span.name in signatures:
+            raise LinkError(f"Procedure {span.name} is defined in both the program and module "
+                            f"{_get_defining_module(objects, span.name).name}")
+    return tokens[:3] + get_stub_tokens(signatures, tokens[2]) + tokens[3:]
+
+
+# put the objects' procedures in place of the stubs the program was compiled against, returning the program
+# the code of each procedure is copied in with fresh labels and temporaries, so that they cannot clash with the
+# program's, and every call is pointed at the procedure it calls
+def link(program: TacProgram, objects: List[ModuleObject]) -> TacProgram:
+    defined: Dict[str, ModuleObject] = {}
+    for module in objects:
+        for name in module.procedures:
+            if name in defined:
+                raise LinkError(f"Procedure {name} is defined in both module {defined[name].name} and module "
+                                f"{module.name}")
+            defined[name] = module
+
+    # every call from a module must be to a procedure with the signature it was compiled against
+    for module in objects:
+        for caller, procedure in module.procedures.items():
+            for callee, signature in procedure.callees.items():
+                if callee not in defined:
+                    raise LinkError(f"Undefined procedure {callee}, called by {caller} in module {module.name}")
+                if defined[callee].signatures[callee] != signature:
+                    raise LinkError(f"Module {module.name} was compiled against a different version of {callee} "
+                                    f"from module {defined[callee].name}, and needs compiling again")
+
+    program.procedures = [p for p in program.procedures if p.name not in defined]
+    linked = []
+    for module in objects:
+        for name, compiled in module.procedures.items():
+            procedure = TacProcedure(name, compiled.parameters, program)
+            program.procedures.append(procedure)
+            linked.append((procedure, compiled))
+    for procedure, compiled in linked:
+        restore_procedure(program, procedure, compiled, compiled.first_line)
+
+    for unit in program.get_code_units():
+        for item in unit.program:
+            if isinstance(item, TacInstruction) and item.op == "LCall":
+                item.arg1 = program.get_procedure(item.arg1.tag).label
+    return program
+
+
+def save_object(module: ModuleObject, filename: str):
+    with open(filename, "wb") as file:
+        pickle.dump(module, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_object(filename: str) -> ModuleObject:
+    with open(filename, "rb") as file:
+        try:
+            module = pickle.load(file)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            raise LinkError(f"{filename} is not an Oreo object: {e}")
+    if not isinstance(module, ModuleObject):
+        raise LinkError(f"{filename} is not an Oreo object")
+    if module.compiler_version != get_compiler_version():
+        raise LinkError(f"{filename} was compiled by a different version of the compiler, and needs compiling again")
+    return module
+
+
+# the name of the module in a file, and the name of its object
+def get_module_name(filename: str) -> str:
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def get_object_file(filename: str, object_dir=None) -> str:
+    base = os.path.splitext(filename)[0]
+    if object_dir is not None:
+        base = os.path.join(object_dir, os.path.basename(base))
+    return base + OBJECT_EXTENSION
+
+
+# the signatures of the procedures the tokens call without defining
+def _get_imports(tokens: List[Token], signatures: Dict[str, Tuple]) -> Dict[str, Tuple]:
+    defined = {span.name for span in find_procedures(tokens)}
+    called = {t.attribute[:-1] for t in tokens if t.name == "ID_PAREN"}
+    return {name: signature for name, signature in signatures.items() if name in called and name not in defined}
+
+
+def _get_defining_module(objects: List[ModuleObject], name: str) -> ModuleObject:
+    return next(module for module in objects if name in module.signatures)
+
+
+def _check_only_definitions(parse_tree: ParseTreeNode, errors: ErrorLog):
+    for statement in parse_tree.get_child("compound").children[1:-1]:
+        # anything the parser could not parse has already been reported
+        if statement.is_non_terminal("error") or statement.children[0].is_non_terminal("function_definition"):
+            continue
+        node = statement
+        while not isinstance(node.content, Terminal):
+            node = node.children[0]
+        token = node.content.token
+        error = ParseError("A module can only define procedures", token.line_num, token.col_num, token.context_line)
+        if errors is None:
+            raise error
+        errors.add(error)
@@ -0,0 +1,210 @@
+from typing import Dict, List, Tuple
+
+from analysis import AnalysisCache, transform_each_loop
+from cfg import BasicBlock, ControlFlowGraph, Loop, count_definitions
+from tac import TacInstruction, TacProgram, TacVariable, is_number_literal
+
+
+# loop invariant code motion followed by strength reduction
+# returns true iff the program was changed
+def optimise_loops(program: TacProgram):
+    analyses = AnalysisCache(program)
+    hoisted = hoist_loop_invariants(program, analyses)
+    reduced = reduce_strength(program, analyses)
+    return hoisted or reduced
+
+
+# move instructions which compute the same value on every iteration of a loop into a preheader,
+# which runs once before the loop is entered
+def hoist_loop_invariants(program: TacProgram, analyses: AnalysisCache = None):
+    analyses = analyses or AnalysisCache(program)
+    return transform_each_loop(program, lambda unit, cfg, loop: _hoist_from_loop(unit, cfg, loop, analyses), analyses)
+
+
+# replace multiplications of an induction variable by a constant with an addition on each iteration
+# eg in a loop containing i := i + 1, t = i * 4 becomes a variable s which is initialised to i * 4 in the preheader
+# and has 4 added to it whenever i is incremented
+def reduce_strength(program: TacProgram, analyses: AnalysisCache = None):
+    return transform_each_loop(program, _reduce_strength_in_loop, analyses)
+
+
+def _hoist_from_loop(unit, cfg: ControlFlowGraph, loop: Loop, analyses: AnalysisCache):
+    dominators = analyses.get("dominators", unit)
+    live_in, _ = analyses.get("liveness", unit)
+    loop_definitions = count_definitions(loop.get_instructions())
+    all_definitions = analyses.get("definitions", unit)
+    exits = loop.get_exiting_blocks()
+
+    hoisted: List[TacInstruction] = []
+    hoisted_names = set()
+    changed = True
+    while changed:
+        changed = False
+        for block in sorted(loop.blocks, key=lambda b: b.index):
+            dominates_exits = all(block in dominators[e] for e in exits)
+            for instruction in list(block.instructions):
+                if _is_hoistable(instruction, loop_definitions, all_definitions, hoisted_names, dominates_exits,
+                                 live_in[loop.header]):
+                    block.instructions.remove(instruction)
+                    hoisted.append(instruction)
+                    hoisted_names.add(repr(instruction.get_defined_variable()))
+                    changed = True
+
+    if not hoisted:
+        return False
+
+    _insert_preheader(unit, cfg, loop, hoisted)
+    return True
+
+
+def _is_hoistable(instruction, loop_definitions, all_definitions, hoisted_names, dominates_exits, header_live_in):
+    if not instruction.is_pure():
+        return False
+
+    defined = repr(instruction.get_defined_variable())
+    if loop_definitions[defined] != 1:
+        return False
+
+    # every operand must be a literal, or a variable whose value does not change inside the loop
+    if any(loop_definitions[repr(v)] > 0 and repr(v) not in hoisted_names for v in instruction.get_used_variables()):
+        return False
+
+    # division can fail, so only do it early if the original program would definitely have done it
+    if instruction.op == "/" and not dominates_exits:
+        return False
+
+    if not instruction.get_defined_variable().is_named and all_definitions[defined] == 1:
+        # temporaries are only assigned once, so nothing else can observe them being assigned earlier
+        return True
+
+    # a user variable may be read after the loop, or before this point in the loop, so it must be assigned
+    # on every path out of the loop and must not be read before being assigned
+    return dominates_exits and defined not in header_live_in
+
+
+def _insert_preheader(unit, cfg: ControlFlowGraph, loop: Loop, instructions: List[TacInstruction]):
+    header = loop.header
+    preheader = BasicBlock(header.index, unit.new_label("preheader"))
+    preheader.instructions = instructions
+
+    # entries into the loop now go via the preheader, but back edges still go straight to the header
+    for predecessor in header.predecessors:
+        terminator = predecessor.get_terminator()
+        if predecessor not in loop.blocks and terminator and terminator.get_jump_target().name == header.label.name:
+            terminator.result_var = preheader.label
+
+    # the preheader is placed directly before the header, so a loop block there must now jump over it
+    layout_predecessor = cfg.blocks[header.index - 1] if header.index > 0 else None
+    if layout_predecessor in loop.blocks and layout_predecessor.falls_through():
+        layout_predecessor.instructions.append(TacInstruction(result_var=header.label, op="Goto"))
+
+    cfg.insert_block(header.index, preheader)
+
+
+def _reduce_strength_in_loop(unit, cfg: ControlFlowGraph, loop: Loop):
+    induction_variables = find_induction_variables(loop)
+    loop_definitions = count_definitions(loop.get_instructions())
+
+    # (induction variable name, multiplier) -> the variable which tracks their product
+    reduced: Dict[Tuple[str, int], TacVariable] = {}
+    initialisers = []
+    for block in sorted(loop.blocks, key=lambda b: b.index):
+        for instruction in list(block.instructions):
+            multiplication = _get_induction_multiplication(instruction, induction_variables)
+            if multiplication is None or loop_definitions[repr(instruction.result_var)] != 1:
+                continue
+
+            induction_variable, multiplier = multiplication
+            key = (repr(induction_variable), multiplier)
+            if key not in reduced:
+                product = unit.new_variable()
+                reduced[key] = product
+                initialisers.append(TacInstruction(result_var=product, op="*", arg1=induction_variable,
+                                                   arg2=str(multiplier)))
+                _update_after_increment(induction_variables[repr(induction_variable)], product, multiplier)
+
+            _replace_multiplication(cfg, block, instruction, reduced[key], induction_variables)
+
+    if not reduced:
+        return False
+
+    _insert_preheader(unit, cfg, loop, initialisers)
+    return True
+
+
+# basic induction variables are only assigned to once in the loop, by adding or subtracting a constant
+# returns a map from variable name to (the block of the assignment, the assignment, the step)
+def find_induction_variables(loop: Loop):
+    loop_definitions = count_definitions(loop.get_instructions())
+    induction_variables = {}
+    for block in loop.blocks:
+        for instruction in block.instructions:
+            defined = instruction.get_defined_variable()
+            if defined is None or loop_definitions[repr(defined)] != 1 or instruction.op not in ["+", "-"]:
+                continue
+
+            if _is_variable(instruction.arg1, defined) and is_number_literal(instruction.arg2):
+                step = int(instruction.arg2)
+            elif instruction.op == "+" and _is_variable(instruction.arg2, defined) and is_number_literal(instruction.arg1):
+                step = int(instruction.arg1)
+            else:
+                continue
+
+            induction_variables[repr(defined)] = (block, instruction, -step if instruction.op == "-" else step)
+
+    return induction_variables
+
+
+# returns (induction variable, constant multiplier) if instruction is their product, otherwise None
+def _get_induction_multiplication(instruction: TacInstruction, induction_variables):
+    if instruction.op != "*" or instruction.get_defined_variable() is None:
+        return None
+
+    for variable, constant in [(instruction.arg1, instruction.arg2), (instruction.arg2, instruction.arg1)]:
+        if isinstance(variable, TacVariable) and repr(variable) in induction_variables and is_number_literal(constant):
+            return variable, int(constant)
+
+    return None
+
+
+def _update_after_increment(induction_variable, product: TacVariable, multiplier: int):
+    block, increment, step = induction_variable
+    delta = step * multiplier
+    block.instructions.insert(block.instructions.index(increment) + 1, TacInstruction(
+        result_var=product,
+        op="+" if delta >= 0 else "-",
+        arg1=product,
+        arg2=str(abs(delta))
+    ))
+
+
+# if the product is a temporary which is only read later in the same block, without the induction variable being
+# incremented in between, then its readers can just read the reduced variable instead
+# otherwise copy the reduced variable into it
+def _replace_multiplication(cfg: ControlFlowGraph, block: BasicBlock, multiplication: TacInstruction,
+                            reduced: TacVariable, induction_variables):
+    product = multiplication.get_defined_variable()
+    increments = [i for _, i, _ in induction_variables.values()]
+
+    if not product.is_named:
+        position = block.instructions.index(multiplication)
+        readers = [i for b in cfg.blocks for i in b.instructions
+                   if any(repr(v) == repr(product) for v in i.get_used_variables())]
+        later = block.instructions[position + 1:]
+        if readers and all(r in later for r in readers):
+            last_read = max(later.index(r) for r in readers)
+            if not any(i in increments for i in later[:last_read + 1]):
+                for reader in readers:
+                    reader.replace_used_variable(repr(product), reduced)
+                block.instructions.remove(multiplication)
+                return
+
+    block.instructions[block.instructions.index(multiplication)] = TacInstruction(
+        result_var=product,
+        op="copy",
+        arg1=reduced
+    )
+
+
+def _is_variable(operand, variable: TacVariable):
+    return isinstance(operand, TacVariable) and repr(operand) == repr(variable)
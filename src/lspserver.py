@@ -0,0 +1,184 @@
+"""Language server: keeps each open Oreo file analysed as it is edited, and publishes its errors as diagnostics
+
+Usage: python3 lspserver.py [--grammar <GRAMMAR FILENAME>]
+
+Speaks the Language Server Protocol over stdin and stdout: JSON-RPC messages, each preceded by a Content-Length
+header. Documents are synchronised incrementally, so an editor sends only the text which changed, and after each
+change the server publishes the document's diagnostics. Only the lines an edit touched are lexed again, and only the
+statements containing it are parsed again, so diagnostics keep up with typing even in large files.
+
+Character positions are counted in code points, which are the same as the UTF-16 code units the protocol asks for
+unless the source has characters outside the Basic Multilingual Plane
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional
+
+from document import Document
+from grammarparse import parse_grammar_from_file
+from oreoc import OREO_GRAMMAR
+from parseerror import ParseError
+
+# JSON-RPC error codes
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR = -32603
+
+# LSP constants
+TEXT_DOCUMENT_SYNC_INCREMENTAL = 2
+SEVERITY_ERROR = 1
+MESSAGE_TYPE_ERROR = 1
+
+
+class LanguageServer:
+    def __init__(self, grammar_file=OREO_GRAMMAR):
+        self.expansions = parse_grammar_from_file(grammar_file)
+        self.documents: Dict[str, Document] = {}
+        self.is_shut_down = False
+        self.exit_code: Optional[int] = None  # set once the client asks the server to exit
+        self._handlers = {"initialize": self._initialize, "initialized": self._initialized,
+                          "shutdown": self._shutdown, "exit": self._exit, "textDocument/didOpen": self._did_open,
+                          "textDocument/didChange": self._did_change, "textDocument/didClose": self._did_close}
+
+    # read messages from the input and write responses and notifications to the output, until told to exit or the
+    # input ends
+    def serve(self, input_stream, output_stream) -> int:
+        while self.exit_code is None:
+            message = read_message(input_stream)
+            if message is None:
+                return 1  # the client went away without asking the server to exit
+            for outgoing in self.handle_message(message):
+                write_message(output_stream, outgoing)
+        return self.exit_code
+
+    # handle one message from the client, returning the messages to send back
+    def handle_message(self, message: dict) -> List[dict]:
+        method = message.get("method")
+        params = message.get("params") or {}
+        is_request = "id" in message
+        handler = self._handlers.get(method)
+        if handler is None:
+            if is_request:
+                return [_error_response(message["id"], METHOD_NOT_FOUND, f"Unknown method {method}")]
+            return []  # notifications the server does not handle are ignored
+
+        try:
+            result, outgoing = handler(params)
+        except Exception as e:
+            # a bug in the server should not end the session, or lose the editor's other documents
+            if is_request:
+                return [_error_response(message["id"], INTERNAL_ERROR, f"{type(e).__name__}: {e}")]
+            return [_notification("window/logMessage", {"type": MESSAGE_TYPE_ERROR,
+                                                        "message": f"{method} failed: {type(e).__name__}: {e}"})]
+
+        if is_request:
+            outgoing.insert(0, {"jsonrpc": "2.0", "id": message["id"], "result": result})
+        return outgoing
+
+    def _initialize(self, params):
+        capabilities = {"textDocumentSync": {"openClose": True, "change": TEXT_DOCUMENT_SYNC_INCREMENTAL}}
+        return {"capabilities": capabilities, "serverInfo": {"name": "oreo"}}, []
+
+    def _initialized(self, params):
+        return None, []
+
+    def _shutdown(self, params):
+        self.is_shut_down = True
+        return None, []
+
+    def _exit(self, params):
+        self.exit_code = 0 if self.is_shut_down else 1
+        return None, []
+
+    def _did_open(self, params):
+        item = params["textDocument"]
+        document = Document(item["text"], self.expansions)
+        self.documents[item["uri"]] = document
+        return None, [_publish_diagnostics(item["uri"], item.get("version"), document)]
+
+    def _did_change(self, params):
+        identifier = params["textDocument"]
+        document = self.documents[identifier["uri"]]
+        # the changes are made one after the other, each to the text the last one left
+        for change in params["contentChanges"]:
+            if "range" in change:
+                start, end = change["range"]["start"], change["range"]["end"]
+                document.edit((start["line"], start["character"]), (end["line"], end["character"]), change["text"])
+            else:
+                document.replace(change["text"])
+        document.update()
+        return None, [_publish_diagnostics(identifier["uri"], identifier.get("version"), document)]
+
+    def _did_close(self, params):
+        uri = params["textDocument"]["uri"]
+        self.documents.pop(uri, None)
+        return None, [_notification("textDocument/publishDiagnostics", {"uri": uri, "diagnostics": []})]
+
+
+# the next message in the stream, or None if the stream has ended
+def read_message(stream) -> Optional[dict]:
+    headers = {}
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.decode("ascii").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    body = stream.read(int(headers["content-length"]))
+    return json.loads(body.decode("utf-8"))
+
+
+def write_message(stream, message: dict):
+    body = json.dumps(message).encode("utf-8")
+    stream.write(f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body)
+    stream.flush()
+
+
+def _publish_diagnostics(uri: str, version, document: Document) -> dict:
+    params = {"uri": uri, "diagnostics": [get_diagnostic(error, document.lines) for error in document.diagnostics]}
+    if version is not None:
+        params["version"] = version
+    return _notification("textDocument/publishDiagnostics", params)
+
+
+def get_diagnostic(error: ParseError, lines: List[str]) -> dict:
+    start, end = get_range(error, lines)
+    return {"range": {"start": start, "end": end}, "severity": SEVERITY_ERROR, "source": "oreo",
+            "message": error.description}
+
+
+# the range of text an error is about, from its position to the end of the word there
+def get_range(error: ParseError, lines: List[str]):
+    line = min(max(error.line_num - 1, 0), len(lines) - 1)
+    # token columns count from 0 on the first line and from 1 on the others, and the lexer's columns are one more
+    character = error.col_num - (0 if error.line_num <= 1 else 1) - (1 if error.is_lex_error else 0)
+    character = min(max(character, 0), len(lines[line]))
+
+    text = lines[line]
+    end = character
+    while end < len(text) and not text[end].isspace():
+        end += 1
+    end = max(end, character + 1)
+    return {"line": line, "character": character}, {"line": line, "character": end}
+
+
+def _notification(method: str, params: dict) -> dict:
+    return {"jsonrpc": "2.0", "method": method, "params": params}
+
+
+def _error_response(request_id, code: int, message: str) -> dict:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the Language Server Protocol over stdin and stdout")
+    parser.add_argument("--grammar", "-g", default=OREO_GRAMMAR, help="File containing a valid grammar")
+    args = parser.parse_args()
+
+    server = LanguageServer(args.grammar)
+    sys.exit(server.serve(sys.stdin.buffer, sys.stdout.buffer))
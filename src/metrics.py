@@ -0,0 +1,77 @@
+import json
+from contextlib import contextmanager
+from typing import Dict
+
+# counts of operations in the compiler which are suspected of being hot
+# counting is off unless turned on with enable() or collecting(). Each place which counts checks the enabled flag
+# first, so the only cost when it is off is looking the flag up:
+#     if metrics.enabled:
+#         metrics.increment("parse_steps")
+
+# name -> (Prometheus metric type, description)
+METRICS = {
+    "find_expansion_calls": ("counter", "Calls to find_expansion, including recursive ones"),
+    "find_expansion_max_depth": ("gauge", "Deepest recursion of find_expansion"),
+    "parse_steps": ("counter", "Grammar symbols the parser has matched, expanded or left out"),
+    "get_child_calls": ("counter", "Calls to ParseTreeNode.get_child"),
+    "get_child_scans": ("counter", "Children looked at by ParseTreeNode.get_child"),
+    "get_type_at_node_calls": ("counter", "Calls to ScopeEntry.get_type_at_node"),
+    "get_type_at_node_iterations": ("counter", "Assignments looked at by ScopeEntry.get_type_at_node"),
+    "tac_instructions_emitted": ("counter", "TAC instructions generated from the parse tree"),
+}
+PROMETHEUS_PREFIX = "oreo_"
+
+enabled = False
+counts: Dict[str, int] = {name: 0 for name in METRICS}
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    for name in counts:
+        counts[name] = 0
+
+
+def increment(name: str, amount=1):
+    counts[name] += amount
+
+
+# for gauges which record the largest value seen
+def record_max(name: str, value):
+    if value > counts[name]:
+        counts[name] = value
+
+
+# count from zero within the with block, turning counting back off afterwards if it was off before
+@contextmanager
+def collecting():
+    was_enabled = enabled
+    reset()
+    enable()
+    try:
+        yield counts
+    finally:
+        if not was_enabled:
+            disable()
+
+
+def to_json() -> str:
+    return json.dumps(counts, indent=1, sort_keys=True)
+
+
+# the Prometheus text exposition format, with counters named with a _total suffix as the format recommends
+def to_prometheus() -> str:
+    lines = []
+    for name, (metric_type, description) in METRICS.items():
+        full_name = PROMETHEUS_PREFIX + name + ("_total" if metric_type == "counter" else "")
+        lines += [f"# HELP {full_name} {description}", f"# TYPE {full_name} {metric_type}",
+                  f"{full_name} {counts[name]}"]
+    return "\n".join(lines) + "\n"
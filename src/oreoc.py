@@ -0,0 +1,417 @@
+"""Compiler driver: runs the whole pipeline, from Oreo source to a running program or a program in another language
+
+Usage: python3 oreoc.py <FILENAME> [-O LEVEL] [--stop-after PHASE] [--emit FORMAT] [-o OUTPUT]
+                        [--time-passes] [--mem-report] [--metrics FORMAT] [--metrics-output FILE]
+                        [--profile-generate FILE] [--profile-use FILE] [--cache] [--cache-dir DIR] [--cache-stats]
+                        [--tree-format FORMAT] [--tree-max-depth N] [--tree-max-children N] [--max-errors N]
+                        [--link OBJECT ...]
+
+Errors in the source are reported all at once: each phase carries on past the errors it finds, up to the most errors
+allowed
+
+A module, a file of procedure definitions, is compiled to an object with --emit object. A program, or another module,
+which calls its procedures is compiled against the object with --link, which for a program links the object's
+procedures into it
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import asmbackend
+import cbackend
+import metrics
+from compilecache import CompilationCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_SIZE, STAGES, get_key
+from grammarparse import parse_grammar_from_file
+from incremental import compile_incrementally
+from lexer import lex
+from linker import LinkError, compile_module, get_context_key, get_module_name, get_object_file, get_signatures, \
+    import_objects, link, load_object, save_object
+from parseerror import DEFAULT_MAX_ERRORS, ErrorLog, ParseError, ParseErrors
+from passes import OPTIMISATION_LEVELS, format_table, optimise
+from pgo import collect_profile, load_profile
+from pybackend import generate_python
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import syntax_analyse
+from tac import compile_to_tac
+from treeexport import TREE_FORMATS, write_tree
+from typechecker import type_check
+from vm import OreoRuntimeError, run_tac
+
+OREO_GRAMMAR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "oreo.grammar")
+
+# phases after which compilation can stop, printing what it has got so far
+STOP_POINTS = ["lex", "parse", "semantic", "typecheck", "tac", "optimise"]
+# what to do with the optimised TAC: run it on the virtual machine, or translate it
+# or, for a module, compile it to an object
+EMIT_FORMATS = ["run", "tac", "python", "c", "asm", "exe", "object"]
+
+
+class PhaseReport:
+    def __init__(self, name: str):
+        self.name = name
+        self.wall_time = 0.0  # seconds
+        self.cpu_time = 0.0
+        self.peak_memory = None  # bytes allocated at the phase's peak, beyond what was already allocated before it
+
+
+# runs the phases of compilation, recording how long each one takes, and with trace_memory, how much memory
+# (tracemalloc slows everything down, so is only turned on when asked for)
+class CompilerDriver:
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.reports = []
+
+    @contextmanager
+    def phase(self, name: str):
+        report = PhaseReport(name)
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            memory_before, _ = tracemalloc.get_traced_memory()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+
+        try:
+            yield report
+        finally:
+            report.wall_time = time.perf_counter() - wall_start
+            report.cpu_time = time.process_time() - cpu_start
+            if self.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                report.peak_memory = peak - memory_before
+            self.reports.append(report)
+
+    def stop_tracing(self):
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def format_times(self) -> str:
+        rows = [("phase", "wall ms", "cpu ms")]
+        rows += [(r.name, f"{r.wall_time * 1000:.3f}", f"{r.cpu_time * 1000:.3f}") for r in self.reports]
+        rows.append(("total", f"{sum(r.wall_time for r in self.reports) * 1000:.3f}",
+                     f"{sum(r.cpu_time for r in self.reports) * 1000:.3f}"))
+        return format_table(rows)
+
+    def format_memory(self) -> str:
+        rows = [("phase", "peak KiB")]
+        rows += [(r.name, f"{r.peak_memory / 1024:.1f}") for r in self.reports if r.peak_memory is not None]
+        return format_table(rows)
+
+
+# what each format of output is generated from the optimised TAC by
+GENERATORS = {"tac": repr, "python": generate_python, "c": cbackend.generate_c, "asm": asmbackend.generate_assembly}
+
+
+# parse, analyse and type check the tokens, timing each phase, and stopping after stop_after if it is parse or
+# semantic
+# each phase carries on past the errors it finds, which are raised together once they have all run
+def analyse_tokens(tokens, expansions, driver: CompilerDriver, errors: ErrorLog, stop_after=None):
+    with driver.phase("parse"):
+        parse_tree = syntax_analyse(tokens, expansions, errors)
+    if stop_after != "parse":
+        with driver.phase("semantic"):
+            semantic_analyse(parse_tree, errors)
+    if stop_after not in ["parse", "semantic"]:
+        with driver.phase("typecheck"):
+            type_check(parse_tree, errors)
+    errors.check()
+    return parse_tree
+
+
+# compile the source as far as stop_after, or by default to optimised TAC, timing each phase
+# returns what the last phase made: the tokens, the parse tree or the TAC program
+def compile_source(source: str, expansions, driver: CompilerDriver, errors: ErrorLog, stop_after=None,
+                   optimisation_level=0):
+    with driver.phase("lex"):
+        tokens = lex(source, errors)
+    if stop_after == "lex":
+        errors.check()
+        return tokens
+    parse_tree = analyse_tokens(tokens, expansions, driver, errors, stop_after)
+    if stop_after in ["parse", "semantic", "typecheck"]:
+        return parse_tree
+    with driver.phase("tac"):
+        program = compile_to_tac(parse_tree)
+    if stop_after != "tac":
+        with driver.phase("optimise"):
+            optimise(program, optimisation_level)
+    return program
+
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(description="Compile an Oreo program, and run it or translate it")
+    parser.add_argument("file", help="File path to compile")
+    parser.add_argument("--grammar", "-g", default=OREO_GRAMMAR, help="File containing a valid grammar")
+    parser.add_argument("-O", dest="optimisation_level", type=int, default=0, choices=OPTIMISATION_LEVELS,
+                        help="Optimisation level")
+    parser.add_argument("--stop-after", choices=STOP_POINTS, help="Print the result of this phase and stop")
+    parser.add_argument("--emit", choices=EMIT_FORMATS, default="run", help="What to do with the compiled program")
+    parser.add_argument("--output", "-o",
+                        help="File to write to, instead of standard output (default a.out for exe, and the module's "
+                             "name with .oo for object)")
+    parser.add_argument("--native-backend", choices=["c", "asm"], default="c",
+                        help="Backend used to build executables")
+    parser.add_argument("--time-passes", action="store_true",
+                        help="Report the wall and CPU time of each phase and optimisation pass")
+    parser.add_argument("--mem-report", action="store_true", help="Report the peak memory use of each phase")
+    parser.add_argument("--metrics", choices=["json", "prometheus"],
+                        help="Count hot operations in the compiler, and report the counts in this format")
+    parser.add_argument("--metrics-output", metavar="FILE", help="File to write the metrics to, instead of stderr")
+    parser.add_argument("--profile-generate", metavar="FILE", help="Run with profiling, saving the profile to FILE")
+    parser.add_argument("--profile-use", metavar="FILE", help="Optimise using the profile saved in FILE")
+    parser.add_argument("--cache", action="store_true",
+                        help="Reuse the results of compiling the same source with the same options before")
+    parser.add_argument("--cache-dir", default=os.environ.get("OREO_CACHE_DIR", DEFAULT_CACHE_DIR),
+                        help="Directory to keep the cache in (default $OREO_CACHE_DIR, or ~/.cache/oreo)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_SIZE // (1024 * 1024),
+                        help="Maximum size of the cache in MiB")
+    parser.add_argument("--cache-stats", action="store_true", help="Report cache hits and misses")
+    parser.add_argument("--tree-format", choices=TREE_FORMATS, default="box",
+                        help="How to print the parse tree when stopping after parse, semantic or typecheck")
+    parser.add_argument("--tree-max-depth", type=int, metavar="N", help="Deepest level of the tree to draw as boxes")
+    parser.add_argument("--tree-max-children", type=int, metavar="N",
+                        help="Most children of each node in the tree to draw as boxes")
+    parser.add_argument("--max-errors", type=int, default=DEFAULT_MAX_ERRORS, metavar="N",
+                        help="Stop after reporting this many errors, or 0 for no limit")
+    parser.add_argument("--link", nargs="+", default=[], metavar="OBJECT",
+                        help="Objects of modules to compile against, and for a program to link into it")
+    return parser
+
+
+# returns the exit status
+def main(argv=None, stdin=None, stdout=None, stderr=None):
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    parser = get_argument_parser()
+    args = parser.parse_args(argv)
+    if args.emit == "object" and args.stop_after is not None:
+        parser.error("--stop-after cannot be used with --emit object")
+
+    driver = CompilerDriver(trace_memory=args.mem_report)
+    cache = CompilationCache(args.cache_dir, args.cache_size * 1024 * 1024) if args.cache else None
+    pass_statistics = None
+    status = 0
+    if args.metrics:
+        metrics.reset()
+        metrics.enable()
+    try:
+        pass_statistics = _compile(args, driver, stdin, stdout, cache)
+    except (ParseError, ParseErrors) as e:
+        stderr.write(e.message + "\n")
+        status = 1
+    except (OreoRuntimeError, cbackend.CCompilerError, LinkError, OSError) as e:
+        stderr.write(f"{getattr(e, 'message', e)}\n")
+        status = 1
+    finally:
+        driver.stop_tracing()
+        metrics.disable()
+
+    if args.time_passes:
+        stderr.write(driver.format_times() + "\n")
+        if pass_statistics is not None and pass_statistics.statistics:
+            stderr.write(pass_statistics.format_statistics() + "\n")
+    if args.mem_report:
+        stderr.write(driver.format_memory() + "\n")
+    if args.cache_stats and cache is not None:
+        stderr.write(_format_cache_statistics(cache) + "\n")
+    if args.metrics:
+        report = metrics.to_json() + "\n" if args.metrics == "json" else metrics.to_prometheus()
+        if args.metrics_output:
+            with open(args.metrics_output, "w") as file:
+                file.write(report)
+        else:
+            stderr.write(report)
+
+    return status
+
+
+# returns the pass manager which optimised the program, if compilation got that far
+def _compile(args, driver: CompilerDriver, stdin, stdout, cache: CompilationCache = None):
+    with open(args.file) as file:
+        source = file.read()
+    objects = [load_object(filename) for filename in args.link]
+    errors = ErrorLog(args.max_errors)
+    if args.emit == "object":
+        return _compile_module(args, driver, source, objects, errors)
+    keys = _get_cache_keys(args, source, objects) if cache is not None else {}
+
+    def cached(stage, compute):
+        if cache is None:
+            return compute()
+        with driver.phase("cache"):
+            value = cache.get(keys[stage], stage)
+        if value is None:
+            value = compute()
+            # what is left after recovering from errors is not kept, so that the errors are found again next time
+            if errors.errors:
+                return value
+            with driver.phase("cache"):
+                cache.put(keys[stage], stage, value)
+        return value
+
+    # an unchanged file takes no more than hashing it and reading back the output
+    if cache is not None and args.stop_after is None and args.emit in ["python", "c", "asm"]:
+        with driver.phase("cache"):
+            output = cache.get(keys["output"], "output")
+        if output is not None:
+            return _write_output(args, stdout, output)
+
+    program = None
+    if cache is not None and args.stop_after in [None, "optimise"]:
+        with driver.phase("cache"):
+            cached_tac = cache.get(keys["tac"], "tac")
+        if cached_tac is not None:
+            program = cached_tac
+
+    manager = None
+    if program is None:
+        def lex_source():
+            with driver.phase("lex"):
+                return lex(source, errors)
+
+        tokens = cached("tokens", lex_source)
+        if args.stop_after == "lex":
+            errors.check()
+            return _write_output(args, stdout, "\n".join(map(str, tokens)))
+        if objects:
+            tokens = import_objects(tokens, objects)
+
+        def analyse(stop_after=None):
+            with driver.phase("grammar"):
+                expansions = parse_grammar_from_file(args.grammar)
+            # the parser consumes the tokens it is given
+            return analyse_tokens(list(tokens), expansions, driver, errors, stop_after)
+
+        if args.stop_after in ["parse", "semantic"]:
+            parse_tree = analyse(args.stop_after)
+            return _write_tree(args, stdout, parse_tree, print_scope=args.stop_after == "semantic")
+
+        if cache is not None and args.stop_after != "typecheck":
+            # only the main program and the procedures which have changed are compiled from scratch, which stops at the
+            # first error in them, so then the whole program is analysed again, to report every error in it
+            errors.check()
+            with driver.phase("grammar"):
+                expansions = parse_grammar_from_file(args.grammar)
+            try:
+                with driver.phase("incremental"):
+                    program, recompiled = compile_incrementally(tokens, expansions, cache, keys["procedure"])
+            except (ParseError, ParseErrors):
+                analyse()
+                raise
+            cache.statistics.recompiled_procedures = recompiled
+        else:
+            parse_tree = cached("tree", analyse)
+            if args.stop_after == "typecheck":
+                return _write_tree(args, stdout, parse_tree, print_type=True)
+
+            with driver.phase("tac"):
+                program = compile_to_tac(parse_tree)
+        if objects:
+            with driver.phase("link"):
+                link(program, objects)
+        if args.stop_after == "tac":
+            return _write_output(args, stdout, repr(program))
+
+        with driver.phase("optimise"):
+            profile = load_profile(args.profile_use, program) if args.profile_use else None
+            manager = optimise(program, args.optimisation_level, profile)
+        if cache is not None:
+            with driver.phase("cache"):
+                cache.put(keys["tac"], "tac", program)
+
+    if args.stop_after == "optimise" or args.emit == "tac":
+        _write_output(args, stdout, repr(program))
+        return manager
+
+    if args.emit == "run":
+        with driver.phase("run"):
+            vm = run_tac(program, stdin, stdout, profiling=args.profile_generate is not None)
+        if args.profile_generate:
+            collect_profile(vm).save(args.profile_generate)
+    elif args.emit == "exe":
+        backend = cbackend if args.native_backend == "c" else asmbackend
+        with driver.phase("backend"):
+            if backend is cbackend:
+                cbackend.build_executable(program, args.output or "a.out", optimise=args.optimisation_level > 0)
+            else:
+                asmbackend.build_executable(program, args.output or "a.out")
+    else:
+        with driver.phase("backend"):
+            output = GENERATORS[args.emit](program)
+        if cache is not None:
+            with driver.phase("cache"):
+                cache.put(keys["output"], "output", output)
+        _write_output(args, stdout, output)
+
+    return manager
+
+
+# compile a module to an object, written to the output file
+def _compile_module(args, driver: CompilerDriver, source: str, objects, errors: ErrorLog):
+    context_key = get_context_key(args.grammar)
+    with driver.phase("grammar"):
+        expansions = parse_grammar_from_file(args.grammar)
+    with driver.phase("module"):
+        module = compile_module(source, expansions, get_module_name(args.file), context_key, get_signatures(objects),
+                                errors)
+    save_object(module, args.output or get_object_file(args.file))
+
+
+# the key for each stage of compiling the source with the given arguments, and linking it with the objects
+def _get_cache_keys(args, source: str, objects):
+    with open(args.grammar, "rb") as file:
+        grammar = file.read()
+    profile = b""
+    if args.profile_use:
+        with open(args.profile_use, "rb") as file:
+            profile = file.read()
+
+    options = f"-O{args.optimisation_level}"
+    linked = " ".join(module.key for module in objects)
+    return {
+        "tokens": get_key("tokens", source),
+        "tree": get_key("tree", source, grammar, linked),
+        "procedure": get_key("procedure", grammar),
+        "tac": get_key("tac", source, grammar, options, profile, linked),
+        "output": get_key("output", source, grammar, options, profile, args.emit, linked),
+    }
+
+
+def _format_cache_statistics(cache: CompilationCache) -> str:
+    statistics = cache.statistics
+    rows = [("stage", "hits", "misses")]
+    rows += [(stage, str(statistics.hits[stage]), str(statistics.misses[stage])) for stage in STAGES]
+    report = format_table(rows) + f"\n{statistics.writes} writes, {statistics.evictions} evictions"
+    if statistics.recompiled_procedures is not None:
+        report += f"\nrecompiled procedures: {' '.join(statistics.recompiled_procedures) or 'none'}"
+    return report
+
+
+def _write_output(args, stdout, text: str):
+    if not text.endswith("\n"):
+        text += "\n"
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text)
+    else:
+        stdout.write(text)
+
+
+def _write_tree(args, stdout, tree, print_scope=False, print_type=False):
+    def write(stream):
+        write_tree(tree, stream, args.tree_format, print_scope, print_type, args.tree_max_depth, args.tree_max_children)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            write(file)
+    else:
+        write(stdout)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
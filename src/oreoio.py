@@ -0,0 +1,43 @@
+import sys
+
+# output is written to the underlying stream once this many characters have been printed
+OUTPUT_BUFFER_SIZE = 1 << 16
+
+
+# the input and output of a running Oreo program, shared by the virtual machine and the python backend
+# the C runtime in runtime/oreo_runtime.c behaves the same way:
+# - printed values are collected in a buffer, which is written out when it fills up, before a line is read (so
+#   that prompts appear first) and when the program ends
+# - numbers and booleans print as decimal integers, so booleans print as 1 or 0
+# - numbers are signed 64 bit integers, and arithmetic on them wraps round when it overflows
+# - reading a line drops its trailing newline, and gives an empty string at the end of the input
+class OreoIO:
+    def __init__(self, stdin=None, stdout=None, buffer_size=OUTPUT_BUFFER_SIZE):
+        self.stdin = stdin if stdin is not None else sys.stdin
+        self.stdout = stdout if stdout is not None else sys.stdout
+        self.buffer_size = buffer_size
+
+        self._output = []
+        self._output_size = 0
+
+    def write(self, text: str):
+        self._output.append(text)
+        self._output_size += len(text)
+        if self._output_size >= self.buffer_size:
+            self.flush()
+
+    def write_line(self, text: str):
+        self.write(text + "\n")
+
+    def read_line(self) -> str:
+        self.flush()
+        line = self.stdin.readline()
+        return line[:-1] if line.endswith("\n") else line
+
+    def flush(self):
+        if self._output:
+            self.stdout.write("".join(self._output))
+            self._output = []
+            self._output_size = 0
+        if hasattr(self.stdout, "flush"):
+            self.stdout.flush()
@@ -1,10 +1,18 @@
+from typing import List
+
 from colours import RED, BLUE, YELLOW, RESET_COLOUR
 
+# how many errors are reported before compilation stops
+DEFAULT_MAX_ERRORS = 20
+
 
 class ParseError(Exception):
     def __init__(self, message, line_num, col_num, context_line, is_lex_error=False):
         self.line_num = line_num
         self.col_num = col_num
+        self.description = message  # without the position, context or colours, eg for editors to show
+        self.is_lex_error = is_lex_error
+        self.context_line = context_line
 
         context_line = self.highlight_error_token(col_num, context_line)
 
@@ -31,3 +39,37 @@ class ParseError(Exception):
         num_non_tabs = max(col_num - num_tabs - 1, 0)
         formatted_message += ("\t" * num_tabs) + (" " * num_non_tabs) + f"{BLUE}↑{RESET_COLOUR}"
         return formatted_message
+
+
+# every error found in a program by phases which carry on past each one, in the order they appear in the source
+class ParseErrors(Exception):
+    def __init__(self, errors: List[ParseError], is_truncated=False):
+        self.errors = sorted(errors, key=lambda e: (e.line_num, e.col_num))
+        self.is_truncated = is_truncated  # whether compilation stopped at the most errors allowed
+
+        formatted_message = "\n".join(e.message for e in self.errors)
+        if is_truncated:
+            formatted_message += f"\n{RED}Too many errors, stopped after {len(self.errors)}{RESET_COLOUR}"
+        self.message = formatted_message
+        super().__init__(formatted_message)
+
+
+# collects the errors found by the phases, so that each can recover from an error and go on to find the next
+# max_errors is how many to collect before stopping, or None or 0 for no limit
+class ErrorLog:
+    def __init__(self, max_errors=DEFAULT_MAX_ERRORS):
+        self.errors: List[ParseError] = []
+        self.max_errors = max_errors
+
+    # is_fatal is whether the phase cannot carry on after the error, in which case every error so far is raised
+    def add(self, error: ParseError, is_fatal=False):
+        self.errors.append(error)
+        if self.max_errors and len(self.errors) >= self.max_errors:
+            raise ParseErrors(self.errors, is_truncated=True)
+        if is_fatal:
+            raise ParseErrors(self.errors)
+
+    # raise every error found so far, if there are any
+    def check(self):
+        if self.errors:
+            raise ParseErrors(self.errors)
@@ -1,14 +1,17 @@
 """Entry point for commmand line interaction
 
-Usage: python3 parser.py <FILENAME> [--grammar <GRAMMAR FILENAME>]
+Usage: python3 parser.py <FILENAME> [--grammar <GRAMMAR FILENAME>] [--format FORMAT] [--max-depth N]
+                         [--max-children N]
 """
 
 import argparse
 import os
+import sys
 
 from grammarparse import parse_grammar_from_file
 from parseerror import ParseError
 from syntaxanalyser import parse_file
+from treeexport import TREE_FORMATS, write_tree
 
 if __name__ == "__main__":
     oreo_grammar = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "oreo.grammar")
@@ -16,10 +19,14 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Parse the given file and print the parse tree")
     parser.add_argument("file", help="File path to parse")
     parser.add_argument("--grammar", '-g', default=oreo_grammar, help="File containing a valid grammar")
+    parser.add_argument("--format", choices=TREE_FORMATS, default="box", help="How to print the parse tree")
+    parser.add_argument("--max-depth", type=int, help="Deepest level of the tree to draw as boxes")
+    parser.add_argument("--max-children", type=int, help="Most children of each node to draw as boxes")
     args = parser.parse_args()
 
     parsed_expansions = parse_grammar_from_file(args.grammar)
     try:
-        print(parse_file(args.file, parsed_expansions).get_pretty_print_string())
+        parse_tree = parse_file(args.file, parsed_expansions)
+        write_tree(parse_tree, sys.stdout, args.format, max_depth=args.max_depth, max_children=args.max_children)
     except ParseError as e:
         print(e.message)
@@ -0,0 +1,136 @@
+import time
+from typing import Callable, List, Sequence
+
+from analysis import AnalysisCache
+from deadcode import remove_dead_code
+from inline import inline_procedures
+from loopopt import hoist_loop_invariants, reduce_strength
+from pgo import layout_blocks
+from regalloc import allocate_temporaries
+from tac import TacInstruction, TacProgram
+from unroll import unroll_loops
+
+OPTIMISATION_LEVELS = [0, 1, 2]
+# a fixpoint pass is not run again after this many runs, even if it is still changing the program
+MAX_FIXPOINT_ITERATIONS = 10
+
+
+# an optimisation over a whole TAC program
+# run(program, analyses) returns true iff it changed the program, and can get analyses from the AnalysisCache
+# - requires: the analyses it uses, which are worked out for every code unit before it runs
+# - preserves: the analyses which are still valid after it has changed the program
+# - fixpoint: run it again and again until it stops changing the program
+class Pass:
+    def __init__(self, name: str, run: Callable[[TacProgram, AnalysisCache], bool], requires: Sequence[str] = (),
+                 preserves: Sequence[str] = (), fixpoint=False):
+        self.name = name
+        self.run = run
+        self.requires = requires
+        self.preserves = preserves
+        self.fixpoint = fixpoint
+
+    def __repr__(self):
+        return self.name
+
+
+class PassStatistics:
+    def __init__(self, name: str, instructions_before: int):
+        self.name = name
+        self.wall_time = 0.0  # seconds
+        self.cpu_time = 0.0
+        self.instructions_before = instructions_before
+        self.instructions_after = instructions_before
+        self.iterations = 0
+        self.changed = False
+
+
+# runs a pipeline of passes over programs, recording statistics for each pass it runs
+class PassManager:
+    def __init__(self, passes: List[Pass]):
+        self.passes = passes
+        self.statistics: List[PassStatistics] = []
+        self.analyses = None  # the cache used by the last run
+
+    # returns true iff any pass changed the program
+    def run(self, program: TacProgram):
+        self.analyses = AnalysisCache(program)
+        changed = False
+        for optimisation in self.passes:
+            statistics = PassStatistics(optimisation.name, count_instructions(program))
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+
+            max_iterations = MAX_FIXPOINT_ITERATIONS if optimisation.fixpoint else 1
+            while statistics.iterations < max_iterations:
+                for unit in program.get_code_units():
+                    for name in optimisation.requires:
+                        self.analyses.get(name, unit)
+
+                statistics.iterations += 1
+                if not optimisation.run(program, self.analyses):
+                    break
+                statistics.changed = changed = True
+                self.analyses.invalidate(optimisation.preserves)
+
+            statistics.wall_time = time.perf_counter() - wall_start
+            statistics.cpu_time = time.process_time() - cpu_start
+            statistics.instructions_after = count_instructions(program)
+            self.statistics.append(statistics)
+
+        return changed
+
+    # a table of the statistics, one row per pass run
+    def format_statistics(self) -> str:
+        rows = [("pass", "wall ms", "cpu ms", "before", "after", "iterations")]
+        rows += [(s.name, f"{s.wall_time * 1000:.3f}", f"{s.cpu_time * 1000:.3f}", str(s.instructions_before),
+                  str(s.instructions_after), str(s.iterations)) for s in self.statistics]
+        return format_table(rows)
+
+
+# the passes run at each optimisation level
+# 0 does nothing, 1 does cheap optimisations which never make the program bigger (apart from inlining tiny
+# procedures), and 2 does everything
+# with a profile, inlining and unrolling go by what actually ran, and blocks are laid out for the hot path
+# both end by allocating the temporaries of each code unit, which has to come after everything that changes the code
+def get_pipeline(optimisation_level: int, profile=None) -> List[Pass]:
+    if optimisation_level not in OPTIMISATION_LEVELS:
+        raise ValueError(f"Unknown optimisation level {optimisation_level}")
+    if optimisation_level == 0:
+        return []
+
+    dead_code = Pass("dead-code", remove_dead_code, requires=["cfg", "liveness"], preserves=["cfg"], fixpoint=True)
+    inline = Pass("inline", lambda p, a: inline_procedures(p, optimisation_level, profile, a),
+                  requires=["cfg", "loops"])
+    hoist = Pass("hoist-invariants", hoist_loop_invariants,
+                 requires=["cfg", "loops", "dominators", "liveness", "definitions"])
+    # only the frame sizes change, so every analysis is still valid
+    allocate = Pass("allocate-temporaries", lambda p, _: allocate_temporaries(p),
+                    preserves=["cfg", "liveness", "loops", "allocation"])
+    if optimisation_level == 1:
+        return [inline, hoist, dead_code, allocate]
+
+    pipeline = [inline, hoist,
+                Pass("reduce-strength", reduce_strength, requires=["cfg", "loops"]),
+                Pass("unroll", lambda p, a: unroll_loops(p, profile=profile, analyses=a),
+                     requires=["cfg", "loops", "dominators", "uses"]),
+                dead_code]
+    if profile is not None:
+        pipeline.append(Pass("layout-blocks", lambda p, a: layout_blocks(p, profile, a), requires=["cfg"]))
+    return pipeline + [allocate]
+
+
+# optimise the program in place, returning the pass manager, which holds the statistics
+def optimise(program: TacProgram, optimisation_level=2, profile=None) -> PassManager:
+    manager = PassManager(get_pipeline(optimisation_level, profile))
+    manager.run(program)
+    return manager
+
+
+# rows of strings as aligned columns, with the first column on the left and the rest, which are numbers, on the right
+def format_table(rows) -> str:
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join("  ".join(cell.ljust(width) if i == 0 else cell.rjust(width)
+                               for i, (cell, width) in enumerate(zip(row, widths))).rstrip() for row in rows)
+
+
+def count_instructions(program: TacProgram):
+    return sum(isinstance(i, TacInstruction) for unit in program.get_code_units() for i in unit.program)
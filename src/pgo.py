@@ -0,0 +1,289 @@
+import json
+import re
+from typing import Dict, List, Tuple, Union
+
+from analysis import AnalysisCache
+from cfg import BasicBlock, ControlFlowGraph
+from tac import IF_FALSE_GOTO, Label, TacInstruction, TacProgram
+
+PROFILE_VERSION = 1
+
+
+# execution counts from running a program on the virtual machine, for guiding optimisations
+# counts are keyed by the source position of the statement they belong to, rather than by anything in the TAC, so
+# that a profile can be recorded from one compilation and used by another, with different optimisations or after
+# small edits to the source:
+# - blocks: how many times control reached each label, keyed like "while_start@12:5"
+# - branches: [times executed, times the condition was false] for each if and while, keyed like "branch@12:5"
+# - calls: how many times each call was made, keyed like "call add@13:22"
+class Profile:
+    def __init__(self):
+        self.blocks: Dict[str, int] = {}
+        self.branches: Dict[str, List[int]] = {}
+        self.calls: Dict[str, int] = {}
+
+    def get_block_count(self, label: Label) -> Union[int, None]:
+        return self.blocks.get(_label_key(label))
+
+    # (times executed, times the condition was false)
+    def get_branch_counts(self, instruction: TacInstruction) -> Union[Tuple[int, int], None]:
+        counts = self.branches.get(_branch_key(instruction))
+        return tuple(counts) if counts is not None else None
+
+    def get_call_count(self, instruction: TacInstruction) -> Union[int, None]:
+        return self.calls.get(_call_key(instruction))
+
+    # add the counts from another run of the same program
+    def merge(self, other: "Profile"):
+        for key, count in other.blocks.items():
+            self.blocks[key] = self.blocks.get(key, 0) + count
+        for key, (executed, false) in other.branches.items():
+            old_executed, old_false = self.branches.get(key, (0, 0))
+            self.branches[key] = [old_executed + executed, old_false + false]
+        for key, count in other.calls.items():
+            self.calls[key] = self.calls.get(key, 0) + count
+
+    def save(self, filename):
+        with open(filename, "w") as file:
+            json.dump({"version": PROFILE_VERSION, "blocks": self.blocks, "branches": self.branches,
+                       "calls": self.calls}, file, indent=1, sort_keys=True)
+
+
+# if program is given, the profile is matched up with it, as with match_profile
+def load_profile(filename, program: TacProgram = None) -> Profile:
+    with open(filename) as file:
+        data = json.load(file)
+    if data.get("version") != PROFILE_VERSION:
+        raise ValueError(f"{filename} is not a version {PROFILE_VERSION} profile")
+
+    profile = Profile()
+    profile.blocks = data["blocks"]
+    profile.branches = data["branches"]
+    profile.calls = data["calls"]
+    return match_profile(profile, program) if program is not None else profile
+
+
+# the profile of a virtual machine which was run with profiling on
+# copies of the same statement, made by inlining or unrolling, have their counts added together
+def collect_profile(vm) -> Profile:
+    assert vm.profiling
+    profile = Profile()
+
+    for label, index in vm.labels:
+        key = _label_key(label)
+        if key is not None and index < len(vm.code):
+            profile.blocks[key] = profile.blocks.get(key, 0) + vm.execution_counts[index]
+
+    for index, instruction in enumerate(vm.instructions):
+        if instruction.is_conditional_jump() and instruction.position is not None:
+            executed, false = profile.branches.get(_branch_key(instruction), (0, 0))
+            profile.branches[_branch_key(instruction)] = [executed + vm.execution_counts[index],
+                                                          false + vm.false_counts[index]]
+        elif instruction.op == "LCall" and instruction.position is not None:
+            key = _call_key(instruction)
+            profile.calls[key] = profile.calls.get(key, 0) + vm.execution_counts[index]
+
+    return profile
+
+
+# a copy of the profile keyed by the source positions in program
+# positions which the profile has no count for, eg because lines were added above them, are matched up in order
+# with the positions of the same kind of statement in the profile, as long as there are as many of each
+def match_profile(profile: Profile, program: TacProgram) -> Profile:
+    matched = Profile()
+    program_keys = _get_program_keys(program)
+
+    for table in ["blocks", "branches", "calls"]:
+        recorded = getattr(profile, table)
+        result = getattr(matched, table)
+
+        for kind, keys in _group_by_kind(program_keys[table]).items():
+            recorded_keys = _group_by_kind(recorded).get(kind, [])
+            if any(k not in recorded for k in keys) and len(keys) == len(recorded_keys):
+                for key, recorded_key in zip(keys, recorded_keys):
+                    result[key] = recorded[recorded_key]
+            else:
+                result.update((k, recorded[k]) for k in keys if k in recorded)
+
+    return matched
+
+
+# reorder each code unit's basic blocks so that the hot path through it is laid out contiguously
+# starting from the entry, each block is followed by its most frequently taken successor, inverting conditional
+# jumps so that the common case falls through. Blocks which never ran are moved to the end
+# returns true iff the program was changed
+def layout_blocks(program: TacProgram, profile: Profile, analyses: AnalysisCache = None):
+    analyses = analyses or AnalysisCache(program)
+    changed = False
+    for unit in program.get_code_units():
+        cfg = analyses.get("cfg", unit)
+        if len(cfg.blocks) < 2:
+            continue
+
+        order = _get_layout(cfg, profile)
+        if order != cfg.blocks:
+            unit.program = _linearise(unit, cfg, order)
+            analyses.invalidate_unit(unit)
+            changed = True
+
+    return changed
+
+
+def _get_layout(cfg: ControlFlowGraph, profile: Profile) -> List[BasicBlock]:
+    weights = _get_edge_weights(cfg, profile)
+    counts = _get_block_counts(cfg, profile, weights)
+
+    # the entry must stay first
+    seeds = [cfg.blocks[0]] + sorted(cfg.blocks[1:], key=lambda b: (counts.get(b) == 0, b.index))
+    order = []
+    placed = set()
+    for seed in seeds:
+        block = seed
+        while block is not None and block not in placed:
+            order.append(block)
+            placed.add(block)
+            block = _get_next_in_chain(cfg, block, weights, placed)
+
+    return order
+
+
+# the successor to lay out straight after block: the one control most often goes to, or if nothing is known, the
+# one it already falls through to. Successors known never to be taken are left to be placed later
+def _get_next_in_chain(cfg: ControlFlowGraph, block: BasicBlock, weights, placed) -> Union[BasicBlock, None]:
+    fall_through = cfg.blocks[block.index + 1] \
+        if block.falls_through() and block.index + 1 < len(cfg.blocks) else None
+
+    candidates = []
+    for successor in block.successors:
+        weight = weights.get((block, successor))
+        if successor not in placed and (weight or (weight is None and successor is fall_through)):
+            candidates.append((weight or 0, successor is fall_through, successor))
+
+    return max(candidates, key=lambda c: c[:2])[2] if candidates else None
+
+
+# how many times control went along each edge, where the profile says
+def _get_edge_weights(cfg: ControlFlowGraph, profile: Profile) -> Dict[Tuple[BasicBlock, BasicBlock], int]:
+    blocks_by_label = {b.label.name: b for b in cfg.blocks if b.label is not None}
+    weights = {}
+    for block in cfg.blocks:
+        terminator = block.get_terminator()
+        counts = profile.get_branch_counts(terminator) \
+            if terminator is not None and terminator.is_conditional_jump() else None
+        if counts is None or block.index + 1 >= len(cfg.blocks):
+            continue
+
+        executed, false = counts
+        jumps = false if terminator.op == IF_FALSE_GOTO else executed - false
+        weights[(block, cfg.blocks[block.index + 1])] = executed - jumps
+        weights[(block, blocks_by_label[terminator.get_jump_target().name])] = jumps
+
+    # the edge out of a block with only one successor is taken every time the block runs
+    for block, count in _get_block_counts(cfg, profile, weights).items():
+        if len(block.successors) == 1:
+            weights.setdefault((block, block.successors[0]), count)
+
+    return weights
+
+
+# how many times each block ran, from its label's count, or else from the edges into it
+def _get_block_counts(cfg: ControlFlowGraph, profile: Profile, weights) -> Dict[BasicBlock, int]:
+    counts = {}
+    for block in cfg.blocks:
+        if block.label is not None and profile.get_block_count(block.label) is not None:
+            counts[block] = profile.get_block_count(block.label)
+        elif block.predecessors and all((p, block) in weights for p in block.predecessors):
+            counts[block] = sum(weights[(p, block)] for p in block.predecessors)
+
+    return counts
+
+
+# flatten the blocks back into TAC in the given order, adding, removing or inverting jumps wherever a block no
+# longer sits directly before the block it used to fall through to
+def _linearise(unit, cfg: ControlFlowGraph, order: List[BasicBlock]):
+    blocks_by_label = {b.label.name: b for b in cfg.blocks if b.label is not None}
+    end_label = None
+
+    def get_label(block):
+        nonlocal end_label
+        if block is None:  # the end of the main program
+            end_label = end_label or unit.new_label("layout_end")
+            return end_label
+        if block.label is None:
+            block.label = unit.new_label("layout")
+        return block.label
+
+    code_by_block = {}
+    for position, block in enumerate(order):
+        instructions = list(block.instructions)
+        next_in_layout = order[position + 1] if position + 1 < len(order) else None
+        terminator = block.get_terminator()
+
+        if block.falls_through():
+            fall_through = cfg.blocks[block.index + 1] if block.index + 1 < len(cfg.blocks) else None
+            if fall_through is not next_in_layout:
+                if terminator is not None and blocks_by_label[terminator.get_jump_target().name] is next_in_layout:
+                    inverted = terminator.copy()
+                    inverted.invert_condition(get_label(fall_through))
+                    instructions[-1] = inverted
+                else:
+                    instructions.append(TacInstruction(result_var=get_label(fall_through), op="Goto"))
+
+        elif terminator is not None and terminator.op == "Goto" \
+                and blocks_by_label[terminator.get_jump_target().name] is next_in_layout:
+            instructions.pop()
+
+        code_by_block[block] = instructions
+
+    code = []
+    for block in order:
+        if block.label is not None:
+            code.append(block.label)
+        code.extend(code_by_block[block])
+    if end_label is not None:
+        code.append(end_label)
+
+    return code
+
+
+def _position_key(kind, position):
+    return f"{kind}@{position[0]}:{position[1]}" if position is not None else None
+
+
+def _label_key(label: Label):
+    return _position_key(label.tag, label.position)
+
+
+def _branch_key(instruction: TacInstruction):
+    return _position_key("branch", instruction.position)
+
+
+def _call_key(instruction: TacInstruction):
+    return _position_key(f"call {instruction.arg1.tag}", instruction.position)
+
+
+def _get_program_keys(program: TacProgram) -> Dict[str, set]:
+    keys = {"blocks": set(), "branches": set(), "calls": set()}
+    for unit in program.get_code_units():
+        for item in unit.program:
+            if isinstance(item, Label):
+                keys["blocks"].add(_label_key(item))
+            elif item.is_conditional_jump():
+                keys["branches"].add(_branch_key(item))
+            elif item.op == "LCall":
+                keys["calls"].add(_call_key(item))
+
+    for table in keys.values():
+        table.discard(None)
+    return keys
+
+
+# keys grouped by the kind of thing they count, each group in source order
+def _group_by_kind(keys) -> Dict[str, List[str]]:
+    groups = {}
+    for key in keys:
+        groups.setdefault(key.split("@")[0], []).append(key)
+    for group in groups.values():
+        group.sort(key=lambda k: tuple(int(n) for n in re.findall(r"\d+", k.split("@")[1])))
+
+    return groups
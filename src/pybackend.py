@@ -0,0 +1,247 @@
+import functools
+import sys
+from typing import Dict, List, Union
+
+from cfg import BasicBlock, ControlFlowGraph
+from oreoio import OreoIO
+from tac import IF_FALSE_GOTO, IF_TRUE_GOTO, INT_MIN, SLOT_SIZE, TacInstruction, TacProcedure, TacProgram, \
+    TacVariable, is_number_literal, wrap
+from vm import MAX_CALL_DEPTH, OreoRuntimeError
+
+INDENT = "    "
+
+# python expressions for the TAC ops which compute a value, given python expressions for their operands
+# arithmetic wraps round to a signed 64 bit integer, as in the virtual machine, by masking the result inline
+EXPRESSIONS = {
+    "copy": "{0}",
+    "+": f"({{0}} + {{1}} + {-INT_MIN} & {(1 << 64) - 1}) - {-INT_MIN}",
+    "-": f"({{0}} - {{1}} + {-INT_MIN} & {(1 << 64) - 1}) - {-INT_MIN}",
+    "*": f"({{0}} * {{1}} + {-INT_MIN} & {(1 << 64) - 1}) - {-INT_MIN}",
+    "/": "_divide({0}, {1})",
+    "==": "1 if {0} == {1} else 0",
+    "<": "1 if {0} < {1} else 0",
+    "&&": "1 if {0} and {1} else 0",
+    "||": "1 if {0} or {1} else 0",
+    "not": "0 if {0} else 1"
+}
+
+# what the generated program needs to run on its own, which PythonProgram.run otherwise provides
+STANDALONE_PRELUDE = f"""import sys
+
+
+def _write(text):
+    sys.stdout.write(text)
+
+
+def _read_line():
+    sys.stdout.flush()
+    line = sys.stdin.readline()
+    return line[:-1] if line.endswith("\\n") else line
+
+
+def _divide(dividend, divisor):
+    quotient = abs(dividend) // abs(divisor)
+    quotient = -quotient if (dividend < 0) != (divisor < 0) else quotient
+    return (quotient + {-INT_MIN} & {(1 << 64) - 1}) - {-INT_MIN}
+"""
+# runs the main program, reporting runtime errors as oreoc does, and allowing calls nested as deep as in the VM
+STANDALONE_MAIN = f"""if __name__ == "__main__":
+    sys.setrecursionlimit(sys.getrecursionlimit() + {MAX_CALL_DEPTH})
+    try:
+        main()
+    except ZeroDivisionError:
+        sys.exit("Division by zero")
+    except RecursionError:
+        sys.exit("Procedure calls nested more than {MAX_CALL_DEPTH} deep")
+"""
+
+
+# a TAC program translated into python source, and the code object compiled from it
+# each procedure becomes a python function taking its parameters as arguments, and the main program becomes a
+# function called main, so that every variable is a local
+class PythonProgram:
+    def __init__(self, program: TacProgram):
+        self.source = "\n".join(["# generated from Oreo TAC", ""] + _generate_units(program)) + "\n"
+        self.code = _compile_source(self.source)
+
+    # run the program, returning the final values of the main program's variables
+    # each Oreo call is a python call, so the recursion limit is raised for the run to allow calls nested as deep as
+    # the virtual machine does
+    def run(self, stdin=None, stdout=None) -> Dict[str, Union[int, str]]:
+        io = OreoIO(stdin, stdout)
+        namespace = {"_divide": _divide, "_write": io.write, "_read_line": io.read_line}
+        exec(self.code, namespace)
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(recursion_limit + MAX_CALL_DEPTH)
+        try:
+            return namespace["main"]()
+        except ZeroDivisionError:
+            raise OreoRuntimeError("Division by zero")
+        except RecursionError:
+            raise OreoRuntimeError(f"Procedure calls nested more than {MAX_CALL_DEPTH} deep")
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+            io.flush()
+
+    # write the generated source to a file, for debugging
+    def dump(self, filename):
+        with open(filename, "w") as file:
+            file.write(self.source)
+
+
+def compile_to_python(program: TacProgram) -> PythonProgram:
+    return PythonProgram(program)
+
+
+# a python script which runs the program on its own
+def generate_python(program: TacProgram) -> str:
+    lines = ["# generated from Oreo TAC", "", STANDALONE_PRELUDE, ""] + _generate_units(program)
+    return "\n".join(lines + ["", "", STANDALONE_MAIN])
+
+
+# a function for each procedure, and one called main for the main program
+def _generate_units(program: TacProgram) -> List[str]:
+    lines = []
+    for procedure in program.procedures:
+        lines += _generate_unit(procedure) + [""]
+    return lines + _generate_unit(program)
+
+
+# compiling is slow compared to running small programs, so the same source is only compiled once
+@functools.lru_cache(maxsize=64)
+def _compile_source(source: str):
+    return compile(source, "<oreo>", "exec")
+
+
+# division truncates towards zero, and wraps round, as in the virtual machine
+def _divide(dividend, divisor):
+    quotient = abs(dividend) // abs(divisor)
+    return wrap(-quotient if (dividend < 0) != (divisor < 0) else quotient)
+
+
+# a unit with no labels is just its straight line code
+# otherwise its blocks are numbered, and run inside a dispatch loop:
+#     while True:
+#         if _block == 0: ...
+#         if _block == 1: ...
+# a block ends by setting _block to the block which runs next. Blocks later in the layout are reached by falling
+# through the rest of the ifs, and earlier ones by going round the loop again
+def _generate_unit(unit: Union[TacProgram, TacProcedure]) -> List[str]:
+    is_procedure = isinstance(unit, TacProcedure)
+    cfg = ControlFlowGraph(unit.program)
+    block_numbers = {b.label.name: b.index for b in cfg.blocks if b.label is not None}
+
+    parameters = [repr(p) for p in unit.parameters] if is_procedure else []
+    name = f"p_{unit.name}" if is_procedure else "main"
+    lines = [f"def {name}({', '.join(parameters)}):"]
+
+    variables = sorted({repr(v) for i in unit.program if isinstance(i, TacInstruction)
+                        for v in i.get_used_variables() + [i.get_defined_variable()] if v is not None} - set(parameters))
+    if variables:
+        lines.append(INDENT + " = ".join(variables) + " = 0")
+
+    # the main program hands back its variables, so their final values can be inspected
+    exit_statement = "return" if is_procedure \
+        else "return {" + ", ".join(f"'{v[2:]}': {v}" for v in variables if v.startswith("v_")) + "}"
+
+    if not block_numbers:
+        for block in cfg.blocks:
+            lines += _generate_block(block, block_numbers, 1)
+        lines.append(INDENT + exit_statement)
+        return lines
+
+    lines += [INDENT + "_block = 0", INDENT + "while True:"]
+    for block in cfg.blocks:
+        lines.append(INDENT * 2 + f"if _block == {block.index}:")
+        lines += _generate_block(block, block_numbers, 3)
+    lines.append(INDENT * 2 + exit_statement)
+
+    return lines
+
+
+def _generate_block(block: BasicBlock, block_numbers: Dict[str, int], depth: int):
+    lines = []
+    pending_arguments = []  # pushed parameters, first argument last
+    in_dispatch_loop = len(block_numbers) > 0
+    next_block = block.index + 1
+
+    def emit(line):
+        lines.append(INDENT * depth + line)
+
+    def jump(target, condition=None):
+        target_block = block_numbers[target.name]
+        if condition is None:
+            emit(f"_block = {target_block}" + ("; continue" if target_block <= block.index else ""))
+        elif target_block > block.index:
+            emit(f"_block = {target_block} if {condition} else {next_block}")
+        else:
+            emit(f"if {condition}: _block = {target_block}; continue")
+            emit(f"_block = {next_block}")
+
+    for instruction in block.instructions:
+        op = instruction.op
+        if op in EXPRESSIONS:
+            operands = [_operand(a) for a in [instruction.arg1, instruction.arg2] if a is not None]
+            emit(f"{instruction.result_var!r} = {EXPRESSIONS[op].format(*operands)}")
+
+        elif op == "Goto":
+            jump(instruction.get_jump_target())
+            return lines
+
+        elif op == IF_FALSE_GOTO:
+            jump(instruction.get_jump_target(), f"not {_operand(instruction.arg1)}")
+            return lines
+
+        elif op == IF_TRUE_GOTO:
+            jump(instruction.get_jump_target(), _operand(instruction.arg1))
+            return lines
+
+        elif op == "ReadLine":
+            emit(f"{instruction.result_var!r} = _read_line()")
+
+        elif op == "PrintString":
+            emit(f"_write(str({_operand(instruction.arg1)}))")
+
+        elif op == "PrintStringLn":
+            emit(f"_write(str({_operand(instruction.arg1)}) + '\\n')")
+
+        # the calling sequence collapses into a python call, as the pushes always come straight before the call
+        elif op == "PushParam":
+            pending_arguments.append(_operand(instruction.arg1))
+
+        elif op == "LCall":
+            call = f"p_{instruction.arg1.tag}({', '.join(reversed(pending_arguments))})"
+            pending_arguments = []
+            emit(f"{instruction.result_var!r} = {call}" if instruction.result_var is not None else call)
+
+        elif op == "PopParams":
+            assert not pending_arguments and int(instruction.arg1) % SLOT_SIZE == 0
+
+        elif op == "BeginFunc":
+            continue
+
+        elif op == "Return":
+            emit("return" if instruction.arg1 is None else f"return {_operand(instruction.arg1)}")
+            return lines
+
+        elif op == "EndFunc":
+            emit("return")
+            return lines
+
+        else:
+            raise ValueError(f"Cannot generate python for {instruction}")
+
+    if in_dispatch_loop:
+        emit(f"_block = {next_block}")
+    elif not lines:
+        emit("pass")
+
+    return lines
+
+
+def _operand(operand) -> str:
+    if isinstance(operand, TacVariable):
+        return repr(operand)
+    if is_number_literal(operand):
+        return str(wrap(int(operand)))
+    return repr(operand[1:-1])
@@ -0,0 +1,175 @@
+from typing import Dict, List, Union
+
+from cfg import ControlFlowGraph
+from tac import TacProcedure, TacProgram
+
+
+class LiveInterval:
+    def __init__(self, name: str, position: int):
+        self.name = name
+        self.start = position
+        self.end = position
+
+    def __repr__(self):
+        return f"{self.name}[{self.start}, {self.end}]"
+
+    def extend(self, position: int):
+        self.start = min(self.start, position)
+        self.end = max(self.end, position)
+
+    def overlaps(self, other):
+        return self.start <= other.end and other.start <= self.end
+
+
+# where each temporary of a code unit lives
+# temporaries are given either a register, or if there are not enough registers, a spill slot in the frame
+# registers and spill slots are both numbered from 0, and are shared by temporaries which are never live at once
+class TemporaryAllocation:
+    def __init__(self, num_registers: Union[int, None]):
+        self.num_registers = num_registers  # the limit, or None for as many as needed
+        self.registers: Dict[str, int] = {}
+        self.spill_slots: Dict[str, int] = {}
+        self.intervals: List[LiveInterval] = []
+        self.num_registers_used = 0
+        self.num_spill_slots = 0
+
+    def __repr__(self):
+        return f"registers={self.registers} spilled={self.spill_slots}"
+
+    # the number of slots the frame needs to hold every temporary, with registers first then spill slots
+    def get_num_slots(self):
+        return self.num_registers_used + self.num_spill_slots
+
+    def is_spilled(self, name: str):
+        return name in self.spill_slots
+
+    # the slot holding the temporary, in a frame laid out as registers then spill slots
+    def get_slot(self, name: str):
+        if name in self.registers:
+            return self.registers[name]
+        return self.num_registers_used + self.spill_slots[name]
+
+
+# give every code unit an allocation of its temporaries, stored as unit.allocation, and shrink the procedures'
+# frames to fit
+# the allocation is only valid until the code is next changed, so the pass manager throws it away when a pass does
+# returns true iff any procedure's frame got smaller
+def allocate_temporaries(program: TacProgram, num_registers=None):
+    changed = False
+    for unit in program.get_code_units():
+        unit.allocation = allocate_unit(unit.program, num_registers)
+        if isinstance(unit, TacProcedure):
+            frame_size = unit.frame_size
+            unit.set_frame_size(unit.num_locals, unit.allocation.get_num_slots())
+            changed = changed or unit.frame_size < frame_size
+    return changed
+
+
+def allocate_unit(code, num_registers=None) -> TemporaryAllocation:
+    allocation = TemporaryAllocation(num_registers)
+    allocation.intervals = get_live_intervals(code)
+    _linear_scan(allocation)
+    return allocation
+
+
+# the range of instruction positions over which each temporary holds a value which may still be read
+def get_live_intervals(code) -> List[LiveInterval]:
+    cfg = ControlFlowGraph(code)
+    live_in, live_out = cfg.get_live_variables()
+
+    intervals: Dict[str, LiveInterval] = {}
+
+    def extend(name, position):
+        if name.startswith("t_"):
+            if name in intervals:
+                intervals[name].extend(position)
+            else:
+                intervals[name] = LiveInterval(name, position)
+
+    position = 0
+    for block in cfg.blocks:
+        start = position
+        for instruction in block.instructions:
+            for variable in instruction.get_used_variables() + [instruction.get_defined_variable()]:
+                if variable is not None:
+                    extend(repr(variable), position)
+            position += 1
+        end = max(start, position - 1)
+
+        # a temporary which is live across the edges into or out of a block is live throughout it
+        for name in live_in[block]:
+            extend(name, start)
+        for name in live_out[block]:
+            extend(name, end)
+
+    return sorted(intervals.values(), key=lambda i: (i.start, i.end))
+
+
+# Poletto and Sarkar's linear scan: walk the intervals in order of start, freeing the registers of those which have
+# ended, and when no register is free, spilling whichever interval ends last
+# an interval only frees its register after the position it ends at, so an instruction never writes its result to
+# the register of one of its operands
+def _linear_scan(allocation: TemporaryAllocation):
+    active: List[LiveInterval] = []  # intervals with a register, sorted by end
+    free_registers: List[int] = []
+    spilled: List[LiveInterval] = []
+    free_spill_slots: List[int] = []
+
+    for interval in allocation.intervals:
+        for expired in [a for a in active if a.end < interval.start]:
+            active.remove(expired)
+            free_registers.append(allocation.registers[expired.name])
+        for expired in [s for s in spilled if s.end < interval.start]:
+            spilled.remove(expired)
+            free_spill_slots.append(allocation.spill_slots[expired.name])
+
+        if free_registers:
+            free_registers.sort()
+            register = free_registers.pop(0)
+        elif allocation.num_registers is None or len(active) < allocation.num_registers:
+            register = len(active)
+        else:
+            # steal the register of the active interval that lasts longest, if it outlasts this one
+            victim = active[-1]
+            if victim.end > interval.end:
+                register = allocation.registers.pop(victim.name)
+                active.remove(victim)
+                _spill(allocation, victim, spilled, free_spill_slots)
+            else:
+                _spill(allocation, interval, spilled, free_spill_slots)
+                continue
+
+        allocation.registers[interval.name] = register
+        active.append(interval)
+        active.sort(key=lambda a: a.end)
+
+    allocation.num_registers_used = max(allocation.registers.values(), default=-1) + 1
+    allocation.num_spill_slots = max(allocation.spill_slots.values(), default=-1) + 1
+
+
+def _spill(allocation: TemporaryAllocation, interval: LiveInterval, spilled: List[LiveInterval],
+           free_spill_slots: List[int]):
+    if free_spill_slots:
+        free_spill_slots.sort()
+        slot = free_spill_slots.pop(0)
+    else:
+        slot = len(spilled)
+    allocation.spill_slots[interval.name] = slot
+    spilled.append(interval)
+
+
+# true iff every temporary in code has been given a location, and no two temporaries which are live at the same
+# time share one
+def is_valid_allocation(allocation: TemporaryAllocation):
+    by_location = {}
+    for interval in allocation.intervals:
+        if interval.name in allocation.registers:
+            location = ("register", allocation.registers[interval.name])
+        elif interval.name in allocation.spill_slots:
+            location = ("spill", allocation.spill_slots[interval.name])
+        else:
+            return False
+        by_location.setdefault(location, []).append(interval)
+
+    return all(not a.overlaps(b) for intervals in by_location.values()
+               for i, a in enumerate(intervals) for b in intervals[i + 1:])
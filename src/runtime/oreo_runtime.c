@@ -0,0 +1,184 @@
+/* Runtime support for Oreo programs compiled to native code
+ * The behaviour matches oreoio.py, which the virtual machine and python backend use: booleans print as 1 or 0,
+ * arithmetic wraps round to 64 bits, division truncates towards zero, and reading a line drops its trailing newline
+ *
+ * Output is collected in a buffer and written with one system call when the buffer fills up, before a line is read
+ * (so that prompts appear), and at exit. Input is read in blocks, and lines are split out of the block */
+#define _POSIX_C_SOURCE 200809L
+
+#include <errno.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+
+#include "oreo_runtime.h"
+
+#define OUTPUT_BUFFER_SIZE 65536
+#define INPUT_BUFFER_SIZE 65536
+
+static char output_buffer[OUTPUT_BUFFER_SIZE];
+static size_t output_length = 0;
+
+static char input_buffer[INPUT_BUFFER_SIZE];
+static size_t input_start = 0, input_end = 0;
+static int input_finished = 0;
+
+/* pairs of decimal digits, so numbers can be converted two digits at a time */
+static const char digit_pairs[] =
+    "00010203040506070809101112131415161718192021222324252627282930313233343536373839"
+    "40414243444546474849505152535455565758596061626364656667686970717273747576777879"
+    "8081828384858687888990919293949596979899";
+
+static void write_all(int fd, const char *bytes, size_t length) {
+    while (length > 0) {
+        ssize_t written = write(fd, bytes, length);
+        if (written < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            _exit(1);
+        }
+        bytes += written;
+        length -= (size_t) written;
+    }
+}
+
+static void flush_output(void) {
+    write_all(STDOUT_FILENO, output_buffer, output_length);
+    output_length = 0;
+}
+
+static void write_bytes(const char *bytes, size_t length) {
+    if (length > OUTPUT_BUFFER_SIZE - output_length) {
+        flush_output();
+        /* too big to be worth copying into the buffer */
+        if (length >= OUTPUT_BUFFER_SIZE) {
+            write_all(STDOUT_FILENO, bytes, length);
+            return;
+        }
+    }
+    memcpy(output_buffer + output_length, bytes, length);
+    output_length += length;
+}
+
+static void *allocate(void *memory, size_t size) {
+    memory = realloc(memory, size);
+    if (memory == NULL) {
+        flush_output();
+        write_all(STDERR_FILENO, "Out of memory\n", 14);
+        exit(1);
+    }
+    return memory;
+}
+
+void oreo_print_num(oreo_value value) {
+    char digits[20];
+    char *start = digits + sizeof digits;
+    /* work with the magnitude unsigned, as the most negative number has no positive counterpart */
+    uint64_t magnitude = value < 0 ? 0 - (uint64_t) value : (uint64_t) value;
+
+    while (magnitude >= 100) {
+        unsigned pair = (unsigned) (magnitude % 100) * 2;
+        magnitude /= 100;
+        *--start = digit_pairs[pair + 1];
+        *--start = digit_pairs[pair];
+    }
+    if (magnitude >= 10) {
+        unsigned pair = (unsigned) magnitude * 2;
+        *--start = digit_pairs[pair + 1];
+        *--start = digit_pairs[pair];
+    } else {
+        *--start = (char) ('0' + magnitude);
+    }
+
+    if (value < 0) {
+        write_bytes("-", 1);
+    }
+    write_bytes(start, (size_t) (digits + sizeof digits - start));
+}
+
+void oreo_print_str(oreo_value value) {
+    const char *string = (const char *) (intptr_t) value;
+    write_bytes(string, strlen(string));
+}
+
+void oreo_print_newline(void) {
+    if (output_length == OUTPUT_BUFFER_SIZE) {
+        flush_output();
+    }
+    output_buffer[output_length++] = '\n';
+}
+
+/* returns false at the end of the input */
+static int fill_input(void) {
+    ssize_t got;
+    if (input_finished) {
+        return 0;
+    }
+    do {
+        got = read(STDIN_FILENO, input_buffer, INPUT_BUFFER_SIZE);
+    } while (got < 0 && errno == EINTR);
+
+    if (got <= 0) {
+        input_finished = 1;
+        return 0;
+    }
+    input_start = 0;
+    input_end = (size_t) got;
+    return 1;
+}
+
+oreo_value oreo_read_line(void) {
+    size_t capacity = 64, length = 0;
+    char *line = allocate(NULL, capacity);
+
+    flush_output();
+    for (;;) {
+        char *newline;
+        size_t available;
+        if (input_start == input_end && !fill_input()) {
+            break;
+        }
+
+        available = input_end - input_start;
+        newline = memchr(input_buffer + input_start, '\n', available);
+        if (newline != NULL) {
+            available = (size_t) (newline - (input_buffer + input_start));
+        }
+
+        if (length + available + 1 > capacity) {
+            while (length + available + 1 > capacity) {
+                capacity *= 2;
+            }
+            line = allocate(line, capacity);
+        }
+        memcpy(line + length, input_buffer + input_start, available);
+        length += available;
+        input_start += available;
+
+        if (newline != NULL) {
+            input_start++;
+            break;
+        }
+    }
+
+    line[length] = '\0';
+    return OREO_STRING(line);
+}
+
+oreo_value oreo_divide(oreo_value dividend, oreo_value divisor) {
+    if (divisor == 0) {
+        flush_output();
+        write_all(STDERR_FILENO, "Division by zero\n", 17);
+        exit(1);
+    }
+    /* the only quotient which does not fit in 64 bits wraps round, rather than being undefined */
+    if (divisor == -1) {
+        return (oreo_value) (0 - (uint64_t) dividend);
+    }
+    return dividend / divisor;
+}
+
+void oreo_exit(void) {
+    flush_output();
+}
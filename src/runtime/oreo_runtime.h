@@ -0,0 +1,19 @@
+/* Runtime support for Oreo programs compiled to native code */
+#ifndef OREO_RUNTIME_H
+#define OREO_RUNTIME_H
+
+#include <stdint.h>
+
+/* every Oreo value fits in one 8 byte slot: numbers and booleans directly, strings as a pointer */
+typedef int64_t oreo_value;
+
+#define OREO_STRING(s) ((oreo_value) (intptr_t) (s))
+
+void oreo_print_num(oreo_value value);
+void oreo_print_str(oreo_value value);
+void oreo_print_newline(void);
+oreo_value oreo_read_line(void);
+oreo_value oreo_divide(oreo_value dividend, oreo_value divisor);
+void oreo_exit(void);
+
+#endif
@@ -1,9 +1,10 @@
 from typing import Dict, List
 
+import metrics
 from lexer import Token
-from parseerror import ParseError
+from parseerror import ErrorLog, ParseError
 from syntaxanalyser import ParseTreeNode
-from typechecker import _type_check
+from typechecker import ERROR, _type_check
 
 
 class Scope:
@@ -41,9 +42,12 @@ class Scope:
             raise ParseError(f"Use of undeclared identifier {identifier}",
                              token.line_num, token.col_num, token.context_line)
 
-    def get_var_type(self, id_node: ParseTreeNode, procedures):
+    # an identifier used without being declared has the error type, as the use has already been reported
+    def get_var_type(self, id_node: ParseTreeNode, procedures, errors: ErrorLog = None):
         identifier = id_node.get_terminal_attribute()
-        return self.vars[identifier].get_type_at_node(id_node, procedures)
+        if identifier not in self.vars or not self.vars[identifier].has_been_declared(id_node.content.token):
+            return ERROR
+        return self.vars[identifier].get_type_at_node(id_node, procedures, errors)
 
 
 class ScopeEntry:
@@ -60,26 +64,34 @@ class ScopeEntry:
     def assign(self, id_node: ParseTreeNode, value_node: ParseTreeNode):
         self.assignments.append({"id_node": id_node, "value_node": value_node})
 
-    def get_type_at_node(self, node, procedures):
+    def get_type_at_node(self, node, procedures, errors: ErrorLog = None):
         token = node.content.token
         latest_type = None
-        for assignment in self.assignments:
+        # the latest assignment before the node decides its type, so look backwards from there
+        num_iterations = 0
+        for i in range(self._count_assignments_before_or_at(token) - 1, -1, -1):
+            num_iterations += 1
+            assignment = self.assignments[i]
             id_node = assignment["id_node"]
-            if _is_before_or_at(id_node.content.token, token):
-                # if this is a self assignment, then do not type check or infer type from this
-                # to avoid infinite recursion
-                # self assignment eg "x := x + 1"
-                parent = id_node.get_common_parent(node)
-                if parent.is_non_terminal("a"):
-                    continue
-
-                # we sometimes need to type check the value node
-                # because type checking happens left to right, and assignments are right to left
-                # eg x := 1, we should type check 1 and set x's type to its type
-                value_node = assignment["value_node"]
-                if not hasattr(value_node, "type"):
-                    _type_check(value_node, procedures)
-                latest_type = value_node.type
+            # if this is a self assignment, then do not type check or infer type from this
+            # to avoid infinite recursion
+            # self assignment eg "x := x + 1"
+            parent = id_node.get_common_parent(node)
+            if parent.is_non_terminal("a"):
+                continue
+
+            # we sometimes need to type check the value node
+            # because type checking happens left to right, and assignments are right to left
+            # eg x := 1, we should type check 1 and set x's type to its type
+            value_node = assignment["value_node"]
+            if not hasattr(value_node, "type"):
+                _type_check(value_node, procedures, errors)
+            latest_type = value_node.type
+            break
+
+        if metrics.enabled:
+            metrics.increment("get_type_at_node_calls")
+            metrics.increment("get_type_at_node_iterations", num_iterations)
 
         if not latest_type \
                 and not token.line_num == self.declare_token.line_num and token.col_num == self.declare_token.col_num:
@@ -88,8 +100,20 @@ class ScopeEntry:
 
         return latest_type
 
+    # assignments are made in the order they appear in the source, so a binary search finds those before the token
+    def _count_assignments_before_or_at(self, token):
+        low, high = 0, len(self.assignments)
+        while low < high:
+            middle = (low + high) // 2
+            if _is_before_or_at(self.assignments[middle]["id_node"].content.token, token):
+                low = middle + 1
+            else:
+                high = middle
+        return low
 
-def semantic_analyse(root: ParseTreeNode):
+
+# if errors is given, each error is added to it and analysis carries on after it, instead of stopping at the first
+def semantic_analyse(root: ParseTreeNode, errors: ErrorLog = None):
     assert root.is_non_terminal("p")  # this must be program root
 
     global_scope = Scope()
@@ -99,65 +123,77 @@ def semantic_analyse(root: ParseTreeNode):
         child.scope = global_scope
 
         if child.is_non_terminal("compound"):
-            _analyse(child, global_scope)  # begin the semantic analyse proper once we find the actual program body
+            # begin the semantic analyse proper once we find the actual program body
+            _analyse(child, global_scope, errors)
 
 
-def _analyse(node: ParseTreeNode, scope):
+def _analyse(node: ParseTreeNode, scope, errors):
     node.scope = scope
 
     if node.is_non_terminal("function_definition"):
-        _analyse_func_definition(node)
+        # a procedure only sees its own scope, so one which has already been analysed need not be again
+        if not hasattr(node.children[0], "scope"):
+            _analyse_func_definition(node, errors)
 
     elif node.is_non_terminal("v"):  # variable declaration, with optional assignment
-        _analyse_variable_assignment(node, scope, is_declaration=True)
+        _analyse_variable_assignment(node, scope, errors, is_declaration=True)
 
     elif node.is_non_terminal("a"):  # assignment of an already declared variable
-        _analyse_variable_assignment(node, scope, is_declaration=False)
+        _analyse_variable_assignment(node, scope, errors, is_declaration=False)
 
     elif node.is_non_terminal("pr") and node.has_child("GET"):  # assign declared variable to user input
-        _analyse_variable_assignment(node, scope, is_declaration=False)
+        _analyse_variable_assignment(node, scope, errors, is_declaration=False)
 
     elif node.is_terminal("ID"):
-        scope.use_var(node)
+        _report_errors(errors, scope.use_var, node)
 
     elif node.children:
         for child in node.children:
-            _analyse(child, scope)
+            _analyse(child, scope, errors)
 
 
-def _analyse_variable_assignment(node, scope, is_declaration):
+def _analyse_variable_assignment(node, scope, errors, is_declaration):
     id_node = None
     assign_node = None
+    declared = True
     for child in node.children:
         child.scope = scope
 
         if child.is_terminal("ID"):
             id_node = child
             if is_declaration:
-                scope.declare(id_node)
+                declared = _report_errors(errors, scope.declare, id_node)
 
-        # for 'v' and 'a' non-terminals, respectively
-        elif child.is_non_terminal("var_assign") or child.is_non_terminal("expression") or child.is_terminal("GET"):
+        # for 'v' and 'a' non-terminals, respectively, or the value left by the parser in place of one with an error
+        elif child.is_in(["var_assign", "expression", "GET", "error"]):
             assign_node = child
 
     assert id_node is not None and (assign_node is not None or is_declaration)
     if assign_node is not None:
-        scope.assign(id_node, assign_node)
-        _analyse(assign_node, scope)
+        # a redefinition is not recorded as an assignment to the variable it clashed with, as its value could then
+        # be typed through itself, eg var x := x + 1
+        if declared:
+            _report_errors(errors, scope.assign, id_node, assign_node)
+        _analyse(assign_node, scope, errors)
+
+
+# analyse one procedure definition on its own, eg again after it has changed, as it only sees its own scope
+def semantic_analyse_procedure(definition: ParseTreeNode, errors: ErrorLog = None):
+    _analyse_func_definition(definition, errors)
 
 
-def _analyse_func_definition(node):
+def _analyse_func_definition(node, errors=None):
     scope = Scope()  # each function has its own scope
     for child in node.children:
         child.scope = scope
 
         if child.is_non_terminal("func_def_args"):
-            _analyse_func_args(child, scope)
+            _analyse_func_args(child, scope, errors)
         elif child.is_non_terminal("function_compound"):
-            _analyse(child, scope)
+            _analyse(child, scope, errors)
 
 
-def _analyse_func_args(node, scope):
+def _analyse_func_args(node, scope, errors):
     type_node = node.get_child("arg_type")
     type_node.children[0].scope = scope
 
@@ -165,11 +201,24 @@ def _analyse_func_args(node, scope):
         child.scope = scope
 
         if child.is_terminal("ID"):
-            scope.declare(child)
             assert type_node
-            scope.assign(child, type_node)  # fix the type of the variable
+            if _report_errors(errors, scope.declare, child):
+                scope.assign(child, type_node)  # fix the type of the variable
         elif child.is_non_terminal("later_func_def_arg"):
-            _analyse_func_args(child, scope)
+            _analyse_func_args(child, scope, errors)
+
+
+# call the function, and if errors are being collected, add any error it raises to them instead of raising it
+# returns true iff it raised no error
+def _report_errors(errors: ErrorLog, function, *args):
+    try:
+        function(*args)
+    except ParseError as e:
+        if errors is None:
+            raise
+        errors.add(e)
+        return False
+    return True
 
 
 # returns true iff a appears before or at the same location as b
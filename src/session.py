@@ -0,0 +1,26 @@
+# the state of one compilation which has to be kept apart from any other compilation in the same process, which may
+# be running at the same time in another thread or asyncio task
+# each TacProgram has a session, which numbers its labels and temporaries, and the copies of procedures inlined into
+# it, so that names are unique within the program. Anything which adds code to a program numbers it through the
+# program's session, rather than through counters shared by every program
+class CompilationSession:
+    def __init__(self):
+        self.num_labels = 0
+        self.num_temporaries = 0
+        self.num_inlined_calls = 0
+
+    def __repr__(self):
+        return f"CompilationSession({self.num_labels} labels, {self.num_temporaries} temporaries, " \
+               f"{self.num_inlined_calls} inlined calls)"
+
+    def next_label_number(self) -> int:
+        self.num_labels += 1
+        return self.num_labels
+
+    def next_temporary_number(self) -> int:
+        self.num_temporaries += 1
+        return self.num_temporaries
+
+    def next_inlined_call_number(self) -> int:
+        self.num_inlined_calls += 1
+        return self.num_inlined_calls
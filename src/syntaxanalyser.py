@@ -1,10 +1,11 @@
-import copy
 import math
+from collections import deque
 from typing import List, Union, Dict
 
+import metrics
 from colours import BLUE, YELLOW, RESET_COLOUR
 from lexer import Token, lex
-from parseerror import ParseError
+from parseerror import ErrorLog, ParseError
 
 # for pretty printing
 PADDING = 1 * " "
@@ -16,9 +17,34 @@ LINE_VERTICAL_UPWARDS = "╩"
 LINE_CROSS = "╬"
 LINE_HORIZONTAL = "═"
 
+# how many times a symbol in an expansion can appear, written after it in the grammar
+ZERO_OR_MORE = "*"
+ONE_OR_MORE = "+"
+OPTIONAL = "?"
+REPETITIONS = [ZERO_OR_MORE, ONE_OR_MORE, OPTIONAL]
 
-class Terminal:
-    def __init__(self, token: Token):
+# for recovering from errors: the parser drops the statement an error is in, skips to the end of it or the start of the
+# next, and carries on with the statements after it
+STATEMENTS = ["statement", "function_statement"]
+STATEMENT_KEYWORDS = ["VAR", "PRINT", "PRINTLN", "GET", "WHILE", "IF", "PROCEDURE", "RETURN"]
+
+
+class GrammarSymbol:
+    def __init__(self, repetition=""):
+        self.repetition = repetition  # "" if the symbol appears exactly once
+
+    # whether the symbol can be left out
+    def is_optional(self):
+        return self.repetition in [ZERO_OR_MORE, OPTIONAL]
+
+    # whether the symbol can appear more than once
+    def is_repeated(self):
+        return self.repetition in [ZERO_OR_MORE, ONE_OR_MORE]
+
+
+class Terminal(GrammarSymbol):
+    def __init__(self, token: Token, repetition=""):
+        super().__init__(repetition)
         self.token = token
 
     def __eq__(self, other):
@@ -28,10 +54,10 @@ class Terminal:
         return repr(self.token)
 
 
-class NonTerminal:
-    def __init__(self, name: str, is_zero_or_more=False):
+class NonTerminal(GrammarSymbol):
+    def __init__(self, name: str, repetition=""):
+        super().__init__(repetition)
         self.name = name
-        self.is_zero_or_more = is_zero_or_more
 
     def __hash__(self):
         return hash(self.name)
@@ -50,7 +76,7 @@ class Expansion:
     def __repr__(self):
         if self.rhs is None:
             return "<ε>"
-        return "<" + " ".join(repr(x) for x in self.rhs) + ">"
+        return "<" + " ".join(repr(x) + x.repetition for x in self.rhs) + ">"
 
     def __eq__(self, other):
         return len(other.rhs) == len(self.rhs) \
@@ -62,8 +88,6 @@ class ParseTreeNode:
         self.content = content
         self.children: List[ParseTreeNode] = []
         self.parent = parent
-        self.processed = False
-        self.destroy = False
 
         if parent:
             self.level = parent.level + 1
@@ -92,8 +116,14 @@ class ParseTreeNode:
     def get_child(self, name, optional=False):
         for child in self.children:
             if child.is_non_terminal(name) or child.is_terminal(name):
+                if metrics.enabled:
+                    metrics.increment("get_child_calls")
+                    metrics.increment("get_child_scans", self.children.index(child) + 1)
                 return child
 
+        if metrics.enabled:
+            metrics.increment("get_child_calls")
+            metrics.increment("get_child_scans", len(self.children))
         if not optional:
             raise ValueError(f"{self} has missing child {name}")
 
@@ -128,192 +158,361 @@ class ParseTreeNode:
             my_p = my_p.parent
             other_p = other
 
-    def parse_tokens(self, tokens: List[Token], expansions):
-        prev_token = None
-
-        while True:
-            node = self.get_next_node()
-            self.handle_eof_errors(node, prev_token, tokens)
-            if node is None:
-                return
-            prev_token = tokens[0]
+    # parse the tokens as this node's non terminal, taking those it uses off the front of the list
+    # the parser keeps a stack of the nodes it is part way through expanding, and appends each child to its node as
+    # it is parsed, so the children of a repeated symbol make a flat list, eg the statements in a compound
+    # if errors is given, each error is added to it and parsing carries on after the statement it is in
+    def parse_tokens(self, tokens: List[Token], expansions, errors: ErrorLog = None):
+        position = 0  # of the next token
+        error_position = None  # of the last error recovered from
+        try:
+            if not tokens:
+                raise _get_eof_error(self.content, None)
+            expansion = _get_expansion(self.content, tokens[0], expansions, is_optional=False)
+            # each frame is a node, the symbols it expands to, the index of the next one, and how many times that
+            # symbol has been parsed so far
+            stack = [[self, expansion.rhs, 0, 0]] if expansion else []
+            while stack:
+                try:
+                    frame = stack[-1]
+                    node, rhs, index, count = frame
+                    if index == len(rhs):
+                        stack.pop()
+                        if stack:
+                            _move_past(stack[-1])
+                        continue
+
+                    if metrics.enabled:
+                        metrics.increment("parse_steps")
+                    symbol = rhs[index]
+                    if position == len(tokens):
+                        raise _get_eof_error(symbol, tokens[position - 1] if position else None)
+                    token = tokens[position]
+                    # a symbol which can appear one or more times is optional once it has appeared
+                    is_optional = symbol.is_optional() or (symbol.repetition == ONE_OR_MORE and count > 0)
+
+                    if isinstance(symbol, Terminal):
+                        if symbol.token.name == token.name:
+                            node.children.append(ParseTreeNode(Terminal(token), node))
+                            position += 1
+                            _move_past(frame)
+                        elif is_optional:
+                            frame[2:] = [index + 1, 0]
+                        else:
+                            raise ParseError(f"expected '{repr(symbol).lower()}', got '{repr(token).lower()}'",
+                                             token.line_num, token.col_num, token.context_line)
+                    else:
+                        expansion = _get_expansion(symbol, token, expansions, is_optional)
+                        if expansion:
+                            child = ParseTreeNode(NonTerminal(symbol.name), node)
+                            # the first child of a node is given the token it starts with, even if it is a non
+                            # terminal, which is how later phases find, eg, the operator in a relative_operator
+                            if not node.children:
+                                child.content.token = token
+                            node.children.append(child)
+                            stack.append([child, expansion.rhs, 0, 0])
+                        else:
+                            frame[2:] = [index + 1, 0]  # the symbol is left out, or expands to nothing
+                except ParseError as e:
+                    # give up if there is no statement to drop, or if the last recovery got no further
+                    recovered_position = None
+                    if errors is not None and position != error_position:
+                        recovered_position = _recover(stack, tokens, position)
+                    if recovered_position is None:
+                        raise
+                    errors.add(e)
+                    error_position, position = position, recovered_position
+
+            if position < len(tokens):
+                token = tokens[position]
+                raise ParseError(f"expected END OF FILE, got '{repr(token).lower()}'",
+                                 token.line_num, token.col_num, token.context_line)
+        except ParseError as e:
+            if errors is None:
+                raise
+            errors.add(e, is_fatal=True)
+        finally:
+            del tokens[:position]
+
+    # the tree drawn with box drawing characters, one line for each level of it, and one for the edges above each
+    # max_depth is the deepest level to draw, counting this node as level 0, and max_children the most children to
+    # draw of any node; whatever is left out is drawn as a box saying so
+    def get_pretty_print_string(self, print_scope=False, print_type=False, max_depth=None, max_children=None):
+        levels = _get_boxes(self, print_scope, print_type, max_depth, max_children)
+        output = []
+        for depth, boxes in enumerate(levels):
+            line, edges = _draw_level(boxes)
+            # the root has no edges above it, unless it is all there is
+            if depth > 0 or len(levels) == 1:
+                output.append(edges + RESET_COLOUR)
+            output.append(line + RESET_COLOUR)
 
-            if isinstance(node.content, NonTerminal):
-                # expand the non terminal
-                node._expand(tokens, expansions)
+        return "\n".join(output)
 
-            else:
-                # compare the expected terminal to actual next token
-                if node.content.token.name == tokens[0].name:
-                    node.content.token = tokens.pop(0)
-                    node.processed = True
-                else:
-                    raise ParseError(f"expected '{repr(node.content).lower()}', got '{repr(tokens[0]).lower()}'",
-                                     tokens[0].line_num, tokens[0].col_num, tokens[0].context_line)
-
-    def handle_eof_errors(self, node, prev_token, tokens):
-        if node is None:
-            if tokens:
-                raise ParseError(f"expected END OF FILE, got '{repr(tokens[0]).lower()}'",
-                                 tokens[0].line_num, tokens[0].col_num, tokens[0].context_line)
-            return
-
-        if not tokens:
-            # EOF reached unexpectedly
-            if prev_token:
-                line_num = prev_token.line_num
-                col_num = len(prev_token.context_line.rstrip())
-                context_line = prev_token.context_line
-            else:
-                # the file was empty
-                line_num, col_num, context_line = 0, 0, "<No content to parse>"
-            raise ParseError(f"expected '{repr(node.content).lower()}', got END OF FILE",
-                             line_num, col_num, context_line)
+    def get_children_breadth_first(self):
+        visited = []
+        queue = deque([self])
 
-    def get_next_node(self):
-        if not self.processed:
-            return self
+        while queue:
+            node = queue.popleft()
+            visited.append(node)
+            queue.extend(node.children)
 
-        self.children = [c for c in self.children if not c.destroy]
+        return visited
 
-        for child in self.children:
-            child_node = child.get_next_node()
-            if child_node is not None:
-                return child_node
+    def get_string_width(self):
+        children_width = sum([c.get_string_width() for c in self.children])
 
-        return None
+        return max(len(repr(self.content)), children_width) + len(PADDING) * 2
 
-    def _expand(self, tokens, expansions):
-        assert (isinstance(self.content, NonTerminal))
 
-        expansion = find_expansion(self.content, tokens[0], expansions)
-        if not expansion:
-            if self.content.is_zero_or_more:
-                self.destroy = True
-                return
-            else:
-                nonterminal_str = repr(self.content).replace("_", " ")
-                raise ParseError(f"expected a valid {nonterminal_str}, got '{repr(tokens[0]).lower()}'",
-                                 tokens[0].line_num, tokens[0].col_num, tokens[0].context_line)
-        self.processed = True
-
-        # if this non terminal has a Kleene star, add an optional sibling with the same non terminal and Kleene star
-        if self.content.is_zero_or_more:
-            duplicate = ParseTreeNode(NonTerminal(self.content.name, is_zero_or_more=True), self.parent)
-            self.parent.children.insert(self.parent.children.index(self) + 1, duplicate)
-
-        if isinstance(expansion, str) and expansion == "ε":
-            self.destroy = True
+# a node as get_pretty_print_string draws it, or a box standing in for the nodes it leaves out
+class _Box:
+    def __init__(self, label: str, text: str, parent):
+        self.label = label  # the box is laid out as if this were all it showed
+        self.text = text  # what it shows, which may have the scope or type after the label
+        self.parent = parent
+        self.children: List[_Box] = []
+        self.width = 0  # of the box and everything below it
+        self.left_col = 0
+        self.repr_col = 0  # where the middle of the label is, where the edges to its children join
+
+
+# the boxes to draw for each level of the tree, left to right
+def _get_boxes(root: ParseTreeNode, print_scope, print_type, max_depth, max_children) -> List[List[_Box]]:
+    levels = []
+    queue = deque([(root, None, 0)])  # each node, or the label of a box for the nodes left out, with its parent's box
+    while queue:
+        node, parent, depth = queue.popleft()
+        if isinstance(node, str):
+            box = _Box(node, node, parent)
         else:
-            self.children = [ParseTreeNode(copy.deepcopy(x), parent=self) for x in expansion.rhs]
-            self.children[0].content.token = tokens[0]
-
-    def get_pretty_print_string(self, print_scope=False, print_type=False):
-        output = []
-        line = YELLOW
-        edges_line = BLUE
-        prev_node = None
-        level = 0
-        breadth_first = self.get_children_breadth_first()
-        for node in breadth_first:
-            if node.level != level:
-                level = node.level
-                if node.level > 1:
-                    output.append(edges_line + RESET_COLOUR)
-                output.append(line + RESET_COLOUR)
-                line = YELLOW
-                edges_line = BLUE
-                prev_node = None
-
-            if node.parent:
-                while len(line) < node.parent.left_col:
-                    line += " "
-
-            edges_line, line = self._update_line_and_edge_line(edges_line, line, node, prev_node, print_scope,
-                                                               print_type)
-
-            prev_node = node
-
-        output.append(edges_line + RESET_COLOUR)
-        output.append(line + RESET_COLOUR)
-
-        return "\n".join(output)
+            label = repr(node.content)
+            scope = " " + str(node.scope) if print_scope and hasattr(node, "scope") else ""
+            node_type = ": " + str(node.type) if print_type and hasattr(node, "type") else ""
+            box = _Box(label, label + scope + node_type, parent)
+
+            if max_depth is not None and depth == max_depth and node.children:
+                queue.append(("…", box, depth + 1))
+            elif max_children is not None and len(node.children) > max_children:
+                queue.extend((child, box, depth + 1) for child in node.children[:max_children])
+                queue.append((f"… {len(node.children) - max_children} more", box, depth + 1))
+            else:
+                queue.extend((child, box, depth + 1) for child in node.children)
+
+        if parent is not None:
+            parent.children.append(box)
+        if depth == len(levels):
+            levels.append([])
+        levels[depth].append(box)
+
+    # each box is wide enough for its label, and for its children side by side
+    for boxes in reversed(levels):
+        for box in boxes:
+            box.width = max(len(box.label), sum(child.width for child in box.children)) + len(PADDING) * 2
+
+    return levels
+
+
+# the line of labels for a level of the tree, and the line of edges above it, which join each box to its parent
+def _draw_level(boxes: List[_Box]):
+    line = [YELLOW]
+    line_length = len(YELLOW)
+    edges = list(BLUE)  # a list of characters, so that a parent's junction can be drawn in without copying the line
+    prev_box = None
+    for box in boxes:
+        if box.parent is not None and line_length < box.parent.left_col:
+            line.append((box.parent.left_col - line_length) * " ")
+            line_length = box.parent.left_col
+
+        edge_char = LINE_HORIZONTAL if prev_box is not None and prev_box.parent is box.parent else " "
+        box.left_col = line_length
+
+        margin = math.floor(box.width / 2 - len(box.label) / 2) * " "
+        content = PADDING + box.text + PADDING
+        box.repr_col = line_length + len(margin) + len(PADDING) + math.ceil(len(box.label) / 2)
+        line += [margin, content]
+        line_length += len(margin) + len(content)
+
+        edges += math.ceil(line_length - len(edges) - len(content) / 2 - 1) * edge_char
+        edges.append(_get_vertical_char(box))
+
+        line.append(margin)
+        line_length += len(margin)
+
+        # the last child joins the edge to its parent, which crosses its siblings' edges
+        if box.parent is not None and box is box.parent.children[-1] and len(box.parent.children) > 1:
+            repr_col = box.parent.repr_col
+            if repr_col < len(edges) and edges[repr_col] == LINE_VERTICAL:
+                connector_char = LINE_CROSS
+            else:
+                connector_char = LINE_VERTICAL_UPWARDS
+            edges[repr_col - 1:repr_col + 1] = [connector_char]
 
-    def _update_line_and_edge_line(self, edges_line, line, node, prev_node, print_scope, print_type):
-        edge_char = LINE_HORIZONTAL if prev_node and prev_node.parent == node.parent else " "
+        prev_box = box
 
-        node.left_col = len(line)
+    return "".join(line), "".join(edges)
 
-        line += math.floor(node.get_string_width() / 2 - len(repr(node.content)) / 2) * " "
-        node.repr_col = len(line) + len(PADDING) + math.ceil(len(repr(node.content)) / 2)
-        scope = " " + str(node.scope) if print_scope and hasattr(node, "scope") else ""
-        node_type = ": " + str(node.type) if print_type and hasattr(node, "type") else ""
-        content = PADDING + repr(node.content) + scope + node_type + PADDING
-        line += content
 
-        edges_line += math.ceil(len(line) - len(edges_line) - len(content) / 2 - 1) * edge_char
-        edges_line += self._get_vertical_char(node)
+def _get_vertical_char(box: _Box):
+    if box.parent is None:
+        return LINE_VERTICAL
 
-        line += math.floor(node.get_string_width() / 2 - len(repr(node.content)) / 2) * " "
-        node.right_col = len(line)
-        edges_line = self._draw_link_to_parent(edges_line, node)
+    if len(box.parent.children) == 1:
+        return LINE_VERT_ONLY
+    elif box is box.parent.children[0]:
+        return LINE_VERT_LEFTMOST
+    elif box is box.parent.children[-1]:
+        return LINE_VERT_RIGHTMOST
 
-        return edges_line, line
+    return LINE_VERTICAL
 
-    def _draw_link_to_parent(self, edges_line, node):
-        if node.parent and node == node.parent.children[-1] and len(node.parent.children) > 1:
-            if node.parent.repr_col < len(edges_line) and edges_line[node.parent.repr_col] == LINE_VERTICAL:
-                connector_char = LINE_CROSS
-            else:
-                connector_char = LINE_VERTICAL_UPWARDS
-            edges_line = edges_line[0:node.parent.repr_col - 1] + connector_char \
-                + edges_line[node.parent.repr_col + 1:]
 
-        return edges_line
+# depth is how deeply nested this call is in calls to itself
+def find_expansion(lhs: NonTerminal, next_token, expansions, depth=1) -> Union[bool, str, Expansion]:
+    if metrics.enabled:
+        metrics.increment("find_expansion_calls")
+        metrics.record_max("find_expansion_max_depth", depth)
 
-    def _get_vertical_char(self, node):
-        if not node.parent:
-            return LINE_VERTICAL
+    can_be_empty = False
+    for expansion in expansions[lhs]:
+        if expansion.rhs is None:
+            return "ε"
 
-        if len(node.parent.children) == 1:
-            return LINE_VERT_ONLY
-        elif node == node.parent.children[0]:
-            return LINE_VERT_LEFTMOST
-        elif node == node.parent.children[-1]:
-            return LINE_VERT_RIGHTMOST
+        # the expansion can start with any symbol up to and including the first which cannot be left out
+        for symbol in expansion.rhs:
+            if isinstance(symbol, Terminal) and symbol.token.name == next_token.name:
+                return expansion
 
-        return LINE_VERTICAL
+            if isinstance(symbol, NonTerminal) and find_expansion(symbol, next_token, expansions, depth + 1):
+                return expansion
 
-    def get_children_breadth_first(self):
-        visited = []
-        queue = [self]
+            if not symbol.is_optional():
+                break
+        else:
+            can_be_empty = True  # every symbol can be left out, so it may be that none of them are there
 
-        while queue:
-            node = queue.pop(0)
-            if node not in visited:
-                visited.append(node)
-                queue.extend(node.children)
+    return "ε" if can_be_empty else False
 
-        return visited
 
-    def get_string_width(self):
-        children_width = sum([c.get_string_width() for c in self.children])
+# the expansion a non terminal takes if the next token is this one, or None if it expands to nothing, or is optional
+# and cannot start with the token
+def _get_expansion(symbol: NonTerminal, token: Token, expansions, is_optional) -> Union[Expansion, None]:
+    expansion = find_expansion(symbol, token, expansions)
+    if not expansion and not is_optional:
+        nonterminal_str = repr(symbol).replace("_", " ")
+        raise ParseError(f"expected a valid {nonterminal_str}, got '{repr(token).lower()}'",
+                         token.line_num, token.col_num, token.context_line)
+    if not isinstance(expansion, Expansion):
+        return None
+    return expansion
 
-        return max(len(repr(self.content)), children_width) + len(PADDING) * 2
 
+# move the frame on from the symbol which has just been parsed, staying on it if it can be repeated
+def _move_past(frame):
+    symbol = frame[1][frame[2]]
+    if symbol.is_repeated():
+        frame[3] += 1
+    else:
+        frame[2:] = [frame[2] + 1, 0]
 
-def find_expansion(lhs: NonTerminal, next_token, expansions) -> Union[bool, str, Expansion]:
-    for expansion in expansions[lhs]:
-        if expansion.rhs is None:
-            return "ε"
 
-        if isinstance(expansion.rhs[0], Terminal) and expansion.rhs[0].token.name == next_token.name:
-            return expansion
+# recover from an error at position in the innermost list of statements, returning the position to carry on parsing
+# from, or None if the error is not in a statement
+def _recover(stack, tokens: List[Token], position) -> Union[int, None]:
+    if position == len(tokens):
+        return None
 
-        if isinstance(expansion.rhs[0], NonTerminal) and find_expansion(expansion.rhs[0], next_token, expansions):
-            return expansion
+    for depth in range(len(stack) - 1, -1, -1):
+        statements_index = _get_statements_index(stack[depth])
+        if statements_index is not None:
+            break
+    else:
+        return None
 
-    return False
+    # the list has had a statement, even if it was the one dropped, so it can end at the next END
+    stack[depth][2:] = [statements_index, 1]
+    node = stack[depth][0]
+    is_in_statement = depth < len(stack) - 1
+    # an error node is left in place of what is dropped, so that later phases can tell a procedure has an error in it
+    if is_in_statement:
+        statement = node.children.pop()
+        if not _salvage_assignment(statement, node) and not _salvage_definition(statement, node):
+            node.children.append(ParseTreeNode(NonTerminal("error"), node))
+        del stack[depth + 1:]
+    else:
+        node.children.append(ParseTreeNode(NonTerminal("error"), node))
+        if tokens[position].name != "END":
+            position += 1  # the token cannot start a statement here, eg a procedure inside a procedure
+
+    # skip to after the next semicolon, or to the next END or statement keyword, skipping over any blocks whole
+    num_open_blocks = 0
+    while position < len(tokens):
+        name = tokens[position].name
+        if num_open_blocks == 0 and (name == "END" or name in STATEMENT_KEYWORDS):
+            break
+        position += 1
+        if name == "BEGIN":
+            num_open_blocks += 1
+        elif name == "END":
+            num_open_blocks -= 1
+        elif name == ";" and num_open_blocks == 0:
+            break
+    return position
+
+
+# the index of the list of statements a frame is on, or has just finished because the next token cannot start a
+# statement, or None if it is not on one
+def _get_statements_index(frame) -> Union[int, None]:
+    _, rhs, index, _ = frame
+    for statements_index in [index, index - 1]:
+        if 0 <= statements_index < len(rhs) and isinstance(rhs[statements_index], NonTerminal) \
+                and rhs[statements_index].name in STATEMENTS:
+            return statements_index
+    return None
+
+
+# a declaration or assignment which is dropped because of an error after the name of its variable is kept, with an
+# error node for its value, so that later uses of the variable are not errors as well
+# returns true iff the statement was kept
+def _salvage_assignment(statement: ParseTreeNode, parent: ParseTreeNode):
+    if not statement.children or not statement.children[0].is_in(["v", "a"]):
+        return False
+    assignment = statement.children[0]
+    num_kept = 2 if assignment.is_non_terminal("v") else 1
+    if len(assignment.children) < num_kept or not assignment.children[num_kept - 1].is_terminal("ID"):
+        return False
+
+    del assignment.children[num_kept:]
+    assignment.children.append(ParseTreeNode(NonTerminal("error"), assignment))
+    parent.children.append(statement)
+    return True
+
+
+# likewise, a procedure definition with an error after its name is kept, with an error node in place of its
+# parameters and body, so that calls to it are not errors as well
+def _salvage_definition(statement: ParseTreeNode, parent: ParseTreeNode):
+    if not statement.children or not statement.children[0].is_non_terminal("function_definition"):
+        return False
+    definition = statement.children[0]
+    if len(definition.children) < 2:
+        return False
+
+    del definition.children[2:]
+    definition.children.append(ParseTreeNode(NonTerminal("error"), definition))
+    parent.children.append(statement)
+    return True
+
+
+def _get_eof_error(symbol, prev_token: Union[Token, None]):
+    if prev_token:
+        line_num = prev_token.line_num
+        col_num = len(prev_token.context_line.rstrip())
+        context_line = prev_token.context_line
+    else:
+        # the file was empty
+        line_num, col_num, context_line = 0, 0, "<No content to parse>"
+    return ParseError(f"expected '{repr(symbol).lower()}', got END OF FILE", line_num, col_num, context_line)
 
 
 def parse_file(filename, expansions):
@@ -327,8 +526,8 @@ def parse_string(str_to_parse, expansions):
     return syntax_analyse(lex(str_to_parse), expansions)
 
 
-def syntax_analyse(tokens: List[Token], expansions: Dict[NonTerminal, List[Expansion]]):
+def syntax_analyse(tokens: List[Token], expansions: Dict[NonTerminal, List[Expansion]], errors: ErrorLog = None):
     root = ParseTreeNode(NonTerminal("p"))
-    root.parse_tokens(tokens, expansions)
+    root.parse_tokens(tokens, expansions, errors)
 
     return root
@@ -0,0 +1,201 @@
+"""Generates valid Oreo programs of a given size and shape, for benchmarking the compiler
+
+Usage: python3 synthetic.py [--statements N] [--nesting-depth N] [--expression-length N] [--procedures N]
+                            [--variables N] [--seed N]
+"""
+
+import argparse
+import random
+from typing import List
+
+INDENT = "    "
+# (operator, weight) for the binary operators used between the terms of an expression
+# multiplication is only ever by a small constant, as multiplying variables together in loops makes their values
+# grow exponentially
+ARITHMETIC_OPERATORS = [("+", 4), ("-", 3)]
+COMPARISON_OPERATORS = ["<", ">", "==", "<=", ">="]
+
+
+# the size and shape of a generated program
+# - statements: roughly how many statements the main program has, counting the ones nested inside ifs and whiles
+# - nesting_depth: how deeply ifs and whiles are nested; the first statement is always nested this deep
+# - expression_length: how many terms each expression has
+# - procedures: how many procedures are defined, each of which may call the ones before it
+# - variables: how many variables the main program declares up front
+class ProgramShape:
+    def __init__(self, statements=20, nesting_depth=2, expression_length=4, procedures=0, variables=5, seed=0):
+        self.statements = statements
+        self.nesting_depth = nesting_depth
+        self.expression_length = expression_length
+        self.procedures = procedures
+        self.variables = variables
+        self.seed = seed
+
+
+# an Oreo program with the given shape, which passes semantic analysis and type checking
+# every value is a number, so that types always agree, every variable is declared and assigned before it is used,
+# and divisions are only by non zero constants. Every loop runs exactly twice, so programs always terminate, but
+# the running time is exponential in the nesting depth of whiles. Nothing is read from the input
+# the same shape always gives the same program
+def generate_program(shape: ProgramShape, name="synthetic") -> str:
+    return _ProgramGenerator(shape).generate(name)
+
+
+class _ProgramGenerator:
+    def __init__(self, shape: ProgramShape):
+        self.shape = shape
+        self.random = random.Random(shape.seed)
+        self.lines: List[str] = []
+        self.depth = 1
+        self.procedures: List[str] = []  # names of the procedures defined so far
+        self.parameter_counts = {}
+        self.num_names = 0
+
+    def generate(self, name):
+        self.lines = [f"program {name}", "begin"]
+        for _ in range(self.shape.procedures):
+            self._generate_procedure()
+
+        variables = []
+        for _ in range(self.shape.variables):
+            variable = self._new_name("v")
+            self._emit(f"var {variable} := {self._expression(variables or ['1'])};")
+            variables.append(variable)
+        variables = variables or [self._declare_variable("v", [])]
+
+        remaining = self.shape.statements
+        if remaining > 0 and self.shape.nesting_depth > 0:
+            remaining -= self._generate_nested(variables, self.shape.nesting_depth, remaining)
+        while remaining > 0:
+            remaining -= self._generate_statement(variables, remaining)
+
+        self.lines.append("end")
+        return "\n".join(self.lines) + "\n"
+
+    def _generate_procedure(self):
+        name = self._new_name("p")
+        parameters = [self._new_name("a") for _ in range(self.random.randint(1, 3))]
+        self._emit(f"procedure {name}({', '.join('num ' + p for p in parameters)}) begin")
+        self.depth += 1
+
+        # procedures can only see their own parameters and locals
+        names = list(parameters)
+        names.append(self._declare_variable("l", names))
+        for _ in range(self.random.randint(1, 4)):
+            self._generate_statement(names, 1, allow_calls=True)
+        self._emit(f"return {self._expression(names)};")
+
+        self.depth -= 1
+        self._emit("end")
+        self.procedures.append(name)
+        self.parameter_counts[name] = len(parameters)
+
+    # returns the number of statements generated, which is at most budget
+    def _generate_statement(self, variables, budget, allow_calls=True) -> int:
+        kind = self.random.choices(["assign", "print", "if", "while", "declare"], [6, 2, 2, 1, 1])[0]
+        if kind in ["if", "while"] and budget > 1 and self.depth <= self.shape.nesting_depth:
+            return self._generate_nested(variables, 1, budget, kind)
+
+        if kind == "print":
+            self._emit(f"println {self._expression(variables, allow_calls)};")
+        elif kind == "declare":
+            variables.append(self._declare_variable("v", variables))
+        else:
+            target = self.random.choice(variables)
+            self._emit(f"{target} := {self._expression(variables, allow_calls)};")
+        return 1
+
+    # an if or while, with another one nested inside it and so on, depth deep
+    # returns the number of statements generated, which is at most budget unless the budget is too small for an if
+    # and the statement inside it
+    def _generate_nested(self, variables, depth, budget, kind=None) -> int:
+        kind = kind or self.random.choice(["if", "while"])
+        condition = self._condition(variables)
+        generated = 1
+        counter = None
+        if kind == "while":
+            counter = self._new_name("c")
+            self._emit(f"var {counter} := 0;")
+            condition = f"{counter} < 2"
+            generated += 1
+
+        self._emit(f"{kind} ({condition})" + (" then" if kind == "if" else ""))
+        self._emit("begin")
+        self.depth += 1
+        inner = list(variables)  # variables declared inside the block cannot be used after it
+        body_start = len(self.lines)
+        if depth > 1 and budget - generated > 1:
+            generated += self._generate_nested(inner, depth - 1, budget - generated)
+        # a block must have at least one statement in it, even if that goes over the budget
+        body_size = self.random.randint(1, 3)
+        while body_size > 0 and (generated < budget or (len(self.lines) == body_start and counter is None)):
+            generated += self._generate_statement(inner, min(body_size, budget - generated))
+            body_size -= 1
+        if counter is not None:
+            self._emit(f"{counter} := {counter} + 1;")
+        self.depth -= 1
+
+        if kind == "if" and self.random.random() < 0.5 and generated < budget:
+            self._emit("end")
+            self._emit("else")
+            self._emit("begin")
+            self.depth += 1
+            generated += self._generate_statement(list(variables), 1)
+            self.depth -= 1
+        self._emit("end;")
+
+        return generated
+
+    def _declare_variable(self, prefix, variables) -> str:
+        variable = self._new_name(prefix)
+        self._emit(f"var {variable} := {self._expression(variables or ['1'])};")
+        return variable
+
+    def _expression(self, variables, allow_calls=True) -> str:
+        terms = [self._term(variables, allow_calls) for _ in range(max(1, self.shape.expression_length))]
+        expression = terms[0]
+        for term in terms[1:]:
+            operator = self.random.choices([o for o, _ in ARITHMETIC_OPERATORS],
+                                           [w for _, w in ARITHMETIC_OPERATORS])[0]
+            expression += f" {operator} {term}"
+        return expression
+
+    def _term(self, variables, allow_calls) -> str:
+        choice = self.random.random()
+        if allow_calls and self.procedures and choice < 0.1:
+            procedure = self.random.choice(self.procedures)
+            arguments = [self._term(variables, False) for _ in range(self.parameter_counts[procedure])]
+            return f"{procedure}({', '.join(arguments)})"
+        if choice < 0.2:
+            return f"({self.random.choice(variables)} {self.random.choice('*/')} {self.random.randint(1, 9)})"
+        if choice < 0.5:
+            return str(self.random.randint(0, 99))
+        return self.random.choice(variables)
+
+    def _condition(self, variables) -> str:
+        operator = self.random.choice(COMPARISON_OPERATORS)
+        condition = f"{self._term(variables, False)} {operator} {self._term(variables, False)}"
+        if self.random.random() < 0.2:
+            # and binds looser than comparison in the grammar, so the comparisons need brackets
+            other = f"{self._term(variables, False)} {self.random.choice(COMPARISON_OPERATORS)} " \
+                    f"{self._term(variables, False)}"
+            condition = f"({condition}) {self.random.choice(['and', 'or'])} ({other})"
+        return condition
+
+    def _new_name(self, prefix) -> str:
+        self.num_names += 1
+        return f"{prefix}{self.num_names}"
+
+    def _emit(self, line):
+        self.lines.append(INDENT * self.depth + line)
+
+
+if __name__ == "__main__":
+    defaults = ProgramShape()
+    parser = argparse.ArgumentParser(description="Print a synthetic Oreo program of the given shape")
+    for option in ["statements", "nesting_depth", "expression_length", "procedures", "variables", "seed"]:
+        parser.add_argument("--" + option.replace("_", "-"), type=int, default=getattr(defaults, option))
+    args = parser.parse_args()
+
+    print(generate_program(ProgramShape(args.statements, args.nesting_depth, args.expression_length,
+                                        args.procedures, args.variables, args.seed)), end="")
@@ -1,8 +1,16 @@
-from typing import Union, List
+import copy
+import re
+from typing import Dict, Union, List
 
-from syntaxanalyser import ParseTreeNode
+import metrics
+from parseerror import ParseError
+from session import CompilationSession
+from syntaxanalyser import ParseTreeNode, Terminal
+from typechecker import get_argument_nodes
 
 IF_FALSE_GOTO = "IfFalseGoto"
+# only produced by optimisations, which invert branches so that the common path falls through
+IF_TRUE_GOTO = "IfTrueGoto"
 
 # TAC doesn't have booleans
 TRUE_TAC = 1
@@ -22,7 +30,8 @@ binary_ops = {
 }
 unary_ops = {
     "NOT": "not",
-    IF_FALSE_GOTO: IF_FALSE_GOTO
+    IF_FALSE_GOTO: IF_FALSE_GOTO,
+    IF_TRUE_GOTO: IF_TRUE_GOTO
 }
 no_operands = {
     "Goto": "Goto",
@@ -31,22 +40,60 @@ no_operands = {
     "PRINTLN": "PrintStringLn"
 }
 
+# Calling convention:
+# - the caller evaluates the arguments left to right, then pushes them right to left with PushParam, so the first
+#   argument ends up on top of the parameter stack
+# - LCall jumps to the procedure's label. If the call is part of an expression, the value given to Return is
+#   stored in the LCall's result variable
+# - the callee starts with BeginFunc n, which reserves n bytes for its local variables and temporaries. Its i-th
+#   parameter is the i-th value down from the top of the parameter stack
+# - Return (or reaching EndFunc, which returns no value) goes back to the caller, which then removes its arguments
+#   with PopParams n, where n is the number of bytes it pushed
+# every value, whether a number, string or boolean, takes up one slot of SLOT_SIZE bytes
+SLOT_SIZE = 8
+# numbers are signed 64 bit integers, as in the C runtime, so arithmetic wraps round when it overflows, and so do
+# number literals too big to fit
+INT_MIN = -(1 << 63)
+INT_MAX = (1 << 63) - 1
+procedure_ops = {
+    "BeginFunc": "BeginFunc",
+    "EndFunc": "EndFunc",
+    "PushParam": "PushParam",
+    "PopParams": "PopParams",
+    "LCall": "LCall",
+    "Return": "Return"
+}
+
+# ops which only compute a value from their operands, so can be freely moved or removed by the optimiser
+PURE_OPS = ["copy", "not"] + list(binary_ops.values())
+JUMP_OPS = ["Goto", IF_FALSE_GOTO, IF_TRUE_GOTO]
+CONDITIONAL_JUMP_OPS = [IF_FALSE_GOTO, IF_TRUE_GOTO]
+# ops after which control does not carry on to the next instruction
+RETURN_OPS = ["Return", "EndFunc"]
+
 COMBINER_OPERATORS = ["+", "-", "/", "*", "AND", "OR", "relative_operator", "simple_expr"]
 COMBINERS = ["and_or_b", "mul_div", "add_sub", "comp_e"]
 COMBINER_OPERANDS = ["bool", "term", "factor", "TRUE", "FALSE", "simple_expr", "compare_expr", "expression"]
 
 
 class TacProgram:
-    def __init__(self, parse_tree: ParseTreeNode):
-        Label.auto_increment = 0
-        TacVariable.auto_increment = 0
-
+    def __init__(self, parse_tree: ParseTreeNode, session: CompilationSession = None):
+        self.session = session or CompilationSession()
         self.program: List[Union[Label, TacInstruction]] = []
         self.variables: List[TacVariable] = []
+        self.procedures: List[TacProcedure] = []
+        self.allocation = None  # set by regalloc.allocate_temporaries, and thrown away when the code changes
         self.oreo_to_tac(parse_tree)
 
     def __repr__(self):
-        return "\n".join([self.instruction_str(i) for i in self.program])
+        return "\n".join([self.instruction_str(i) for i in self.program] + [repr(p) for p in self.procedures])
+
+    # the main program and each procedure, which all have their own code in a .program list
+    def get_code_units(self):
+        return [self] + self.procedures
+
+    def get_procedure(self, name):
+        return next((p for p in self.procedures if p.name == name), None)
 
     # pretty print with tabs
     def instruction_str(self, instruction):
@@ -56,12 +103,15 @@ class TacProgram:
             return f"\t{instruction}"
 
     # return an unused, unique variable name
-    def _new_variable(self):
-        var = TacVariable()
+    def new_variable(self):
+        var = TacVariable(session=self.session)
         self.variables.append(var)
 
         return var
 
+    def new_label(self, tag, position=None):
+        return Label(tag, self.session, position)
+
     # appends instructions and labels to self.program
     # also adds a result property to the node
     def oreo_to_tac(self, node: ParseTreeNode):
@@ -82,13 +132,19 @@ class TacProgram:
             self._compile_while_statement(node)
             return
 
+        # procedures are compiled separately from the code around them
+        elif node.is_non_terminal("function_definition"):
+            self._compile_function_definition(node)
+            node.result = "NULL RESULT"
+            return
+
         for child in node.children:
             self.oreo_to_tac(child)
 
         if node.is_terminal("NUMBER") or node.is_terminal("STRING"):
             literal = node.content.token.attribute
             if node.is_terminal("NUMBER"):
-                literal = int(literal)
+                literal = wrap(int(literal))
             node.result = NodeResult(literal=literal)
 
         elif node.is_terminal("TRUE") or node.is_terminal("FALSE"):
@@ -111,7 +167,15 @@ class TacProgram:
             self._compile_assignment(node.get_child("ID"), node.get_child("var_assign").get_child("expression"))
 
         elif node.is_non_terminal("pr"):
-            node.result = self._compile_print_expression(node)
+            get_result = self._compile_print_expression(node)
+            if get_result is not None:
+                node.result = get_result
+
+        elif node.is_non_terminal("function_call"):
+            self._compile_procedure_call(node, returns_value=False)
+
+        elif node.is_non_terminal("return_statement"):
+            self._compile_return_statement(node)
 
         if hasattr(node, "result"):
             assert isinstance(node.result, NodeResult)
@@ -120,19 +184,26 @@ class TacProgram:
 
     def _compile_print_expression(self, node: ParseTreeNode):
         if node.has_child("GET"):
+            # read a line of input into the variable
             return self._add_instruction(
+                result_var=TacVariable(node.get_child("ID").get_terminal_attribute()),
                 op="GET"
             )
         else:
+            expression = node.get_child("expression")
             self._add_instruction(
-                result_var=node.get_child("expression").result,
-                op=node.get_a_child(["PRINT", "PRINTLN"]).content.token.name
+                arg1=expression.result,
+                op=node.get_a_child(["PRINT", "PRINTLN"]).content.token.name,
+                no_result=True
             )
-            return "NULL RESULT"
+            # TAC values are untyped, but native backends need to know how to print them
+            self.program[-1].value_type = getattr(expression, "type", None)
+            return None
 
     def _compile_while_statement(self, node: ParseTreeNode):
-        while_start_label = Label("while_start")
-        end_while_label = Label("while_end")
+        position = _get_position(node)
+        while_start_label = self.new_label("while_start", position)
+        end_while_label = self.new_label("while_end", position)
 
         self.program.append(while_start_label)
 
@@ -145,7 +216,8 @@ class TacProgram:
         self._add_instruction(
             arg1=condition_node.result,
             op=IF_FALSE_GOTO,
-            result_var=end_while_label
+            result_var=end_while_label,
+            position=position
         )
 
         # the condition held, so execute the loop body
@@ -160,21 +232,23 @@ class TacProgram:
         condition_node = node.get_child("bool")
         self.oreo_to_tac(condition_node)
 
-        condition_is_false_label = Label('if_false')
+        position = _get_position(node)
+        condition_is_false_label = self.new_label("if_false", position)
 
         # IfZ a Goto L1;
         # > result=L1 op=IfFalseGoto, arg1=a
         self._add_instruction(
             arg1=condition_node.result,
             op=IF_FALSE_GOTO,
-            result_var=condition_is_false_label
+            result_var=condition_is_false_label,
+            position=position
         )
 
         # the if statement was true
         self.oreo_to_tac(node.get_child("compound"))
 
         if node.has_child("optional_else"):
-            end_of_else_block_label = Label('else_end')
+            end_of_else_block_label = self.new_label("else_end", position)
 
             # if condition held, skip the else block
             self._add_goto_instruction(end_of_else_block_label)
@@ -188,6 +262,47 @@ class TacProgram:
             # there's no else block: if condition doesn't hold, just jump down here
             self.program.append(condition_is_false_label)
 
+    def _compile_function_definition(self, node: ParseTreeNode):
+        procedure = TacProcedure(node.get_child("ID_PAREN").get_terminal_attribute()[:-1],
+                                 [TacVariable(n.get_terminal_attribute()) for n in _get_parameter_nodes(node)], self)
+        self.procedures.append(procedure)  # added before compiling the body, so that it can call itself
+
+        main_program = self.program
+        self.program = procedure.program
+        self._add_instruction(op="BeginFunc", arg1="0", no_result=True)
+        self.oreo_to_tac(node.get_child("function_compound"))
+        self._add_instruction(op="EndFunc", no_result=True)
+        self.program = main_program
+
+        # the procedure's scope holds its parameters and every local variable declared in it
+        procedure.set_frame_size(len(node.get_child("function_compound").scope.vars) - len(procedure.parameters))
+
+    # node is either a function_call statement, or a factor which calls a procedure
+    def _compile_procedure_call(self, node: ParseTreeNode, returns_value):
+        id_paren = node.get_child("ID_PAREN")
+        procedure = self.get_procedure(id_paren.get_terminal_attribute()[:-1])
+        arguments = get_argument_nodes(node)
+
+        token = id_paren.content.token
+        if procedure is None:
+            raise ParseError(f"Call to undeclared procedure", token.line_num, token.col_num, token.context_line)
+
+        for argument in reversed(arguments):
+            self._add_instruction(op="PushParam", arg1=argument.result, no_result=True)
+
+        result = self._add_instruction(op="LCall", arg1=procedure.label, no_result=not returns_value,
+                                       position=(token.line_num, token.col_num))
+
+        if arguments:
+            self._add_instruction(op="PopParams", arg1=str(len(arguments) * SLOT_SIZE), no_result=True)
+
+        return result
+
+    def _compile_return_statement(self, node: ParseTreeNode):
+        optional_expr = node.get_child("optional_expr", optional=True)
+        value = optional_expr.get_child("expression").result if optional_expr else None
+        self._add_instruction(op="Return", arg1=value, no_result=True)
+
     def _add_goto_instruction(self, label):
         self._add_instruction(
             op="Goto",
@@ -241,7 +356,7 @@ class TacProgram:
         combiners = COMBINERS if specific_combiners is None else specific_combiners
 
         if node.has_child("ID_PAREN"):  # for factor
-            raise NotImplementedError
+            return self._compile_procedure_call(node, returns_value=True)
 
         elif node.has_child("NOT"):  # for bool
             return self._add_instruction(op="NOT", arg1=node.get_child("bool").result)
@@ -310,22 +425,67 @@ class TacProgram:
                 arg2=equality
             )
 
-    def _add_instruction(self, result_var=None, op=None, arg1=None, arg2=None):
+    # no_result is for instructions which do not produce a value, so do not need a result variable
+    # position is the (line, column) in the source of the statement the instruction comes from, which profiles
+    # are keyed by
+    def _add_instruction(self, result_var=None, op=None, arg1=None, arg2=None, no_result=False, position=None):
         if isinstance(arg1, NodeResult):
             arg1 = arg1.get()
         if isinstance(arg2, NodeResult):
             arg2 = arg2.get()
 
-        if result_var is None:
-            result_var = self._new_variable()
+        if result_var is None and not no_result:
+            result_var = self.new_variable()
+        if metrics.enabled:
+            metrics.increment("tac_instructions_emitted")
         self.program.append(TacInstruction(
             result_var=result_var,
             op=op,
             arg1=arg1,
             arg2=arg2
         ))
+        self.program[-1].position = position
+
+        return NodeResult(variable=result_var) if result_var is not None else None
+
+
+class TacProcedure:
+    def __init__(self, name: str, parameters: List["TacVariable"], owner: TacProgram):
+        self.name = name
+        self.label = ProcedureLabel(name)
+        self.parameters = parameters
+        self.owner = owner
+        self.program: List[Union[Label, TacInstruction]] = []
+        self.num_locals = 0
+        self.frame_size = 0
+        self.allocation = None
+
+    def __repr__(self):
+        return "\n".join([repr(self.label) + ":"] + [self.owner.instruction_str(i) for i in self.program])
+
+    @property
+    def session(self):
+        return self.owner.session
 
-        return NodeResult(variable=result_var)
+    def new_variable(self):
+        return self.owner.new_variable()
+
+    def new_label(self, tag, position=None):
+        return self.owner.new_label(tag, position)
+
+    # the temporaries used in this procedure's code
+    def get_temporaries(self):
+        return {repr(v) for i in self.program if isinstance(i, TacInstruction)
+                for v in i.get_used_variables() + [i.get_defined_variable()] if v is not None and not v.is_named}
+
+    # the frame holds a slot for every local variable and temporary, but not the parameters, which the caller
+    # pushed onto the parameter stack
+    def set_frame_size(self, num_locals, num_temporaries=None):
+        if num_temporaries is None:
+            num_temporaries = len(self.get_temporaries())
+        self.num_locals = num_locals
+        self.frame_size = (self.num_locals + num_temporaries) * SLOT_SIZE
+        self.program[0].arg1 = str(self.frame_size)
 
 
 class NodeResult:
@@ -353,28 +513,34 @@ class NodeResult:
             return self.variable
 
 
+# labels are numbered by the session of the program they belong to
 class Label:
-    auto_increment = 0
-
-    def __init__(self, tag):
-        Label.auto_increment += 1
-        self.name = f"L{str(Label.auto_increment)}_{tag}"
+    def __init__(self, tag, session: CompilationSession, position=None):
+        self.tag = tag
+        self.name = f"L{session.next_label_number()}_{tag}"
+        self.position = position  # (line, column) of the statement the label belongs to, if any
 
     def __repr__(self):
         return self.name
 
 
-class TacVariable:
-    auto_increment = 0
+# procedures are called by name, so their labels are not numbered
+class ProcedureLabel(Label):
+    def __init__(self, procedure_name):
+        self.tag = procedure_name
+        self.name = f"_{procedure_name}"
+        self.position = None
+
 
-    def __init__(self, name=None):
+# a user variable if it has a name, or else a temporary, numbered by the session of the program it belongs to
+class TacVariable:
+    def __init__(self, name=None, session: CompilationSession = None):
         if name is not None:
             self.name = name
             self.is_named = True
         else:
             self.is_named = False
-            TacVariable.auto_increment += 1
-            self.name = str(TacVariable.auto_increment)
+            self.name = str(session.next_temporary_number())
 
     def set_name(self, new_name):
         self.name = new_name
@@ -406,6 +572,8 @@ class TacInstruction:
         self.arg1 = arg1
         self.arg2 = arg2
         self.op = self.get_tac_op(op)
+        self.value_type = None  # the type checker's type of the value printed, for PrintString and PrintStringLn
+        self.position = None  # (line, column) of the source statement, for branches and calls
 
     def __repr__(self):
         if self.op == "copy":
@@ -414,12 +582,28 @@ class TacInstruction:
         if self.op == IF_FALSE_GOTO:
             return f"IfZ {self.arg1} Goto {self.result_var};"
 
+        if self.op == IF_TRUE_GOTO:
+            return f"IfNZ {self.arg1} Goto {self.result_var};"
+
         if self.op == "Goto":
             return f"Goto {self.result_var};"
 
         if self.op in unary_ops.values():
             return f"{self.result_var} = {self.op} {self.arg1};"
 
+        if self.op == no_operands["GET"]:
+            return f"{self.result_var} = {self.op};"
+
+        if self.op in no_operands.values():
+            return f"{self.op} {self.arg1};"
+
+        if self.op == "LCall" and self.result_var is not None:
+            return f"{self.result_var} = LCall {self.arg1};"
+
+        if self.op in procedure_ops.values():
+            operand = "" if self.arg1 is None else f" {self.arg1}"
+            return f"{self.op}{operand};"
+
         if self.op in binary_ops.values():
             return f"{self.result_var} = {self.arg1} {self.op} {self.arg2};"
 
@@ -429,6 +613,12 @@ class TacInstruction:
         if oreo_op == "Goto":
             return oreo_op
 
+        if oreo_op in procedure_ops.keys():
+            return procedure_ops[oreo_op]
+
+        if oreo_op in no_operands.keys():
+            return no_operands[oreo_op]
+
         if oreo_op == "copy":
             assert self.arg2 is None
             return "copy"
@@ -443,10 +633,105 @@ class TacInstruction:
 
         raise ValueError(f"Unrecognised operator {oreo_op}")
 
+    # a shallow copy, which shares operands with the original
+    def copy(self):
+        return copy.copy(self)
+
+    def is_jump(self):
+        return self.op in JUMP_OPS
+
+    # true iff control never carries on to the next instruction after this one
+    def is_terminator(self):
+        return self.is_jump() or self.op in RETURN_OPS
+
+    def is_conditional_jump(self):
+        return self.op in CONDITIONAL_JUMP_OPS
+
+    # swap IfZ for IfNZ and vice versa, jumping to target instead
+    def invert_condition(self, target: "Label"):
+        assert self.is_conditional_jump()
+        self.op = IF_TRUE_GOTO if self.op == IF_FALSE_GOTO else IF_FALSE_GOTO
+        self.result_var = target
+
+    def get_jump_target(self) -> Union[Label, None]:
+        return self.result_var if self.is_jump() else None
+
+    # the variable written to by this instruction, or None if it does not write one
+    def get_defined_variable(self) -> Union[TacVariable, None]:
+        if self.is_jump() or not isinstance(self.result_var, TacVariable):
+            return None
+        return self.result_var
+
+    # the variables read by this instruction
+    def get_used_variables(self) -> List[TacVariable]:
+        return [a for a in [self.arg1, self.arg2] if isinstance(a, TacVariable)]
+
+    # swap every variable this instruction reads or writes for its replacement in renamed, keyed by name
+    def rename_variables(self, renamed: Dict[str, "TacVariable"]):
+        if isinstance(self.result_var, TacVariable):
+            self.result_var = renamed.get(repr(self.result_var), self.result_var)
+        if isinstance(self.arg1, TacVariable):
+            self.arg1 = renamed.get(repr(self.arg1), self.arg1)
+        if isinstance(self.arg2, TacVariable):
+            self.arg2 = renamed.get(repr(self.arg2), self.arg2)
+
+    # swap any use of the variable old_name for new_var (the defined variable is left alone)
+    def replace_used_variable(self, old_name: str, new_var):
+        if isinstance(self.arg1, TacVariable) and repr(self.arg1) == old_name:
+            self.arg1 = new_var
+        if isinstance(self.arg2, TacVariable) and repr(self.arg2) == old_name:
+            self.arg2 = new_var
+
+    def is_pure(self):
+        return self.op in PURE_OPS
+
 
 # parse_tree should have been semantically analysed and type checked
-def compile_to_tac(parse_tree: ParseTreeNode):
-    return TacProgram(parse_tree)
+def compile_to_tac(parse_tree: ParseTreeNode, session: CompilationSession = None):
+    return TacProgram(parse_tree, session)
+
+
+# copy a list of TAC, giving each label defined in it a fresh name from the session, so the copy can sit alongside
+# the original
+# jumps to labels defined outside of code still point at the original labels
+def clone_code(code: List[Union[Label, TacInstruction]], session: CompilationSession):
+    new_labels = {item.name: Label(item.tag, session, item.position) for item in code if isinstance(item, Label)}
+    cloned = []
+    for item in code:
+        if isinstance(item, Label):
+            cloned.append(new_labels[item.name])
+        else:
+            instruction = item.copy()
+            if instruction.is_jump() and instruction.get_jump_target().name in new_labels:
+                instruction.result_var = new_labels[instruction.get_jump_target().name]
+            cloned.append(instruction)
+
+    return cloned
+
+
+# the number a result which has overflowed wraps round to
+def wrap(value: int) -> int:
+    return (value - INT_MIN) % (1 << 64) + INT_MIN
+
+
+# true iff the TAC operand is an integer literal, eg "5" or "-3"
+def is_number_literal(operand):
+    return isinstance(operand, str) and re.fullmatch(r"-?\d+", operand) is not None
+
+
+# the ID nodes of the parameters in a function_definition
+def _get_parameter_nodes(function_definition: ParseTreeNode):
+    args = function_definition.get_child("func_def_args", optional=True)
+    if args is None:
+        return []
+    return [args.get_child("ID")] + [a.get_child("ID") for a in args.children if a.is_non_terminal("later_func_def_arg")]
+
+
+# the (line, column) of the first token of the node
+def _get_position(node: ParseTreeNode):
+    while not isinstance(node.content, Terminal):
+        node = node.children[0]
+    return node.content.token.line_num, node.content.token.col_num
 
 
 def inherit_node_result(node: ParseTreeNode, child_names: List[str]):
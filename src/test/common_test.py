@@ -1,5 +1,10 @@
 import os
 
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import parse_file
+from tac import compile_to_tac
+from typechecker import type_check
+
 
 def get_data_dir():
     return os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..", "data")
@@ -7,3 +12,11 @@ def get_data_dir():
 
 def get_grammar_file():
     return os.path.join(get_data_dir(), "..", "oreo.grammar")
+
+
+# run the whole front end on a file in the data directory
+def compile_data_file(filename, expansions):
+    parse_tree = parse_file(os.path.join(get_data_dir(), filename), expansions)
+    semantic_analyse(parse_tree)
+    type_check(parse_tree)
+    return compile_to_tac(parse_tree)
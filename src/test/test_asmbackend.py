@@ -0,0 +1,99 @@
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from asmbackend import REGISTERS, asm_string_literal, build_executable, generate_assembly
+from grammarparse import parse_grammar_from_file
+from inline import inline_procedures
+from loopopt import optimise_loops
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import parse_string
+from tac import compile_to_tac
+from test.common_test import compile_data_file, get_grammar_file
+from typechecker import type_check
+from vm import run_tac
+
+
+class TestAssemblyBackend(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def compile_string(self, s):
+        parse_tree = parse_string(s, self.expansions)
+        semantic_analyse(parse_tree)
+        type_check(parse_tree)
+        return compile_to_tac(parse_tree)
+
+    def run_native(self, program, stdin=""):
+        if shutil.which("cc") is None or os.uname().machine != "x86_64":
+            self.skipTest("no x86-64 toolchain")
+
+        executable = build_executable(program, os.path.join(self.directory.name, "program"))
+        return subprocess.run([executable], input=stdin, capture_output=True, text=True)
+
+    def assert_same_as_vm(self, program, stdin=""):
+        expected = io.StringIO()
+        run_tac(program, io.StringIO(stdin), expected)
+        result = self.run_native(program, stdin)
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertEqual(expected.getvalue(), result.stdout)
+
+    def test_data_files(self):
+        for filename in ["loops.oreo", "counted_loops.oreo", "procedures.oreo", "overflow.oreo"]:
+            for optimise in [False, True]:
+                with self.subTest(filename=filename, optimise=optimise):
+                    program = compile_data_file(filename, self.expansions)
+                    if optimise:
+                        inline_procedures(program)
+                        optimise_loops(program)
+                    self.assert_same_as_vm(program)
+
+    def test_values(self):
+        program = self.compile_string("program p begin "
+                                      "var a := 7; var b := 0 - 2; var s := 'say \"hi\" \\\\'; "
+                                      "println a / b; println a < b; println not (a == 7); println s; "
+                                      "println (a < 8) and (b < 0); println 5000000000 * 3; "
+                                      "var name; get name; print name; println '!'; "
+                                      "end")
+        self.assert_same_as_vm(program, stdin="oreo\n")
+
+    def test_spilling(self):
+        expression = "a * 1 + (a * 2 + (a * 3 + (a * 4 + (a * 5 + (a * 6 + (a * 7 + a * 8))))))"
+        program = self.compile_string(f"program p begin var a := 2; println {expression}; end")
+        self.assertIn("QWORD PTR", generate_assembly(program).split("main:")[1])
+        self.assertEqual(len(REGISTERS), len([r for r in REGISTERS if f"push {r}" in generate_assembly(program)]))
+        self.assert_same_as_vm(program)
+
+    def test_stack_arguments(self):
+        for num_parameters in [7, 8]:
+            with self.subTest(num_parameters):
+                parameters = ", ".join(f"num x{i}" for i in range(num_parameters))
+                arguments = ", ".join(str(i * 10) for i in range(num_parameters))
+                body = " ".join(f"println x{i};" for i in range(num_parameters))
+                program = self.compile_string(f"program p begin procedure f({parameters}) begin {body} end "
+                                              f"f({arguments}); end")
+                self.assert_same_as_vm(program)
+
+    def test_recursion(self):
+        program = self.compile_string("program p begin "
+                                      "procedure countdown(num n) begin "
+                                      "if (n > 0) then begin print n; countdown(n - 1); end; "
+                                      "end "
+                                      "countdown(3); "
+                                      "end")
+        self.assert_same_as_vm(program)
+
+    def test_compare_and_branch(self):
+        assembly = generate_assembly(compile_data_file("loops.oreo", self.expansions))
+        self.assertIn("jge .L2_while_end", assembly)
+        self.assertNotIn("setl", assembly)
+
+    def test_string_literal(self):
+        self.assertEqual('"a\\"b\\\\c\\303\\251"', asm_string_literal('a"b\\cé'))
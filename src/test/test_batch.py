@@ -0,0 +1,83 @@
+import io
+import os
+import tempfile
+import unittest
+
+from batch import compile_batch, compile_file, find_output_names, find_source_files, format_summary, main
+from grammarparse import parse_grammar_from_file
+from test.common_test import get_data_dir, get_grammar_file
+
+FILES = ["procedures.oreo", "simple.oreo", "test9.oreo", "operations.oreo", "nested_function.oreo"]
+
+
+class TestBatch(unittest.TestCase):
+    def data_file(self, filename):
+        return os.path.join(get_data_dir(), filename)
+
+    def test_find_source_files(self):
+        filenames = find_source_files([get_data_dir()])
+        self.assertIn(self.data_file("procedures.oreo"), filenames)
+        self.assertTrue(all(f.endswith(".oreo") for f in filenames))
+        self.assertEqual(["missing.oreo"], find_source_files(["missing.oreo"]))
+
+    def test_find_output_names(self):
+        output_names = find_output_names([get_data_dir(), os.path.join("missing", "missing.oreo")])
+        self.assertEqual("procedures.oreo", output_names[self.data_file("procedures.oreo")])
+        self.assertEqual("missing.oreo", output_names[os.path.join("missing", "missing.oreo")])
+
+    def test_compile_file(self):
+        expansions = parse_grammar_from_file(get_grammar_file())
+        result = compile_file(self.data_file("procedures.oreo"), expansions, optimisation_level=2)
+        self.assertTrue(result.is_ok())
+        self.assertEqual(["lex", "parse", "semantic", "typecheck", "tac", "optimise"], list(result.times))
+
+        result = compile_file(self.data_file("test9.oreo"), expansions)
+        self.assertFalse(result.is_ok())
+        self.assertIn("error", result.error)
+
+        result = compile_file("missing.oreo", expansions)
+        self.assertIn("FileNotFoundError", result.error)
+
+        # a bug in the compiler is reported as an error in the file, rather than stopping the batch
+        result = compile_file(self.data_file("procedures.oreo"), None)
+        self.assertIn("Internal compiler error", result.error)
+
+    def test_compile_batch(self):
+        filenames = [self.data_file(f) for f in FILES]
+        for chunk_size in [1, 2]:
+            with self.subTest(chunk_size):
+                results = list(compile_batch(filenames, get_grammar_file(), jobs=2, chunk_size=chunk_size))
+                self.assertCountEqual(filenames, [r.filename for r in results])
+                failed = {os.path.basename(r.filename) for r in results if not r.is_ok()}
+                self.assertEqual({"test9.oreo", "nested_function.oreo"}, failed)
+
+        summary = format_summary(results)
+        self.assertIn(self.data_file("simple.oreo"), summary)
+        self.assertIn("2 failed", summary.splitlines()[-1])
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as directory:
+            stdout, stderr = io.StringIO(), io.StringIO()
+            status = main([self.data_file("procedures.oreo"), self.data_file("test9.oreo"), "--grammar",
+                           get_grammar_file(), "-j", "2", "--emit", "python", "--output-dir", directory],
+                          stdout, stderr)
+            self.assertEqual(1, status)
+            self.assertTrue(os.path.exists(os.path.join(directory, "procedures.py")))
+            self.assertIn(self.data_file("test9.oreo") + ":\n", stderr.getvalue())
+            self.assertIn("ok    " + self.data_file("procedures.oreo"), stdout.getvalue())
+
+    def test_main_keeps_directories(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source_dir = os.path.join(directory, "source")
+            for subdirectory in ["a", "b"]:
+                os.makedirs(os.path.join(source_dir, subdirectory))
+                with open(os.path.join(source_dir, subdirectory, "x.oreo"), "w") as file:
+                    file.write(f"program x begin println \"{subdirectory}\"; end")
+
+            output_dir = os.path.join(directory, "output")
+            status = main([source_dir, "--grammar", get_grammar_file(), "-j", "2", "--emit", "python", "--output-dir",
+                           output_dir], io.StringIO(), io.StringIO())
+            self.assertEqual(0, status)
+            for subdirectory in ["a", "b"]:
+                with open(os.path.join(output_dir, subdirectory, "x.py")) as file:
+                    self.assertIn(f"'{subdirectory}'", file.read())
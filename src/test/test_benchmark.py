@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from benchmark import PHASES, compare_to_baseline, find_superlinear_phases, fit_power_law, format_results, \
+    load_results, run_benchmarks, save_results
+from grammarparse import parse_grammar_from_file
+from test.common_test import get_grammar_file
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_fit_power_law(self):
+        coefficient, exponent = fit_power_law([1, 2, 4, 8], [3, 12, 48, 192])
+        self.assertAlmostEqual(3, coefficient)
+        self.assertAlmostEqual(2, exponent)
+
+        self.assertAlmostEqual(1, fit_power_law([10, 20, 40], [0.5, 1, 2])[1])
+        self.assertEqual((0.0, 0.0), fit_power_law([10], [1]))
+
+    def test_run_benchmarks(self):
+        results = run_benchmarks(["statements", "nesting"], [2, 4], parse_grammar_from_file(get_grammar_file()),
+                                 repeats=1)
+
+        for family in ["statements", "nesting"]:
+            result = results["families"][family]
+            self.assertEqual([2, 4], result["sizes"])
+            self.assertLess(result["tokens"][0], result["tokens"][1])
+            self.assertEqual(set(PHASES), set(result["times"]))
+            self.assertEqual(set(PHASES), set(result["exponents"]))
+        self.assertIn("exponent", format_results(results))
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "baselines", "results.json")
+            save_results(results, filename)
+            self.assertEqual(results, load_results(filename))
+
+    def test_regressions_and_scaling(self):
+        def results(parse_times):
+            return {"families": {"statements": {
+                "sizes": [10, 20, 40], "tokens": [100, 200, 400],
+                "times": {phase: parse_times if phase == "parse" else [0.001, 0.002, 0.004] for phase in PHASES},
+                "exponents": {phase: fit_power_law([100, 200, 400], parse_times if phase == "parse"
+                                                   else [0.001, 0.002, 0.004])[1] for phase in PHASES}}}}
+
+        baseline = results([0.01, 0.02, 0.04])
+        self.assertEqual([], compare_to_baseline(baseline, baseline))
+        self.assertEqual([], find_superlinear_phases(baseline))
+
+        quadratic = results([0.01, 0.04, 0.16])
+        regressions = compare_to_baseline(quadratic, baseline)
+        self.assertEqual(2, len(regressions))
+        self.assertTrue(regressions[0].startswith("statements parse at size 20"))
+        self.assertEqual([("statements", "parse")], find_superlinear_phases(quadratic))
@@ -0,0 +1,79 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from build import COMPILED, UP_TO_DATE, build_modules, find_dependencies, main
+from test.common_test import get_data_dir, get_grammar_file
+
+MODULES = ["greetings.oreo", "maths.oreo", "report.oreo"]
+
+
+class TestBuild(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        for module in MODULES:
+            shutil.copy(os.path.join(get_data_dir(), "modules", module), self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def module_file(self, filename):
+        return os.path.join(self.directory.name, filename)
+
+    def build(self, filenames):
+        results = build_modules([self.module_file(f) for f in filenames], get_grammar_file(), jobs=2)
+        return {os.path.basename(r.filename): r for r in results}
+
+    def test_find_dependencies(self):
+        dependencies = find_dependencies([self.module_file(f) for f in MODULES])
+        self.assertEqual([], dependencies[self.module_file("greetings.oreo")])
+        self.assertEqual([self.module_file("maths.oreo")], dependencies[self.module_file("report.oreo")])
+
+    def test_build_modules(self):
+        results = self.build(MODULES)
+        self.assertEqual({COMPILED}, {r.status for r in results.values()})
+        self.assertTrue(os.path.exists(self.module_file("report.oo")))
+
+        results = self.build(MODULES)
+        self.assertEqual({UP_TO_DATE}, {r.status for r in results.values()})
+
+        # a module calling a procedure which has changed is compiled again, but one which does not call it is not
+        with open(self.module_file("maths.oreo"), "a") as file:
+            file.write("procedure cube(num x) begin return x * square(x); end\n")
+        results = self.build(MODULES)
+        self.assertEqual(COMPILED, results["maths.oreo"].status)
+        self.assertEqual(UP_TO_DATE, results["report.oreo"].status)
+        with open(self.module_file("maths.oreo"), "a") as file:
+            file.write("procedure sum_to(str s) begin return 0; end\n")  # the first definition is the one used
+        self.assertEqual(UP_TO_DATE, self.build(MODULES)["report.oreo"].status)
+
+    def test_errors(self):
+        with open(self.module_file("maths.oreo"), "w") as file:
+            file.write("procedure square(num x) begin return x * \"x\"; end\n")
+        with open(self.module_file("a.oreo"), "w") as file:
+            file.write("procedure a() begin return b(); end\n")
+        with open(self.module_file("b.oreo"), "w") as file:
+            file.write("procedure b() begin return a(); end\n")
+
+        results = self.build(MODULES + ["a.oreo", "b.oreo"])
+        self.assertTrue(results["greetings.oreo"].is_ok())
+        self.assertIn("should be NUM", results["maths.oreo"].error)
+        self.assertEqual(f"Depends on {self.module_file('maths.oreo')}, which did not build",
+                         results["report.oreo"].error)
+        self.assertIn("depend on each other in a circle", results["a.oreo"].error)
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as object_dir:
+            stdout, stderr = io.StringIO(), io.StringIO()
+            status = main([self.directory.name, "--object-dir", object_dir, "--grammar", get_grammar_file()], stdout,
+                          stderr)
+            self.assertEqual(0, status)
+            self.assertEqual(["greetings.oo", "maths.oo", "report.oo"], sorted(os.listdir(object_dir)))
+            self.assertEqual("3 modules: 3 compiled, 0 up to date, 0 failed", stdout.getvalue().splitlines()[-1])
+            self.assertEqual("", stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from cbackend import build_executable, c_string_literal, generate_c
+from grammarparse import parse_grammar_from_file
+from inline import inline_procedures
+from loopopt import optimise_loops
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import parse_string
+from tac import compile_to_tac
+from test.common_test import compile_data_file, get_grammar_file
+from typechecker import type_check
+from vm import run_tac
+
+
+class TestCBackend(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def compile_string(self, s):
+        parse_tree = parse_string(s, self.expansions)
+        semantic_analyse(parse_tree)
+        type_check(parse_tree)
+        return compile_to_tac(parse_tree)
+
+    def run_native(self, program, stdin="", optimise=False):
+        if shutil.which("cc") is None:
+            self.skipTest("no C compiler")
+
+        executable = build_executable(program, os.path.join(self.directory.name, "program"), optimise)
+        return subprocess.run([executable], input=stdin, capture_output=True, text=True)
+
+    def assert_same_as_vm(self, program, stdin="", optimise=False):
+        expected = io.StringIO()
+        run_tac(program, io.StringIO(stdin), expected)
+        result = self.run_native(program, stdin, optimise)
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertEqual(expected.getvalue(), result.stdout)
+
+    def test_data_files(self):
+        for filename in ["loops.oreo", "counted_loops.oreo", "procedures.oreo", "overflow.oreo"]:
+            for optimise in [False, True]:
+                with self.subTest(filename=filename, optimise=optimise):
+                    program = compile_data_file(filename, self.expansions)
+                    if optimise:
+                        inline_procedures(program)
+                        optimise_loops(program)
+                    self.assert_same_as_vm(program, optimise=optimise)
+
+    def test_values(self):
+        program = self.compile_string("program p begin "
+                                      "var a := 7; var b := 0 - 2; var s := 'say \"hi\" \\\\ 100%'; "
+                                      "println a / b; println a < b; println not (a == 7); println s; "
+                                      "var name; get name; print name; println '!'; "
+                                      "end")
+        self.assert_same_as_vm(program, stdin="oreo\n")
+
+    def test_buffered_io(self):
+        # more output than fits in the runtime's buffer, and a line longer than its input buffer
+        program = self.compile_string("program p begin "
+                                      "var i := 0 - 20000; while (i < 20000) begin println i * 1000003; "
+                                      "i := i + 1; end; "
+                                      "var a; var b; var c; get a; get b; get c; println a; println b; println c; "
+                                      "println 0 - 9223372036854775807 - 1; "
+                                      "end")
+        self.assert_same_as_vm(program, stdin="x" * 100000 + "\nshort\nno newline")
+
+    def test_recursion(self):
+        program = self.compile_string("program p begin "
+                                      "procedure countdown(num n) begin "
+                                      "if (n > 0) then begin print n; countdown(n - 1); end; "
+                                      "end "
+                                      "countdown(3); "
+                                      "end")
+        self.assert_same_as_vm(program)
+
+    def test_division_by_zero(self):
+        program = self.compile_string("program p begin var a := 0; println 1; var b := 1 / a; end")
+        result = self.run_native(program)
+        self.assertNotEqual(0, result.returncode)
+        self.assertEqual("1\n", result.stdout)
+
+    def test_generated_code(self):
+        c = generate_c(compile_data_file("procedures.oreo", self.expansions))
+        self.assertIn("static oreo_value p_add(oreo_value v_x, oreo_value v_y);", c)
+        self.assertIn("goto L1_while_start;", c)
+        self.assertIn("v_total = p_add(v_total, t_3);", c)
+
+    def test_string_literal(self):
+        self.assertEqual('"a\\"b\\\\c\\?\\303\\251"', c_string_literal('a"b\\c?é'))
@@ -0,0 +1,36 @@
+import unittest
+
+from cfg import ControlFlowGraph
+from grammarparse import parse_grammar_from_file
+from test.common_test import compile_data_file, get_grammar_file
+
+
+class TestControlFlowGraph(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+        self.program = compile_data_file("loops.oreo", self.expansions)
+        self.cfg = ControlFlowGraph(self.program.program)
+
+    def test_round_trip(self):
+        self.assertEqual(repr(self.program), "\n".join(self.program.instruction_str(i) for i in self.cfg.to_code()))
+
+    def test_entry_dominates_everything(self):
+        dominators = self.cfg.get_dominators()
+        entry = self.cfg.blocks[0]
+        self.assertTrue(all(entry in d for d in dominators.values()))
+
+    def test_nested_loops(self):
+        loops = self.cfg.get_natural_loops()
+        self.assertEqual(3, len(loops))
+
+        outer = loops[-1]
+        inner = next(loop for loop in loops if loop is not outer and loop.header in outer.blocks)
+        self.assertTrue(inner.blocks < outer.blocks)
+        self.assertEqual([outer.header], outer.get_exiting_blocks())
+
+    def test_liveness(self):
+        live_in, live_out = self.cfg.get_live_variables()
+        self.assertEqual(set(), live_in[self.cfg.blocks[0]])
+        loop_header = self.cfg.get_natural_loops()[0].header
+        self.assertIn("v_i", live_in[loop_header])
+        self.assertIn("v_total", live_out[loop_header])
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+from compilecache import CompilationCache, get_key
+from grammarparse import parse_grammar_from_file
+from tac import TacProgram
+from test.common_test import compile_data_file, get_grammar_file
+
+
+class TestCompileCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = CompilationCache(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        key = get_key("source")
+        self.assertIsNone(self.cache.get(key, "tokens"))
+        self.assertTrue(self.cache.put(key, "tokens", ["PROGRAM", "ID(x)"]))
+        self.assertEqual(["PROGRAM", "ID(x)"], self.cache.get(key, "tokens"))
+        self.assertIsNone(self.cache.get(key, "tree"))
+
+        self.assertEqual(1, self.cache.statistics.hits["tokens"])
+        self.assertEqual(1, self.cache.statistics.misses["tokens"])
+        self.assertEqual(1, self.cache.statistics.misses["tree"])
+        self.assertEqual(1, self.cache.statistics.writes)
+
+        # another compiler sharing the directory sees the result
+        self.assertEqual(["PROGRAM", "ID(x)"], CompilationCache(self.directory.name).get(key, "tokens"))
+
+    def test_tac(self):
+        program = compile_data_file("procedures.oreo", parse_grammar_from_file(get_grammar_file()))
+        key = get_key("procedures")
+        self.cache.put(key, "tac", program)
+        loaded = self.cache.get(key, "tac")
+        self.assertIsInstance(loaded, TacProgram)
+        self.assertEqual(repr(program), repr(loaded))
+
+    def test_keys(self):
+        self.assertEqual(get_key("source", "-O1"), get_key("source", "-O1"))
+        self.assertNotEqual(get_key("source", "-O1"), get_key("source", "-O2"))
+        self.assertNotEqual(get_key("ab", "c"), get_key("a", "bc"))
+        self.assertEqual(get_key("source"), get_key(b"source"))
+
+    def test_corrupt(self):
+        key = get_key("source")
+        self.cache.put(key, "output", "print(1)")
+        path = self.cache._get_path(key, "output")
+        with open(path, "wb") as file:
+            file.write(b"not a cached result")
+
+        self.assertIsNone(self.cache.get(key, "output"))
+        self.assertEqual(1, self.cache.statistics.misses["output"])
+        self.assertFalse(os.path.exists(path))
+
+    def test_unpicklable(self):
+        self.assertFalse(self.cache.put(get_key("source"), "output", lambda: None))
+        self.assertEqual(0, self.cache.statistics.writes)
+
+    def test_eviction(self):
+        keys = [get_key(str(i)) for i in range(4)]
+        for i, key in enumerate(keys):
+            self.cache.put(key, "output", os.urandom(1000))
+            os.utime(self.cache._get_path(key, "output"), (1000 + i, 1000 + i))
+        # reading an entry makes it the most recently used
+        self.cache.get(keys[0], "output")
+
+        self.cache.max_size = 3000
+        self.cache.put(get_key("4"), "output", os.urandom(1000))
+        self.assertGreater(self.cache.statistics.evictions, 0)
+        self.assertLessEqual(self.cache._get_size(), 3000)
+        self.assertIsNotNone(self.cache.get(keys[0], "output"))
+        self.assertIsNotNone(self.cache.get(get_key("4"), "output"))
+        self.assertIsNone(self.cache.get(keys[1], "output"))
+
+    def test_clear(self):
+        self.cache.put(get_key("source"), "tokens", [])
+        self.cache.clear()
+        self.assertIsNone(self.cache.get(get_key("source"), "tokens"))
+        self.assertEqual([], [f for f in self.cache._get_files()])
@@ -0,0 +1,121 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from compileclient import main as client_main, send_request, send_requests
+from compileserver import CompileServer, compile_request
+from grammarparse import parse_grammar_from_file
+from syntaxanalyser import parse_file
+from synthetic import ProgramShape, generate_program
+from test.common_test import get_data_dir, get_grammar_file
+
+PROGRAM = """program p begin
+    var x := 1;
+    println x + 2;
+end"""
+
+
+class TestCompileRequest(unittest.TestCase):
+    def test_compile(self):
+        response = compile_request(PROGRAM, {"grammar": get_grammar_file()})
+        self.assertEqual("ok", response["status"])
+        self.assertIn("PrintStringLn", response["output"])
+        self.assertIn("parse", response["times"])
+
+        response = compile_request(PROGRAM, {"grammar": get_grammar_file(), "stop_after": "lex"})
+        self.assertTrue(response["output"].startswith("PROGRAM"))
+
+    def test_error(self):
+        response = compile_request(PROGRAM.replace("x + 2", "y"), {"grammar": get_grammar_file()})
+        self.assertEqual("error", response["status"])
+        self.assertEqual(3, response["diagnostics"][0]["line"])
+        self.assertEqual("Use of undeclared identifier y", response["diagnostics"][0]["description"])
+
+        response = compile_request(PROGRAM.replace("x + 2", "y + z"), {"grammar": get_grammar_file()})
+        self.assertEqual([(3, 13), (3, 17)], [(d["line"], d["column"]) for d in response["diagnostics"]])
+        response = compile_request(PROGRAM.replace("x + 2", "y + z"), {"grammar": get_grammar_file(), "max_errors": 1})
+        self.assertEqual(1, len(response["diagnostics"]))
+
+    def test_internal_error(self):
+        # the server checks the options first, so an unknown format is a bug by the time it reaches the compiler
+        response = compile_request(PROGRAM, {"grammar": get_grammar_file(), "emit": "exe"})
+        self.assertEqual("error", response["status"])
+        self.assertIn("Internal compiler error", response["diagnostics"][0]["description"])
+
+
+class TestCompileServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.directory.name, "oreo.sock")
+        self.server = CompileServer(self.socket_path, get_grammar_file(), workers=1)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+        self.directory.cleanup()
+
+    async def request(self, *requests):
+        return await asyncio.to_thread(send_requests, list(requests), self.socket_path)
+
+    async def test_compile(self):
+        responses = await self.request({"id": 1, "source": PROGRAM, "options": {"optimisation_level": 2}},
+                                       {"id": 2, "source": PROGRAM, "options": {"optimisation_level": 2}},
+                                       {"id": 3, "source": PROGRAM.replace("x + 2", "y")})
+        self.assertEqual([1, 2, 3], [r["id"] for r in responses])
+        self.assertEqual(["ok", "ok", "error"], [r["status"] for r in responses])
+        self.assertEqual(responses[0]["output"], responses[1]["output"])
+
+        statistics = (await self.request({"command": "stats"}))[0]["statistics"]
+        self.assertEqual(1, statistics["cache_hits"])
+        self.assertEqual(2, statistics["compiled"])
+
+    async def test_invalid(self):
+        responses = await self.request({"source": PROGRAM, "options": {"emit": "exe"}}, {"command": "run"}, [])
+        self.assertEqual(["error"] * 3, [r["status"] for r in responses])
+
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        writer.write(b"not json\n")
+        response = json.loads(await reader.readline())
+        writer.close()
+        self.assertEqual("error", response["status"])
+
+    async def test_busy(self):
+        self.server.max_pending = 0
+        response = (await self.request({"source": PROGRAM}))[0]
+        self.assertEqual("busy", response["status"])
+
+    async def test_timeout(self):
+        with open(os.path.join(get_data_dir(), "procedures.oreo")) as file:
+            source = file.read()
+        response = (await self.request({"source": source, "options": {"timeout": 0.000001}}))[0]
+        self.assertEqual("timeout", response["status"])
+
+    async def test_timeout_frees_pool(self):
+        source = generate_program(ProgramShape(statements=600, nesting_depth=1, expression_length=3, variables=5))
+        response = (await self.request({"source": source, "options": {"optimisation_level": 2, "timeout": 0.01}}))[0]
+        self.assertEqual("timeout", response["status"])
+
+        # the compile nobody is waiting for still counts against the requests which can be pending
+        self.server.max_pending = 1
+        self.assertEqual("busy", (await self.request({"source": PROGRAM}))[0]["status"])
+        # but later compiles do not wait for it to finish
+        self.server.max_pending = 2
+        response = (await self.request({"source": PROGRAM, "options": {"timeout": 5}}))[0]
+        self.assertEqual("ok", response["status"])
+
+    async def test_shutdown(self):
+        await asyncio.to_thread(send_request, {"command": "shutdown"}, self.socket_path)
+        await asyncio.wait_for(self.server.serve_until_shutdown(), 5)
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    async def test_client(self):
+        filename = os.path.join(get_data_dir(), "simple.oreo")
+        stdout = io.StringIO()
+        status = await asyncio.to_thread(client_main, [filename, "--socket", self.socket_path], stdout)
+        self.assertEqual(0, status)
+
+        expected = parse_file(filename, parse_grammar_from_file(get_grammar_file())).get_pretty_print_string()
+        self.assertEqual(expected + "\n", stdout.getvalue())
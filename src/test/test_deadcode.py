@@ -0,0 +1,49 @@
+import unittest
+
+from deadcode import remove_dead_code
+from grammarparse import parse_grammar_from_file
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import parse_string
+from tac import compile_to_tac
+from test.common_test import get_grammar_file
+from typechecker import type_check
+
+
+class TestDeadCode(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+
+    def compile_string(self, s):
+        parse_tree = parse_string(s, self.expansions)
+        semantic_analyse(parse_tree)
+        type_check(parse_tree)
+        return compile_to_tac(parse_tree)
+
+    def test_removes_unused_values(self):
+        program = self.compile_string("program p begin "
+                                      "procedure f(num a) begin var x := a * 2; var y := x + 1; println a; end "
+                                      "f(3); var kept := 4 * 5; end")
+
+        self.assertTrue(remove_dead_code(program))
+        procedure = repr(program.get_procedure("f"))
+        self.assertNotIn("v_x", procedure)
+        self.assertNotIn("v_y", procedure)
+        # the main program's variables are its result
+        self.assertIn("v_kept", repr(program))
+        self.assertFalse(remove_dead_code(program))
+
+    def test_keeps_values_used_later(self):
+        program = self.compile_string("program p begin "
+                                      "procedure f(num a) begin var x := a * 2; while (a < 3) begin "
+                                      "println x; a := a + 1; end; end "
+                                      "f(0); end")
+        self.assertFalse(remove_dead_code(program))
+
+    def test_keeps_division_by_zero(self):
+        program = self.compile_string("program p begin "
+                                      "procedure f(num a) begin var x := 1 / a; var y := 1 / 2; end "
+                                      "f(0); end")
+
+        self.assertTrue(remove_dead_code(program))
+        self.assertIn("v_x", repr(program))
+        self.assertNotIn("v_y", repr(program))
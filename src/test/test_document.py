@@ -0,0 +1,190 @@
+import glob
+import os
+import unittest
+
+from document import Document
+from grammarparse import parse_grammar_from_file
+from incremental import get_definitions
+from lexer import lex
+from parseerror import ParseError
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import syntax_analyse
+from test.common_test import get_data_dir, get_grammar_file
+from typechecker import type_check
+
+PROGRAM = """program p begin
+    procedure double(num x) begin
+        return x * 2;
+    end
+    procedure twice(num x) begin
+        var y := double(x);
+        while (y > 100) begin
+            y := y - 1;
+        end;
+        return double(y);
+    end
+    procedure greet(str name) begin
+        print "hello ";
+        println name;
+    end
+    var total := twice(3);
+    while (total < 10) begin
+        total := total + 1;
+    end;
+    greet("oreo");
+end"""
+
+
+class TestDocument(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+
+    # the tree and first error of the whole front end, run from scratch
+    def analyse(self, source):
+        tree = syntax_analyse(lex(source), self.expansions)
+        try:
+            semantic_analyse(tree)
+            type_check(tree)
+        except ParseError as e:
+            return tree, e
+        return tree, None
+
+    def assert_analysed(self, document: Document):
+        source = document.get_text()
+        try:
+            tree, error = self.analyse(source)
+        except ParseError as e:
+            self.assertIsNone(document.tree)
+            self.assertEqual((e.line_num, e.col_num, e.description),
+                             _get_position(document.diagnostics[0]))
+            return
+
+        # a failed analysis leaves some nodes of the tree typed, and which depends on the order they were checked in
+        print_type = error is None
+        self.assertEqual(tree.get_pretty_print_string(print_type=print_type),
+                         document.tree.get_pretty_print_string(print_type=print_type))
+        if error is None:
+            self.assertEqual([], document.diagnostics)
+        else:
+            self.assertEqual(_get_position(error), _get_position(document.diagnostics[0]))
+        self.assertEqual([(t.name, t.attribute, t.line_num, t.col_num) for t in lex(source)],
+                         [(t.name, t.attribute, t.line_num, t.col_num) for t in document.tokens])
+
+    def test_data_files(self):
+        for filename in sorted(glob.glob(os.path.join(get_data_dir(), "*.oreo"))):
+            with self.subTest(filename=os.path.basename(filename)):
+                with open(filename) as f:
+                    self.assert_analysed(Document(f.read(), self.expansions))
+
+    def test_edit(self):
+        document = Document(PROGRAM, self.expansions)
+        document.edit((2, 19), (2, 20), "3")
+        document.update()
+        self.assertIn("return x * 3;", document.get_text())
+        self.assert_analysed(document)
+
+        # adding lines moves the tokens after them
+        document.edit((5, 0), (5, 0), "        println x;\n\n")
+        document.update()
+        self.assertEqual("        println x;", document.lines[5])
+        self.assert_analysed(document)
+
+        document.edit((5, 0), (7, 0), "")
+        document.update()
+        self.assertEqual(PROGRAM.replace("x * 2", "x * 3"), document.get_text())
+        self.assert_analysed(document)
+
+    def test_errors(self):
+        document = Document(PROGRAM, self.expansions)
+        document.edit((2, 19), (2, 20), "")
+        document.update()
+        self.assertEqual(["expected a valid factor, got ';'"], [e.description for e in document.diagnostics])
+        self.assertIsNone(document.tree)
+
+        # one error in each statement which does not parse
+        document.edit((13, 8), (13, 15), "println name name")
+        document.update()
+        self.assertEqual([3, 14], [e.line_num for e in document.diagnostics])
+
+        document.edit((2, 19), (2, 19), "2")
+        document.edit((13, 8), (13, 31), "println name;")
+        document.update()
+        self.assertEqual(PROGRAM, document.get_text())
+        self.assertEqual([], document.diagnostics)
+        self.assert_analysed(document)
+
+        # a type error in the main program
+        document.edit((15, 17), (15, 25), "\"three\"")
+        document.update()
+        self.assertEqual([17], [e.line_num for e in document.diagnostics])
+        self.assert_analysed(document)
+
+    def test_multi_line_tokens(self):
+        document = Document(PROGRAM, self.expansions)
+        document.edit((1, 0), (1, 0), "    {- ")
+        document.update()
+        self.assertEqual(["unclosed comment"], [e.description for e in document.diagnostics])
+        self.assertEqual(2, document.diagnostics[0].line_num)
+
+        # closing the comment takes the whole first procedure into it
+        document.edit((4, 0), (4, 0), "-}")
+        document.update()
+        self.assert_analysed(document)
+        self.assertEqual("Call to undeclared procedure", document.diagnostics[0].description)
+
+        document.edit((4, 0), (4, 2), "")
+        document.edit((1, 0), (1, 7), "")
+        document.update()
+        self.assertEqual(PROGRAM, document.get_text())
+        self.assertEqual([], document.diagnostics)
+
+    def test_reuse(self):
+        document = Document(PROGRAM, self.expansions)
+        double, twice, greet = get_definitions(document.tree)
+        self.assertEqual(["double", "twice", "greet"], document.analysed_procedures)
+        self.assertTrue(document.is_main_analysed)
+
+        # an edit inside a procedure only parses and analyses that procedure again
+        document.edit((12, 15), (12, 20), "goodbye")
+        document.update()
+        self.assertEqual(["greet"], document.analysed_procedures)
+        self.assertFalse(document.is_main_analysed)
+        self.assertEqual([double, twice], get_definitions(document.tree)[:2])
+        self.assertIsNot(greet, get_definitions(document.tree)[2])
+        self.assert_analysed(document)
+
+        # changing what a procedure returns analyses its callers and the main program again
+        document.edit((2, 15), (2, 20), '"two"')
+        document.update()
+        self.assertEqual(["double", "twice"], document.analysed_procedures)
+        self.assertTrue(document.is_main_analysed)
+        self.assert_analysed(document)
+
+        # an edit to a statement in a loop only parses that statement again, and the outlines of the blocks around it
+        document.edit((2, 15), (2, 20), "x * 2")
+        document.update()
+        document.edit((17, 25), (17, 26), "2")
+        document.update()
+        self.assertEqual(3, document.num_parsed_chunks)
+        self.assertEqual([], document.analysed_procedures)
+        self.assertTrue(document.is_main_analysed)
+        self.assert_analysed(document)
+
+        document.update()
+        self.assertEqual(0, document.num_parsed_chunks)
+        self.assertFalse(document.is_main_analysed)
+
+    def test_replace(self):
+        document = Document(PROGRAM, self.expansions)
+        document.replace("program p begin\n    println 1;\nend")
+        document.update()
+        self.assertEqual([], get_definitions(document.tree))
+        self.assert_analysed(document)
+
+
+def _get_position(error: ParseError):
+    return error.line_num, error.col_num, error.description
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -23,6 +23,19 @@ class TestGrammarParse(unittest.TestCase):
             ]
         }, expansions)
 
+    def test_parse_repetitions(self):
+        expansions = parse_grammar([
+            'x -> y* "A"+ "*"? "+"',
+            'y -> "C"'
+        ])
+
+        rhs = expansions[NonTerminal("x")][0].rhs
+        self.assertEqual([NonTerminal("y"), Terminal(Token("A")), Terminal(Token("*")), Terminal(Token("+"))], rhs)
+        self.assertEqual(["*", "+", "?", ""], [symbol.repetition for symbol in rhs])
+        self.assertEqual([True, False, True, False], [symbol.is_optional() for symbol in rhs])
+        self.assertEqual([True, True, False, False], [symbol.is_repeated() for symbol in rhs])
+        self.assertEqual('<y* A+ *? +>', repr(expansions[NonTerminal("x")][0]))
+
     def test_parse_real_grammar(self):
         expansions = parse_grammar_from_file(get_grammar_file())
 
@@ -0,0 +1,109 @@
+import io
+import tempfile
+import unittest
+
+from compilecache import CompilationCache, get_key
+from grammarparse import parse_grammar_from_file
+from incremental import compile_incrementally, find_procedures
+from lexer import lex
+from parseerror import ParseError
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import parse_string
+from tac import TacInstruction, compile_to_tac
+from test.common_test import get_grammar_file
+from typechecker import type_check
+from vm import run_tac
+
+PROGRAM = """program p begin
+    procedure double(num x) begin
+        return x * 2;
+    end
+    procedure twice(num x) begin
+        var y := double(x);
+        println y;
+        return double(x);
+    end
+    procedure greet(str name) begin
+        print "hello ";
+        println name;
+    end
+    println twice(3);
+    greet("oreo");
+end"""
+
+
+class TestIncremental(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = CompilationCache(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def compile_string(self, s):
+        parse_tree = parse_string(s, self.expansions)
+        semantic_analyse(parse_tree)
+        type_check(parse_tree)
+        return compile_to_tac(parse_tree)
+
+    def compile_incrementally(self, s):
+        return compile_incrementally(lex(s), self.expansions, self.cache, get_key("test"))
+
+    def run_program(self, program):
+        stdout = io.StringIO()
+        run_tac(program, io.StringIO(), stdout)
+        return stdout.getvalue()
+
+    def test_find_procedures(self):
+        spans = find_procedures(lex(PROGRAM))
+        self.assertEqual(["double", "twice", "greet"], [s.name for s in spans])
+        self.assertEqual([("NUM",), ("NUM",), ("STR",)], [s.parameter_types for s in spans])
+        self.assertEqual([2, 5, 10], [s.first_line for s in spans])
+
+        # without the end of a procedure, it is left to the parser to report the error
+        self.assertEqual([], find_procedures(lex("program p begin procedure f() begin println 1;\n"
+                                                 "procedure g() begin println 2; end end")))
+
+    def test_unchanged(self):
+        program, recompiled = self.compile_incrementally(PROGRAM)
+        self.assertEqual(["double", "twice", "greet"], recompiled)
+        self.assertEqual("6\n6\nhello oreo\n", self.run_program(program))
+
+        program, recompiled = self.compile_incrementally(PROGRAM)
+        self.assertEqual([], recompiled)
+        self.assertEqual("6\n6\nhello oreo\n", self.run_program(program))
+
+    def test_changed_body(self):
+        self.compile_incrementally(PROGRAM)
+        edited = PROGRAM.replace('print "hello ";', 'print "goodbye ";')
+        program, recompiled = self.compile_incrementally(edited)
+        self.assertEqual(["greet"], recompiled)
+        self.assertEqual(self.run_program(self.compile_string(edited)), self.run_program(program))
+
+    def test_moved(self):
+        self.compile_incrementally(PROGRAM)
+        moved = "{- a comment\n-}\n" + PROGRAM
+        program, recompiled = self.compile_incrementally(moved)
+        self.assertEqual([], recompiled)
+
+        def get_positions(unit):
+            return [i.position for i in unit.program if isinstance(i, TacInstruction) and i.op == "LCall"]
+
+        expected = self.compile_string(moved)
+        for procedure in program.procedures:
+            self.assertEqual(get_positions(expected.get_procedure(procedure.name)), get_positions(procedure))
+
+    def test_changed_signature(self):
+        self.compile_incrementally(PROGRAM)
+        # twice calls double, so has to be compiled again once double returns a string
+        edited = PROGRAM.replace("return x * 2;", 'return "two";')
+        program, recompiled = self.compile_incrementally(edited)
+        self.assertEqual(["double", "twice"], recompiled)
+        self.assertEqual("two\ntwo\nhello oreo\n", self.run_program(program))
+
+    def test_removed_callee(self):
+        self.compile_incrementally(PROGRAM)
+        edited = PROGRAM.replace("procedure double(num x) begin\n        return x * 2;\n    end\n", "")
+        with self.assertRaises(ParseError):
+            self.compile_incrementally(edited)
@@ -0,0 +1,82 @@
+import io
+import unittest
+
+from grammarparse import parse_grammar_from_file
+from inline import get_call_graph, get_recursive_procedures, inline_procedures
+from passes import optimise
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import parse_string
+from tac import compile_to_tac
+from test.common_test import compile_data_file, get_grammar_file
+from typechecker import type_check
+from vm import run_tac
+
+
+class TestInline(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+        self.program = compile_data_file("procedures.oreo", self.expansions)
+
+    def compile_string(self, s):
+        parse_tree = parse_string(s, self.expansions)
+        semantic_analyse(parse_tree)
+        type_check(parse_tree)
+        return compile_to_tac(parse_tree)
+
+    def test_call_graph(self):
+        self.assertEqual({"add": set(), "sum_to": {"add"}, "greet": set()}, get_call_graph(self.program))
+
+    def test_recursion_detection(self):
+        self.assertEqual({"a", "b", "c"}, get_recursive_procedures({"a": {"b"}, "b": {"a", "d"}, "c": {"c"}, "d": set()}))
+
+        program = self.compile_string("program p begin procedure f(num n) begin f(n - 1); end f(3); end")
+        self.assertFalse(inline_procedures(program, optimisation_level=2))
+        self.assertIn("LCall _f", repr(program))
+
+    def test_level_zero(self):
+        before = repr(self.program)
+        self.assertFalse(inline_procedures(self.program, optimisation_level=0))
+        self.assertEqual(before, repr(self.program))
+
+    def test_level_one_only_inlines_tiny_procedures(self):
+        self.assertTrue(inline_procedures(self.program, optimisation_level=1))
+
+        self.assertEqual(["sum_to"], [p.name for p in self.program.procedures])
+        self.assertNotIn("LCall _add", repr(self.program))
+        self.assertIn("LCall _sum_to", repr(self.program))
+
+        # add's parameters are now locals of sum_to
+        self.assertEqual(4, self.program.get_procedure("sum_to").num_locals)
+
+    def test_level_two(self):
+        self.assertTrue(inline_procedures(self.program, optimisation_level=2))
+
+        self.assertEqual([], self.program.procedures)
+        self.assertNotIn("LCall", repr(self.program))
+        self.assertNotIn("Return", repr(self.program))
+        self.assertIn("v__greet", repr(self.program))
+
+    def test_locals_start_at_zero(self):
+        # r is only assigned when x is positive, so each call which is not returns 0, even once inlined in a loop
+        source = """program p begin
+            procedure pick(num x) begin
+                var r;
+                if (x > 0) then begin
+                    r := 5;
+                end;
+                return r;
+            end
+            var i := 3;
+            while (i > 0) begin
+                println pick(i - 2);
+                i := i - 1;
+            end;
+        end"""
+        outputs = []
+        for level in [0, 2]:
+            program = self.compile_string(source)
+            optimise(program, level)
+            stdout = io.StringIO()
+            run_tac(program, io.StringIO(), stdout)
+            outputs.append(stdout.getvalue())
+        self.assertEqual(["5\n0\n0\n"] * 2, outputs)
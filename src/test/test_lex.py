@@ -4,7 +4,7 @@ import unittest
 import lexer
 
 from lexer import Token
-from parseerror import ParseError
+from parseerror import ErrorLog, ParseError
 from test.common_test import get_data_dir
 
 
@@ -35,6 +35,17 @@ class TestLex(unittest.TestCase):
     def test_unclosed_comment(self):
         self.assertRaises(ParseError, lexer.lex, '''id := "a string" {- an unclosed comment  then if;''')
 
+    def test_recovery(self):
+        errors = ErrorLog()
+        tokens = lexer.lex('x := 1 @@ 2;\nprintln "hello;\ny#z := 3; {- unclosed', errors)
+        self.assertEqual([Token("ID", "x"), Token(":="), Token("NUMBER", "1"), Token("NUMBER", "2"), Token(";"),
+                          Token("PRINTLN"), Token("STRING", "hello"), Token(";"),
+                          Token("ID", "y"), Token("ID", "z"), Token(":="), Token("NUMBER", "3"), Token(";")], tokens)
+        self.assertEqual([("unrecognised token", 1, 8), ("unclosed string", 2, 10), ("unrecognised token", 3, 3),
+                          ("unclosed comment", 3, 12)],
+                         [(e.description, e.line_num, e.col_num) for e in errors.errors])
+        self.assertEqual(["x := 1 @@ 2;", 'println "hello;'], [tokens[0].context_line, tokens[6].context_line])
+
     def test_adjacent_string_and_number(self):
         tokens = lexer.lex("program myprog 29'my string 22'1")
         self.assertEqual([Token("PROGRAM"), Token("ID", "myprog"), Token("NUMBER", "29"),
@@ -0,0 +1,114 @@
+import io
+import os
+import tempfile
+import unittest
+
+from grammarparse import parse_grammar_from_file
+from lexer import lex
+from linker import LinkError, compile_module, get_module_key, get_object_file, import_objects, link, load_object, \
+    save_object
+from parseerror import ParseError
+from passes import optimise
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import syntax_analyse
+from tac import compile_to_tac
+from test.common_test import get_data_dir, get_grammar_file
+from typechecker import type_check
+from vm import run_tac
+
+PROGRAM = """program p begin
+    report_all(2);
+    println square(6);
+end"""
+
+
+class TestLinker(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+
+    def compile_module(self, name, signatures=None, source=None):
+        if source is None:
+            with open(os.path.join(get_data_dir(), "modules", name + ".oreo")) as file:
+                source = file.read()
+        return compile_module(source, self.expansions, name, "test", signatures)
+
+    def compile_program(self, s, objects):
+        parse_tree = syntax_analyse(import_objects(lex(s), objects), self.expansions)
+        semantic_analyse(parse_tree)
+        type_check(parse_tree)
+        return link(compile_to_tac(parse_tree), objects)
+
+    def run_program(self, program):
+        stdout = io.StringIO()
+        run_tac(program, io.StringIO(), stdout)
+        return stdout.getvalue()
+
+    def test_compile_module(self):
+        maths = self.compile_module("maths")
+        self.assertEqual({"square": (("NUM",), "NUM"), "sum_to": (("NUM",), "NUM")}, maths.signatures)
+        self.assertEqual({}, maths.get_imports())
+
+        report = self.compile_module("report", maths.signatures)
+        self.assertEqual(["report", "report_all"], list(report.signatures))
+        self.assertEqual(maths.signatures, report.get_imports())
+        with open(os.path.join(get_data_dir(), "modules", "report.oreo")) as file:
+            source = file.read()
+        self.assertEqual(report.key, get_module_key("test", source, lex(source), maths.signatures))
+        changed = dict(maths.signatures, square=(("NUM",), "STR"))
+        self.assertNotEqual(report.key, get_module_key("test", source, lex(source), changed))
+        # only the signatures of the procedures it calls count
+        added = dict(maths.signatures, f=((), "NUM"))
+        self.assertEqual(report.key, get_module_key("test", source, lex(source), added))
+
+        with self.assertRaises(ParseError) as context:
+            self.compile_module("m", source="procedure f() begin return 1; end println f();")
+        self.assertEqual("A module can only define procedures", context.exception.description)
+        with self.assertRaises(ParseError):
+            self.compile_module("report")  # without the signatures of the procedures it calls
+
+    def test_link(self):
+        maths = self.compile_module("maths")
+        report = self.compile_module("report", maths.signatures)
+        program = self.compile_program(PROGRAM, [maths, report])
+        self.assertEqual("row 2\nrow 7\n36\n", self.run_program(program))
+
+        # as a whole program, it can be optimised
+        program = self.compile_program(PROGRAM, [maths, report])
+        optimise(program, 2)
+        self.assertEqual("row 2\nrow 7\n36\n", self.run_program(program))
+
+    def test_link_errors(self):
+        maths = self.compile_module("maths")
+        report = self.compile_module("report", maths.signatures)
+        with self.assertRaisesRegex(LinkError, "Undefined procedure (square|sum_to), called by report"):
+            self.compile_program("program p begin report_all(1); end", [report])
+
+        with self.assertRaisesRegex(LinkError, "defined in both module maths and module copy"):
+            self.compile_program(PROGRAM, [maths, report, self.compile_module("copy", source="procedure square(num x) "
+                                                                                              "begin return x; end")])
+
+        with self.assertRaisesRegex(LinkError, "defined in both the program and module maths"):
+            import_objects(lex("program p begin procedure square(num x) begin return x; end end"), [maths])
+
+        # report was compiled against square returning a number
+        changed = self.compile_module("maths", source="procedure square(num x) begin return \"x\"; end "
+                                                      "procedure sum_to(num n) begin return n; end")
+        with self.assertRaisesRegex(LinkError, "needs compiling again"):
+            self.compile_program("program p begin report_all(1); end", [changed, report])
+
+    def test_save_object(self):
+        maths = self.compile_module("maths")
+        with tempfile.TemporaryDirectory() as directory:
+            object_file = get_object_file("modules/maths.oreo", directory)
+            self.assertEqual(os.path.join(directory, "maths.oo"), object_file)
+            save_object(maths, object_file)
+            self.assertEqual(maths.signatures, load_object(object_file).signatures)
+
+            with open(object_file, "wb") as file:
+                file.write(b"not an object")
+            with self.assertRaisesRegex(LinkError, "is not an Oreo object"):
+                load_object(object_file)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from analysis import AnalysisCache
+from cfg import ControlFlowGraph
+from grammarparse import parse_grammar_from_file
+from loopopt import hoist_loop_invariants, optimise_loops, reduce_strength
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import parse_string
+from tac import compile_to_tac
+from test.common_test import compile_data_file, get_grammar_file
+from typechecker import type_check
+
+
+class TestLoopOptimisation(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+        self.program = compile_data_file("loops.oreo", self.expansions)
+
+    def get_loop_instructions(self):
+        cfg = ControlFlowGraph(self.program.program)
+        return [repr(i) for loop in cfg.get_natural_loops() for i in loop.get_instructions()]
+
+    def test_hoist_invariant_condition(self):
+        self.assertIn("t_1 = v_n * 2;", self.get_loop_instructions())
+        self.assertTrue(hoist_loop_invariants(self.program))
+
+        self.assertNotIn("t_1 = v_n * 2;", self.get_loop_instructions())
+        self.assertIn("t_1 = v_n * 2;", repr(self.program))
+
+    def test_user_variable_not_hoisted_past_exit(self):
+        # k is only assigned if the loop body runs, so must not be assigned before the loop
+        hoist_loop_invariants(self.program)
+        self.assertIn("v_k = v_n + 3;", self.get_loop_instructions())
+
+    def test_strength_reduction(self):
+        self.assertTrue(reduce_strength(self.program))
+
+        instructions = self.get_loop_instructions()
+        self.assertFalse(any("v_i * 4" in i for i in instructions))
+        self.assertTrue(any(i.endswith("+ 4;") for i in instructions))
+        self.assertTrue(any(i.endswith("- 2;") for i in instructions))
+
+    def test_loop_is_smaller(self):
+        before = len(self.get_loop_instructions())
+        self.assertTrue(optimise_loops(self.program))
+        self.assertLess(len(self.get_loop_instructions()), before)
+
+        # a second run has nothing left to do
+        self.assertFalse(hoist_loop_invariants(self.program))
+
+    def test_analyses_are_shared_between_loops(self):
+        # loops which do not overlap are all hoisted from with the same analyses, so how many times they are worked
+        # out does not depend on how many loops there are
+        num_computed = []
+        for num_loops in [1, 5]:
+            loop_source = "i := 0; while (i < n) begin total := total + n * 2; i := i + 1; end; "
+            parse_tree = parse_string("program p begin var n := 3; var i := 0; var total := 0; "
+                                      + loop_source * num_loops + "println total; end", self.expansions)
+            semantic_analyse(parse_tree)
+            type_check(parse_tree)
+            program = compile_to_tac(parse_tree)
+
+            analyses = AnalysisCache(program)
+            self.assertTrue(hoist_loop_invariants(program, analyses))
+            self.assertEqual(0, len([i for loop in ControlFlowGraph(program.program).get_natural_loops()
+                                     for i in loop.get_instructions() if "n * 2" in repr(i)]))
+            num_computed.append(analyses.num_computed)
+
+        self.assertEqual(num_computed[0], num_computed[1])
@@ -0,0 +1,107 @@
+import io
+import unittest
+
+from lspserver import INTERNAL_ERROR, METHOD_NOT_FOUND, LanguageServer, read_message, write_message
+from test.common_test import get_grammar_file
+
+URI = "file:///p.oreo"
+PROGRAM = """program p begin
+    var x := 1;
+    println y;
+end"""
+
+
+class TestLanguageServer(unittest.TestCase):
+    def setUp(self):
+        self.server = LanguageServer(get_grammar_file())
+
+    def notify(self, method, params):
+        return self.server.handle_message({"jsonrpc": "2.0", "method": method, "params": params})
+
+    def change(self, version, *changes):
+        return self.notify("textDocument/didChange", {"textDocument": {"uri": URI, "version": version},
+                                                      "contentChanges": list(changes)})
+
+    def test_initialize(self):
+        messages = self.server.handle_message({"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {}})
+        self.assertEqual(1, messages[0]["id"])
+        self.assertEqual(2, messages[0]["result"]["capabilities"]["textDocumentSync"]["change"])
+
+        messages = self.server.handle_message({"jsonrpc": "2.0", "id": 2, "method": "hover", "params": {}})
+        self.assertEqual(METHOD_NOT_FOUND, messages[0]["error"]["code"])
+        self.assertEqual([], self.notify("$/setTrace", {"value": "off"}))
+
+    def test_diagnostics(self):
+        messages = self.notify("textDocument/didOpen", {"textDocument": {"uri": URI, "version": 1,
+                                                                         "languageId": "oreo", "text": PROGRAM}})
+        params = messages[0]["params"]
+        self.assertEqual("textDocument/publishDiagnostics", messages[0]["method"])
+        self.assertEqual((URI, 1), (params["uri"], params["version"]))
+        self.assertEqual(1, len(params["diagnostics"]))
+        diagnostic = params["diagnostics"][0]
+        self.assertEqual("Use of undeclared identifier y", diagnostic["message"])
+        self.assertEqual({"start": {"line": 2, "character": 12}, "end": {"line": 2, "character": 14}},
+                         diagnostic["range"])
+
+        # fixing the error clears it
+        messages = self.change(2, {"range": {"start": {"line": 2, "character": 12},
+                                             "end": {"line": 2, "character": 13}}, "text": "x"})
+        self.assertEqual([], messages[0]["params"]["diagnostics"])
+        self.assertEqual("    println x;", self.server.documents[URI].lines[2])
+
+        # a lex error, on the first line, where columns are counted differently
+        messages = self.change(3, {"text": "program 'p begin\nend"})
+        diagnostic = messages[0]["params"]["diagnostics"][0]
+        self.assertEqual("unclosed string", diagnostic["message"])
+        self.assertEqual({"line": 0, "character": 8}, diagnostic["range"]["start"])
+
+        # several changes are made in order
+        messages = self.change(4, {"text": PROGRAM},
+                               {"range": {"start": {"line": 1, "character": 4}, "end": {"line": 1, "character": 4}},
+                                "text": "var y := 2;\n    "})
+        self.assertEqual([], messages[0]["params"]["diagnostics"])
+
+        messages = self.notify("textDocument/didClose", {"textDocument": {"uri": URI}})
+        self.assertEqual([], messages[0]["params"]["diagnostics"])
+        self.assertNotIn(URI, self.server.documents)
+
+    def test_internal_error(self):
+        # a change to a document which is not open
+        messages = self.change(1, {"text": PROGRAM})
+        self.assertEqual("window/logMessage", messages[0]["method"])
+
+        messages = self.server.handle_message({"jsonrpc": "2.0", "id": 3, "method": "textDocument/didOpen",
+                                               "params": {}})
+        self.assertEqual(INTERNAL_ERROR, messages[0]["error"]["code"])
+
+    def test_serve(self):
+        input_stream = io.BytesIO()
+        for message in [{"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {}},
+                        {"jsonrpc": "2.0", "method": "textDocument/didOpen",
+                         "params": {"textDocument": {"uri": URI, "version": 1, "text": PROGRAM}}},
+                        {"jsonrpc": "2.0", "id": 2, "method": "shutdown"},
+                        {"jsonrpc": "2.0", "method": "exit"}]:
+            write_message(input_stream, message)
+        input_stream.seek(0)
+        output_stream = io.BytesIO()
+        self.assertEqual(0, self.server.serve(input_stream, output_stream))
+
+        output_stream.seek(0)
+        messages = []
+        message = read_message(output_stream)
+        while message is not None:
+            messages.append(message)
+            message = read_message(output_stream)
+        self.assertEqual([1, None, 2], [m.get("id") for m in messages])
+        self.assertEqual("textDocument/publishDiagnostics", messages[1]["method"])
+
+    def test_exit_without_shutdown(self):
+        input_stream = io.BytesIO()
+        write_message(input_stream, {"jsonrpc": "2.0", "method": "exit"})
+        input_stream.seek(0)
+        self.assertEqual(1, self.server.serve(input_stream, io.BytesIO()))
+        self.assertEqual(1, LanguageServer(get_grammar_file()).serve(io.BytesIO(), io.BytesIO()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import json
+import unittest
+
+import metrics
+from grammarparse import parse_grammar_from_file
+from passes import count_instructions
+from test.common_test import compile_data_file, get_grammar_file
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+
+    def test_disabled_by_default(self):
+        metrics.reset()
+        compile_data_file("procedures.oreo", self.expansions)
+        self.assertEqual(0, sum(metrics.counts.values()))
+
+    def test_collecting(self):
+        with metrics.collecting() as counts:
+            program = compile_data_file("procedures.oreo", self.expansions)
+        self.assertFalse(metrics.enabled)
+
+        for name in metrics.METRICS:
+            self.assertGreater(counts[name], 0, name)
+        self.assertGreater(counts["get_child_scans"], counts["get_child_calls"])
+        self.assertLess(counts["find_expansion_max_depth"], counts["find_expansion_calls"])
+        self.assertEqual(count_instructions(program), counts["tac_instructions_emitted"])
+
+        # counting again starts from zero
+        with metrics.collecting() as counts_again:
+            compile_data_file("procedures.oreo", self.expansions)
+        self.assertEqual(counts, counts_again)
+
+    def test_exports(self):
+        with metrics.collecting():
+            compile_data_file("loops.oreo", self.expansions)
+
+        self.assertEqual(metrics.counts, json.loads(metrics.to_json()))
+
+        lines = metrics.to_prometheus().splitlines()
+        self.assertEqual(3 * len(metrics.METRICS), len(lines))
+        self.assertIn("# TYPE oreo_parse_steps_total counter", lines)
+        self.assertIn("# TYPE oreo_find_expansion_max_depth gauge", lines)
+        self.assertIn(f"oreo_parse_steps_total {metrics.counts['parse_steps']}", lines)
@@ -0,0 +1,164 @@
+import io
+import json
+import os
+import re
+import tempfile
+import unittest
+
+from oreoc import main
+from test.common_test import get_data_dir, get_grammar_file
+
+
+class TestOreoc(unittest.TestCase):
+    def run_oreoc(self, *argv, stdin=""):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        status = main(list(argv) + ["--grammar", get_grammar_file()], io.StringIO(stdin), stdout, stderr)
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def data_file(self, filename):
+        return os.path.join(get_data_dir(), filename)
+
+    def test_run(self):
+        for level in ["0", "1", "2"]:
+            with self.subTest(level):
+                status, output, _ = self.run_oreoc(self.data_file("procedures.oreo"), "-O", level)
+                self.assertEqual(0, status)
+                self.assertEqual("90\nhello oreo\n9\n", output)
+
+    def test_stop_points(self):
+        _, tokens, _ = self.run_oreoc(self.data_file("procedures.oreo"), "--stop-after", "lex")
+        self.assertEqual(["PROGRAM", "ID(procedures)", "BEGIN"], tokens.splitlines()[:3])
+
+        _, tree, _ = self.run_oreoc(self.data_file("procedures.oreo"), "--stop-after", "typecheck", "--tree-format",
+                                    "jsonl")
+        self.assertEqual({"id": 0, "parent": None, "depth": 0, "non_terminal": "p"}, json.loads(tree.splitlines()[0]))
+
+        _, tac, _ = self.run_oreoc(self.data_file("procedures.oreo"), "--stop-after", "tac")
+        self.assertIn("LCall _sum_to", tac)
+
+        _, optimised, _ = self.run_oreoc(self.data_file("procedures.oreo"), "--stop-after", "optimise", "-O2")
+        self.assertNotIn("LCall", optimised)
+
+    def test_emit(self):
+        _, python, _ = self.run_oreoc(self.data_file("procedures.oreo"), "--emit", "python")
+        self.assertIn("def p_add", python)
+
+        with tempfile.TemporaryDirectory() as directory:
+            output_file = os.path.join(directory, "program.c")
+            status, output, _ = self.run_oreoc(self.data_file("procedures.oreo"), "--emit", "c", "-o", output_file)
+            self.assertEqual("", output)
+            with open(output_file) as file:
+                self.assertIn("p_add", file.read())
+
+    def test_link(self):
+        with tempfile.TemporaryDirectory() as directory:
+            objects = [os.path.join(directory, m + ".oo") for m in ["maths", "report"]]
+            status, output, _ = self.run_oreoc(self.data_file("modules/maths.oreo"), "--emit", "object", "-o",
+                                               objects[0])
+            self.assertEqual((0, ""), (status, output))
+            status, _, _ = self.run_oreoc(self.data_file("modules/report.oreo"), "--emit", "object", "-o", objects[1],
+                                          "--link", objects[0])
+            self.assertEqual(0, status)
+
+            program = os.path.join(directory, "main.oreo")
+            with open(program, "w") as file:
+                file.write("program main begin report_all(2); println square(6); end")
+            for level in ["0", "2"]:
+                with self.subTest(level):
+                    status, output, _ = self.run_oreoc(program, "--link", *objects, "-O", level)
+                    self.assertEqual((0, "row 2\nrow 7\n36\n"), (status, output))
+
+            status, _, errors = self.run_oreoc(program, "--link", objects[1])
+            self.assertEqual(1, status)
+            self.assertIn("Call to undeclared procedure", errors)
+
+    def test_errors(self):
+        status, output, errors = self.run_oreoc(self.data_file("test9.oreo"))
+        self.assertEqual(1, status)
+        self.assertEqual("", output)
+        self.assertIn("should be NUM", errors)
+
+        # every error is reported, up to the most allowed
+        with tempfile.TemporaryDirectory() as directory:
+            source_file = os.path.join(directory, "errors.oreo")
+            with open(source_file, "w") as file:
+                file.write("program p begin\n    println x;\n    println 1 +;\n    println y;\nend\n")
+            status, _, errors = self.run_oreoc(source_file)
+            self.assertEqual(1, status)
+            self.assertEqual(["2:13", "3:16", "4:13"], re.findall(r"line \S*?(\d+:\d+)", errors))
+            with tempfile.TemporaryDirectory() as cache_dir:
+                _, _, cached_errors = self.run_oreoc(source_file, "--cache", "--cache-dir", cache_dir)
+            self.assertEqual(errors, cached_errors)
+
+            _, _, errors = self.run_oreoc(source_file, "--max-errors", "1")
+            self.assertEqual(1, errors.count(" error on line "))
+            self.assertIn("Too many errors, stopped after 1", errors)
+
+            # including a syntax error in a procedure, which does not make calls to it errors as well
+            with open(source_file, "w") as file:
+                file.write("program p begin\n    procedure f(num n) begin\n        if (n < 2) then begin\n"
+                           "            return n;\n        end;\n        return f(n - 1) + 1;\n    end\n"
+                           "    println f(3);\n    var z := f(2) + 1;\n    println y;\nend\n")
+            status, _, errors = self.run_oreoc(source_file)
+            self.assertEqual(1, status)
+            self.assertEqual(["4:13", "10:13"], re.findall(r"line \S*?(\d+:\d+)", errors))
+            self.assertIn("expected a valid statement, got 'return'", errors)
+
+            # a redefinition is reported, rather than its value being typed through itself
+            for source in ["program p begin var x := 1; var x := x + 1; println x; end",
+                           "program p begin procedure f(num a) begin var a := a + 1; return a; end println f(1); end",
+                           "program p begin procedure f(num a, num a) begin return a + 1; end println f(1, 2); end"]:
+                with open(source_file, "w") as file:
+                    file.write(source)
+                status, _, errors = self.run_oreoc(source_file)
+                self.assertEqual(1, status)
+                self.assertEqual(1, errors.count(" error on line "))
+                self.assertRegex(errors, "Redefinition of identifier [xa]")
+
+    def test_reports(self):
+        status, _, errors = self.run_oreoc(self.data_file("loops.oreo"), "-O2", "--time-passes", "--mem-report")
+        self.assertEqual(0, status)
+        for phase in ["lex", "parse", "semantic", "typecheck", "tac", "optimise", "run", "total"]:
+            self.assertRegex(errors, rf"\n{phase} +[\d.]+ +[\d.]+\n")
+        self.assertIn("hoist-invariants", errors)
+        self.assertIn("peak KiB", errors)
+
+    def test_metrics(self):
+        status, _, errors = self.run_oreoc(self.data_file("loops.oreo"), "--metrics", "prometheus")
+        self.assertEqual(0, status)
+        self.assertRegex(errors, r"\noreo_parse_steps_total [1-9]\d*\n")
+
+    def test_profile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            profile_file = os.path.join(directory, "profile.json")
+            status, expected_output, _ = self.run_oreoc(self.data_file("counted_loops.oreo"),
+                                                        "--profile-generate", profile_file)
+            self.assertEqual(0, status)
+            self.assertTrue(os.path.exists(profile_file))
+
+            status, output, errors = self.run_oreoc(self.data_file("counted_loops.oreo"), "-O2", "--profile-use",
+                                                    profile_file, "--time-passes")
+            self.assertEqual(0, status)
+            self.assertEqual(expected_output, output)
+            self.assertIn("layout-blocks", errors)
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            arguments = [self.data_file("procedures.oreo"), "--cache", "--cache-dir", directory, "--cache-stats"]
+            _, expected_output, _ = self.run_oreoc(*arguments)
+            status, output, errors = self.run_oreoc(*arguments)
+            self.assertEqual(0, status)
+            self.assertEqual(expected_output, output)
+            self.assertRegex(errors, r"tac +1 +0")
+
+            _, expected_c, _ = self.run_oreoc(*arguments, "--emit", "c")
+            _, c, errors = self.run_oreoc(*arguments, "--emit", "c")
+            self.assertEqual(expected_c, c)
+            self.assertRegex(errors, r"output +1 +0")
+
+            # stopping early goes through the earlier stages, which were cached by the first run
+            _, expected_tree, errors = self.run_oreoc(*arguments, "--stop-after", "typecheck")
+            self.assertRegex(errors, r"tokens +1 +0")
+            _, tree, errors = self.run_oreoc(*arguments, "--stop-after", "typecheck")
+            self.assertEqual(expected_tree, tree)
+            self.assertRegex(errors, r"tree +1 +0")
@@ -0,0 +1,45 @@
+import io
+import unittest
+
+from oreoio import OreoIO
+
+
+class RecordingInput(io.StringIO):
+    # remembers what had been output by the time each line was read
+    def __init__(self, text, output):
+        super().__init__(text)
+        self.output = output
+        self.seen = []
+
+    def readline(self, *args):
+        self.seen.append(self.output.getvalue())
+        return super().readline(*args)
+
+
+class TestOreoIO(unittest.TestCase):
+    def test_output_is_buffered(self):
+        stdout = io.StringIO()
+        oreo_io = OreoIO(stdout=stdout, buffer_size=10)
+
+        oreo_io.write("12345")
+        oreo_io.write_line("678")
+        self.assertEqual("", stdout.getvalue())
+
+        oreo_io.write("9")
+        self.assertEqual("12345678\n9", stdout.getvalue())
+
+        oreo_io.write("0")
+        oreo_io.flush()
+        self.assertEqual("12345678\n90", stdout.getvalue())
+
+    def test_flush_before_reading(self):
+        stdout = io.StringIO()
+        stdin = RecordingInput("oreo\nbiscuit", stdout)
+        oreo_io = OreoIO(stdin, stdout)
+
+        oreo_io.write("name? ")
+        self.assertEqual("oreo", oreo_io.read_line())
+        self.assertEqual(["name? "], stdin.seen)
+
+        self.assertEqual("biscuit", oreo_io.read_line())
+        self.assertEqual("", oreo_io.read_line())
@@ -0,0 +1,133 @@
+import io
+import unittest
+
+from analysis import AnalysisCache
+from grammarparse import parse_grammar_from_file
+from passes import Pass, PassManager, count_instructions, get_pipeline, optimise
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import parse_string
+from tac import compile_to_tac
+from test.common_test import compile_data_file, get_grammar_file
+from typechecker import type_check
+from vm import run_tac
+
+# x is used only in the if, so it is dead once y is removed, which takes a second run of dead code elimination
+DEAD_CHAIN = ("program p begin "
+              "procedure f(num a) begin var x := a * 2; if (a < 1) then begin var y := x + 1; end; println a; end "
+              "f(0); end")
+
+
+class TestPasses(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+
+    def compile_string(self, s):
+        parse_tree = parse_string(s, self.expansions)
+        semantic_analyse(parse_tree)
+        type_check(parse_tree)
+        return compile_to_tac(parse_tree)
+
+    def run_program(self, program):
+        stdout = io.StringIO()
+        vm = run_tac(program, io.StringIO(), stdout)
+        return vm, stdout.getvalue()
+
+    def test_levels_preserve_behaviour(self):
+        for filename in ["procedures.oreo", "loops.oreo", "counted_loops.oreo"]:
+            with self.subTest(filename):
+                before, expected_output = self.run_program(compile_data_file(filename, self.expansions))
+                for level in [1, 2]:
+                    program = compile_data_file(filename, self.expansions)
+                    optimise(program, level)
+                    after, output = self.run_program(program)
+                    self.assertEqual(expected_output, output)
+                    self.assertLessEqual(after.instructions_executed, before.instructions_executed)
+
+    def test_level_zero(self):
+        program = compile_data_file("procedures.oreo", self.expansions)
+        before = repr(program)
+        manager = optimise(program, 0)
+        self.assertEqual(before, repr(program))
+        self.assertEqual([], manager.statistics)
+
+    def test_pipelines(self):
+        self.assertEqual(["inline", "hoist-invariants", "dead-code", "allocate-temporaries"],
+                         [p.name for p in get_pipeline(1)])
+        self.assertEqual(["inline", "hoist-invariants", "reduce-strength", "unroll", "dead-code",
+                          "allocate-temporaries"], [p.name for p in get_pipeline(2)])
+        self.assertRaises(ValueError, get_pipeline, 3)
+
+    def test_statistics(self):
+        program = self.compile_string(DEAD_CHAIN)
+        size = count_instructions(program)
+        manager = optimise(program, 1)
+
+        self.assertEqual(["inline", "hoist-invariants", "dead-code", "allocate-temporaries"],
+                         [s.name for s in manager.statistics])
+        dead_code = manager.statistics[2]
+        self.assertTrue(dead_code.changed)
+        self.assertEqual(3, dead_code.iterations)
+        self.assertLess(dead_code.instructions_after, dead_code.instructions_before)
+        self.assertEqual(size, manager.statistics[0].instructions_before)
+        self.assertEqual(count_instructions(program), manager.statistics[-1].instructions_after)
+        self.assertTrue(all(s.wall_time >= 0 and s.cpu_time >= 0 for s in manager.statistics))
+
+        table = manager.format_statistics().splitlines()
+        self.assertEqual(5, len(table))
+        self.assertTrue(table[3].startswith("dead-code"))
+
+    def test_analyses_are_cached_until_invalidated(self):
+        program = self.compile_string(DEAD_CHAIN)
+        analyses = AnalysisCache(program)
+        cfg = analyses.get("cfg", program)
+        liveness = analyses.get("liveness", program)
+        self.assertIs(cfg, analyses.get("cfg", program))
+        self.assertIs(liveness, analyses.get("liveness", program))
+
+        analyses.invalidate(["cfg"])
+        self.assertIs(cfg, analyses.get("cfg", program))
+        self.assertIsNot(liveness, analyses.get("liveness", program))
+
+        # liveness was computed from the cfg, so cannot outlive it
+        analyses.invalidate(["liveness"])
+        self.assertIsNot(cfg, analyses.get("cfg", program))
+
+    def test_allocation(self):
+        program = compile_data_file("procedures.oreo", self.expansions)
+        optimise(program, 1)
+        self.assertTrue(all(unit.allocation is not None for unit in program.get_code_units()))
+
+        # the allocation is out of date once a pass changes the code
+        manager = PassManager([Pass("change", lambda p, a: True)])
+        manager.run(program)
+        self.assertTrue(all(unit.allocation is None for unit in program.get_code_units()))
+
+    def test_required_analyses_are_computed_first(self):
+        seen = []
+        manager = PassManager([Pass("look", lambda p, a: seen.append(a.num_computed) and False,
+                                    requires=["cfg", "loops"])])
+        program = self.compile_string(DEAD_CHAIN)
+        manager.run(program)
+        self.assertEqual([2 * len(program.get_code_units())], seen)
+
+    def test_passes_use_the_cached_analyses(self):
+        # i doubles rather than counting, so none of the loop passes can change the loop
+        program = self.compile_string("program p begin var i := 1; while (i < 100) begin i := i * 2; end; "
+                                      "println i; end")
+        for optimisation in get_pipeline(2):
+            if optimisation.name in ["inline", "hoist-invariants", "reduce-strength", "unroll"]:
+                manager = PassManager([optimisation])
+                self.assertFalse(manager.run(program))
+                # everything the pass looked at was worked out beforehand, as it said it would be
+                self.assertEqual(len(optimisation.requires), manager.analyses.num_computed)
+                self.assertGreater(manager.analyses.num_reused, 0)
+
+
+        # changing the code of one unit only throws away its own analyses
+        program = self.compile_string(DEAD_CHAIN)
+        analyses = AnalysisCache(program)
+        main_cfg, procedure = analyses.get("cfg", program), program.procedures[0]
+        procedure_cfg = analyses.get("cfg", procedure)
+        analyses.invalidate_unit(procedure)
+        self.assertIs(main_cfg, analyses.get("cfg", program))
+        self.assertIsNot(procedure_cfg, analyses.get("cfg", procedure))
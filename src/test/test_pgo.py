@@ -0,0 +1,114 @@
+import io
+import os
+import tempfile
+import unittest
+
+from grammarparse import parse_grammar_from_file
+from inline import inline_procedures
+from pgo import Profile, collect_profile, layout_blocks, load_profile
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import parse_string
+from tac import compile_to_tac
+from test.common_test import get_grammar_file
+from typechecker import type_check
+from unroll import unroll_loops
+from vm import run_tac
+
+RARE_BRANCH = """program p begin
+    var i := 0; var rare := 0;
+    while (i < 100) begin
+        if (i == 50) then begin rare := rare + 1; end else begin rare := rare + 2; end;
+        i := i + 1;
+    end;
+    println rare;
+end"""
+
+
+class TestProfileGuidedOptimisation(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+
+    def compile_string(self, s):
+        parse_tree = parse_string(s, self.expansions)
+        semantic_analyse(parse_tree)
+        type_check(parse_tree)
+        return compile_to_tac(parse_tree)
+
+    def run_program(self, program, profiling=False):
+        stdout = io.StringIO()
+        vm = run_tac(program, io.StringIO(), stdout, profiling)
+        return vm, stdout.getvalue()
+
+    def test_collect_profile(self):
+        vm, _ = self.run_program(self.compile_string(RARE_BRANCH), profiling=True)
+        profile = collect_profile(vm)
+
+        self.assertEqual(101, profile.blocks["while_start@3:5"])
+        self.assertEqual(99, profile.blocks["if_false@4:9"])
+        self.assertEqual([101, 1], profile.branches["branch@3:5"])
+        self.assertEqual([100, 99], profile.branches["branch@4:9"])
+
+    def test_layout_makes_common_case_fall_through(self):
+        before, expected_output = self.run_program(self.compile_string(RARE_BRANCH), profiling=True)
+        profile = collect_profile(before)
+
+        program = self.compile_string(RARE_BRANCH)
+        self.assertTrue(layout_blocks(program, profile))
+        self.assertIn("IfNZ", repr(program))
+
+        after, output = self.run_program(program)
+        self.assertEqual(expected_output, output)
+        self.assertLess(after.branches_taken, before.branches_taken)
+
+        # laying out again with the same profile changes nothing
+        self.assertFalse(layout_blocks(program, profile))
+
+    def test_layout_with_empty_profile(self):
+        program = self.compile_string(RARE_BRANCH)
+        before = repr(program)
+        self.assertFalse(layout_blocks(program, Profile()))
+        self.assertEqual(before, repr(program))
+
+    def test_save_and_load(self):
+        program = self.compile_string(RARE_BRANCH)
+        profile = collect_profile(self.run_program(program, profiling=True)[0])
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "profile.json")
+            profile.save(filename)
+            loaded = load_profile(filename)
+
+            # the source has moved down two lines since the profile was recorded
+            shifted = self.compile_string("\n\n" + RARE_BRANCH)
+            matched = load_profile(filename, shifted)
+
+        self.assertEqual(profile.blocks, loaded.blocks)
+        self.assertEqual(profile.branches, loaded.branches)
+        self.assertEqual(101, matched.blocks["while_start@5:5"])
+        self.assertEqual([100, 99], matched.branches["branch@6:9"])
+
+    def test_profile_guides_inlining(self):
+        source = ("program p begin "
+                  "procedure report(num n) begin " + "println n; " * 16 + "end "
+                  "var i := 0; "
+                  "while (i < 3) begin i := i + 1; end; "
+                  "if (i == 10) then begin report(i); end; "
+                  "end")
+        program = self.compile_string(source)
+        profile = collect_profile(self.run_program(program, profiling=True)[0])
+
+        # called from only one place, so it is inlined without a profile, but the call never runs
+        self.assertTrue(inline_procedures(self.compile_string(source), optimisation_level=2))
+        program = self.compile_string(source)
+        self.assertFalse(inline_procedures(program, optimisation_level=2, profile=profile))
+        self.assertIn("LCall _report", repr(program))
+
+    def test_cold_loops_are_not_unrolled(self):
+        source = ("program p begin var total := 0; var go := 0; "
+                  "if (go == 1) then begin var i := 0; while (i < 4) begin total := total + i; i := i + 1; end; end; "
+                  "println total; end")
+        program = self.compile_string(source)
+        profile = collect_profile(self.run_program(program, profiling=True)[0])
+
+        self.assertTrue(unroll_loops(self.compile_string(source)))
+        self.assertFalse(unroll_loops(self.compile_string(source), profile=profile))
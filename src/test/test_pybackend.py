@@ -0,0 +1,124 @@
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from grammarparse import parse_grammar_from_file
+from loopopt import optimise_loops
+from pybackend import compile_to_python, generate_python
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import parse_string
+from tac import compile_to_tac
+from test.common_test import compile_data_file, get_grammar_file
+from typechecker import type_check
+from vm import OreoRuntimeError, run_tac
+
+
+class TestPythonBackend(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+
+    def compile_string(self, s):
+        parse_tree = parse_string(s, self.expansions)
+        semantic_analyse(parse_tree)
+        type_check(parse_tree)
+        return compile_to_tac(parse_tree)
+
+    def test_same_as_vm(self):
+        for filename in ["loops.oreo", "counted_loops.oreo", "procedures.oreo", "overflow.oreo"]:
+            with self.subTest(filename):
+                program = compile_data_file(filename, self.expansions)
+                optimise_loops(program)
+
+                vm_output = io.StringIO()
+                vm = run_tac(program, stdout=vm_output)
+                output = io.StringIO()
+                variables = compile_to_python(program).run(stdout=output)
+
+                self.assertEqual(vm_output.getvalue(), output.getvalue())
+                for name, value in variables.items():
+                    self.assertEqual(vm.get_variable(name), value)
+
+    def test_straight_line_code(self):
+        program = self.compile_string("program p begin var a := 7; var b := (0 - a) / 2; get a; println a; end")
+        python_program = compile_to_python(program)
+        self.assertNotIn("while", python_program.source)
+
+        output = io.StringIO()
+        variables = python_program.run(io.StringIO("hi\n"), output)
+        self.assertEqual({"a": "hi", "b": -3}, variables)
+        self.assertEqual("hi\n", output.getvalue())
+
+    def test_recursion(self):
+        program = self.compile_string("program p begin "
+                                      "procedure countdown(num n) begin "
+                                      "if (n > 0) then begin print n; countdown(n - 1); end; "
+                                      "end "
+                                      "countdown(3); "
+                                      "end")
+        output = io.StringIO()
+        compile_to_python(program).run(stdout=output)
+        self.assertEqual("321", output.getvalue())
+
+    def test_standalone(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "program.py")
+            for name in ["procedures.oreo", "overflow.oreo"]:
+                with self.subTest(name):
+                    program = compile_data_file(name, self.expansions)
+                    with open(filename, "w") as file:
+                        file.write(generate_python(program))
+                    vm_output = io.StringIO()
+                    run_tac(program, stdout=vm_output)
+                    result = subprocess.run([sys.executable, filename], capture_output=True, text=True)
+                    self.assertEqual(vm_output.getvalue(), result.stdout)
+
+            program = self.compile_string("program p begin var a := \"\"; get a; println a; "
+                                          "var z := 0; var b := 1 / z; end")
+            with open(filename, "w") as file:
+                file.write(generate_python(program))
+            result = subprocess.run([sys.executable, filename], input="hi\n", capture_output=True, text=True)
+            self.assertEqual(1, result.returncode)
+            self.assertEqual("hi\n", result.stdout)
+            self.assertEqual("Division by zero\n", result.stderr)
+
+    def test_deep_recursion(self):
+        program = self.compile_string("program p begin "
+                                      "procedure down(num n) begin "
+                                      "if (n > 0) then begin down(n - 1); end; "
+                                      "if (n == 0) then begin println 0; end; "
+                                      "end "
+                                      "down(5000); "
+                                      "end")
+        output = io.StringIO()
+        compile_to_python(program).run(stdout=output)
+        self.assertEqual("0\n", output.getvalue())
+
+    def test_runaway_recursion(self):
+        program = self.compile_string("program p begin "
+                                      "procedure forever() begin forever(); end "
+                                      "forever(); "
+                                      "end")
+        with self.assertRaises(OreoRuntimeError):
+            compile_to_python(program).run()
+
+    def test_division_by_zero(self):
+        program = self.compile_string("program p begin var a := 0; var b := 1 / a; end")
+        with self.assertRaises(OreoRuntimeError):
+            compile_to_python(program).run()
+
+    def test_code_is_cached(self):
+        first = compile_to_python(compile_data_file("loops.oreo", self.expansions))
+        second = compile_to_python(compile_data_file("loops.oreo", self.expansions))
+        self.assertIs(first.code, second.code)
+
+    def test_dump(self):
+        python_program = compile_to_python(compile_data_file("procedures.oreo", self.expansions))
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "procedures.py")
+            python_program.dump(filename)
+            with open(filename) as file:
+                self.assertEqual(python_program.source, file.read())
+        self.assertIn("def p_sum_to(v_n):", python_program.source)
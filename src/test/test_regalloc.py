@@ -0,0 +1,69 @@
+import unittest
+
+from grammarparse import parse_grammar_from_file
+from loopopt import hoist_loop_invariants
+from regalloc import allocate_temporaries, get_live_intervals, is_valid_allocation
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import parse_string
+from tac import compile_to_tac
+from test.common_test import compile_data_file, get_grammar_file
+from typechecker import type_check
+
+
+class TestRegisterAllocation(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+
+    def compile_string(self, s):
+        parse_tree = parse_string(s, self.expansions)
+        semantic_analyse(parse_tree)
+        type_check(parse_tree)
+        return compile_to_tac(parse_tree)
+
+    def test_slots_are_reused(self):
+        program = compile_data_file("loops.oreo", self.expansions)
+        allocate_temporaries(program)
+
+        self.assertEqual(7, len(program.allocation.intervals))
+        self.assertEqual(2, program.allocation.get_num_slots())
+        self.assertTrue(is_valid_allocation(program.allocation))
+
+    def test_loop_carried_temporary(self):
+        program = compile_data_file("loops.oreo", self.expansions)
+        intervals = {i.name: i for i in get_live_intervals(program.program)}
+        self.assertFalse(intervals["t_1"].overlaps(intervals["t_5"]))
+
+        # once hoisted, t_1 is read on every iteration, so must stay live for the whole loop
+        hoist_loop_invariants(program)
+        intervals = {i.name: i for i in get_live_intervals(program.program)}
+        self.assertTrue(intervals["t_1"].overlaps(intervals["t_5"]))
+
+        allocate_temporaries(program)
+        self.assertTrue(is_valid_allocation(program.allocation))
+        self.assertNotEqual(program.allocation.get_slot("t_1"), program.allocation.get_slot("t_5"))
+
+    def test_spilling(self):
+        program = self.compile_string("program p begin var a := 1; "
+                                      "var x := ((a * 2) + (a * 3)) * ((a * 4) + (a * 5)); end")
+        allocate_temporaries(program)
+        self.assertEqual(4, program.allocation.num_registers_used)
+        self.assertEqual(0, program.allocation.num_spill_slots)
+
+        # the temporaries which live longest are spilled
+        allocate_temporaries(program, num_registers=2)
+        self.assertEqual(2, program.allocation.num_registers_used)
+        self.assertEqual({"t_3", "t_6"}, set(program.allocation.spill_slots))
+        self.assertTrue(is_valid_allocation(program.allocation))
+
+        slots = {program.allocation.get_slot(i.name) for i in program.allocation.intervals}
+        self.assertEqual({0, 1, 2, 3}, slots)
+
+    def test_frame_size(self):
+        program = compile_data_file("procedures.oreo", self.expansions)
+        allocate_temporaries(program)
+
+        # sum_to's two temporaries are never live at the same time
+        sum_to = program.get_procedure("sum_to")
+        self.assertEqual(1, sum_to.allocation.get_num_slots())
+        self.assertEqual(3 * 8, sum_to.frame_size)
+        self.assertEqual("BeginFunc 24;", repr(sum_to.program[0]))
@@ -0,0 +1,65 @@
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from grammarparse import parse_grammar_from_file
+from lexer import lex
+from passes import optimise
+from semanticanalyser import semantic_analyse
+from session import CompilationSession
+from syntaxanalyser import parse_file, syntax_analyse
+from tac import compile_to_tac
+from test.common_test import get_data_dir, get_grammar_file
+from typechecker import type_check
+
+
+class TestCompilationSession(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+
+    def compile_data_file(self, filename, session=None, optimisation_level=2):
+        parse_tree = parse_file(os.path.join(get_data_dir(), filename), self.expansions)
+        semantic_analyse(parse_tree)
+        type_check(parse_tree)
+        program = compile_to_tac(parse_tree, session)
+        optimise(program, optimisation_level)
+        return program
+
+    def test_numbering(self):
+        session = CompilationSession()
+        program = self.compile_data_file("procedures.oreo", session, optimisation_level=0)
+        self.assertIs(session, program.session)
+        self.assertIs(session, program.procedures[0].session)
+        optimise(program, 2)
+        self.assertGreater(session.num_inlined_calls, 0)
+
+        num_labels = session.num_labels
+        self.assertEqual(f"L{num_labels + 1}_extra", program.new_label("extra").name)
+        temporary = program.new_variable()
+        self.assertEqual(str(session.num_temporaries), temporary.name)
+
+    def test_independent(self):
+        # compiling another program in between does not change how the first is numbered
+        expected = repr(self.compile_data_file("procedures.oreo"))
+        other = self.compile_data_file("loops.oreo")
+        self.assertEqual(expected, repr(self.compile_data_file("procedures.oreo")))
+        other.new_label("extra")
+        self.assertEqual(expected, repr(self.compile_data_file("procedures.oreo")))
+
+    def test_threads(self):
+        filenames = ["procedures.oreo", "loops.oreo", "counted_loops.oreo"] * 3
+        expected = {filename: repr(self.compile_data_file(filename)) for filename in set(filenames)}
+
+        # the parser only reads the grammar, so one grammar can be shared between the threads
+        def compile_in_thread(filename):
+            with open(os.path.join(get_data_dir(), filename)) as file:
+                parse_tree = syntax_analyse(lex(file.read()), self.expansions)
+            semantic_analyse(parse_tree)
+            type_check(parse_tree)
+            program = compile_to_tac(parse_tree)
+            optimise(program, 2)
+            return filename, repr(program)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            for filename, program in executor.map(compile_in_thread, filenames):
+                self.assertEqual(expected[filename], program)
@@ -1,10 +1,10 @@
 import os
 import unittest
 
-from grammarparse import parse_grammar_from_file
-from parseerror import ParseError
+from grammarparse import parse_grammar, parse_grammar_from_file
+from parseerror import ErrorLog, ParseError, ParseErrors
 from syntaxanalyser import syntax_analyse, parse_file
-from lexer import lex
+from lexer import Token, lex
 from test.common_test import get_data_dir, get_grammar_file
 
 
@@ -46,7 +46,130 @@ class TestSyntaxAnalyser(unittest.TestCase):
                     else:
                         self.assertIsNotNone(parse_file(path, self.expansions))
 
+    def test_recovery(self):
+        source = """program p begin
+            var x := 1 +;
+            println x
+            var y := 2;
+            while (y <) begin
+                println y;
+            end;
+            if (x > 1) then begin
+                println 1 2;
+            end;
+            5;
+            println x;
+        end"""
+        errors = ErrorLog()
+        parse_tree = syntax_analyse(lex(source), self.expansions, errors)
+        self.assertEqual([(2, 25), (4, 13), (5, 23), (9, 27), (11, 13)],
+                         [(e.line_num, e.col_num) for e in errors.errors])
+        self.assertEqual("expected a valid term, got ';'", errors.errors[0].description)
+
+        # each statement with an error is replaced by an error node, but a declaration keeps its variable
+        compound = parse_tree.get_child("compound")
+        statements = [s.children[0] if s.children else s for s in compound.children[1:-1]]
+        self.assertEqual(["v", "error", "v", "error", "i", "error", "pr"], [repr(s.content) for s in statements])
+        self.assertEqual(["VAR", "ID(x)", "error"], [repr(c.content) for c in statements[0].children])
+        self.assertEqual(["BEGIN", "error", "END"],
+                         [repr(c.content) for c in statements[4].get_child("compound").children])
+
+        # as does a procedure definition its name, so calls to it are not errors too
+        parse_tree = syntax_analyse(lex("program p begin procedure f(num begin return 1; end println f(); end"),
+                                    self.expansions, errors)
+        definition = parse_tree.get_child("compound").children[1].children[0]
+        self.assertEqual(["PROCEDURE", "ID_PAREN(f()", "error"], [repr(c.content) for c in definition.children])
+
+        # without recovery, the first error is the same
+        for filename in ["test2.oreo", "test3.oreo", "test4.oreo", "nested_function.oreo", "illegal_expression.oreo"]:
+            with self.subTest(filename):
+                with open(os.path.join(get_data_dir(), filename)) as f:
+                    source = f.read()
+                with self.assertRaises(ParseError) as context:
+                    syntax_analyse(lex(source), self.expansions)
+                errors = ErrorLog()
+                try:
+                    syntax_analyse(lex(source), self.expansions, errors)
+                except ParseErrors:
+                    pass
+                self.assertEqual(context.exception.message, errors.errors[0].message)
+
+        # an error outside any statement stops the parse, as does reaching the most errors allowed
+        with self.assertRaises(ParseErrors) as context:
+            syntax_analyse(lex("program begin println 1; end"), self.expansions, ErrorLog())
+        self.assertEqual(1, len(context.exception.errors))
+        with self.assertRaises(ParseErrors) as context:
+            syntax_analyse(lex("program p begin 1; 2; 3; end"), self.expansions, ErrorLog(max_errors=2))
+        self.assertTrue(context.exception.is_truncated)
+        self.assertEqual(2, len(context.exception.errors))
+
+    def test_repetitions(self):
+        # statements are parsed into a flat list in their compound
+        statements = "".join(f"println {i};" for i in range(500))
+        parse_tree = syntax_analyse(lex(f"program p begin {statements} end"), self.expansions)
+        compound = parse_tree.get_child("compound")
+        self.assertEqual(502, len(compound.children))
+        self.assertTrue(all(child.is_non_terminal("statement") for child in compound.children[1:-1]))
+        self.assertTrue(all(child.parent is compound and child.level == 2 for child in compound.children))
+
+        # an optional symbol which is not there leaves no node
+        v = syntax_analyse(lex("program p begin var x; end"), self.expansions).get_child("compound").children[1]
+        self.assertEqual(["VAR", "ID", ";"], [c.content.token.name for c in v.children[0].children])
+
+    def test_toy_repetitions(self):
+        expansions = parse_grammar([
+            'p -> "PROGRAM" list? "END"',
+            'list -> item+ ","*',
+            'item -> "ID" "NUMBER"?',
+        ])
+
+        def parse(s):
+            return syntax_analyse(_make_tokens(s), expansions)
+
+        self.assertEqual(["PROGRAM", "END"], [repr(c.content) for c in parse("PROGRAM END").children])
+        items = parse("PROGRAM ID ID NUMBER ID , , END").get_child("list").children
+        self.assertEqual(["item", "item", "item", ",", ","], [repr(c.content) for c in items])
+        self.assertEqual([1, 2, 1], [len(item.children) for item in items[:3]])
+
+        with self.assertRaises(ParseError) as context:
+            parse("PROGRAM , END")
+        self.assertEqual("expected 'end', got ','", context.exception.description)
+
+        with self.assertRaises(ParseError) as context:
+            parse("PROGRAM ID NUMBER")
+        self.assertEqual("expected 'item', got END OF FILE", context.exception.description)
+
     def test_print_parse_tree(self):
         parse_tree = syntax_analyse(lex("program prog begin print x >= y; end"), self.expansions)
         print(parse_tree.get_pretty_print_string())
         self.assertIsNotNone(parse_tree)
+
+    def test_print_limits(self):
+        statements = "".join(f"println {i};" for i in range(20))
+        parse_tree = syntax_analyse(lex(f"program p begin {statements} end"), self.expansions)
+
+        lines = parse_tree.get_pretty_print_string(max_depth=2, max_children=4).splitlines()
+        # a line of labels for each level, and a line of edges above each but the first, with the levels below the
+        # deepest drawn as a box under each node which has children
+        self.assertEqual(7, len(lines))
+        self.assertIn("BEGIN", lines[4])
+        self.assertEqual(3, lines[4].count("statement"))
+        self.assertIn("… 18 more", lines[4])
+        self.assertEqual(3, lines[6].count("…"))
+
+        # a subtree is drawn as if it were the whole tree
+        statement = parse_tree.get_child("compound").children[1]
+        self.assertEqual(statement.get_pretty_print_string(), syntax_analyse(
+            lex("program p begin println 0; end"), self.expansions).get_child("compound").children[1]
+                         .get_pretty_print_string())
+        self.assertEqual(2, len(parse_tree.children[0].get_pretty_print_string().splitlines()))
+
+
+# tokens with the names in the string, all on one line
+def _make_tokens(s):
+    tokens = []
+    for col_num, name in enumerate(s.split()):
+        token = Token(name, None, 1, col_num)
+        token.context_line = s
+        tokens.append(token)
+    return tokens
@@ -0,0 +1,55 @@
+import io
+import unittest
+
+from grammarparse import parse_grammar_from_file
+from passes import optimise
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import parse_string
+from synthetic import ProgramShape, generate_program
+from tac import compile_to_tac
+from test.common_test import get_grammar_file
+from typechecker import type_check
+from vm import run_tac
+
+
+class TestSynthetic(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+
+    def compile_string(self, s):
+        parse_tree = parse_string(s, self.expansions)
+        semantic_analyse(parse_tree)
+        type_check(parse_tree)
+        return compile_to_tac(parse_tree)
+
+    def run_program(self, program):
+        stdout = io.StringIO()
+        run_tac(program, io.StringIO(), stdout)
+        return stdout.getvalue()
+
+    def test_programs_are_valid(self):
+        for seed in range(8):
+            shape = ProgramShape(statements=10, nesting_depth=seed % 4, expression_length=1 + seed % 5,
+                                 procedures=seed % 3, variables=seed % 4, seed=seed)
+            with self.subTest(seed=seed):
+                source = generate_program(shape)
+                expected_output = self.run_program(self.compile_string(source))
+
+                # and make good test cases for the optimiser
+                program = self.compile_string(source)
+                optimise(program, 2)
+                self.assertEqual(expected_output, self.run_program(program))
+
+    def test_shape(self):
+        source = generate_program(ProgramShape(statements=20, nesting_depth=4, expression_length=7, procedures=2,
+                                               variables=3))
+        self.assertEqual(2, source.count("procedure "))
+        self.assertEqual(source, generate_program(ProgramShape(statements=20, nesting_depth=4, expression_length=7,
+                                                               procedures=2, variables=3)))
+
+        # the first statement is nested 4 deep
+        depths = [len(line) - len(line.lstrip()) for line in source.splitlines() if line.strip() == "begin"]
+        self.assertEqual(4 * 4, max(depths))
+
+    def test_seeds_differ(self):
+        self.assertNotEqual(generate_program(ProgramShape(seed=1)), generate_program(ProgramShape(seed=2)))
@@ -5,7 +5,7 @@ from grammarparse import parse_grammar_from_file
 from semanticanalyser import semantic_analyse
 from syntaxanalyser import parse_file
 from tac import compile_to_tac
-from test.common_test import get_data_dir, get_grammar_file
+from test.common_test import compile_data_file, get_data_dir, get_grammar_file
 from typechecker import type_check
 
 
@@ -22,3 +22,26 @@ class TestTacCompiler(unittest.TestCase):
         program = compile_to_tac(parse_tree)
         print("\nCOMPILE OUTPUT:\n" + repr(program))
         self.assertIsNotNone(parse_tree)
+
+    def test_procedures(self):
+        program = compile_data_file("procedures.oreo", self.expansions)
+
+        self.assertEqual(["add", "sum_to", "greet"], [p.name for p in program.procedures])
+        for procedure in program.procedures:
+            self.assertEqual("BeginFunc", procedure.program[0].op)
+            self.assertEqual("EndFunc", procedure.program[-1].op)
+
+        # add has one temporary, sum_to has two locals and two temporaries
+        self.assertEqual([8, 32, 0], [p.frame_size for p in program.procedures])
+        self.assertEqual("BeginFunc 32;", repr(program.get_procedure("sum_to").program[0]))
+
+    def test_calling_sequence(self):
+        program = compile_data_file("procedures.oreo", self.expansions)
+
+        # arguments are pushed last first, and popped by the caller
+        main = [repr(i) for i in program.program]
+        call = main.index("v_nested = LCall _add;")
+        self.assertEqual(["PushParam t_8;", "PushParam t_7;"], main[call - 2:call])
+        self.assertEqual("PopParams 16;", main[call + 1])
+        self.assertIn("LCall _greet;", main)
+        self.assertIn("Return t_1;", repr(program.get_procedure("add")))
@@ -0,0 +1,68 @@
+import io
+import json
+import unittest
+
+from grammarparse import parse_grammar_from_file
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import parse_string
+from test.common_test import get_grammar_file
+from treeexport import walk, write_dot, write_json_lines, write_tree
+from typechecker import type_check
+
+PROGRAM = """program p begin
+    var x := 'say "hi"';
+    println x;
+end"""
+
+
+class TestTreeExport(unittest.TestCase):
+    def setUp(self):
+        self.tree = parse_string(PROGRAM, parse_grammar_from_file(get_grammar_file()))
+
+    def test_walk(self):
+        nodes = list(walk(self.tree))
+        self.assertEqual(len(self.tree.get_children_breadth_first()), len(nodes))
+        self.assertEqual(list(range(len(nodes))), [node_id for _, node_id, _, _ in nodes])
+
+        # parents come before their children, and each node is one deeper than its parent
+        depths = {}
+        for node, node_id, parent_id, depth in nodes:
+            self.assertEqual(0 if parent_id is None else depths[parent_id] + 1, depth)
+            depths[node_id] = depth
+        self.assertEqual(["p", "PROGRAM", "ID(p)", "compound", "BEGIN"], [repr(n.content) for n, _, _, _ in nodes[:5]])
+
+    def test_json_lines(self):
+        semantic_analyse(self.tree)
+        type_check(self.tree)
+        stream = io.StringIO()
+        write_json_lines(self.tree, stream)
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+
+        self.assertEqual({"id": 0, "parent": None, "depth": 0, "non_terminal": "p"}, records[0])
+        self.assertEqual({"id": 2, "parent": 0, "depth": 1, "terminal": "ID", "attribute": "p", "line": 1,
+                          "column": 8}, records[2])
+        strings = [r for r in records if r.get("terminal") == "STRING"]
+        self.assertEqual(['say "hi"'], [r["attribute"] for r in strings])
+        self.assertIn("STR", [r.get("type") for r in records])
+
+    def test_dot(self):
+        stream = io.StringIO()
+        write_dot(self.tree, stream)
+        lines = stream.getvalue().splitlines()
+
+        self.assertEqual("digraph parse_tree {", lines[0])
+        self.assertEqual("}", lines[-1])
+        self.assertIn('    n0 [label="p", shape=box];', lines)
+        self.assertIn('    n1 [label="PROGRAM", shape=ellipse];', lines)
+        self.assertIn("    n0 -> n1;", lines)
+        self.assertEqual(len(list(walk(self.tree))) - 1, sum("->" in line for line in lines))
+        self.assertIn('label="STRING(say \\"hi\\")"', stream.getvalue())
+
+    def test_box(self):
+        stream = io.StringIO()
+        write_tree(self.tree, stream, "box", max_depth=1)
+        self.assertEqual(self.tree.get_pretty_print_string(max_depth=1) + "\n", stream.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
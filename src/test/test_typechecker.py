@@ -2,8 +2,10 @@ import os
 import unittest
 
 from grammarparse import parse_grammar_from_file
+from lexer import lex
+from parseerror import ErrorLog, ParseError
 from semanticanalyser import semantic_analyse
-from syntaxanalyser import parse_file
+from syntaxanalyser import parse_file, parse_string, syntax_analyse
 from test.common_test import get_data_dir, get_grammar_file
 from typechecker import type_check
 
@@ -18,3 +20,68 @@ class TestTypeChecker(unittest.TestCase):
         type_check(parse_tree)
         print(parse_tree.get_pretty_print_string(print_type=True))
         self.assertIsNotNone(parse_tree)
+
+    def test_recursive_call_value(self):
+        # the return type of a procedure is not known until the end of it
+        parse_tree = parse_string("program p begin procedure f(num n) begin var r := f(n); return r; end end",
+                                  self.expansions)
+        semantic_analyse(parse_tree)
+        with self.assertRaises(ParseError) as context:
+            type_check(parse_tree)
+        self.assertEqual("Can't use the value of a call to f from inside it", context.exception.description)
+
+    def test_arguments(self):
+        source = """program p begin
+            procedure a(num x, bool b) begin
+                return x;
+            end
+            println a("s", true);
+            a(1, 2);
+            a(1, true, 3);
+            println a(1);
+            println a(1, 1 < 2) + 1;
+        end"""
+        errors = ErrorLog()
+        parse_tree = syntax_analyse(lex(source), self.expansions, errors)
+        semantic_analyse(parse_tree, errors)
+        type_check(parse_tree, errors)
+        self.assertEqual(["expression at STRING(s) has type STR, should be NUM",
+                          "expression at NUMBER(2) has type NUM, should be BOOL",
+                          "a takes 2 arguments but was given 3", "a takes 2 arguments but was given 1"],
+                         [e.description for e in errors.errors])
+
+    def test_recovery(self):
+        source = """program p begin
+            var x := 1 +;
+            println x + 1;
+            println y;
+            var s := "a" * 2;
+            var t := s + 1;
+            if (t + 1) then begin
+                println z;
+            end;
+            var x := 3;
+            procedure f(num a) begin
+                return a + "no";
+            end
+            println f(1) + 1;
+            procedure g(num a) begin
+                var b := a;
+                println b +;
+                return b;
+            end
+            var c := g(1) + 1;
+        end"""
+        errors = ErrorLog()
+        parse_tree = syntax_analyse(lex(source), self.expansions, errors)
+        semantic_analyse(parse_tree, errors)
+        type_check(parse_tree, errors)
+
+        # whatever has an error in it has the error type, which is allowed anywhere, so nothing is reported twice
+        self.assertEqual(["expected a valid term, got ';'", "expected a valid term, got ';'",
+                          "Use of undeclared identifier y",
+                          "Use of undeclared identifier z", "Redefinition of identifier x",
+                          "factor at STRING(a) has type STR, should be NUM",
+                          "expression at ID(t) has type NUM, should be BOOL",
+                          "term at STRING(no) has type STR, should be NUM"],
+                         [e.description for e in errors.errors])
@@ -0,0 +1,47 @@
+import unittest
+
+from cfg import ControlFlowGraph
+from grammarparse import parse_grammar_from_file
+from test.common_test import compile_data_file, get_grammar_file
+from unroll import get_counted_loop, unroll_loops
+
+
+class TestUnroll(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+        self.program = compile_data_file("counted_loops.oreo", self.expansions)
+
+    def get_loops(self):
+        cfg = ControlFlowGraph(self.program.program)
+        return cfg, cfg.get_natural_loops()
+
+    def test_trip_counts(self):
+        cfg, loops = self.get_loops()
+        trip_counts = [get_counted_loop(cfg, loop).get_trip_count() for loop in loops]
+        self.assertEqual([10, 34], trip_counts)
+
+    def test_unroll(self):
+        self.assertTrue(unroll_loops(self.program, factor=4))
+
+        # the short loop has gone completely, and the long one runs four iterations per check
+        _, loops = self.get_loops()
+        self.assertEqual(1, len(loops))
+        self.assertEqual(4, repr(self.program).count("v_d = v_d - 3;") - 2)
+        self.assertEqual(10, repr(self.program).count("v_c = v_c + 1;"))
+        self.assertIn("t_4 = 4 < v_d;", repr(self.program))
+
+    def test_size_budget(self):
+        self.assertFalse(unroll_loops(self.program, size_budget=1))
+        self.assertEqual(2, len(self.get_loops()[1]))
+
+    def test_no_full_unroll(self):
+        self.assertTrue(unroll_loops(self.program, factor=3, max_full_unroll_trip_count=0))
+
+        # 10 iterations is three passes of three iterations, then one more
+        self.assertEqual(3 + 1, repr(self.program).count("v_c = v_c + 1;"))
+        self.assertIn("t_1 = v_c < 9;", repr(self.program))
+
+    def test_unknown_start(self):
+        program = compile_data_file("loops.oreo", self.expansions)
+        cfg = ControlFlowGraph(program.program)
+        self.assertTrue(all(get_counted_loop(cfg, loop) is None for loop in cfg.get_natural_loops()))
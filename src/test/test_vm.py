@@ -0,0 +1,112 @@
+import io
+import unittest
+
+from grammarparse import parse_grammar_from_file
+from inline import inline_procedures
+from loopopt import optimise_loops
+from regalloc import allocate_temporaries
+from semanticanalyser import semantic_analyse
+from syntaxanalyser import parse_string
+from tac import compile_to_tac
+from test.common_test import compile_data_file, get_grammar_file
+from typechecker import type_check
+from unroll import unroll_loops
+from vm import OreoRuntimeError, run_tac
+
+
+class TestVirtualMachine(unittest.TestCase):
+    def setUp(self):
+        self.expansions = parse_grammar_from_file(get_grammar_file())
+
+    def compile_string(self, s):
+        parse_tree = parse_string(s, self.expansions)
+        semantic_analyse(parse_tree)
+        type_check(parse_tree)
+        return compile_to_tac(parse_tree)
+
+    def run_program(self, program, stdin=""):
+        stdout = io.StringIO()
+        vm = run_tac(program, io.StringIO(stdin), stdout)
+        return vm, stdout.getvalue()
+
+    def test_arithmetic(self):
+        program = self.compile_string("program p begin "
+                                      "var a := 7; var b := 0 - 2; "
+                                      "println a + b * 3; println a / b; println (0 - a) / 2; println (a / 2) * 2; "
+                                      "end")
+        _, output = self.run_program(program)
+        self.assertEqual("1\n-3\n-3\n6\n", output)
+
+        # as in the C runtime, numbers are 64 bit and wrap round
+        program = compile_data_file("overflow.oreo", self.expansions)
+        _, output = self.run_program(program)
+        self.assertEqual("-7055958792655077376\n-9223372036854775808\n9223372036854775807\n-9223372036854775808\n"
+                         "-9223372036854775808\n7766279631452241919\n1\n", output)
+
+    def test_booleans(self):
+        program = self.compile_string("program p begin "
+                                      "var a := 3; "
+                                      "println a < 4; println a > 4; println a <= 3; println a >= 4; println a == 3; "
+                                      "println true and not false; println false or (a == 2); "
+                                      "end")
+        _, output = self.run_program(program)
+        self.assertEqual("1\n0\n1\n0\n1\n1\n0\n", output)
+
+    def test_input_output(self):
+        program = self.compile_string("program p begin "
+                                      "var name; var other; get name; get other; "
+                                      "print 'hello '; println name; println other; "
+                                      "end")
+        _, output = self.run_program(program, stdin="oreo\nbiscuit")
+        self.assertEqual("hello oreo\nbiscuit\n", output)
+
+    def test_procedures(self):
+        vm, output = self.run_program(compile_data_file("procedures.oreo", self.expansions))
+        self.assertEqual("90\nhello oreo\n9\n", output)
+        self.assertEqual(9, vm.get_variable("nested"))
+        self.assertEqual([], vm.parameters)
+        self.assertEqual([], vm.call_stack)
+
+    def test_recursion(self):
+        program = self.compile_string("program p begin "
+                                      "procedure countdown(num n) begin "
+                                      "if (n > 0) then begin println n; countdown(n - 1); end; "
+                                      "end "
+                                      "countdown(3); "
+                                      "end")
+        _, output = self.run_program(program)
+        self.assertEqual("3\n2\n1\n", output)
+
+    def test_division_by_zero(self):
+        program = self.compile_string("program p begin var a := 0; var b := 1 / a; end")
+        with self.assertRaises(OreoRuntimeError):
+            self.run_program(program)
+
+    def test_counters(self):
+        program = self.compile_string("program p begin "
+                                      "var i := 0; while (i < 3) begin i := i + 1; end; "
+                                      "end")
+        vm, _ = self.run_program(program)
+
+        # 1 initialisation, then 4 instructions for each of 3 iterations, then the final check of the condition
+        self.assertEqual(1 + 4 * 3 + 2, vm.instructions_executed)
+        self.assertEqual(4, vm.branches_executed)
+        self.assertEqual(1, vm.branches_taken)
+
+    # optimising must not change what a program does, and should make it do less work
+    def test_optimisations_preserve_behaviour(self):
+        for filename, variable in [("loops.oreo", "total"), ("counted_loops.oreo", "total"),
+                                   ("procedures.oreo", "nested")]:
+            with self.subTest(filename):
+                program = compile_data_file(filename, self.expansions)
+                before, before_output = self.run_program(program)
+
+                inline_procedures(program)
+                optimise_loops(program)
+                unroll_loops(program)
+                allocate_temporaries(program)
+                after, after_output = self.run_program(program)
+
+                self.assertEqual(before_output, after_output)
+                self.assertEqual(before.get_variable(variable), after.get_variable(variable))
+                self.assertLess(after.instructions_executed, before.instructions_executed)
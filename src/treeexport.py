@@ -0,0 +1,75 @@
+import json
+from typing import Iterator, Optional, TextIO, Tuple
+
+from syntaxanalyser import ParseTreeNode, Terminal
+
+TREE_FORMATS = ["box", "jsonl", "dot"]
+
+
+# every node in the tree, depth first in source order, with its number in that order, its parent's number and its
+# depth below the root
+# only the path from the root to the current node is kept, so however many nodes the tree has, the memory used only
+# grows with its depth
+def walk(root: ParseTreeNode) -> Iterator[Tuple[ParseTreeNode, int, Optional[int], int]]:
+    yield root, 0, None, 0
+    next_id = 1
+    stack = [(0, iter(root.children))]  # each node on the path, with the children of it still to visit
+    while stack:
+        parent_id, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            continue
+
+        yield child, next_id, parent_id, len(stack)
+        if child.children:
+            stack.append((next_id, iter(child.children)))
+        next_id += 1
+
+
+# what the exporters say about a node, as a JSON object
+def get_record(node: ParseTreeNode, node_id: int, parent_id: Optional[int], depth: int) -> dict:
+    record = {"id": node_id, "parent": parent_id, "depth": depth}
+    if isinstance(node.content, Terminal):
+        token = node.content.token
+        record.update(terminal=token.name, attribute=token.attribute, line=token.line_num, column=token.col_num)
+    else:
+        record["non_terminal"] = node.content.name
+    if hasattr(node, "type"):
+        record["type"] = node.type
+    return record
+
+
+# write each node as a JSON object on a line of its own, parents before their children
+def write_json_lines(root: ParseTreeNode, stream: TextIO):
+    for node, node_id, parent_id, depth in walk(root):
+        stream.write(json.dumps(get_record(node, node_id, parent_id, depth)) + "\n")
+
+
+# write the tree as a Graphviz graph, with boxes for non terminals and ellipses for terminals
+def write_dot(root: ParseTreeNode, stream: TextIO, print_type=False):
+    stream.write("digraph parse_tree {\n")
+    for node, node_id, parent_id, _ in walk(root):
+        label = repr(node.content)
+        if print_type and hasattr(node, "type"):
+            label += f": {node.type}"
+        shape = "ellipse" if isinstance(node.content, Terminal) else "box"
+        stream.write(f"    n{node_id} [label={_quote(label)}, shape={shape}];\n")
+        if parent_id is not None:
+            stream.write(f"    n{parent_id} -> n{node_id};\n")
+    stream.write("}\n")
+
+
+# write the tree in one of TREE_FORMATS
+def write_tree(root: ParseTreeNode, stream: TextIO, tree_format="box", print_scope=False, print_type=False,
+               max_depth=None, max_children=None):
+    if tree_format == "jsonl":
+        write_json_lines(root, stream)
+    elif tree_format == "dot":
+        write_dot(root, stream, print_type)
+    else:
+        stream.write(root.get_pretty_print_string(print_scope, print_type, max_depth, max_children) + "\n")
+
+
+def _quote(s: str) -> str:
+    return '"' + s.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
@@ -1,6 +1,6 @@
 from typing import List
 
-from parseerror import ParseError
+from parseerror import ErrorLog, ParseError
 from syntaxanalyser import ParseTreeNode, Terminal
 
 # types
@@ -8,33 +8,52 @@ BOOL = "BOOL"
 NUM = "NUM"
 STR = "STR"
 NONE = "NONE"  # for functions that return nothing
+ERROR = "ERROR"  # for whatever an error has been reported in, which any type is allowed in place of
 
 
 # publicly callable top level type check
-def type_check(root: ParseTreeNode):
+# if errors is given, each error is added to it and type checking carries on after it, instead of stopping at the first
+def type_check(root: ParseTreeNode, errors: ErrorLog = None):
     # do not type check the name of the program, just the body
-    _type_check(root.get_child("compound"), [])
+    _type_check(root.get_child("compound"), [], errors)
+
+
+# type check one procedure definition on its own, eg again after it has changed
+# procedures are the definitions of the procedures it can call, other than itself, which have been type checked
+def type_check_procedure(definition: ParseTreeNode, procedures: List[ParseTreeNode], errors: ErrorLog = None):
+    _type_check(definition, list(procedures), errors)
 
 
 # private recursive call of type checker
-def _type_check(node: ParseTreeNode, procedures: List[ParseTreeNode]):
+def _type_check(node: ParseTreeNode, procedures: List[ParseTreeNode], errors: ErrorLog = None):
+    # do this first to allow recursive procedures, and so that a procedure which has already been type checked can
+    # still be called
+    if node.is_non_terminal("function_definition"):
+        procedures.append(node)
+
     # only type check each node once
     # this is useful because sometimes type checking happens out of order, eg in assignment
     if hasattr(node, "type"):
         return
 
-    # do this first to allow recursive procedures
-    if node.is_non_terminal("function_definition"):
-        procedures.append(node)
-
     # type check from the bottom up
     for child in node.children:
-        _type_check(child, procedures)
+        _type_check(child, procedures, errors)
+
+    try:
+        _type_check_node(node, procedures, errors)
+    except ParseError as e:
+        if errors is None:
+            raise
+        errors.add(e)
+        node.type = ERROR  # so that nothing using the node is reported as well
 
+
+def _type_check_node(node: ParseTreeNode, procedures, errors):
     # there is no nice way to do this because many cases have unique behaviour
     # so sadly the best simple way to do it is a big old branching if statement
     if node.is_non_terminal("function_definition"):
-        node.type = node.get_child("function_compound").type
+        node.type = ERROR if _has_error(node) else node.get_child("function_compound").type
 
     elif node.is_non_terminal("function_compound"):
         _type_check_function_compound(node)
@@ -60,6 +79,9 @@ def _type_check(node: ParseTreeNode, procedures: List[ParseTreeNode]):
     elif node.is_non_terminal("factor"):
         _type_check_factor(node, procedures)
 
+    elif node.is_non_terminal("function_call"):
+        _type_check_function_call(node, procedures, none_return_allowed=True)
+
     elif node.is_non_terminal("bool"):
         _type_check_bool(node)
 
@@ -79,7 +101,7 @@ def _type_check(node: ParseTreeNode, procedures: List[ParseTreeNode]):
         node.type = NUM
 
     elif node.is_terminal("ID"):
-        var_type = node.scope.get_var_type(node, procedures)
+        var_type = node.scope.get_var_type(node, procedures, errors)
         node.type = var_type
 
     elif node.is_terminal("NUMBER") or node.is_terminal("NUM"):
@@ -92,6 +114,10 @@ def _type_check(node: ParseTreeNode, procedures: List[ParseTreeNode]):
     elif node.is_terminal("STRING") or node.is_terminal("STR") or node.is_terminal("GET"):
         node.type = STR
 
+    # left by the parser in place of the value of an assignment with an error in it
+    elif node.is_non_terminal("error"):
+        node.type = ERROR
+
 
 def _type_check_return_statement(node):
     optional_expr_node = node.get_child("optional_expr", optional=True)
@@ -169,13 +195,30 @@ def _type_check_function_call(node: ParseTreeNode, procedures, none_return_allow
     called_procedure = id_paren.content.token.attribute
 
     for procedure in procedures:
-        if procedure.get_child("ID_PAREN").content.token.attribute == called_procedure:
-            if procedure.type == NONE and not none_return_allowed:
+        # the name is always the second child of a definition, and reading it directly keeps calls to programs with
+        # many procedures quick
+        if procedure.children[1].content.token.attribute == called_procedure:
+            # a call from inside the procedure comes before its return type is known, which is only allowed when
+            # there is an error in it, eg if it is missing its end, so that the rest of the program is in it
+            if not hasattr(procedure, "type"):
+                if _has_error(procedure):
+                    node.type = ERROR
+                    return
+                if not none_return_allowed:
+                    token = id_paren.content.token
+                    raise ParseError(f"Can't use the value of a call to {called_procedure[:-1]} from inside it",
+                                     token.line_num, token.col_num, token.context_line)
+
+            elif procedure.type == NONE and not none_return_allowed:
                 token = id_paren.content.token
                 raise ParseError(f"Can't assign to procedure that returns none",
                                  token.line_num, token.col_num, token.context_line)
 
-            node.type = procedure.type
+            # the parameters of a definition the parser recovered inside are not known
+            if not procedure.has_child("error"):
+                _check_arguments(node, procedure)
+            # a call statement's value is not used, and it may be a call to the procedure it is in
+            node.type = NONE if none_return_allowed else procedure.type
             return
 
     token = id_paren.content.token
@@ -183,12 +226,55 @@ def _type_check_function_call(node: ParseTreeNode, procedures, none_return_allow
                      token.line_num, token.col_num, token.context_line)
 
 
+# a call must give one argument of the right type for each of the procedure's parameters
+def _check_arguments(call: ParseTreeNode, procedure: ParseTreeNode):
+    token = call.get_child("ID_PAREN").content.token
+    arguments = get_argument_nodes(call)
+    parameter_types = _get_parameter_types(procedure)
+    if len(arguments) != len(parameter_types):
+        raise ParseError(f"{token.attribute[:-1]} takes {len(parameter_types)} arguments but was given "
+                         f"{len(arguments)}", token.line_num, token.col_num, token.context_line)
+
+    for argument, parameter_type in zip(arguments, parameter_types):
+        _require_type(argument, parameter_type)
+
+
+# the expression nodes of the arguments in a procedure call, which is a function_call statement or a factor
+def get_argument_nodes(call: ParseTreeNode) -> List[ParseTreeNode]:
+    parameters = call.get_child("parameters", optional=True)
+    if parameters is None:
+        return []
+    return [parameters.get_child("expression")] \
+        + [p.get_child("expression") for p in parameters.children if p.is_non_terminal("later_parameters")]
+
+
+# the type of each parameter of a function_definition, in order
+def _get_parameter_types(function_definition: ParseTreeNode) -> List[str]:
+    args = function_definition.get_child("func_def_args", optional=True)
+    if args is None:
+        return []
+    arg_types = [args.get_child("arg_type")] \
+        + [a.get_child("arg_type") for a in args.children if a.is_non_terminal("later_func_def_arg")]
+    return [arg_type.children[0].content.token.name for arg_type in arg_types]
+
+
+# returns true iff the parser left an error node anywhere in the tree, in place of something it could not parse
+def _has_error(root: ParseTreeNode):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.is_non_terminal("error"):
+            return True
+        stack += node.children
+    return False
+
+
 def _require_child_type(node: ParseTreeNode, child: str, required_type):
     _require_type(node.get_child(child), required_type)
 
 
 def _require_type(node, required_type):
-    if node.type != required_type:
+    if node.type not in [required_type, ERROR]:
         child = node
         while not isinstance(child.content, Terminal):
             child = child.children[0]
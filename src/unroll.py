@@ -0,0 +1,199 @@
+from typing import Union
+
+from analysis import AnalysisCache, transform_each_loop
+from cfg import ControlFlowGraph, Loop, count_uses
+from loopopt import find_induction_variables
+from tac import IF_FALSE_GOTO, TacInstruction, TacProgram, TacVariable, clone_code, is_number_literal
+
+DEFAULT_UNROLL_FACTOR = 4
+# loops which run at most this many times are unrolled completely, if they fit in the size budget
+MAX_FULL_UNROLL_TRIP_COUNT = 16
+# the most instructions that unrolling may turn a single loop body into
+DEFAULT_SIZE_BUDGET = 256
+
+
+# unroll loops whose trip count is known at compile time
+# loops with few enough iterations are replaced by that many copies of their body, and larger ones have their
+# body repeated factor times per check of the loop condition
+# with a profile, loops which never ran are left alone, as unrolling them would only make the program bigger
+# returns true iff the program was changed
+def unroll_loops(program: TacProgram, factor=DEFAULT_UNROLL_FACTOR,
+                 max_full_unroll_trip_count=MAX_FULL_UNROLL_TRIP_COUNT, size_budget=DEFAULT_SIZE_BUDGET,
+                 profile=None, analyses: AnalysisCache = None):
+    analyses = analyses or AnalysisCache(program)
+
+    def unroll(unit, cfg, loop):
+        counted_loop = get_counted_loop(cfg, loop, analyses.get("loops", unit), analyses.get("dominators", unit),
+                                        analyses.get("uses", unit))
+        if counted_loop is None:
+            return False
+        if profile is not None and loop.header.label is not None \
+                and profile.get_block_count(loop.header.label) == 0:
+            return False
+
+        return counted_loop.unroll(unit, factor, max_full_unroll_trip_count, size_budget)
+
+    return transform_each_loop(program, unroll, analyses)
+
+
+# a loop of the form:
+# L_header: t = i < limit; IfZ t Goto L_exit; <body, which adds step to i exactly once>; Goto L_header;
+# where i has a constant value on entry to the loop
+class CountedLoop:
+    def __init__(self, cfg: ControlFlowGraph, loop: Loop, induction_variable: TacVariable, start: int, step: int,
+                 limit: int):
+        self.cfg = cfg
+        self.loop = loop
+        self.induction_variable = induction_variable
+        self.start = start
+        self.step = step
+        self.limit = limit
+
+        self.header = loop.header
+        self.latch = loop.latches[0]
+        self.comparison, self.branch = self.header.instructions
+        self.exit_label = self.branch.get_jump_target()
+
+        # the body, without the jump back to the header
+        self.body = []
+        for block in cfg.blocks[self.header.index + 1:self.latch.index + 1]:
+            if block.label is not None:
+                self.body.append(block.label)
+            self.body.extend(i for i in block.instructions if i is not self.latch.get_terminator())
+        self.body_size = len([i for i in self.body if isinstance(i, TacInstruction)])
+
+    def get_trip_count(self):
+        distance = self.limit - self.start if self.step > 0 else self.start - self.limit
+        return max(0, -(-distance // abs(self.step)))
+
+    # unit is the main program or procedure the loop is in
+    def unroll(self, unit, factor, max_full_unroll_trip_count, size_budget):
+        trip_count = self.get_trip_count()
+
+        if trip_count <= max_full_unroll_trip_count and trip_count * self.body_size <= size_budget:
+            code = [self.header.label] + self._copy_body(unit, trip_count)
+
+        else:
+            factor = self._choose_factor(trip_count, factor, size_budget)
+            if factor is None:
+                return False
+            code = self._unroll_partially(unit, trip_count, factor)
+
+        # the loop is replaced in place, so the exit may no longer directly follow it
+        after_loop = self.cfg.blocks[self.latch.index + 1] if self.latch.index + 1 < len(self.cfg.blocks) else None
+        if after_loop is None or after_loop.label is None or after_loop.label.name != self.exit_label.name:
+            code.append(TacInstruction(result_var=self.exit_label, op="Goto"))
+
+        self.cfg.replace_blocks(self.header.index, self.latch.index, code)
+        return True
+
+    # the largest factor no bigger than the requested one for which the unrolled loop and its leftover
+    # iterations fit in the budget
+    def _choose_factor(self, trip_count, factor, size_budget):
+        for f in range(min(factor, trip_count), 1, -1):
+            if (f + trip_count % f) * self.body_size <= size_budget:
+                return f
+        return None
+
+    # the loop runs factor iterations per check of the condition, for as many whole multiples of factor as it can
+    # then runs the remaining iterations one after another
+    def _unroll_partially(self, unit, trip_count, factor):
+        whole_iterations = trip_count // factor
+        remainder_label = unit.new_label("unroll_remainder")
+
+        # stop as soon as there are not enough iterations left to run factor of them
+        comparison = self.comparison.copy()
+        new_limit = str(self.start + whole_iterations * factor * self.step)
+        if self.step > 0:
+            comparison.arg2 = new_limit
+        else:
+            comparison.arg1 = new_limit
+        branch = self.branch.copy()
+        branch.result_var = remainder_label
+
+        return [self.header.label, comparison, branch] \
+            + self._copy_body(unit, factor) \
+            + [TacInstruction(result_var=self.header.label, op="Goto"), remainder_label] \
+            + self._copy_body(unit, trip_count % factor)
+
+    def _copy_body(self, unit, times):
+        code = []
+        for _ in range(times):
+            code.extend(clone_code(self.body, unit.session))
+        return code
+
+
+# returns a CountedLoop if the loop has a trip count known at compile time, otherwise None
+# loops, dominators and uses are the cfg's natural loops, dominators and count_uses, which are worked out from it if
+# they are not given
+def get_counted_loop(cfg: ControlFlowGraph, loop: Loop, loops=None, dominators=None, uses=None) \
+        -> Union[CountedLoop, None]:
+    header = loop.header
+    if len(loop.latches) != 1 or loop.get_exiting_blocks() != [header] or len(header.instructions) != 2:
+        return None
+
+    # the body must be laid out straight after the header, with no loops inside it
+    latch = loop.latches[0]
+    if set(cfg.blocks[header.index:latch.index + 1]) != loop.blocks or latch.get_terminator() is None \
+            or latch.get_terminator().is_conditional_jump():
+        return None
+    loops = loops if loops is not None else cfg.get_natural_loops()
+    if any(other.header in loop.blocks for other in loops if other.header is not header):
+        return None
+
+    comparison, branch = header.instructions
+    condition = comparison.get_defined_variable()
+    if comparison.op != "<" or branch.op != IF_FALSE_GOTO or not isinstance(branch.arg1, TacVariable) \
+            or repr(branch.arg1) != repr(condition) or condition.is_named:
+        return None
+
+    # the condition must not be needed anywhere else, as the unrolled loop only calculates it occasionally
+    uses = uses if uses is not None else count_uses(i for b in cfg.blocks for i in b.instructions)
+    if uses[repr(condition)] != 1:
+        return None
+
+    induction_variables = find_induction_variables(loop)
+    if isinstance(comparison.arg1, TacVariable) and repr(comparison.arg1) in induction_variables \
+            and is_number_literal(comparison.arg2):
+        variable, limit, counts_up = comparison.arg1, int(comparison.arg2), True
+    elif isinstance(comparison.arg2, TacVariable) and repr(comparison.arg2) in induction_variables \
+            and is_number_literal(comparison.arg1):
+        variable, limit, counts_up = comparison.arg2, int(comparison.arg1), False
+    else:
+        return None
+
+    # the induction variable must move towards the limit, and be updated exactly once per iteration
+    increment_block, _, step = induction_variables[repr(variable)]
+    dominators = dominators if dominators is not None else cfg.get_dominators()
+    if step == 0 or (step > 0) != counts_up or increment_block not in dominators[latch]:
+        return None
+
+    start = _get_initial_value(loop, variable)
+    if start is None:
+        return None
+
+    return CountedLoop(cfg, loop, variable, start, step, limit)
+
+
+# follow the only path into the loop backwards, looking for a constant assignment to variable
+def _get_initial_value(loop: Loop, variable: TacVariable) -> Union[int, None]:
+    entries = [p for p in loop.header.predecessors if p not in loop.blocks]
+    if len(entries) != 1:
+        return None
+
+    block = entries[0]
+    visited = set()
+    while block not in visited:
+        visited.add(block)
+        for instruction in reversed(block.instructions):
+            defined = instruction.get_defined_variable()
+            if defined is not None and repr(defined) == repr(variable):
+                if instruction.op == "copy" and is_number_literal(instruction.arg1):
+                    return int(instruction.arg1)
+                return None
+
+        if len(block.predecessors) != 1:
+            return None
+        block = block.predecessors[0]
+
+    return None
@@ -0,0 +1,380 @@
+from typing import Dict, List, Tuple, Union
+
+from oreoio import OreoIO
+from tac import IF_FALSE_GOTO, IF_TRUE_GOTO, SLOT_SIZE, Label, TacInstruction, TacProcedure, TacProgram, TacVariable, \
+    is_number_literal, wrap
+
+# calls nested deeper than this are assumed to be runaway recursion
+MAX_CALL_DEPTH = 100000
+
+
+class OreoRuntimeError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+# where each variable and constant of a code unit lives in its frame
+# named variables come first, then temporaries, then the constants the unit uses
+# temporaries share slots according to the unit's allocation, if it has one, otherwise each gets a slot of its own
+class FrameLayout:
+    def __init__(self, unit: Union[TacProgram, TacProcedure]):
+        self.slots: Dict[str, int] = {}
+        self.constants: Dict[Union[int, str], int] = {}
+        self.parameter_slots: List[int] = []
+
+        instructions = [i for i in unit.program if isinstance(i, TacInstruction)]
+        variables = [v for i in instructions for v in i.get_used_variables() + [i.get_defined_variable()]
+                     if v is not None]
+        parameters = unit.parameters if isinstance(unit, TacProcedure) else []
+
+        for variable in parameters + [v for v in variables if v.is_named]:
+            self.slots.setdefault(repr(variable), len(self.slots))
+        self.parameter_slots = [self.slots[repr(p)] for p in parameters]
+
+        num_named = len(self.slots)
+        allocation = unit.allocation
+        for variable in variables:
+            name = repr(variable)
+            if not variable.is_named and name not in self.slots:
+                if allocation is not None:
+                    self.slots[name] = num_named + allocation.get_slot(name)
+                else:
+                    self.slots[name] = len(self.slots)
+
+        self.size = max(self.slots.values(), default=-1) + 1
+        self.template: list = [0] * self.size
+
+    # the slot holding the operand, which is either a variable or a literal
+    def get_slot(self, operand) -> int:
+        if isinstance(operand, TacVariable):
+            return self.slots[repr(operand)]
+
+        # number literals wrap round to 64 bits, like the results of arithmetic
+        value = wrap(int(operand)) if is_number_literal(operand) else operand[1:-1]
+        if value not in self.constants:
+            self.constants[value] = len(self.template)
+            self.template.append(value)
+        return self.constants[value]
+
+
+# executes TAC directly
+# before running, every code unit is decoded into one flat list of (handler, d, a, b) tuples, where the handler
+# is looked up once from the op, labels are resolved to indices into the list, and operands are resolved to slots
+# in a frame, which is a plain list
+# procedures are laid out first, then the main program, so the program ends when execution runs off the end
+# when profiling, the machine also counts how many times each instruction runs and how many times each
+# conditional jump finds its condition false. This uses a separate loop and separate branch handlers, so costs
+# nothing when it is off
+class VirtualMachine:
+    def __init__(self, program: TacProgram, stdin=None, stdout=None, profiling=False):
+        self.io = OreoIO(stdin, stdout)
+        self.write = self.io.write  # bound once, as printing is so common
+
+        self.code = []
+        self.frame: list = []
+        self.parameters: list = []  # the parameter stack
+        self.call_stack: list = []  # (return index, caller's frame, slot for the returned value)
+
+        self.instructions_executed = 0
+        self.branches_executed = 0
+        self.branches_taken = 0
+
+        self.profiling = profiling
+        self.instructions: List[TacInstruction] = []  # the instruction each entry of code was decoded from
+        self.labels: List[Tuple[Label, int]] = []  # each label, with the index of the instruction after it
+
+        self._load(program)
+        self.execution_counts = [0] * len(self.code) if profiling else None
+        self.false_counts = [0] * len(self.code) if profiling else None
+
+    def _load(self, program: TacProgram):
+        units = program.procedures + [program]
+        layouts = {id(unit): FrameLayout(unit) for unit in units}
+
+        # resolve every label to the index of the instruction after it
+        label_indices = {}
+        starts = {}
+        index = 0
+        for unit in units:
+            starts[id(unit)] = index
+            for item in unit.program:
+                if isinstance(item, Label):
+                    label_indices[item.name] = index
+                    self.labels.append((item, index))
+                else:
+                    index += 1
+
+        procedures = {p.label.name: (starts[id(p)], layouts[id(p)].template,
+                                     layouts[id(p)].parameter_slots) for p in program.procedures}
+
+        handlers = dict(HANDLERS, **PROFILING_HANDLERS) if self.profiling else HANDLERS
+        for unit in units:
+            layout = layouts[id(unit)]
+            for item in unit.program:
+                if isinstance(item, TacInstruction):
+                    self.code.append(_decode(item, layout, label_indices, procedures, handlers))
+                    self.instructions.append(item)
+
+        self.entry = starts[id(program)]
+        self.main_template = layouts[id(program)].template
+        self.main_slots = layouts[id(program)].slots
+
+    def run(self):
+        code = self.code
+        end = len(code)
+        self.frame = list(self.main_template)
+        pc = self.entry
+        executed = 0
+
+        try:
+            if self.profiling:
+                counts = self.execution_counts
+                while pc < end:
+                    counts[pc] += 1
+                    handler, d, a, b = code[pc]
+                    pc = handler(self, pc + 1, d, a, b)
+                    executed += 1
+            else:
+                while pc < end:
+                    handler, d, a, b = code[pc]
+                    pc = handler(self, pc + 1, d, a, b)
+                    executed += 1
+        except ZeroDivisionError:
+            raise OreoRuntimeError("Division by zero")
+        finally:
+            self.instructions_executed += executed
+            self.io.flush()
+
+        return self
+
+    # the value of a variable of the main program
+    def get_variable(self, name):
+        return self.frame[self.main_slots["v_" + name]]
+
+    def get_counters(self):
+        return {
+            "instructions_executed": self.instructions_executed,
+            "branches_executed": self.branches_executed,
+            "branches_taken": self.branches_taken
+        }
+
+
+# load the program into a new virtual machine and run it, returning the machine so its counters can be read
+def run_tac(program: TacProgram, stdin=None, stdout=None, profiling=False) -> VirtualMachine:
+    return VirtualMachine(program, stdin, stdout, profiling).run()
+
+
+def _decode(instruction: TacInstruction, layout: FrameLayout, label_indices, procedures, handlers):
+    op = instruction.op
+    d = a = b = -1
+
+    if instruction.is_jump():
+        d = label_indices[instruction.get_jump_target().name]
+    elif isinstance(instruction.result_var, TacVariable):
+        d = layout.get_slot(instruction.result_var)
+
+    if op == "LCall":
+        a = procedures[instruction.arg1.name]
+    elif op in ["BeginFunc", "PopParams"]:
+        a = int(instruction.arg1) // SLOT_SIZE
+    elif instruction.arg1 is not None:
+        a = layout.get_slot(instruction.arg1)
+
+    if instruction.arg2 is not None:
+        b = layout.get_slot(instruction.arg2)
+
+    return handlers[op], d, a, b
+
+
+# handlers take the machine, the index of the next instruction and the decoded operands,
+# and return the index of the instruction to run next
+# the arithmetic handlers only wrap a result round when it is out of range, with the limits written out, as looking
+# up INT_MIN and INT_MAX would slow every one down
+
+def _copy(vm, pc, d, a, b):
+    frame = vm.frame
+    frame[d] = frame[a]
+    return pc
+
+
+def _add(vm, pc, d, a, b):
+    frame = vm.frame
+    value = frame[a] + frame[b]
+    frame[d] = value if -0x8000000000000000 <= value <= 0x7FFFFFFFFFFFFFFF else wrap(value)
+    return pc
+
+
+def _subtract(vm, pc, d, a, b):
+    frame = vm.frame
+    value = frame[a] - frame[b]
+    frame[d] = value if -0x8000000000000000 <= value <= 0x7FFFFFFFFFFFFFFF else wrap(value)
+    return pc
+
+
+def _multiply(vm, pc, d, a, b):
+    frame = vm.frame
+    value = frame[a] * frame[b]
+    frame[d] = value if -0x8000000000000000 <= value <= 0x7FFFFFFFFFFFFFFF else wrap(value)
+    return pc
+
+
+# division truncates towards zero, and only overflows dividing the most negative number by -1
+def _divide(vm, pc, d, a, b):
+    frame = vm.frame
+    dividend, divisor = frame[a], frame[b]
+    quotient = abs(dividend) // abs(divisor)
+    frame[d] = wrap(-quotient if (dividend < 0) != (divisor < 0) else quotient)
+    return pc
+
+
+def _equal(vm, pc, d, a, b):
+    frame = vm.frame
+    frame[d] = 1 if frame[a] == frame[b] else 0
+    return pc
+
+
+def _less_than(vm, pc, d, a, b):
+    frame = vm.frame
+    frame[d] = 1 if frame[a] < frame[b] else 0
+    return pc
+
+
+def _and(vm, pc, d, a, b):
+    frame = vm.frame
+    frame[d] = 1 if frame[a] and frame[b] else 0
+    return pc
+
+
+def _or(vm, pc, d, a, b):
+    frame = vm.frame
+    frame[d] = 1 if frame[a] or frame[b] else 0
+    return pc
+
+
+def _not(vm, pc, d, a, b):
+    frame = vm.frame
+    frame[d] = 0 if frame[a] else 1
+    return pc
+
+
+def _goto(vm, pc, d, a, b):
+    return d
+
+
+def _if_false_goto(vm, pc, d, a, b):
+    vm.branches_executed += 1
+    if vm.frame[a]:
+        return pc
+    vm.branches_taken += 1
+    return d
+
+
+def _if_true_goto(vm, pc, d, a, b):
+    vm.branches_executed += 1
+    if not vm.frame[a]:
+        return pc
+    vm.branches_taken += 1
+    return d
+
+
+def _if_false_goto_profiling(vm, pc, d, a, b):
+    vm.branches_executed += 1
+    if vm.frame[a]:
+        return pc
+    vm.false_counts[pc - 1] += 1
+    vm.branches_taken += 1
+    return d
+
+
+def _if_true_goto_profiling(vm, pc, d, a, b):
+    vm.branches_executed += 1
+    if not vm.frame[a]:
+        vm.false_counts[pc - 1] += 1
+        return pc
+    vm.branches_taken += 1
+    return d
+
+
+def _read_line(vm, pc, d, a, b):
+    vm.frame[d] = vm.io.read_line()
+    return pc
+
+
+def _print(vm, pc, d, a, b):
+    vm.write(str(vm.frame[a]))
+    return pc
+
+
+def _print_line(vm, pc, d, a, b):
+    vm.write(str(vm.frame[a]) + "\n")
+    return pc
+
+
+def _push_parameter(vm, pc, d, a, b):
+    vm.parameters.append(vm.frame[a])
+    return pc
+
+
+def _pop_parameters(vm, pc, d, a, b):
+    del vm.parameters[len(vm.parameters) - a:]
+    return pc
+
+
+# the callee gets a fresh frame, with its parameters copied in from the top of the parameter stack
+def _call(vm, pc, d, a, b):
+    entry, template, parameter_slots = a
+    if len(vm.call_stack) >= MAX_CALL_DEPTH:
+        raise OreoRuntimeError(f"Procedure calls nested more than {MAX_CALL_DEPTH} deep")
+
+    frame = list(template)
+    parameters = vm.parameters
+    for i, slot in enumerate(parameter_slots):
+        frame[slot] = parameters[-1 - i]
+
+    vm.call_stack.append((pc, vm.frame, d))
+    vm.frame = frame
+    return entry
+
+
+def _begin_function(vm, pc, d, a, b):
+    return pc
+
+
+def _return(vm, pc, d, a, b):
+    value = vm.frame[a] if a >= 0 else None
+    pc, vm.frame, result = vm.call_stack.pop()
+    if result >= 0:
+        vm.frame[result] = value
+    return pc
+
+
+HANDLERS = {
+    "copy": _copy,
+    "+": _add,
+    "-": _subtract,
+    "*": _multiply,
+    "/": _divide,
+    "==": _equal,
+    "<": _less_than,
+    "&&": _and,
+    "||": _or,
+    "not": _not,
+    "Goto": _goto,
+    IF_FALSE_GOTO: _if_false_goto,
+    IF_TRUE_GOTO: _if_true_goto,
+    "ReadLine": _read_line,
+    "PrintString": _print,
+    "PrintStringLn": _print_line,
+    "PushParam": _push_parameter,
+    "PopParams": _pop_parameters,
+    "LCall": _call,
+    "BeginFunc": _begin_function,
+    "Return": _return,
+    "EndFunc": _return
+}
+
+PROFILING_HANDLERS = {
+    IF_FALSE_GOTO: _if_false_goto_profiling,
+    IF_TRUE_GOTO: _if_true_goto_profiling
+}